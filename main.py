@@ -52,6 +52,8 @@ random = _try_import_builtin("random")
 argparse = _try_import_builtin("argparse")
 gc = _try_import_builtin("gc")
 heapq = _try_import_builtin("heapq")
+collections = _try_import_builtin("collections")
+inspect = _try_import_builtin("inspect")
 
 if _import_failures:
     _buffer_log("ERROR", f"\n{'='*70}")
@@ -105,6 +107,7 @@ def import_standard_libraries():
         ("csv", "import csv"),
         ("datetime", "import datetime"),
         ("hashlib", "import hashlib"),
+        ("hmac", "import hmac"),
         ("json", "import json"),
         ("math", "import math"),
         ("pickle", "import pickle"),
@@ -113,6 +116,7 @@ def import_standard_libraries():
         ("re", "import re"),
         ("secrets", "import secrets"),
         ("socket", "import socket"),
+        ("sqlite3", "import sqlite3"),
         ("threading", "import threading"),
         ("time", "import time"),
         ("traceback", "import traceback"),
@@ -123,6 +127,8 @@ def import_standard_libraries():
         ("io", "import io"),
         ("zipfile", "import zipfile"),
         ("functools", "import functools"),
+        ("gzip", "import gzip"),
+        ("mimetypes", "import mimetypes"),
         ("ipaddress", "import ipaddress"),
         ("string", "import string"),
     ]
@@ -300,6 +306,7 @@ def check_and_import_dependencies():
             "from flask import Flask, render_template_string, session, redirect, url_for, request, jsonify, make_response, g, send_file, send_from_directory",
             "Flask",
         ),
+        ("Werkzeug 工具函数", "from werkzeug.utils import safe_join", "Werkzeug"),
         ("Flask CORS", "from flask_cors import CORS", "flask-cors"),
         ("pyotp (一次性密码)", "import pyotp", "pyotp"),
         ("requests (HTTP库)", "import requests", "requests"),
@@ -376,15 +383,29 @@ def initialize_global_variables():
     logging.info("开始初始化全局变量...")
 
     global auth_system, token_manager, html_content
-    global web_sessions, web_sessions_lock, session_file_locks, session_file_locks_lock
+    global web_sessions, web_sessions_lock, session_file_locks
     global session_activity, session_activity_lock
     global chrome_pool, background_task_manager
-    global MAX_MEMORY_SESSIONS  # <--- [修正] 添加这一行，声明为全局变量
 
     auth_system = AuthSystem()
     token_manager = TokenManager(TOKENS_STORAGE_DIR)
     logging.info("认证系统和Token管理器已创建。")
 
+    # 以下服务内部持有锁/条件变量，必须在 eventlet.monkey_patch() 之后创建
+    global run_finalizer, multi_account_runner, login_admission, school_cookie_cache
+    global session_store, session_flusher, expiry_service, password_hasher, page_cache
+    global asset_manifest
+    expiry_service = ExpiryService()
+    session_store = SessionStore(SESSION_DB_FILE)
+    session_flusher = SessionFlusher()
+    run_finalizer = RunFinalizationService()
+    multi_account_runner = MultiAccountRunner()
+    login_admission = LoginAdmissionController()
+    school_cookie_cache = SchoolCookieCache()
+    password_hasher = PasswordHasher()
+    page_cache = RenderedPageCache()
+    asset_manifest = StaticAssetManifest()
+
     html_content = ""
     try:
         html_path = "index.html"
@@ -400,13 +421,10 @@ def initialize_global_variables():
         logging.error(f"读取文件时发生错误: {e}", exc_info=True)
         sys.exit(1)
 
-    web_sessions = {}
+    web_sessions = SessionRegistry()
     web_sessions_lock = threading.Lock()
 
-    MAX_MEMORY_SESSIONS = 1000
-
-    session_file_locks = {}
-    session_file_locks_lock = threading.Lock()
+    session_file_locks = [threading.Lock() for _ in range(SESSION_LOCK_STRIPES)]
 
     session_activity = {}
     session_activity_lock = threading.Lock()
@@ -803,9 +821,10 @@ SYSTEM_ACCOUNTS_DIR = "system_accounts"
 LOGIN_LOGS_DIR = "logs"
 SESSION_STORAGE_DIR = "sessions"
 TOKENS_STORAGE_DIR = "tokens"
+RUN_JOURNAL_DIR = "run_journal"
 CONFIG_FILE = "config.ini"
 PERMISSIONS_FILE = "permissions.json"
-SESSION_INDEX_FILE = None
+SESSION_DB_FILE = None
 LOGIN_LOG_FILE = None
 AUDIT_LOG_FILE = None
 
@@ -815,8 +834,8 @@ def _create_directories():
     创建程序运行所需的目录结构，目录路径从 config.ini 配置文件读取。
     """
     global SCHOOL_ACCOUNTS_DIR, SYSTEM_ACCOUNTS_DIR, LOGIN_LOGS_DIR
-    global SESSION_STORAGE_DIR, TOKENS_STORAGE_DIR
-    global SESSION_INDEX_FILE, LOGIN_LOG_FILE, AUDIT_LOG_FILE
+    global SESSION_STORAGE_DIR, TOKENS_STORAGE_DIR, RUN_JOURNAL_DIR
+    global SESSION_DB_FILE, LOGIN_LOG_FILE, AUDIT_LOG_FILE
 
     default_dirs = {
         "school_accounts_dir": "school_accounts",
@@ -824,6 +843,7 @@ def _create_directories():
         "log_dir": "logs",
         "sessions_dir": "sessions",
         "tokens_dir": "tokens",
+        "run_journal_dir": "run_journal",
     }
 
     config_file = os.path.join(os.path.dirname(__file__), "config.ini")
@@ -849,6 +869,11 @@ def _create_directories():
                 default_dirs["tokens_dir"] = config.get(
                     "System", "tokens_dir", fallback=default_dirs["tokens_dir"]
                 )
+                default_dirs["run_journal_dir"] = config.get(
+                    "System",
+                    "run_journal_dir",
+                    fallback=default_dirs["run_journal_dir"],
+                )
 
             if config.has_section("Logging"):
                 default_dirs["log_dir"] = config.get(
@@ -867,6 +892,7 @@ def _create_directories():
     LOGIN_LOGS_DIR = os.path.join(base_dir, default_dirs["log_dir"])
     SESSION_STORAGE_DIR = os.path.join(base_dir, default_dirs["sessions_dir"])
     TOKENS_STORAGE_DIR = os.path.join(base_dir, default_dirs["tokens_dir"])
+    RUN_JOURNAL_DIR = os.path.join(base_dir, default_dirs["run_journal_dir"])
 
     directories = {
         "school_accounts": SCHOOL_ACCOUNTS_DIR,
@@ -874,6 +900,7 @@ def _create_directories():
         "logs": LOGIN_LOGS_DIR,
         "sessions": SESSION_STORAGE_DIR,
         "tokens": TOKENS_STORAGE_DIR,
+        "run_journal": RUN_JOURNAL_DIR,
     }
 
     for name, directory in directories.items():
@@ -892,7 +919,7 @@ def _create_directories():
     else:
         print(f"[目录创建] 目录已存在: user_accounts -> {user_accounts_dir}")
 
-    SESSION_INDEX_FILE = os.path.join(SESSION_STORAGE_DIR, "_index.json")
+    SESSION_DB_FILE = os.path.join(SESSION_STORAGE_DIR, "sessions.db")
     LOGIN_LOG_FILE = os.path.join(LOGIN_LOGS_DIR, "login_history.jsonl")
     AUDIT_LOG_FILE = os.path.join(LOGIN_LOGS_DIR, "audit.jsonl")
 
@@ -915,9 +942,22 @@ def _get_default_config():
         "system_accounts_dir": "system_accounts",
         "sessions_dir": "sessions",
         "tokens_dir": "tokens",
+        "run_journal_dir": "run_journal",
         "permissions_file": "permissions.json",
         "session_monitor_check_interval": "60",
         "session_inactivity_timeout": "300",
+        "session_flush_interval": "2",
+        "token_flush_interval": "30",
+        "token_format": "opaque",
+        "token_signing_key_max_age_days": "30",
+        "session_memory_max_count": "1000",
+        "session_memory_budget_mb": "512",
+        "multi_account_max_concurrency": "20",
+        "login_max_concurrency": "20",
+        "login_rate_per_second": "5",
+        "school_cookie_cache_enabled": "true",
+        "school_cookie_verify_interval": "60",
+        "frontend_split_modules": "true",
     }
 
     config["Logging"] = {
@@ -929,6 +969,9 @@ def _get_default_config():
 
     config["Security"] = {
         "password_storage": "plaintext",
+        "bcrypt_rounds": "12",
+        "password_hash_workers": "2",
+        "password_hash_queue_size": "64",
         "brute_force_protection": "true",
         "login_log_retention_days": "90",
     }
@@ -1046,9 +1089,13 @@ def _write_config_with_comments(config_obj, filepath):
         f.write(
             f"tokens_dir = {config_obj.get('System', 'tokens_dir', fallback='tokens')}\n"
         )
+        f.write("# 跑步任务预写日志目录（用于程序重启后从断点继续执行任务）\n")
+        f.write(
+            f"run_journal_dir = {config_obj.get('System', 'run_journal_dir', fallback='run_journal')}\n"
+        )
 
         f.write("# 会话监控检查间隔时间（秒）\n")
-        f.write("# 系统每隔此时间检查一次会话活跃状态，默认60秒\n")
+        f.write("# 有后台任务的会话每隔此时间复查一次活跃状态，默认60秒\n")
         f.write(
             f"session_monitor_check_interval = {config_obj.get('System', 'session_monitor_check_interval', fallback='60')}\n"
         )
@@ -1057,7 +1104,55 @@ def _write_config_with_comments(config_obj, filepath):
             "# 会话超过此时间无活动（且无正在执行的任务）将被自动清理，默认300秒（5分钟）\n"
         )
         f.write(
-            f"session_inactivity_timeout = {config_obj.get('System', 'session_inactivity_timeout', fallback='300')}\n\n"
+            f"session_inactivity_timeout = {config_obj.get('System', 'session_inactivity_timeout', fallback='300')}\n"
+        )
+        f.write("# 会话状态变更后延迟写入存储的最长时间（秒），期间的多次变更合并为一次写入，默认2\n")
+        f.write(
+            f"session_flush_interval = {config_obj.get('System', 'session_flush_interval', fallback='2')}\n"
+        )
+        f.write("# 令牌续期写回文件的最长延迟（秒），令牌的创建和失效会立即写回，默认30\n")
+        f.write(
+            f"token_flush_interval = {config_obj.get('System', 'token_flush_interval', fallback='30')}\n"
+        )
+        f.write("# 登录令牌格式：opaque=随机令牌（服务器端保存），signed=HMAC签名令牌（无需查询存储即可校验，更短）\n")
+        f.write(
+            f"token_format = {config_obj.get('System', 'token_format', fallback='opaque')}\n"
+        )
+        f.write("# 签名令牌密钥的最长使用天数，到期后自动轮换（旧密钥保留到其签发的令牌过期），默认30\n")
+        f.write(
+            f"token_signing_key_max_age_days = {config_obj.get('System', 'token_signing_key_max_age_days', fallback='30')}\n"
+        )
+        f.write("# 内存中保留的已恢复会话数量上限，超出后将最久未访问且无后台任务的会话写回存储并移出内存，默认1000\n")
+        f.write(
+            f"session_memory_max_count = {config_obj.get('System', 'session_memory_max_count', fallback='1000')}\n"
+        )
+        f.write("# 内存中会话的估算内存预算（MB），超出时同样按最久未访问淘汰，默认512\n")
+        f.write(
+            f"session_memory_budget_mb = {config_obj.get('System', 'session_memory_budget_mb', fallback='512')}\n"
+        )
+        f.write("# 多账号模式同时执行的账号数上限（超出的账号排队等待），默认20\n")
+        f.write(
+            f"multi_account_max_concurrency = {config_obj.get('System', 'multi_account_max_concurrency', fallback='20')}\n"
+        )
+        f.write("# 学校账号同时进行登录请求的数量上限（超出的登录按先后顺序排队），默认20\n")
+        f.write(
+            f"login_max_concurrency = {config_obj.get('System', 'login_max_concurrency', fallback='20')}\n"
+        )
+        f.write("# 学校账号每秒最多发起的登录请求数，设置为0表示不限制，默认5\n")
+        f.write(
+            f"login_rate_per_second = {config_obj.get('System', 'login_rate_per_second', fallback='5')}\n"
+        )
+        f.write("# 是否缓存学校账号的登录Cookie，再次登录时先验证缓存的Cookie，有效则跳过登录，默认true\n")
+        f.write(
+            f"school_cookie_cache_enabled = {config_obj.get('System', 'school_cookie_cache_enabled', fallback='true')}\n"
+        )
+        f.write("# 缓存Cookie验证有效后的信任时长（秒），期间再次使用无需重新验证，默认60\n")
+        f.write(
+            f"school_cookie_verify_interval = {config_obj.get('System', 'school_cookie_verify_interval', fallback='60')}\n"
+        )
+        f.write("# 是否把 index.html 中的管理面板、多账号面板等功能模块拆分为独立缓存的脚本，默认true（重启生效）\n")
+        f.write(
+            f"frontend_split_modules = {config_obj.get('System', 'frontend_split_modules', fallback='true')}\n\n"
         )
 
         # [Logging] 配置
@@ -1088,6 +1183,19 @@ def _write_config_with_comments(config_obj, filepath):
         f.write(
             f"password_storage = {config_obj.get('Security', 'password_storage', fallback='plaintext')}\n"
         )
+        f.write("# bcrypt 成本因子（4-31，每加 1 耗时翻倍）\n")
+        f.write("# 修改后，旧哈希会在用户下次登录成功时自动按新成本重新计算\n")
+        f.write(
+            f"bcrypt_rounds = {config_obj.get('Security', 'bcrypt_rounds', fallback='12')}\n"
+        )
+        f.write("# 密码哈希专用线程数（bcrypt 在这些原生线程中执行，不阻塞 eventlet 主循环）\n")
+        f.write(
+            f"password_hash_workers = {config_obj.get('Security', 'password_hash_workers', fallback='2')}\n"
+        )
+        f.write("# 密码哈希等待队列长度（队列满时登录请求直接提示稍后再试）\n")
+        f.write(
+            f"password_hash_queue_size = {config_obj.get('Security', 'password_hash_queue_size', fallback='64')}\n"
+        )
         f.write("# 是否启用暴力破解防护（true/false）\n")
         f.write("# true：启用登录尝试限制和账号临时锁定\n")
         f.write(
@@ -1525,2063 +1633,4718 @@ def _create_default_admin():
     )
 
 
-def get_session_file_path(session_id: str) -> str:
-    """根据 session_id (UUID) 计算会话文件的完整路径"""
-    session_hash = hashlib.sha256(session_id.encode()).hexdigest()
-    return os.path.join(SESSION_STORAGE_DIR, f"{session_hash}.json")
+class CoordinateSidecar:
+    """
+    任务几何坐标的二进制 sidecar 文件（NumPy .npy，float64，形状为 (N, 3)）。
+    一个任务的 target_points / recommended_coords / draft_coords / run_coords 依次拼接存放在同一文件中，
+    各字段的起止位置与列数记录在会话存储的 session_geometry 表里。
+    加载时以内存映射方式打开，只有在任务真正被访问时才转换为 Python 列表。
+    """
 
+    def __init__(self, path: str, segments: dict, inline: dict | None = None):
+        self.path = path
+        self.segments = segments
+        self.inline = inline or {}
+        self._array = None
 
-# ==============================================================================
-# 认证和权限管理系统
-# ==============================================================================
+    @property
+    def lengths(self) -> dict:
+        lengths = {field: len(points) for field, points in self.inline.items()}
+        lengths.update({field: seg[1] for field, seg in self.segments.items()})
+        return lengths
 
+    @staticmethod
+    def write(directory: str, task_index: int, geometry: dict) -> dict:
+        """写入一个任务的几何坐标，返回需记录到数据库的元数据"""
+        blocks, segments, inline = [], {}, {}
+        offset = 0
+        for field, points in geometry.items():
+            if not points:
+                inline[field] = []
+                continue
+            try:
+                block = np.asarray(points, dtype=np.float64)
+                if block.ndim != 2 or block.shape[1] not in (2, 3):
+                    raise ValueError(f"不支持的坐标形状 {block.shape}")
+            except (ValueError, TypeError):
+                inline[field] = [list(p) for p in points]
+                continue
+            width = block.shape[1]
+            integral = bool(width == 3 and np.all(np.mod(block[:, 2], 1) == 0))
+            if width == 2:
+                block = np.hstack([block, np.zeros((len(block), 1))])
+            blocks.append(block)
+            segments[field] = [offset, len(block), width, integral]
+            offset += len(block)
+
+        meta = {"segments": segments, "inline": inline}
+        if blocks:
+            os.makedirs(directory, exist_ok=True)
+            filename = f"{task_index}_{time.time_ns()}.npy"
+            tmp_path = os.path.join(directory, f".{filename}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.concatenate(blocks).astype("<f8", copy=False))
+            os.replace(tmp_path, os.path.join(directory, filename))
+            meta["file"] = filename
+        return meta
+
+    def load(self) -> dict:
+        """将所有字段转换为坐标元组列表（与 RunData 中的原始类型一致）"""
+        geometry = {field: [tuple(p) for p in points] for field, points in self.inline.items()}
+        if self.segments:
+            if self._array is None:
+                self._array = np.load(self.path, mmap_mode="r")
+            for field, (start, count, width, integral) in self.segments.items():
+                rows = self._array[start : start + count, :width].tolist()
+                if integral:
+                    geometry[field] = [(lon, lat, int(t)) for lon, lat, t in rows]
+                else:
+                    geometry[field] = [tuple(row) for row in rows]
+            self._array = None
+        return geometry
 
-class AuthSystem:
-    """用户认证和权限管理系统"""
 
-    def __init__(self):
-        logging.info("=" * 80)
-        logging.info("初始化AuthSystem认证系统...")
-        self.config = self._load_config()
-        logging.info("配置文件已加载")
-        self.permissions = self._load_permissions()
-        logging.info("权限配置已加载")
-        self.lock = threading.Lock()
-        logging.info("线程锁已创建（使用threading.Lock）")
-        self._synchronize_super_admin_permissions()
-        logging.info("AuthSystem初始化完成")
-        logging.info("=" * 80)
+def session_state_has_background_activity(state: dict) -> bool:
+    """
+    根据持久化的会话状态判断会话是否有后台活动（单账号跑步中、开启了自动签到），
+    与 restore_session_to_api_instance 恢复后台线程的条件一致。
+    """
+    if not state.get("stop_run_flag_set", True):
+        return True
+    if state.get("is_multi_account_mode", False):
+        return bool(
+            state.get("multi_account_usernames") or state.get("multi_account_states")
+        ) and state.get("multi_global_params", {}).get("auto_attendance_enabled", False)
+    return bool(state.get("params", {}).get("auto_attendance_enabled", False))
 
-    def _load_config(self):
-        """加载配置文件（增强：处理重复项错误并提示用户修复）"""
-        logging.debug("_load_config: 开始加载配置文件...")
-        try:
-            _create_config_ini()
-        except configparser.DuplicateOptionError as e:
-            logging.error(
-                f"[系统初始化] 配置文件检查失败 --> 错误类型: {type(e).__name__}, 错误详情: {e}, 可能原因: 配置文件损坏或存在重复选项",
-                exc_info=True,
-            )
-            print(
-                f"\n[严重错误] 配置文件 ('config.ini') 已损坏。请修复上述提到的重复选项，然后重新启动程序。"
-            )
-            sys.exit(1)
-        except Exception as e:
-            logging.error(
-                f"[系统初始化] 配置文件检查时发生未知错误 --> 错误类型: {type(e).__name__}, 错误详情: {e}",
-                exc_info=True,
-            )
-            print(
-                f"\n[严重错误] 检查配置文件 'config.ini' 时发生意外错误: {e}\n请检查文件格式是否正确，然后重新启动程序。"
-            )
-            sys.exit(1)
 
-        config = configparser.ConfigParser()
-        config.optionxform = str
-        try:
-            config.read(CONFIG_FILE, encoding="utf-8")
-            logging.debug(
-                f"_load_config: 配置文件加载完成，配置节: {list(config.sections())}"
-            )
-            return config
-        except configparser.DuplicateOptionError as e:
-            logging.error(
-                f"加载配置文件 '{CONFIG_FILE}' 失败，存在重复的配置项: {e}",
-                exc_info=True,
-            )
-            print(f"\n{'='*60}")
-            print(f"[配置文件错误] 无法加载 config.ini 文件！")
-            print(
-                f"  错误原因: 在区域 [{e.section}] 中发现重复的选项 '{e.option}' (不区分大小写)."
-            )
-            print(f"  错误位置: 大约在文件的第 {e.lineno} 行附近.")
-            print(f"\n  请手动打开文件 '{CONFIG_FILE}' 并进行以下操作:")
-            print(f"    1. 找到 [{e.section}] 区域.")
-            print(
-                f"    2. 确保选项 '{e.option}' (例如 LastUser 或 lastuser) 只出现一次."
-            )
-            print(f"    3. 删除重复的那一行.")
-            print(f"    4. 保存文件后重新运行程序.")
-            print(f"{'='*60}\n")
-            sys.exit(1)
-        except Exception as e:
-            logging.error(
-                f"加载配置文件 '{CONFIG_FILE}' 时发生未知错误: {e}", exc_info=True
-            )
-            print(f"\n[配置文件错误] 读取 config.ini 文件时发生意外错误: {e}")
-            print(f"  请检查文件是否存在、是否有读取权限以及格式是否基本正确。")
-            sys.exit(1)
+class SessionStore:
+    """
+    基于 SQLite（WAL 模式）的会话存储引擎，取代“每个会话一个 JSON 文件 + _index.json 索引”的方式。
+      - sessions 表以 session_id 为主键，last_accessed / auth_username 列建有索引
+      - 任务的几何坐标写入二进制 sidecar 文件（见 CoordinateSidecar），session_geometry 表只记录其位置，
+        按任务序号增量写入；读取时以内存映射方式按需加载
+      - 保存会话为单个事务，不再读改写整个索引文件
+      - 首次打开时自动导入旧的 JSON 会话文件，原文件移入 legacy_json 目录留档
+    """
 
-    def find_user_by_phone(self, phone):
-        """
-        遍历所有系统账号，查找绑定了特定手机号的用户。
-        """
-        accounts_dir = SYSTEM_ACCOUNTS_DIR
-        if not os.path.exists(accounts_dir):
-            return None
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id    TEXT PRIMARY KEY,
+            auth_username TEXT,
+            is_guest      INTEGER NOT NULL DEFAULT 0,
+            created_at    REAL,
+            last_accessed REAL NOT NULL DEFAULT 0,
+            background_active INTEGER,
+            state         TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_last_accessed ON sessions(last_accessed);
+        CREATE INDEX IF NOT EXISTS idx_sessions_auth_username ON sessions(auth_username);
+        CREATE TABLE IF NOT EXISTS session_geometry (
+            session_id TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+            task_index INTEGER NOT NULL,
+            geometry   TEXT NOT NULL,
+            PRIMARY KEY (session_id, task_index)
+        );
+    """
 
-        for filename in os.listdir(accounts_dir):
-            if filename.endswith(".json"):
-                user_file = os.path.join(accounts_dir, filename)
-                try:
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
-                        if user_data.get("phone") == phone:
-                            return user_data.get("auth_username")
-                except Exception:
-                    continue
-        return None
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _connection(self):
+        """获取共享连接（首次调用时建表并迁移旧的 JSON 会话文件），调用方须持有 self._lock"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(self._SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+            if "background_active" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN background_active INTEGER")
+            self._conn = conn
+            self._migrate_json_files()
+        return self._conn
 
-    def unbind_phone_from_user(self, phone, except_username=None):
+    @staticmethod
+    def split_geometry(state: dict) -> tuple[dict, dict]:
+        """将完整会话状态拆分为 (不含几何坐标的状态, {任务序号: 几何坐标})"""
+        geometry = {}
+        tasks = []
+        for index, task in enumerate(state.get("loaded_tasks", [])):
+            task = dict(task)
+            geometry[index] = {
+                field: task.pop(field) for field in RunData.GEOMETRY_FIELDS if field in task
+            }
+            tasks.append(task)
+        if "loaded_tasks" in state:
+            state = dict(state, loaded_tasks=tasks)
+        return state, geometry
+
+    def _geometry_dir(self, session_id: str) -> str:
+        session_hash = hashlib.sha256(session_id.encode()).hexdigest()[:32]
+        return os.path.join(os.path.dirname(self.db_path) or ".", "geometry", session_hash)
+
+    def _remove_sidecars(self, session_id: str, keep: dict | None = None, min_index: int | None = None):
         """
-        查找绑定了指定手机号的用户，并将其手机号字段清空。
+        删除会话的 sidecar 文件。keep 为 {任务序号: 保留的文件名}，仅删除这些任务的旧文件；
+        min_index 给出时删除序号不小于该值的任务文件；两者都未给出时删除整个会话目录。
         """
-        if not phone:
+        directory = self._geometry_dir(session_id)
+        if not os.path.isdir(directory):
             return
+        for filename in os.listdir(directory):
+            try:
+                task_index = int(filename.lstrip(".").split("_", 1)[0])
+            except ValueError:
+                task_index = None
+            if keep is not None:
+                remove = task_index in keep and filename != keep[task_index]
+            elif min_index is not None:
+                remove = task_index is not None and task_index >= min_index
+            else:
+                remove = True
+            if remove:
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except OSError as e:
+                    logging.debug(f"[会话存储] 删除 sidecar 文件 {filename} 失败: {e}")
+        if keep is None and min_index is None:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
 
-        bound_username = self.find_user_by_phone(phone)
-
-        if bound_username and bound_username != except_username:
-            logging.info(
-                f"[手机号解绑] 手机号 {phone} 原本绑定在 {bound_username}。正在解绑..."
+    def _write(self, conn, session_id, state, state_json, last_accessed, geometry, task_count):
+        if state is not None:
+            conn.execute(
+                """
+                INSERT INTO sessions (session_id, auth_username, is_guest, created_at, last_accessed, background_active, state)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    auth_username = excluded.auth_username,
+                    is_guest = excluded.is_guest,
+                    created_at = excluded.created_at,
+                    last_accessed = excluded.last_accessed,
+                    background_active = excluded.background_active,
+                    state = excluded.state
+                """,
+                (
+                    session_id,
+                    state.get("auth_username"),
+                    1 if state.get("is_guest") else 0,
+                    state.get("created_at"),
+                    last_accessed,
+                    1 if session_state_has_background_activity(state) else 0,
+                    state_json or json.dumps(state, ensure_ascii=False),
+                ),
             )
-            user_file = self.get_user_file_path(bound_username)
-            if os.path.exists(user_file):
+        else:
+            conn.execute(
+                "UPDATE sessions SET last_accessed = ? WHERE session_id = ?",
+                (last_accessed, session_id),
+            )
+        written_files = {}
+        if geometry:
+            directory = self._geometry_dir(session_id)
+            rows = []
+            for index, geo in geometry.items():
+                meta = CoordinateSidecar.write(directory, index, geo)
+                written_files[index] = meta.get("file")
+                rows.append((session_id, index, json.dumps(meta, ensure_ascii=False)))
+            conn.executemany(
+                "INSERT OR REPLACE INTO session_geometry (session_id, task_index, geometry) VALUES (?, ?, ?)",
+                rows,
+            )
+        if task_count is not None:
+            conn.execute(
+                "DELETE FROM session_geometry WHERE session_id = ? AND task_index >= ?",
+                (session_id, task_count),
+            )
+        return written_files
+
+    def _migrate_json_files(self):
+        session_dir = os.path.dirname(self.db_path) or "."
+        legacy_files = [f for f in os.listdir(session_dir) if f.endswith(".json")]
+        if not legacy_files:
+            return
+
+        migrated, failed = 0, 0
+        with self._conn:
+            for filename in legacy_files:
+                if filename == "_index.json":
+                    continue
                 try:
-                    with self.lock:
-                        with open(user_file, "r", encoding="utf-8") as f:
-                            user_data = json.load(f)
+                    with open(os.path.join(session_dir, filename), "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                    session_id = state.get("session_id")
+                    if not session_id:
+                        raise ValueError("缺少 session_id")
+                    state, geometry = self.split_geometry(state)
+                    self._write(
+                        self._conn,
+                        session_id,
+                        state,
+                        None,
+                        state.get("last_accessed", 0),
+                        geometry,
+                        len(geometry),
+                    )
+                    migrated += 1
+                except Exception as e:
+                    failed += 1
+                    logging.warning(f"[会话存储] 迁移会话文件 {filename} 失败，已跳过: {e}")
 
-                        if user_data.get("phone") == phone:
-                            user_data["phone"] = ""
-                            with open(user_file, "w", encoding="utf-8") as f:
-                                json.dump(user_data, f, indent=2, ensure_ascii=False)
-                            logging.info(
-                                f"[手机号解绑] 已成功解绑用户 {bound_username} 的手机号。"
-                            )
+        legacy_dir = os.path.join(session_dir, "legacy_json")
+        os.makedirs(legacy_dir, exist_ok=True)
+        for filename in legacy_files:
+            try:
+                os.replace(
+                    os.path.join(session_dir, filename), os.path.join(legacy_dir, filename)
+                )
+            except OSError as e:
+                logging.warning(f"[会话存储] 移动旧会话文件 {filename} 失败: {e}")
+        logging.info(
+            f"[会话存储] 已将 {migrated} 个 JSON 会话文件迁移到 SQLite（失败 {failed} 个），原文件已移至 {legacy_dir}"
+        )
 
-                            self.log_audit(
-                                "System",
-                                "auto_unbind_phone",
-                                f"因手机号 {phone} 被新用户注册或绑定，系统自动解绑了用户 {bound_username} 的手机号",
-                            )
-                except Exception as e:
-                    logging.error(
-                        f"[手机号解绑] 解绑用户 {bound_username} 手机号失败: {e}",
-                        exc_info=True,
+    def _attach_geometry(self, conn, session_id: str, state: dict):
+        """为各任务附加几何坐标：sidecar 文件以 geometry_source 形式附加（按需加载），旧格式直接合并"""
+        tasks = state.get("loaded_tasks")
+        if not tasks:
+            return
+        directory = self._geometry_dir(session_id)
+        for index, raw_geometry in conn.execute(
+            "SELECT task_index, geometry FROM session_geometry WHERE session_id = ?",
+            (session_id,),
+        ):
+            if index >= len(tasks):
+                continue
+            meta = json.loads(raw_geometry)
+            if "segments" in meta:
+                tasks[index]["geometry_source"] = CoordinateSidecar(
+                    os.path.join(directory, meta.get("file", "")),
+                    meta["segments"],
+                    meta.get("inline"),
+                )
+            else:
+                tasks[index].update(meta)
+
+    @staticmethod
+    def _decode_row(raw_state: str, last_accessed: float) -> dict:
+        state = json.loads(raw_state)
+        state["last_accessed"] = last_accessed
+        state["last_saved"] = last_accessed
+        return state
+
+    def get(self, session_id: str, with_geometry: bool = True) -> dict | None:
+        """读取会话状态（默认附带各任务的几何坐标），不存在时返回 None"""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT state, last_accessed FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if not row:
+                return None
+            state = self._decode_row(*row)
+            if with_geometry:
+                self._attach_geometry(conn, session_id, state)
+        return state
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row is not None
+
+    def put(
+        self,
+        session_id: str,
+        state: dict | None,
+        geometry: dict | None = None,
+        task_count: int | None = None,
+        state_json: str | None = None,
+        last_accessed: float | None = None,
+        incremental: bool = False,
+    ) -> bool:
+        """
+        写入会话检查点（单个事务）。
+        state 为 None 时只刷新 last_accessed；geometry 为 {任务序号: 几何坐标}，增量写入时只需包含有变化的任务；
+        给出 task_count 时删除序号超出任务数量的几何记录。未拆分几何坐标的完整状态会自动拆分。
+        incremental=True 时若会话记录已不存在（例如已被清理）则不写入并返回 False，调用方应改为完整写入。
+        """
+        if state is not None and geometry is None and state_json is None:
+            state, geometry = self.split_geometry(state)
+            task_count = len(geometry)
+        if last_accessed is None:
+            last_accessed = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                if incremental and not conn.execute(
+                    "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone():
+                    return False
+                written_files = self._write(
+                    conn, session_id, state, state_json, last_accessed, geometry, task_count
+                )
+            if written_files:
+                self._remove_sidecars(session_id, keep=written_files)
+            if task_count is not None:
+                self._remove_sidecars(session_id, min_index=task_count)
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        """删除会话（几何坐标随之级联删除），返回是否确实删除了记录"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+                )
+            self._remove_sidecars(session_id)
+        return cursor.rowcount > 0
+
+    def delete_expired(self, max_age_s: float) -> int:
+        """删除 last_accessed 早于 max_age_s 秒之前的会话，返回删除数量"""
+        cutoff = time.time() - max_age_s
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                expired_ids = [
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT session_id FROM sessions WHERE last_accessed < ?", (cutoff,)
                     )
+                ]
+                conn.execute("DELETE FROM sessions WHERE last_accessed < ?", (cutoff,))
+            for session_id in expired_ids:
+                self._remove_sidecars(session_id)
+        return len(expired_ids)
+
+    def iter_states(self, with_geometry: bool = True):
+        """遍历所有会话，逐个产出 (session_id, state)；数据损坏的会话 state 为 None"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT session_id, state, last_accessed FROM sessions"
+            ).fetchall()
+        for session_id, raw_state, last_accessed in rows:
+            try:
+                state = self._decode_row(raw_state, last_accessed)
+                if with_geometry:
+                    with self._lock:
+                        self._attach_geometry(self._connection(), session_id, state)
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                state = None
+            yield session_id, state
 
-    def _load_permissions(self):
-        """加载权限配置"""
-        logging.debug(f"_load_permissions: 检查权限文件: {PERMISSIONS_FILE}")
-        if os.path.exists(PERMISSIONS_FILE):
-            with open(PERMISSIONS_FILE, "r", encoding="utf-8") as f:
-                perms = json.load(f)
-            logging.debug(
-                f"_load_permissions: 权限配置已加载，权限组数: {len(perms.get('permission_groups', {}))}, 用户组数: {len(perms.get('user_groups', {}))}"
+    def list_index(self) -> list[dict]:
+        """
+        返回所有会话的轻量索引（session_id、auth_username、is_guest、last_accessed、background_active），
+        不解析会话状态；仅对旧版本写入、尚无 background_active 标记的记录解析一次状态补算。
+        """
+        with self._lock:
+            rows = self._connection().execute(
+                """
+                SELECT session_id, auth_username, is_guest, last_accessed, background_active,
+                       CASE WHEN background_active IS NULL THEN state END
+                FROM sessions
+                """
+            ).fetchall()
+        index = []
+        for session_id, auth_username, is_guest, last_accessed, background_active, raw_state in rows:
+            if background_active is None:
+                try:
+                    background_active = session_state_has_background_activity(
+                        json.loads(raw_state)
+                    )
+                except (json.JSONDecodeError, TypeError, AttributeError):
+                    background_active = False
+            index.append(
+                {
+                    "session_id": session_id,
+                    "auth_username": auth_username,
+                    "is_guest": bool(is_guest),
+                    "last_accessed": last_accessed,
+                    "background_active": bool(background_active),
+                }
             )
-            return perms
-        logging.debug("_load_permissions: 权限文件不存在，使用默认配置")
-        return {"permission_groups": {}, "user_groups": {}}
+        return index
 
-    def _save_permissions(self):
-        """保存权限配置"""
-        logging.debug("_save_permissions: 保存权限配置到文件...")
-        with open(PERMISSIONS_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.permissions, f, indent=2, ensure_ascii=False)
-        logging.debug(f"_save_permissions: 权限配置已保存到 {PERMISSIONS_FILE}")
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
 
-    def get_user_file_path(self, auth_username):
-        """获取用户文件路径"""
-        # 修复: 强制转换为字符串，防止传入 int 类型导致 'int' object has no attribute 'encode'
-        user_hash = hashlib.sha256(str(auth_username).encode()).hexdigest()
-        file_path = os.path.join(SYSTEM_ACCOUNTS_DIR, f"{user_hash}.json")
-        logging.debug(
-            f"get_user_file_path: 用户 {auth_username} 的文件路径: {file_path}"
-        )
-        return file_path
 
-    def _update_user_file_group(self, username, new_group):
-        """
-        (辅助函数) 更新 system_accounts 中用户JSON文件内的 group 字段。
-        这确保了 permissions.json 和用户文件之间的数据一致性。
-        """
-        user_file = self.get_user_file_path(username)
-        if os.path.exists(user_file):
-            try:
-                with open(user_file, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
+# ==============================================================================
+# 认证和权限管理系统
+# ==============================================================================
 
-                if user_data.get("group") != new_group:
-                    user_data["group"] = new_group
-                    with open(user_file, "w", encoding="utf-8") as f:
-                        json.dump(user_data, f, indent=2, ensure_ascii=False)
-                    logging.debug(
-                        f"[权限同步] 已更新用户文件 {os.path.basename(user_file)} 的权限组为 {new_group}"
-                    )
-                    return True
-            except Exception as e:
-                logging.error(
-                    f"[权限同步] 更新用户文件 {os.path.basename(user_file)} 失败: {e}",
-                    exc_info=True,
-                )
-        else:
-            logging.warning(
-                f"[权限同步] 找不到用户 {username} 的文件，无法更新其文件内的权限组。"
-            )
-        return False
 
-    def _get_password_storage_method(self):
-        """
-        获取密码存储方式配置。
-        """
-        method = self.config.get("Security", "password_storage", fallback="plaintext")
-        logging.debug(f"_get_password_storage_method: 密码存储方式: {method}")
-        return method
+SESSION_BASE_SIZE_ESTIMATE = 256 * 1024  # Api 实例本身（requests 会话、线程事件、缓存等）的粗略开销
+ACCOUNT_BASE_SIZE_ESTIMATE = 64 * 1024  # 多账号模式下每个账号会话的粗略开销
+COORD_POINT_SIZE_ESTIMATE = 136  # 一个 (lat, lon, t) 元组加三个 float 对象
+SESSION_EVICTION_MIN_IDLE_S = 30
+SESSION_EVICTION_CHECK_INTERVAL_S = 30
 
-    def _encrypt_password(self, password):
-        """
-        加密密码（根据配置决定是否加密）。
-        """
-        method = self._get_password_storage_method()
-        logging.debug(
-            f"[密码加密] 开始处理密码加密 --> 加密方法: {method}, 密码长度: {len(password)}字符"
-        )
 
-        if method == "bcrypt":
-            try:
+def _run_data_geometry_size(run_data) -> int:
+    # 只统计已物化到内存的坐标，仍留在 mmap 旁路文件中的坐标不计入
+    size = 0
+    for field in RunData.GEOMETRY_FIELDS:
+        value = run_data.__dict__.get(field)
+        if value:
+            size += len(value) * COORD_POINT_SIZE_ESTIMATE
+    return size
 
-                salt = bcrypt.gensalt()
-                hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
-                encrypted = hashed.decode("utf-8")
-                logging.debug(
-                    f"[密码加密] 密码已使用bcrypt加密 --> 哈希长度: {len(encrypted)}字符, 哈希前缀: {encrypted[:7]}... (✓ 安全: 自动加盐，抗暴力破解)"
-                )
-                return encrypted
-            except ImportError:
-                logging.error(
-                    "[密码加密] bcrypt库未安装，无法使用bcrypt加密。请运行: pip install bcrypt"
-                )
-                logging.warning("[密码加密] 降级使用SHA256加密（不安全）")
-                method = "encrypted"
 
-        if method == "encrypted":
-            encrypted = hashlib.sha256(password.encode()).hexdigest()
-            logging.debug(
-                f"[密码加密] 密码已使用SHA256加密 --> 哈希长度: {len(encrypted)}字符, 哈希值前8位: {encrypted[:8]}... (⚠️ 警告: SHA256不加盐存在安全风险，建议迁移到bcrypt)"
-            )
-            return encrypted
+def estimate_session_size(api_instance) -> int:
+    """粗略估算一个已恢复会话占用的内存（字节），用于会话内存预算"""
+    size = SESSION_BASE_SIZE_ESTIMATE + 2 * getattr(api_instance, "_session_state_bytes", 0)
+    for run_data in getattr(api_instance, "all_run_data", []):
+        size += _run_data_geometry_size(run_data)
+    for account_session in getattr(api_instance, "accounts", {}).values():
+        size += ACCOUNT_BASE_SIZE_ESTIMATE
+        for run_data in getattr(account_session, "all_run_data", []):
+            size += _run_data_geometry_size(run_data)
+    return size
 
-        logging.warning(
-            f"[密码加密] 使用明文存储密码 --> ⚠️ 严重安全警告: 明文密码存储极度不安全，强烈建议使用bcrypt模式"
-        )
-        return password
 
-    def _verify_password(self, input_password, stored_password):
-        """
-        验证用户输入的密码是否正确。
-        """
-        logging.debug(
-            f"[密码验证] 开始验证密码 --> 输入密码长度: {len(input_password)}字符, 存储密码长度: {len(stored_password)}字符"
-        )
+def session_has_background_activity(api_instance) -> bool:
+    """会话是否有正在执行的跑步任务或开启中的自动签到（这类会话不能移出内存）"""
+    stop_run_flag = getattr(api_instance, "stop_run_flag", None)
+    if stop_run_flag is not None and not stop_run_flag.is_set():
+        return True
+    multi_run_stop_flag = getattr(api_instance, "multi_run_stop_flag", None)
+    if multi_run_stop_flag is not None and not multi_run_stop_flag.is_set():
+        return True
+    if getattr(api_instance, "is_multi_account_mode", False):
+        return bool(getattr(api_instance, "accounts", {})) and getattr(
+            api_instance, "global_params", {}
+        ).get("auto_attendance_enabled", False)
+    return bool(getattr(api_instance, "params", {}).get("auto_attendance_enabled", False))
 
-        if stored_password.startswith("$2b$") or stored_password.startswith("$2a$"):
-            try:
 
-                result = bcrypt.checkpw(
-                    input_password.encode("utf-8"), stored_password.encode("utf-8")
+class SessionRegistry(dict):
+    """
+    内存会话表（web_sessions）。
+
+    启动时只登记会话索引（冷会话），Api 实例在第一次被访问时才从会话存储恢复。
+    `in` 判断同时覆盖已恢复和冷会话且不会触发恢复；`[]`/`get` 会按需恢复；
+    items()/keys()/len() 等只反映已恢复到内存的会话。
+
+    已恢复的会话按最近访问顺序（LRU）记录；数量超过 session_memory_max_count
+    或估算内存超过 session_memory_budget_mb 时，由后台淘汰线程把最久未访问且
+    没有后台任务的会话写回存储并降级为冷会话，下次访问时再透明恢复。
+    """
+
+    def __init__(self, max_sessions: int | None = None, memory_budget_mb: float | None = None):
+        super().__init__()
+        if max_sessions is None or memory_budget_mb is None:
+            config_max_sessions, config_budget_mb = 1000, 512.0
+            try:
+                config = configparser.ConfigParser()
+                config.read(CONFIG_FILE, encoding="utf-8")
+                config_max_sessions = config.getint(
+                    "System", "session_memory_max_count", fallback=config_max_sessions
                 )
-                logging.debug(
-                    f"[密码验证] bcrypt验证完成 --> 验证结果: {'✓ 成功' if result else '✗ 失败'} (✓ 安全: 使用bcrypt.checkpw，防时序攻击)"
+                config_budget_mb = config.getfloat(
+                    "System", "session_memory_budget_mb", fallback=config_budget_mb
                 )
-                return result
-            except ImportError:
-                logging.error("[密码验证] bcrypt库未安装，无法验证bcrypt密码")
-                return False
             except Exception as e:
-                logging.error(f"[密码验证] bcrypt验证失败 --> 错误: {e}")
-                return False
-
-        elif len(stored_password) == 64 and all(
-            c in "0123456789abcdef" for c in stored_password.lower()
+                logging.warning(f"读取会话内存预算配置失败，使用默认值: {e}")
+            if max_sessions is None:
+                max_sessions = config_max_sessions
+            if memory_budget_mb is None:
+                memory_budget_mb = config_budget_mb
+        self.max_sessions = max(1, max_sessions)
+        self.memory_budget_bytes = int(max(1.0, memory_budget_mb) * 1024 * 1024)
+        self._cold = {}
+        self._hydrate_lock = threading.RLock()
+        self._recency = collections.OrderedDict()
+        self._recency_lock = threading.Lock()
+        self._pressure = threading.Event()
+        self._evictor = None
+        self.evicted_count = 0
+        self.estimated_bytes = 0
+
+    def add_cold(self, session_id, meta):
+        if not dict.__contains__(self, session_id):
+            self._cold[session_id] = meta
+            schedule_session_expiry(session_id)
+
+    def __contains__(self, session_id):
+        return dict.__contains__(self, session_id) or session_id in self._cold
+
+    def __missing__(self, session_id):
+        api_instance = self._hydrate(session_id)
+        if api_instance is None:
+            raise KeyError(session_id)
+        return api_instance
+
+    def __getitem__(self, session_id):
+        api_instance = super().__getitem__(session_id)
+        self._touch(session_id)
+        return api_instance
+
+    def get(self, session_id, default=None):
+        try:
+            return self[session_id]
+        except KeyError:
+            return default
+
+    def __setitem__(self, session_id, api_instance):
+        self._cold.pop(session_id, None)
+        super().__setitem__(session_id, api_instance)
+        self._touch(session_id)
+        schedule_session_expiry(session_id)
+        if dict.__len__(self) > self.max_sessions:
+            self._pressure.set()
+
+    def __delitem__(self, session_id):
+        with self._recency_lock:
+            self._recency.pop(session_id, None)
+        if self._cold.pop(session_id, None) is not None and not dict.__contains__(
+            self, session_id
         ):
-            input_hash = hashlib.sha256(input_password.encode()).hexdigest()
-            result = secrets.compare_digest(input_hash, stored_password)
-            logging.debug(
-                f"[密码验证] SHA256哈希验证完成 --> 输入密码哈希前8位: {input_hash[:8]}..., 存储密码哈希前8位: {stored_password[:8]}..., 验证结果: {'✓ 成功' if result else '✗ 失败'} (✓ 安全: 使用secrets.compare_digest防时序攻击)"
-            )
-            return result
+            return
+        super().__delitem__(session_id)
 
-        else:
-            result = secrets.compare_digest(input_password, stored_password)
-            logging.warning(
-                f"[密码验证] 明文密码验证完成 --> 验证结果: {'✓ 成功' if result else '✗ 失败'}"
-            )
-            return result
+    def pop(self, session_id, *default):
+        self._cold.pop(session_id, None)
+        with self._recency_lock:
+            self._recency.pop(session_id, None)
+        return super().pop(session_id, *default)
 
-    def _log_login_attempt(
-        self, auth_username, success, ip_address="", user_agent="", reason=""
-    ):
-        """
-        记录用户登录尝试到日志文件。
-        """
-        logging.info(
-            f"[登录审计] 登录尝试记录 --> 用户名: {auth_username}, 登录结果: {'✓ 成功' if success else '✗ 失败'}, 客户端IP: {ip_address}, User-Agent: {user_agent[:50]}{'...' if len(user_agent) > 50 else ''}, {'失败原因: ' + reason if not success else '登录成功'}"
-        )
+    def _touch(self, session_id):
+        with self._recency_lock:
+            self._recency[session_id] = time.time()
+            self._recency.move_to_end(session_id)
 
-        log_entry = {
-            "timestamp": time.time(),
-            "datetime": datetime.datetime.now().isoformat(),
-            "username": auth_username,
-            "success": success,
-            "ip_address": ip_address,
-            "user_agent": user_agent,
-            "reason": reason,
-        }
+    def peek(self, session_id):
+        """返回已恢复的 Api 实例，冷会话返回 None，不触发恢复"""
+        return dict.get(self, session_id)
 
-        try:
-            with open(LOGIN_LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-            logging.debug(
-                f"[登录审计] 登录日志已写入文件 --> 文件路径: {LOGIN_LOG_FILE}, 用户: {auth_username}, 时间戳: {log_entry['timestamp']}, 格式: JSONL (每行一个JSON对象)"
-            )
-        except Exception as e:
-            logging.error(
-                f"[登录审计] 写入登录日志失败 --> 目标文件: {LOGIN_LOG_FILE}, 用户: {auth_username}, 错误类型: {type(e).__name__}, 错误详情: {e}, 注意: 日志写入失败不影响登录流程继续执行",
-                exc_info=True,
+    def pop_cold(self, session_id):
+        return self._cold.pop(session_id, None)
+
+    def cold_items(self):
+        return list(self._cold.items())
+
+    def cold_meta(self, session_id):
+        return self._cold.get(session_id)
+
+    def cold_count(self) -> int:
+        return len(self._cold)
+
+    def _hydrate(self, session_id):
+        if session_id not in self._cold:
+            return None
+        with self._hydrate_lock:
+            if dict.__contains__(self, session_id):
+                return dict.__getitem__(self, session_id)
+            if session_id not in self._cold:
+                return None
+            api_instance = hydrate_session(session_id)
+            self._cold.pop(session_id, None)
+            if api_instance is not None:
+                super().__setitem__(session_id, api_instance)
+                if dict.__len__(self) > self.max_sessions:
+                    self._pressure.set()
+            return api_instance
+
+    def evict_to_budget(self) -> int:
+        """
+        按最近访问顺序淘汰会话直到满足数量和内存预算，返回本次淘汰的会话数。
+        有后台任务的会话和最近 SESSION_EVICTION_MIN_IDLE_S 秒内访问过的会话不会被淘汰。
+        """
+        now = time.time()
+        with self._recency_lock:
+            candidates = list(self._recency.items())
+        sizes = {
+            session_id: estimate_session_size(api_instance)
+            for session_id, api_instance in list(dict.items(self))
+        }
+        hydrated_count = len(sizes)
+        total_bytes = sum(sizes.values())
+        evicted = 0
+        for session_id, last_used in candidates:
+            if hydrated_count <= self.max_sessions and total_bytes <= self.memory_budget_bytes:
+                break
+            if now - last_used < SESSION_EVICTION_MIN_IDLE_S:
+                break
+            api_instance = dict.get(self, session_id)
+            if api_instance is None or session_has_background_activity(api_instance):
+                continue
+            if self._spill(session_id, api_instance):
+                hydrated_count -= 1
+                total_bytes -= sizes.get(session_id, 0)
+                evicted += 1
+        self.estimated_bytes = total_bytes
+        if evicted:
+            self.evicted_count += evicted
+            logging.info(
+                f"[会话内存] 已将 {evicted} 个最久未访问的会话写回存储并移出内存 "
+                f"(内存会话数: {hydrated_count}/{self.max_sessions}, "
+                f"估算内存: {total_bytes / 1048576:.1f}/{self.memory_budget_bytes / 1048576:.0f}MB)"
             )
+        return evicted
 
-    def get_login_history(self, username=None, limit=100):
-        """获取登录历史 - 优化：避免加载所有记录到内存"""
-        if not os.path.exists(LOGIN_LOG_FILE):
-            return []
+    def _spill(self, session_id, api_instance) -> bool:
+        with self._hydrate_lock:
+            if dict.get(self, session_id) is not api_instance:
+                return False
+            session_flusher.discard(session_id)
+            save_session_state(session_id, api_instance, force_save=True)
+            if not session_store.exists(session_id):
+                return False
+            with session_activity_lock:
+                last_accessed = session_activity.get(session_id, time.time())
+            self._cold[session_id] = {
+                "session_id": session_id,
+                "auth_username": getattr(api_instance, "auth_username", None),
+                "is_guest": getattr(api_instance, "is_guest", False),
+                "last_accessed": last_accessed,
+                "background_active": False,
+            }
+            super().pop(session_id, None)
+            with self._recency_lock:
+                self._recency.pop(session_id, None)
+        if chrome_pool:
+            chrome_pool.cleanup_context(session_id)
+        return True
 
-        history = collections.deque(maxlen=limit * 2)
+    def _evict_loop(self):
+        while True:
+            self._pressure.wait(timeout=SESSION_EVICTION_CHECK_INTERVAL_S)
+            self._pressure.clear()
+            try:
+                self.evict_to_budget()
+            except Exception as e:
+                logging.error(f"[会话内存] 淘汰会话时出错: {e}", exc_info=True)
 
-        try:
-            with open(LOGIN_LOG_FILE, "r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        entry = json.loads(line.strip())
-                        if username is None or entry.get("username") == username:
-                            history.append(entry)
-                    except json.JSONDecodeError as e:
-                        logging.warning(
-                            f"[登录审计] 跳过损坏的日志行 --> 行内容: {line.strip()[:100]}{'...' if len(line.strip()) > 100 else ''}, JSON解析错误: {e}"
-                        )
-                        continue
-                    except Exception as e:
-                        logging.warning(
-                            f"[登录审计] 处理日志行时发生错误 --> 行内容: {line.strip()[:100]}{'...' if len(line.strip()) > 100 else ''}, 错误类型: {type(e).__name__}, 错误详情: {e}"
-                        )
-                        continue
-        except Exception as e:
-            logging.error(
-                f"[登录审计] 读取登录历史失败 --> 文件路径: {LOGIN_LOG_FILE}, 查询用户: {username if username else '全部'}, 限制条数: {limit}, 错误类型: {type(e).__name__}, 错误详情: {e}",
-                exc_info=True,
+    def start_evictor(self):
+        if self._evictor is None or not self._evictor.is_alive():
+            self._evictor = threading.Thread(
+                target=self._evict_loop, daemon=True, name="SessionEvictor"
             )
+            self._evictor.start()
 
-        result = list(history)[-limit:]
-        return result
+    def get_metrics(self) -> dict:
+        return {
+            "hydrated": dict.__len__(self),
+            "cold": len(self._cold),
+            "max_sessions": self.max_sessions,
+            "estimated_mb": round(self.estimated_bytes / 1048576, 1),
+            "budget_mb": round(self.memory_budget_bytes / 1048576, 1),
+            "evicted": self.evicted_count,
+        }
 
-    def check_brute_force(self, auth_username, ip_address):
-        """检查暴力破解（5分钟内最多5次失败）- 优化：找到足够记录后提前退出"""
-        recent_attempts = []
-        current_time = time.time()
-        cutoff_time = current_time - 300
-        MAX_ATTEMPTS = 5
 
-        if os.path.exists(LOGIN_LOG_FILE):
+class PasswordHasherBusy(Exception):
+    """密码哈希队列已满（登录风暴时快速失败，而不是无限排队）"""
+
+
+class PasswordHasher:
+    """
+    bcrypt 哈希/校验专用线程池（全局单例）。
+
+    bcrypt 是刻意设计的 CPU 密集运算，在 async_mode="eventlet" 下直接调用会阻塞唯一的
+    hub，使所有请求与 Socket.IO 推送一起停顿。这里与 ChromeBrowserPool 相同，使用
+    eventlet.patcher 取得原生 threading/queue 创建工作线程，请求放入有界队列，
+    调用方通过 eventlet.tpool.execute() 等待结果，hub 保持可调度。
+      - 并发与队列长度可配置：[Security] password_hash_workers / password_hash_queue_size
+      - 队列已满时抛出 PasswordHasherBusy
+      - 统计排队与哈希耗时（用于 /health）
+    """
+
+    DEFAULT_TIMEOUT_S = 30
+
+    def __init__(self, workers: int | None = None, queue_size: int | None = None):
+        from eventlet import patcher
+
+        self._native_threading = patcher.original("threading")
+        self._native_queue = patcher.original("queue")
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue = None
+        self._threads = []
+        self._start_lock = self._native_threading.Lock()
+        self._stats_lock = self._native_threading.Lock()
+        self._samples = {"hash": collections.deque(maxlen=500), "verify": collections.deque(maxlen=500)}
+        self._counts = {"hash": 0, "verify": 0}
+        self._total_s = {"hash": 0.0, "verify": 0.0}
+        self._max_s = {"hash": 0.0, "verify": 0.0}
+        self._queue_wait_total_s = 0.0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        if self._queue is not None:
+            return
+        with self._start_lock:
+            if self._queue is not None:
+                return
+            workers, queue_size = 2, 64
             try:
-                with open(LOGIN_LOG_FILE, "r", encoding="utf-8") as f:
-                    for line in f:
-                        try:
-                            entry = json.loads(line.strip())
-                            if entry.get("timestamp", 0) > cutoff_time:
-                                if (
-                                    entry.get("username") == auth_username
-                                    or entry.get("ip_address") == ip_address
-                                ):
-                                    if not entry.get("success", False):
-                                        recent_attempts.append(entry)
-                                        if len(recent_attempts) >= MAX_ATTEMPTS:
-                                            return (
-                                                True,
-                                                "登录失败次数过多，请5分钟后再试",
-                                            )
-                        except json.JSONDecodeError as e:
-                            logging.debug(
-                                f"[安全检查] 暴力破解检查时跳过损坏的日志行 --> JSON解析错误: {e}"
-                            )
-                            continue
-                        except Exception as e:
-                            logging.debug(
-                                f"[安全检查] 暴力破解检查时处理日志行错误 --> 错误类型: {type(e).__name__}, 错误详情: {e}"
-                            )
-                            continue
+                config = configparser.ConfigParser()
+                config.read(CONFIG_FILE, encoding="utf-8")
+                workers = config.getint("Security", "password_hash_workers", fallback=workers)
+                queue_size = config.getint(
+                    "Security", "password_hash_queue_size", fallback=queue_size
+                )
             except Exception as e:
-                logging.error(
-                    f"[安全检查] 检查暴力破解失败 --> 目标用户: {auth_username}, IP地址: {ip_address}, 时间窗口: 5分钟, 错误类型: {type(e).__name__}, 错误详情: {e}",
-                    exc_info=True,
+                logging.warning(f"读取密码哈希线程池配置失败，使用默认值: {e}")
+            if self.workers is None:
+                self.workers = max(1, workers)
+            if self.queue_size is None:
+                self.queue_size = max(1, queue_size)
+            queue_obj = self._native_queue.Queue(maxsize=self.queue_size)
+            for i in range(self.workers):
+                thread = self._native_threading.Thread(
+                    target=self._worker_loop,
+                    args=(queue_obj,),
+                    name=f"PasswordHasher-{i}",
+                    daemon=True,
                 )
+                thread.start()
+                self._threads.append(thread)
+            self._queue = queue_obj
+            logging.info(
+                f"[密码哈希] 专用线程池已启动 (workers={self.workers}, queue_size={self.queue_size})"
+            )
 
-        return False, ""
-
-    def generate_2fa_secret(self, auth_username):
-        """生成2FA密钥"""
+    def _worker_loop(self, queue_obj):
+        while True:
+            kind, func, args, enqueued_at, done, box = queue_obj.get()
+            started_at = time.time()
+            try:
+                box["result"] = func(*args)
+            except BaseException as e:
+                box["error"] = e
+            finished_at = time.time()
+            with self._stats_lock:
+                elapsed = finished_at - started_at
+                self._counts[kind] += 1
+                self._total_s[kind] += elapsed
+                self._max_s[kind] = max(self._max_s[kind], elapsed)
+                self._samples[kind].append(elapsed)
+                self._queue_wait_total_s += started_at - enqueued_at
+            done.set()
+
+    def _run(self, kind, func, *args):
+        self._ensure_started()
+        done = self._native_threading.Event()
+        box = {}
         try:
+            self._queue.put_nowait((kind, func, args, time.time(), done, box))
+        except self._native_queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise PasswordHasherBusy("密码校验请求过多，请稍后再试")
 
-            secret = pyotp.random_base32()
+        import eventlet.tpool
 
-            user_file = self.get_user_file_path(auth_username)
-            if os.path.exists(user_file):
-                with self.lock:
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
+        if not eventlet.tpool.execute(done.wait, self.DEFAULT_TIMEOUT_S):
+            raise TimeoutError(f"密码哈希超时 (>{self.DEFAULT_TIMEOUT_S}秒)")
+        if "error" in box:
+            raise box["error"]
+        return box["result"]
 
-                    user_data["2fa_secret"] = secret
-                    user_data["2fa_enabled"] = False
+    def hash(self, password: str, rounds: int) -> str:
+        hashed = self._run(
+            "hash", bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)
+        )
+        return hashed.decode("utf-8")
 
-                    with open(user_file, "w", encoding="utf-8") as f:
-                        json.dump(user_data, f, indent=2, ensure_ascii=False)
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run(
+            "verify", bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8")
+        )
 
-                totp = pyotp.TOTP(secret)
-                uri = totp.provisioning_uri(
-                    name=auth_username, issuer_name="Zelly's Personal Assistant Tools"
-                )
-                return {"success": True, "secret": secret, "qr_uri": uri}
-            return {"success": False, "message": "用户不存在"}
-        except ImportError:
-            return {
-                "success": False,
-                "message": "2FA功能需要安装pyotp库：pip install pyotp",
+    def get_metrics(self) -> dict:
+        """返回线程池排队情况与哈希耗时统计（用于健康检查/监控）"""
+        with self._stats_lock:
+            metrics = {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "rejected": self.rejected,
             }
+            completed = sum(self._counts.values())
+            metrics["avg_queue_wait_s"] = (
+                round(self._queue_wait_total_s / completed, 3) if completed else 0.0
+            )
+            for kind in ("hash", "verify"):
+                count = self._counts[kind]
+                samples = sorted(self._samples[kind])
+                entry = {
+                    "count": count,
+                    "avg_s": round(self._total_s[kind] / count, 3) if count else 0.0,
+                    "max_s": round(self._max_s[kind], 3),
+                }
+                if samples:
+                    entry["p95_s"] = round(
+                        samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3
+                    )
+                metrics[kind] = entry
+        return metrics
 
-    def enable_2fa(self, auth_username, verification_code):
-        """启用2FA（需要验证一次）"""
-        try:
 
-            user_file = self.get_user_file_path(auth_username)
-            if os.path.exists(user_file):
-                with self.lock:
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
+class UserDirectory:
+    """
+    系统账号文件（system_accounts/<sha256>.json）的内存目录。
 
-                    secret = user_data.get("2fa_secret")
-                    if not secret:
-                        return {"success": False, "message": "请先生成2FA密钥"}
+    启动时载入全部账号并建立 手机号 -> 账号文件 索引；读取只需一次 stat 校验文件
+    修改时间与大小，文件未变化时直接返回内存中的副本，变化时（例如手工编辑）重新解析。
+    所有写入都经过 write()/remove() 直写到文件并同步更新内存与索引。
+    """
 
-                    totp = pyotp.TOTP(secret)
-                    if totp.verify(verification_code):
-                        user_data["2fa_enabled"] = True
-                        with open(user_file, "w", encoding="utf-8") as f:
-                            json.dump(user_data, f, indent=2, ensure_ascii=False)
-                        return {"success": True, "message": "2FA已启用"}
-                    return {"success": False, "message": "验证码错误"}
-            return {"success": False, "message": "用户不存在"}
-        except ImportError:
-            return {"success": False, "message": "2FA功能需要安装pyotp库"}
+    def __init__(self, accounts_dir):
+        self.accounts_dir = accounts_dir
+        self._lock = threading.RLock()
+        self._records = {}  # 文件路径 -> 账号数据
+        self._stamps = {}  # 文件路径 -> (mtime_ns, size)
+        self._phones = {}  # 手机号 -> 文件路径
+        self.sync()
+        logging.info(f"UserDirectory: 已载入 {len(self._records)} 个系统账号")
 
-    def verify_2fa(self, auth_username, verification_code):
-        """验证2FA代码"""
+    @staticmethod
+    def _stamp(stat_result):
+        return (stat_result.st_mtime_ns, stat_result.st_size)
+
+    def _index(self, path, record):
+        old = self._records.get(path)
+        if old and old.get("phone") and self._phones.get(old["phone"]) == path:
+            del self._phones[old["phone"]]
+        if record is None:
+            self._records.pop(path, None)
+            self._stamps.pop(path, None)
+            return
+        self._records[path] = record
+        if record.get("phone"):
+            self._phones[record["phone"]] = path
+
+    def _load(self, path, stat_result):
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        self._index(path, record)
+        self._stamps[path] = self._stamp(stat_result)
+        return record
+
+    def _current(self, path):
+        """返回与磁盘一致的内存记录（调用方需持有 self._lock），文件不存在时抛出 FileNotFoundError"""
         try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            self._index(path, None)
+            raise
+        if self._stamps.get(path) != self._stamp(stat_result):
+            return self._load(path, stat_result)
+        return self._records[path]
+
+    def exists(self, path) -> bool:
+        with self._lock:
+            try:
+                self._current(path)
+                return True
+            except (FileNotFoundError, json.JSONDecodeError):
+                return False
 
-            user_file = self.get_user_file_path(auth_username)
-            if os.path.exists(user_file):
-                with open(user_file, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
+    def read(self, path) -> dict:
+        """读取账号数据（返回副本，调用方可直接修改后 write 回去）"""
+        with self._lock:
+            return copy.deepcopy(self._current(path))
+
+    def write(self, path, record: dict):
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            record = copy.deepcopy(record)
+            self._index(path, record)
+            self._stamps[path] = self._stamp(os.stat(path))
+
+    def remove(self, path):
+        with self._lock:
+            os.remove(path)
+            self._index(path, None)
+
+    def find_path_by_phone(self, phone):
+        with self._lock:
+            path = self._phones.get(phone)
+            if path is None:
+                return None
+            try:
+                record = self._current(path)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            return path if record.get("phone") == phone else None
+
+    def sync(self):
+        """与目录内容对齐：新增或变化的文件重新解析，已删除的文件移出内存"""
+        with self._lock:
+            seen = set()
+            if os.path.isdir(self.accounts_dir):
+                for entry in os.scandir(self.accounts_dir):
+                    if not (entry.is_file() and entry.name.endswith(".json")):
+                        continue
+                    seen.add(entry.path)
+                    stat_result = entry.stat()
+                    if self._stamps.get(entry.path) != self._stamp(stat_result):
+                        try:
+                            self._load(entry.path, stat_result)
+                        except Exception as e:
+                            logging.error(
+                                f"[用户目录] 读取用户文件失败 --> 文件名: {entry.name}, 错误类型: {type(e).__name__}, 错误详情: {e}"
+                            )
+                            self._index(entry.path, None)
+            for path in list(self._records):
+                if path not in seen:
+                    self._index(path, None)
+
+    def read_all(self) -> list:
+        """返回 (文件名, 账号数据副本) 列表，用于账号列表"""
+        with self._lock:
+            self.sync()
+            return [
+                (os.path.basename(path), copy.deepcopy(record))
+                for path, record in self._records.items()
+            ]
 
-                if not user_data.get("2fa_enabled", False):
-                    return True
 
-                secret = user_data.get("2fa_secret")
-                if not secret:
-                    return False
+def iter_file_lines_reversed(path, end=None, block_size=64 * 1024):
+    """
+    从文件末尾（或指定的 end 偏移）向前按块读取，逐行产出 (行首字节偏移, 行内容bytes)。
+    空行会被跳过；行内容不含换行符。
+    """
+    with open(path, "rb") as f:
+        if end is None:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+        position = end
+        remainder = b""
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size) + remainder
+            lines = chunk.split(b"\n")
+            remainder = lines.pop(0)
+            line_end = position + len(chunk)
+            for raw in reversed(lines):
+                line_end -= len(raw) + 1
+                if raw.strip():
+                    yield line_end + 1, raw
+        if remainder.strip():
+            yield 0, remainder
+
+
+def parse_log_time(value):
+    """解析日志查询的时间参数：支持 Unix 时间戳或 ISO 格式日期时间，空值返回 None"""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.datetime.fromisoformat(str(value)).timestamp()
 
-                totp = pyotp.TOTP(secret)
-                return totp.verify(verification_code)
-            return False
-        except ImportError:
-            logging.warning("2FA验证失败：pyotp库未安装")
-            return True
-
-    def register_user(
-        self,
-        auth_username,
-        auth_password,
-        group="user",
-        phone="",
-        nickname="",
-        avatar_url="",
-    ):
-        """
-        注册新用户（已升级支持扩展字段）
-        """
-        logging.info(f"register_user: 开始注册新用户: {auth_username}, 权限组: {group}")
-        print(f"[用户注册] 开始注册新用户: {auth_username}, 权限组: {group}")
-        with self.lock:
-            if phone:
-                self.unbind_phone_from_user(phone, except_username=auth_username)
-            user_file = self.get_user_file_path(auth_username)
-            logging.debug(f"register_user: 检查用户文件是否存在: {user_file}")
-            if os.path.exists(user_file):
-                logging.warning(f"register_user: 用户名已存在: {auth_username}")
-                print(f"[用户注册] 用户名已存在: {auth_username}")
-                return {"success": False, "message": "用户名已存在"}
 
-            logging.debug(f"register_user: 加密密码...")
-            print(f"[用户注册] 加密密码...")
-            stored_password = self._encrypt_password(auth_password)
+class SegmentedLogStore:
+    """
+    按天分段的 JSONL 日志存储（登录历史、审计日志）。
 
-            user_data = {
-                "auth_username": auth_username,
-                "password": stored_password,
-                "group": group,
-                "created_at": time.time(),
-                "last_login": None,
-                "session_ids": [],
-                "2fa_enabled": False,
-                "2fa_secret": None,
-                "avatar_url": avatar_url or "default_avatar.png",
-                "max_sessions": 1,
-                "theme": "light",
-                "phone": phone,
-                "nickname": nickname or auth_username,
-            }
+    日志写入 <原文件名去扩展名>/<YYYY-MM-DD>.jsonl，每个分段维护一份
+    “字段值 -> 行首字节偏移列表” 的索引（如 username、action）。查询从最新分段
+    的文件末尾向前读取：命中索引字段时只按偏移读取候选行，否则倒序扫描，
+    凑满一页即返回，并给出 "<分段>:<偏移>" 形式的游标用于继续向前翻页。
 
-            logging.debug(f"register_user: 保存用户数据到文件: {user_file}")
-            print(f"[用户注册] 保存用户数据到文件...")
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+    已封存（非当天）分段的索引会落盘为 <YYYY-MM-DD>.idx.json，重启后无需重建；
+    内存中只缓存最近使用的若干个分段索引。
+    """
 
-            logging.debug(f"register_user: 添加用户到权限组: {group}")
-            self.permissions["user_groups"][auth_username] = group
-            self._save_permissions()
+    INDEX_CACHE_SEGMENTS = 32
 
-            logging.info(
-                f"新用户注册: {auth_username} (组: {group}, 手机: {phone}, 昵称: {nickname})"
-            )
-            print(f"[用户注册] ✓ 用户注册成功: {auth_username} (组: {group})")
-            return {"success": True, "message": "注册成功"}
+    def __init__(self, legacy_file, index_fields=("username",)):
+        self.legacy_file = legacy_file
+        self.directory = os.path.splitext(legacy_file)[0]
+        self.index_fields = tuple(index_fields)
+        self._lock = threading.Lock()
+        self._indexes = collections.OrderedDict()  # 分段名 -> {"size", "fields"}
+        os.makedirs(self.directory, exist_ok=True)
+        self._migrate_legacy_file()
 
-    def authenticate(
-        self, auth_username, auth_password, ip_address="", user_agent="", two_fa_code=""
-    ):
-        """验证用户登录（支持2FA和暴力破解防护）"""
-        logging.info(f"authenticate: 开始认证用户: {auth_username}, IP: {ip_address}")
-        print(f"[用户认证] 开始认证用户: {auth_username}, IP: {ip_address}")
-        with self.lock:
-            if auth_username == "guest" and self.config.getboolean(
-                "Guest", "allow_guest_login", fallback=True
-            ):
-                logging.info(f"authenticate: 游客登录成功: {auth_username}")
-                print(f"[用户认证] 游客登录成功: {auth_username}")
-                self._log_login_attempt(
-                    auth_username, True, ip_address, user_agent, "guest_login"
-                )
-                return {
-                    "success": True,
-                    "auth_username": "guest",
-                    "group": "guest",
-                    "is_guest": True,
-                }
+    @staticmethod
+    def _segment_name(timestamp):
+        return time.strftime("%Y-%m-%d", time.localtime(timestamp))
 
-            logging.debug(f"authenticate: 检查暴力破解防护: {auth_username}")
-            print(f"[用户认证] 检查暴力破解: {auth_username}")
-            is_locked, lock_message = self.check_brute_force(auth_username, ip_address)
-            if is_locked:
-                logging.warning(
-                    f"authenticate: 用户被锁定（暴力破解防护）: {auth_username}"
-                )
-                print(f"[用户认证] 用户被锁定（暴力破解防护）: {auth_username}")
-                self._log_login_attempt(
-                    auth_username, False, ip_address, user_agent, "brute_force_locked"
-                )
-                return {"success": False, "message": lock_message}
+    def _segment_path(self, name):
+        return os.path.join(self.directory, f"{name}.jsonl")
 
-            user_file = self.get_user_file_path(auth_username)
-            logging.debug(f"authenticate: 检查用户文件: {user_file}")
-            if not os.path.exists(user_file):
-                logging.warning(f"authenticate: 用户不存在: {auth_username}")
-                print(f"[用户认证] 用户不存在: {auth_username}")
-                self._log_login_attempt(
-                    auth_username, False, ip_address, user_agent, "user_not_found"
-                )
-                return {"success": False, "message": "用户不存在"}
+    def _index_path(self, name):
+        return os.path.join(self.directory, f"{name}.idx.json")
 
-            logging.debug(f"authenticate: 读取用户数据: {auth_username}")
-            print(f"[用户认证] 读取用户数据: {auth_username}")
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+    def _segment_names(self):
+        return sorted(
+            (f[: -len(".jsonl")] for f in os.listdir(self.directory) if f.endswith(".jsonl")),
+            reverse=True,
+        )
 
-            if user_data.get("banned", False):
-                logging.warning(f"authenticate: 用户已被封禁: {auth_username}")
-                print(f"[用户认证] 用户已被封禁: {auth_username}")
-                self._log_login_attempt(
-                    auth_username, False, ip_address, user_agent, "user_banned"
-                )
-                return {"success": False, "message": "账号已被封禁，请联系管理员"}
+    def _migrate_legacy_file(self):
+        """一次性把旧的单文件日志按日期拆分到分段目录，完成后重命名为 .migrated"""
+        if not os.path.exists(self.legacy_file):
+            return
+        logging.info(f"[日志存储] 正在将 {self.legacy_file} 拆分为按天分段的日志...")
+        migrated = 0
+        current_name, current_file = None, None
+        try:
+            with open(self.legacy_file, "rb") as src:
+                for raw in src:
+                    if not raw.strip():
+                        continue
+                    try:
+                        name = self._segment_name(json.loads(raw)["timestamp"])
+                    except (ValueError, KeyError, TypeError):
+                        if current_name is None:
+                            continue
+                        name = current_name
+                    if name != current_name:
+                        if current_file:
+                            current_file.close()
+                        current_name = name
+                        current_file = open(self._segment_path(name), "ab")
+                    current_file.write(raw if raw.endswith(b"\n") else raw + b"\n")
+                    migrated += 1
+        finally:
+            if current_file:
+                current_file.close()
+        os.replace(self.legacy_file, f"{self.legacy_file}.migrated")
+        logging.info(f"[日志存储] 拆分完成，共迁移 {migrated} 条记录到 {self.directory}")
+
+    def _index_entry(self, fields, entry, offset):
+        for field in self.index_fields:
+            value = entry.get(field)
+            if value is not None:
+                fields[field].setdefault(str(value), []).append(offset)
+
+    def append(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        name = self._segment_name(entry["timestamp"])
+        with self._lock:
+            with open(self._segment_path(name), "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            index = self._indexes.get(name)
+            if index is not None:
+                if index["size"] == offset:
+                    self._index_entry(index["fields"], entry, offset)
+                    index["size"] = offset + len(line)
+                else:
+                    del self._indexes[name]
+
+    def _build_index(self, name, base=None):
+        """从 base（已有索引）的末尾继续向后扫描分段，返回覆盖到当前文件末尾的索引"""
+        if base is None:
+            base = {"size": 0, "fields": {field: {} for field in self.index_fields}}
+        fields = base["fields"]
+        offset = base["size"]
+        with open(self._segment_path(name), "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 尚未写完的行留到下次
+                if raw.strip():
+                    try:
+                        self._index_entry(fields, json.loads(raw), offset)
+                    except ValueError:
+                        pass
+                offset += len(raw)
+        return {"size": offset, "fields": fields}
+
+    def _get_index(self, name):
+        size = os.path.getsize(self._segment_path(name))
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is not None:
+                self._indexes.move_to_end(name)
+                if index["size"] == size:
+                    return index
+        if index is None:
+            try:
+                with open(self._index_path(name), "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if index.get("size", 0) > size or set(index.get("fields", {})) != set(self.index_fields):
+                    index = None
+            except (OSError, ValueError):
+                index = None
+        # 复制一份再扩展，避免与 append 的增量更新交叉修改
+        if index is not None:
+            index = {
+                "size": index["size"],
+                "fields": {
+                    field: {value: list(offsets) for value, offsets in values.items()}
+                    for field, values in index["fields"].items()
+                },
+            }
+        index = self._build_index(name, index)
+        if name < self._segment_name(time.time()):
+            try:
+                tmp_path = f"{self._index_path(name)}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(index, f, separators=(",", ":"))
+                os.replace(tmp_path, self._index_path(name))
+            except OSError as e:
+                logging.warning(f"[日志存储] 保存分段索引失败 {name}: {e}")
+        with self._lock:
+            self._indexes[name] = index
+            self._indexes.move_to_end(name)
+            while len(self._indexes) > self.INDEX_CACHE_SEGMENTS:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _iter_segment(self, name, filters, end):
+        """倒序产出分段内 (偏移, 记录)；end 为游标偏移（不含）"""
+        indexed = [field for field in self.index_fields if field in filters]
+        if indexed:
+            index = self._get_index(name)
+            candidates = min(
+                (index["fields"][field].get(str(filters[field]), []) for field in indexed),
+                key=len,
+            )
+            if end is not None:
+                candidates = candidates[: bisect.bisect_left(candidates, end)]
+            if not candidates:
+                return
+            with open(self._segment_path(name), "rb") as f:
+                for offset in reversed(candidates):
+                    f.seek(offset)
+                    try:
+                        yield offset, json.loads(f.readline())
+                    except ValueError:
+                        continue
+        else:
+            for offset, raw in iter_file_lines_reversed(self._segment_path(name), end):
+                try:
+                    yield offset, json.loads(raw)
+                except ValueError:
+                    continue
 
-            logging.debug(f"authenticate: 验证密码: {auth_username}")
-            print(f"[用户认证] 验证密码: {auth_username}")
-            if not self._verify_password(auth_password, user_data.get("password")):
-                logging.warning(f"authenticate: 密码错误: {auth_username}")
-                print(f"[用户认证] 密码错误: {auth_username}")
-                self._log_login_attempt(
-                    auth_username, False, ip_address, user_agent, "wrong_password"
-                )
-                return {"success": False, "message": "密码错误"}
+    def iter_entries(self, filters=None, since=None, until=None, cursor=None):
+        """
+        按时间倒序产出 (游标, 记录)。filters 为字段等值过滤（None/空字符串忽略），
+        since/until 为时间戳范围，cursor 为上一页返回的游标。
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v not in (None, "")}
+        cursor_name, cursor_offset = None, None
+        if cursor:
+            cursor_name, cursor_offset = cursor.rsplit(":", 1)
+            cursor_offset = int(cursor_offset)
+        since_name = self._segment_name(since) if since is not None else None
+        until_name = self._segment_name(until) if until is not None else None
 
-            if user_data.get("2fa_enabled", False):
-                logging.debug(f"authenticate: 检查2FA验证: {auth_username}")
-                print(f"[用户认证] 检查2FA验证: {auth_username}")
-                if not two_fa_code:
-                    logging.info(f"authenticate: 需要2FA验证码: {auth_username}")
-                    print(f"[用户认证] 需要2FA验证码: {auth_username}")
-                    return {
-                        "success": True,
-                        "message": "需要2FA验证码",
-                        "requires_2fa": True,
-                        "auth_username": auth_username,
-                    }
+        for name in self._segment_names():
+            if cursor_name is not None and name > cursor_name:
+                continue
+            if until_name is not None and name > until_name:
+                continue
+            if since_name is not None and name < since_name:
+                return
+            end = cursor_offset if name == cursor_name else None
+            for offset, entry in self._iter_segment(name, filters, end):
+                timestamp = entry.get("timestamp", 0)
+                if until is not None and timestamp > until:
+                    continue
+                if since is not None and timestamp < since:
+                    return
+                if all(entry.get(k) == v for k, v in filters.items()):
+                    yield f"{name}:{offset}", entry
 
-                if not self.verify_2fa(auth_username, two_fa_code):
-                    logging.warning(f"authenticate: 2FA验证失败: {auth_username}")
-                    print(f"[用户认证] 2FA验证失败: {auth_username}")
-                    self._log_login_attempt(
-                        auth_username, False, ip_address, user_agent, "2fa_failed"
-                    )
-                    return {"success": False, "message": "2FA验证码错误"}
+    def query(self, filters=None, since=None, until=None, cursor=None, limit=100):
+        """返回 (按时间倒序的记录列表, 下一页游标或 None)"""
+        entries = []
+        for position, entry in self.iter_entries(filters, since, until, cursor):
+            entries.append(entry)
+            if len(entries) >= limit:
+                return entries, position
+        return entries, None
 
-            logging.debug(f"authenticate: 更新最后登录时间: {auth_username}")
-            print(f"[用户认证] 更新最后登录时间: {auth_username}")
-            user_data["last_login"] = time.time()
-            user_data["last_login_ip"] = ip_address
-            if "session_ids" not in user_data:
-                user_data["session_ids"] = []
 
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+class LoginFailureTracker:
+    """
+    登录失败的滑动窗口计数器（内存），按用户名和 IP 各保存一个环形缓冲区。
 
-            super_admin = self.config.get("Admin", "super_admin", fallback="admin")
-            if auth_username == super_admin:
-                group = "super_admin"
-            else:
-                group = user_data.get("group", "user")
+    每个缓冲区只保留最近 max_attempts 次失败的 (时间戳, 序号)，判断是否锁定与
+    登录日志的历史长度无关。序号用于在“用户名或 IP 命中”的并集计数中去重，
+    使结果与逐行扫描日志时完全一致。
+    """
 
-            self._log_login_attempt(
-                auth_username, True, ip_address, user_agent, "success"
+    def __init__(self, window_s=300, max_attempts=5):
+        self.window_s = window_s
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._by_user = {}
+        self._by_ip = {}
+        self._seq = 0
+        self._last_prune = time.time()
+
+    def record_failure(self, auth_username, ip_address, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._seq += 1
+            entry = (timestamp, self._seq)
+            for buckets, key in ((self._by_user, auth_username), (self._by_ip, ip_address)):
+                ring = buckets.get(key)
+                if ring is None:
+                    ring = buckets[key] = collections.deque(maxlen=self.max_attempts)
+                ring.append(entry)
+            if timestamp - self._last_prune > self.window_s:
+                self._prune(timestamp - self.window_s)
+                self._last_prune = timestamp
+
+    def _prune(self, cutoff):
+        """丢弃窗口内已没有失败记录的键，防止字典随历史用户/IP 无限增长"""
+        for buckets in (self._by_user, self._by_ip):
+            for key in [k for k, ring in buckets.items() if ring[-1][0] <= cutoff]:
+                del buckets[key]
+
+    def recent_failures(self, auth_username, ip_address, now=None):
+        """返回窗口内用户名或 IP 命中的失败次数（达到 max_attempts 后不再精确计数）"""
+        cutoff = (time.time() if now is None else now) - self.window_s
+        with self._lock:
+            seen = set()
+            for ring in (self._by_user.get(auth_username), self._by_ip.get(ip_address)):
+                if ring is None:
+                    continue
+                recent = [seq for ts, seq in ring if ts > cutoff]
+                # 环形缓冲区已满且全部在窗口内，说明单项已达上限
+                if len(recent) >= self.max_attempts:
+                    return self.max_attempts
+                seen.update(recent)
+            return len(seen)
+
+    def is_locked(self, auth_username, ip_address):
+        return self.recent_failures(auth_username, ip_address) >= self.max_attempts
+
+    def seed_from_log(self, log_store):
+        """启动时只从登录日志最新分段的尾部读取窗口内的失败记录"""
+        entries = []
+        try:
+            for _, entry in log_store.iter_entries(since=time.time() - self.window_s):
+                if not entry.get("success", False):
+                    entries.append(entry)
+        except Exception as e:
+            logging.error(
+                f"[安全检查] 从登录日志恢复失败计数失败 --> 目录: {log_store.directory}, 错误类型: {type(e).__name__}, 错误详情: {e}",
+                exc_info=True,
             )
-            logging.info(f"用户登录: {auth_username} (组: {group}) from {ip_address}")
-            print(f"[用户认证] ✓ 用户登录成功: {auth_username} (组: {group})")
-            logging.info(f"authenticate: ✓ 认证成功，返回用户信息")
-            return {
-                "success": True,
-                "auth_username": auth_username,
-                "group": group,
-                "is_guest": False,
-                "max_sessions": user_data.get("max_sessions", 1),
-                "avatar_url": user_data.get("avatar_url") or "default_avatar.png",
-                "theme": user_data.get("theme", "light"),
-                "session_ids": user_data.get("session_ids", []),
-            }
-
-    def check_permission(self, auth_username, permission):
-        """检查用户是否有特定权限（支持差分化权限）"""
-        group = self.get_user_group(auth_username)
+        for entry in reversed(entries):
+            self.record_failure(
+                entry.get("username"), entry.get("ip_address"), entry.get("timestamp")
+            )
+        return len(entries)
 
-        group_perms = (
-            self.permissions["permission_groups"].get(group, {}).get("permissions", {})
-        )
-        has_permission = group_perms.get(permission, False)
 
-        logging.debug(
-            f"[权限检查] 用户 {auth_username} 的组 {group} 对权限 {permission} 的基础权限: {has_permission}"
-        )
+class AuthSystem:
+    """用户认证和权限管理系统"""
 
-        user_custom = self.permissions.get("user_custom_permissions", {}).get(
-            auth_username, {}
-        )
-        added_perms = user_custom.get("added", [])
-        removed_perms = user_custom.get("removed", [])
+    def __init__(self):
+        logging.info("=" * 80)
+        logging.info("初始化AuthSystem认证系统...")
+        self.config = self._load_config()
+        logging.info("配置文件已加载")
+        self.permissions = self._load_permissions()
+        logging.info("权限配置已加载")
+        # 用户有效权限缓存：用户名 -> (所属组, 权限 frozenset)，权限配置保存时整体失效
+        self._perm_cache = {}
+        self._perm_cache_lock = threading.Lock()
+        self._perm_generation = 0
+        self.users = UserDirectory(SYSTEM_ACCOUNTS_DIR)
+        self.login_log = SegmentedLogStore(LOGIN_LOG_FILE, ("username",))
+        self.audit_log = SegmentedLogStore(AUDIT_LOG_FILE, ("username", "action"))
+        self.login_failures = LoginFailureTracker()
+        seeded = self.login_failures.seed_from_log(self.login_log)
+        logging.info(f"暴力破解计数器已就绪（从登录日志尾部恢复 {seeded} 条近期失败记录）")
+        self.lock = threading.Lock()
+        logging.info("线程锁已创建（使用threading.Lock）")
+        self._synchronize_super_admin_permissions()
+        logging.info("AuthSystem初始化完成")
+        logging.info("=" * 80)
 
-        if added_perms or removed_perms:
-            logging.debug(
-                f"[权限检查] 用户 {auth_username} 的自定义权限 - 添加: {added_perms}, 移除: {removed_perms}"
+    def _load_config(self):
+        """加载配置文件（增强：处理重复项错误并提示用户修复）"""
+        logging.debug("_load_config: 开始加载配置文件...")
+        try:
+            _create_config_ini()
+        except configparser.DuplicateOptionError as e:
+            logging.error(
+                f"[系统初始化] 配置文件检查失败 --> 错误类型: {type(e).__name__}, 错误详情: {e}, 可能原因: 配置文件损坏或存在重复选项",
+                exc_info=True,
             )
-
-        if permission in added_perms:
-            has_permission = True
-            logging.debug(
-                f"[权限检查] 用户 {auth_username} 通过 user_custom_permissions.added 获得权限 {permission}"
+            print(
+                f"\n[严重错误] 配置文件 ('config.ini') 已损坏。请修复上述提到的重复选项，然后重新启动程序。"
+            )
+            sys.exit(1)
+        except Exception as e:
+            logging.error(
+                f"[系统初始化] 配置文件检查时发生未知错误 --> 错误类型: {type(e).__name__}, 错误详情: {e}",
+                exc_info=True,
+            )
+            print(
+                f"\n[严重错误] 检查配置文件 'config.ini' 时发生意外错误: {e}\n请检查文件格式是否正确，然后重新启动程序。"
             )
+            sys.exit(1)
 
-        if permission in removed_perms:
-            has_permission = False
+        config = configparser.ConfigParser()
+        config.optionxform = str
+        try:
+            config.read(CONFIG_FILE, encoding="utf-8")
             logging.debug(
-                f"[权限检查] 用户 {auth_username} 通过 user_custom_permissions.removed 被撤销权限 {permission}"
+                f"_load_config: 配置文件加载完成，配置节: {list(config.sections())}"
             )
-
-        logging.debug(
-            f"[权限检查] 最终结果 - 用户 {auth_username} 对权限 {permission}: {has_permission}"
-        )
-
-        return has_permission
-
-    def get_user_permissions(self, auth_username):
-        """获取用户的完整权限列表（包含差分权限）"""
-        group = self.get_user_group(auth_username)
-
+            return config
+        except configparser.DuplicateOptionError as e:
+            logging.error(
+                f"加载配置文件 '{CONFIG_FILE}' 失败，存在重复的配置项: {e}",
+                exc_info=True,
+            )
+            print(f"\n{'='*60}")
+            print(f"[配置文件错误] 无法加载 config.ini 文件！")
+            print(
+                f"  错误原因: 在区域 [{e.section}] 中发现重复的选项 '{e.option}' (不区分大小写)."
+            )
+            print(f"  错误位置: 大约在文件的第 {e.lineno} 行附近.")
+            print(f"\n  请手动打开文件 '{CONFIG_FILE}' 并进行以下操作:")
+            print(f"    1. 找到 [{e.section}] 区域.")
+            print(
+                f"    2. 确保选项 '{e.option}' (例如 LastUser 或 lastuser) 只出现一次."
+            )
+            print(f"    3. 删除重复的那一行.")
+            print(f"    4. 保存文件后重新运行程序.")
+            print(f"{'='*60}\n")
+            sys.exit(1)
+        except Exception as e:
+            logging.error(
+                f"加载配置文件 '{CONFIG_FILE}' 时发生未知错误: {e}", exc_info=True
+            )
+            print(f"\n[配置文件错误] 读取 config.ini 文件时发生意外错误: {e}")
+            print(f"  请检查文件是否存在、是否有读取权限以及格式是否基本正确。")
+            sys.exit(1)
+
+    def find_user_by_phone(self, phone):
+        """
+        通过用户目录的手机号索引查找绑定了特定手机号的用户。
+        """
+        if not phone:
+            return None
+        user_file = self.users.find_path_by_phone(phone)
+        if user_file is None:
+            return None
+        return self.users.read(user_file).get("auth_username")
+
+    def unbind_phone_from_user(self, phone, except_username=None):
+        """
+        查找绑定了指定手机号的用户，并将其手机号字段清空。
+        """
+        if not phone:
+            return
+
+        bound_username = self.find_user_by_phone(phone)
+
+        if bound_username and bound_username != except_username:
+            logging.info(
+                f"[手机号解绑] 手机号 {phone} 原本绑定在 {bound_username}。正在解绑..."
+            )
+            user_file = self.get_user_file_path(bound_username)
+            if self.users.exists(user_file):
+                try:
+                    with self.lock:
+                        user_data = self.users.read(user_file)
+
+                        if user_data.get("phone") == phone:
+                            user_data["phone"] = ""
+                            self.users.write(user_file, user_data)
+                            logging.info(
+                                f"[手机号解绑] 已成功解绑用户 {bound_username} 的手机号。"
+                            )
+
+                            self.log_audit(
+                                "System",
+                                "auto_unbind_phone",
+                                f"因手机号 {phone} 被新用户注册或绑定，系统自动解绑了用户 {bound_username} 的手机号",
+                            )
+                except Exception as e:
+                    logging.error(
+                        f"[手机号解绑] 解绑用户 {bound_username} 手机号失败: {e}",
+                        exc_info=True,
+                    )
+
+    def _load_permissions(self):
+        """加载权限配置"""
+        logging.debug(f"_load_permissions: 检查权限文件: {PERMISSIONS_FILE}")
+        if os.path.exists(PERMISSIONS_FILE):
+            with open(PERMISSIONS_FILE, "r", encoding="utf-8") as f:
+                perms = json.load(f)
+            logging.debug(
+                f"_load_permissions: 权限配置已加载，权限组数: {len(perms.get('permission_groups', {}))}, 用户组数: {len(perms.get('user_groups', {}))}"
+            )
+            return perms
+        logging.debug("_load_permissions: 权限文件不存在，使用默认配置")
+        return {"permission_groups": {}, "user_groups": {}}
+
+    def _save_permissions(self):
+        """保存权限配置"""
+        logging.debug("_save_permissions: 保存权限配置到文件...")
+        with open(PERMISSIONS_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.permissions, f, indent=2, ensure_ascii=False)
+        self._invalidate_permission_cache()
+        logging.debug(f"_save_permissions: 权限配置已保存到 {PERMISSIONS_FILE}")
+
+    def _invalidate_permission_cache(self):
+        """
+        丢弃全部已编译的有效权限集合。
+        所有权限变更（用户组、差分权限、权限组增删改）最终都会调用 _save_permissions，
+        因此在这里统一失效即可。
+        """
+        with self._perm_cache_lock:
+            self._perm_generation += 1
+            self._perm_cache.clear()
+
+    def get_user_file_path(self, auth_username):
+        """获取用户文件路径"""
+        # 修复: 强制转换为字符串，防止传入 int 类型导致 'int' object has no attribute 'encode'
+        user_hash = hashlib.sha256(str(auth_username).encode()).hexdigest()
+        file_path = os.path.join(SYSTEM_ACCOUNTS_DIR, f"{user_hash}.json")
+        logging.debug(
+            f"get_user_file_path: 用户 {auth_username} 的文件路径: {file_path}"
+        )
+        return file_path
+
+    def _update_user_file_group(self, username, new_group):
+        """
+        (辅助函数) 更新 system_accounts 中用户JSON文件内的 group 字段。
+        这确保了 permissions.json 和用户文件之间的数据一致性。
+        """
+        user_file = self.get_user_file_path(username)
+        if self.users.exists(user_file):
+            try:
+                user_data = self.users.read(user_file)
+
+                if user_data.get("group") != new_group:
+                    user_data["group"] = new_group
+                    self.users.write(user_file, user_data)
+                    logging.debug(
+                        f"[权限同步] 已更新用户文件 {os.path.basename(user_file)} 的权限组为 {new_group}"
+                    )
+                    return True
+            except Exception as e:
+                logging.error(
+                    f"[权限同步] 更新用户文件 {os.path.basename(user_file)} 失败: {e}",
+                    exc_info=True,
+                )
+        else:
+            logging.warning(
+                f"[权限同步] 找不到用户 {username} 的文件，无法更新其文件内的权限组。"
+            )
+        return False
+
+    def _get_password_storage_method(self):
+        """
+        获取密码存储方式配置。
+        """
+        method = self.config.get("Security", "password_storage", fallback="plaintext")
+        logging.debug(f"_get_password_storage_method: 密码存储方式: {method}")
+        return method
+
+    def _get_bcrypt_rounds(self):
+        """获取 bcrypt 成本因子（4-31，默认 12）"""
+        rounds = self.config.getint("Security", "bcrypt_rounds", fallback=12)
+        return min(31, max(4, rounds))
+
+    def _password_needs_rehash(self, stored_password):
+        """
+        判断登录成功后是否需要用当前配置重新哈希密码：
+        存储方式为 bcrypt 时，非 bcrypt 哈希（明文/SHA256）或成本因子与配置不符都需要重算。
+        """
+        if self._get_password_storage_method() != "bcrypt" or not stored_password:
+            return False
+        if not stored_password.startswith(("$2b$", "$2a$")):
+            return True
+        try:
+            return int(stored_password[4:6]) != self._get_bcrypt_rounds()
+        except ValueError:
+            return True
+
+    def _encrypt_password(self, password):
+        """
+        加密密码（根据配置决定是否加密）。
+        """
+        method = self._get_password_storage_method()
+        logging.debug(
+            f"[密码加密] 开始处理密码加密 --> 加密方法: {method}, 密码长度: {len(password)}字符"
+        )
+
+        if method == "bcrypt":
+            try:
+
+                encrypted = password_hasher.hash(password, self._get_bcrypt_rounds())
+                logging.debug(
+                    f"[密码加密] 密码已使用bcrypt加密 --> 哈希长度: {len(encrypted)}字符, 哈希前缀: {encrypted[:7]}... (✓ 安全: 自动加盐，抗暴力破解)"
+                )
+                return encrypted
+            except ImportError:
+                logging.error(
+                    "[密码加密] bcrypt库未安装，无法使用bcrypt加密。请运行: pip install bcrypt"
+                )
+                logging.warning("[密码加密] 降级使用SHA256加密（不安全）")
+                method = "encrypted"
+
+        if method == "encrypted":
+            encrypted = hashlib.sha256(password.encode()).hexdigest()
+            logging.debug(
+                f"[密码加密] 密码已使用SHA256加密 --> 哈希长度: {len(encrypted)}字符, 哈希值前8位: {encrypted[:8]}... (⚠️ 警告: SHA256不加盐存在安全风险，建议迁移到bcrypt)"
+            )
+            return encrypted
+
+        logging.warning(
+            f"[密码加密] 使用明文存储密码 --> ⚠️ 严重安全警告: 明文密码存储极度不安全，强烈建议使用bcrypt模式"
+        )
+        return password
+
+    def _verify_password(self, input_password, stored_password):
+        """
+        验证用户输入的密码是否正确。
+        """
+        logging.debug(
+            f"[密码验证] 开始验证密码 --> 输入密码长度: {len(input_password)}字符, 存储密码长度: {len(stored_password)}字符"
+        )
+
+        if stored_password.startswith("$2b$") or stored_password.startswith("$2a$"):
+            try:
+
+                result = password_hasher.verify(input_password, stored_password)
+                logging.debug(
+                    f"[密码验证] bcrypt验证完成 --> 验证结果: {'✓ 成功' if result else '✗ 失败'} (✓ 安全: 使用bcrypt.checkpw，防时序攻击)"
+                )
+                return result
+            except ImportError:
+                logging.error("[密码验证] bcrypt库未安装，无法验证bcrypt密码")
+                return False
+            except PasswordHasherBusy:
+                raise
+            except Exception as e:
+                logging.error(f"[密码验证] bcrypt验证失败 --> 错误: {e}")
+                return False
+
+        elif len(stored_password) == 64 and all(
+            c in "0123456789abcdef" for c in stored_password.lower()
+        ):
+            input_hash = hashlib.sha256(input_password.encode()).hexdigest()
+            result = secrets.compare_digest(input_hash, stored_password)
+            logging.debug(
+                f"[密码验证] SHA256哈希验证完成 --> 输入密码哈希前8位: {input_hash[:8]}..., 存储密码哈希前8位: {stored_password[:8]}..., 验证结果: {'✓ 成功' if result else '✗ 失败'} (✓ 安全: 使用secrets.compare_digest防时序攻击)"
+            )
+            return result
+
+        else:
+            result = secrets.compare_digest(input_password, stored_password)
+            logging.warning(
+                f"[密码验证] 明文密码验证完成 --> 验证结果: {'✓ 成功' if result else '✗ 失败'}"
+            )
+            return result
+
+    def _log_login_attempt(
+        self, auth_username, success, ip_address="", user_agent="", reason=""
+    ):
+        """
+        记录用户登录尝试到日志文件。
+        """
+        logging.info(
+            f"[登录审计] 登录尝试记录 --> 用户名: {auth_username}, 登录结果: {'✓ 成功' if success else '✗ 失败'}, 客户端IP: {ip_address}, User-Agent: {user_agent[:50]}{'...' if len(user_agent) > 50 else ''}, {'失败原因: ' + reason if not success else '登录成功'}"
+        )
+
+        log_entry = {
+            "timestamp": time.time(),
+            "datetime": datetime.datetime.now().isoformat(),
+            "username": auth_username,
+            "success": success,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "reason": reason,
+        }
+        if not success:
+            self.login_failures.record_failure(
+                auth_username, ip_address, log_entry["timestamp"]
+            )
+
+        try:
+            self.login_log.append(log_entry)
+            logging.debug(
+                f"[登录审计] 登录日志已写入 --> 目录: {self.login_log.directory}, 用户: {auth_username}, 时间戳: {log_entry['timestamp']}, 格式: 按天分段的 JSONL"
+            )
+        except Exception as e:
+            logging.error(
+                f"[登录审计] 写入登录日志失败 --> 目标文件: {LOGIN_LOG_FILE}, 用户: {auth_username}, 错误类型: {type(e).__name__}, 错误详情: {e}, 注意: 日志写入失败不影响登录流程继续执行",
+                exc_info=True,
+            )
+
+    def get_login_history(self, username=None, limit=100):
+        """获取登录历史（按时间正序，最多 limit 条最新记录）"""
+        history, _ = self.query_login_history(username=username, limit=limit)
+        history.reverse()
+        return history
+
+    def query_login_history(
+        self, username=None, ip_address=None, since=None, until=None, cursor=None, limit=100
+    ):
+        """
+        分页查询登录历史，返回 (按时间倒序的记录列表, 下一页游标)。
+        """
+        try:
+            return self.login_log.query(
+                {"username": username, "ip_address": ip_address},
+                since=since,
+                until=until,
+                cursor=cursor,
+                limit=limit,
+            )
+        except (OSError, ValueError) as e:
+            logging.error(
+                f"[登录审计] 读取登录历史失败 --> 目录: {self.login_log.directory}, 查询用户: {username if username else '全部'}, 限制条数: {limit}, 错误类型: {type(e).__name__}, 错误详情: {e}",
+                exc_info=True,
+            )
+            return [], None
+
+    def check_brute_force(self, auth_username, ip_address):
+        """检查暴力破解（5分钟内最多5次失败），基于内存滑动窗口计数，与日志大小无关"""
+        if self.login_failures.is_locked(auth_username, ip_address):
+            return (True, "登录失败次数过多，请5分钟后再试")
+        return False, ""
+
+    def generate_2fa_secret(self, auth_username):
+        """生成2FA密钥"""
+        try:
+
+            secret = pyotp.random_base32()
+
+            user_file = self.get_user_file_path(auth_username)
+            if self.users.exists(user_file):
+                with self.lock:
+                    user_data = self.users.read(user_file)
+
+                    user_data["2fa_secret"] = secret
+                    user_data["2fa_enabled"] = False
+
+                    self.users.write(user_file, user_data)
+
+                totp = pyotp.TOTP(secret)
+                uri = totp.provisioning_uri(
+                    name=auth_username, issuer_name="Zelly's Personal Assistant Tools"
+                )
+                return {"success": True, "secret": secret, "qr_uri": uri}
+            return {"success": False, "message": "用户不存在"}
+        except ImportError:
+            return {
+                "success": False,
+                "message": "2FA功能需要安装pyotp库：pip install pyotp",
+            }
+
+    def enable_2fa(self, auth_username, verification_code):
+        """启用2FA（需要验证一次）"""
+        try:
+
+            user_file = self.get_user_file_path(auth_username)
+            if self.users.exists(user_file):
+                with self.lock:
+                    user_data = self.users.read(user_file)
+
+                    secret = user_data.get("2fa_secret")
+                    if not secret:
+                        return {"success": False, "message": "请先生成2FA密钥"}
+
+                    totp = pyotp.TOTP(secret)
+                    if totp.verify(verification_code):
+                        user_data["2fa_enabled"] = True
+                        self.users.write(user_file, user_data)
+                        return {"success": True, "message": "2FA已启用"}
+                    return {"success": False, "message": "验证码错误"}
+            return {"success": False, "message": "用户不存在"}
+        except ImportError:
+            return {"success": False, "message": "2FA功能需要安装pyotp库"}
+
+    def verify_2fa(self, auth_username, verification_code):
+        """验证2FA代码"""
+        try:
+
+            user_file = self.get_user_file_path(auth_username)
+            if self.users.exists(user_file):
+                user_data = self.users.read(user_file)
+
+                if not user_data.get("2fa_enabled", False):
+                    return True
+
+                secret = user_data.get("2fa_secret")
+                if not secret:
+                    return False
+
+                totp = pyotp.TOTP(secret)
+                return totp.verify(verification_code)
+            return False
+        except ImportError:
+            logging.warning("2FA验证失败：pyotp库未安装")
+            return True
+
+    def register_user(
+        self,
+        auth_username,
+        auth_password,
+        group="user",
+        phone="",
+        nickname="",
+        avatar_url="",
+    ):
+        """
+        注册新用户（已升级支持扩展字段）
+        """
+        logging.info(f"register_user: 开始注册新用户: {auth_username}, 权限组: {group}")
+        print(f"[用户注册] 开始注册新用户: {auth_username}, 权限组: {group}")
+        user_file = self.get_user_file_path(auth_username)
+        if self.users.exists(user_file):
+            logging.warning(f"register_user: 用户名已存在: {auth_username}")
+            print(f"[用户注册] 用户名已存在: {auth_username}")
+            return {"success": False, "message": "用户名已存在"}
+
+        # 密码哈希在锁外执行，避免 bcrypt 期间阻塞其他认证操作
+        logging.debug(f"register_user: 加密密码...")
+        print(f"[用户注册] 加密密码...")
+        stored_password = self._encrypt_password(auth_password)
+
+        with self.lock:
+            if phone:
+                self.unbind_phone_from_user(phone, except_username=auth_username)
+            logging.debug(f"register_user: 检查用户文件是否存在: {user_file}")
+            if self.users.exists(user_file):
+                logging.warning(f"register_user: 用户名已存在: {auth_username}")
+                print(f"[用户注册] 用户名已存在: {auth_username}")
+                return {"success": False, "message": "用户名已存在"}
+
+            user_data = {
+                "auth_username": auth_username,
+                "password": stored_password,
+                "group": group,
+                "created_at": time.time(),
+                "last_login": None,
+                "session_ids": [],
+                "2fa_enabled": False,
+                "2fa_secret": None,
+                "avatar_url": avatar_url or "default_avatar.png",
+                "max_sessions": 1,
+                "theme": "light",
+                "phone": phone,
+                "nickname": nickname or auth_username,
+            }
+
+            logging.debug(f"register_user: 保存用户数据到文件: {user_file}")
+            print(f"[用户注册] 保存用户数据到文件...")
+            self.users.write(user_file, user_data)
+
+            logging.debug(f"register_user: 添加用户到权限组: {group}")
+            self.permissions["user_groups"][auth_username] = group
+            self._save_permissions()
+
+            logging.info(
+                f"新用户注册: {auth_username} (组: {group}, 手机: {phone}, 昵称: {nickname})"
+            )
+            print(f"[用户注册] ✓ 用户注册成功: {auth_username} (组: {group})")
+            return {"success": True, "message": "注册成功"}
+
+    def authenticate(
+        self, auth_username, auth_password, ip_address="", user_agent="", two_fa_code=""
+    ):
+        """验证用户登录（支持2FA和暴力破解防护）"""
+        logging.info(f"authenticate: 开始认证用户: {auth_username}, IP: {ip_address}")
+        print(f"[用户认证] 开始认证用户: {auth_username}, IP: {ip_address}")
+        with self.lock:
+            if auth_username == "guest" and self.config.getboolean(
+                "Guest", "allow_guest_login", fallback=True
+            ):
+                logging.info(f"authenticate: 游客登录成功: {auth_username}")
+                print(f"[用户认证] 游客登录成功: {auth_username}")
+                self._log_login_attempt(
+                    auth_username, True, ip_address, user_agent, "guest_login"
+                )
+                return {
+                    "success": True,
+                    "auth_username": "guest",
+                    "group": "guest",
+                    "is_guest": True,
+                }
+
+            logging.debug(f"authenticate: 检查暴力破解防护: {auth_username}")
+            print(f"[用户认证] 检查暴力破解: {auth_username}")
+            is_locked, lock_message = self.check_brute_force(auth_username, ip_address)
+            if is_locked:
+                logging.warning(
+                    f"authenticate: 用户被锁定（暴力破解防护）: {auth_username}"
+                )
+                print(f"[用户认证] 用户被锁定（暴力破解防护）: {auth_username}")
+                self._log_login_attempt(
+                    auth_username, False, ip_address, user_agent, "brute_force_locked"
+                )
+                return {"success": False, "message": lock_message}
+
+            user_file = self.get_user_file_path(auth_username)
+            logging.debug(f"authenticate: 检查用户文件: {user_file}")
+            if not self.users.exists(user_file):
+                logging.warning(f"authenticate: 用户不存在: {auth_username}")
+                print(f"[用户认证] 用户不存在: {auth_username}")
+                self._log_login_attempt(
+                    auth_username, False, ip_address, user_agent, "user_not_found"
+                )
+                return {"success": False, "message": "用户不存在"}
+
+            logging.debug(f"authenticate: 读取用户数据: {auth_username}")
+            print(f"[用户认证] 读取用户数据: {auth_username}")
+            user_data = self.users.read(user_file)
+
+            if user_data.get("banned", False):
+                logging.warning(f"authenticate: 用户已被封禁: {auth_username}")
+                print(f"[用户认证] 用户已被封禁: {auth_username}")
+                self._log_login_attempt(
+                    auth_username, False, ip_address, user_agent, "user_banned"
+                )
+                return {"success": False, "message": "账号已被封禁，请联系管理员"}
+            stored_password = user_data.get("password")
+            awaiting_2fa = user_data.get("2fa_enabled", False) and not two_fa_code
+
+        # 密码校验（bcrypt）在专用线程池中执行且不持有 self.lock，登录高峰时不会串行化所有认证操作
+        logging.debug(f"authenticate: 验证密码: {auth_username}")
+        print(f"[用户认证] 验证密码: {auth_username}")
+        try:
+            password_ok = self._verify_password(auth_password, stored_password)
+        except PasswordHasherBusy as e:
+            logging.warning(f"authenticate: 密码校验队列已满: {auth_username}")
+            return {"success": False, "message": str(e)}
+        if not password_ok:
+            logging.warning(f"authenticate: 密码错误: {auth_username}")
+            print(f"[用户认证] 密码错误: {auth_username}")
+            with self.lock:
+                self._log_login_attempt(
+                    auth_username, False, ip_address, user_agent, "wrong_password"
+                )
+            return {"success": False, "message": "密码错误"}
+
+        new_password_hash = None
+        if not awaiting_2fa and self._password_needs_rehash(stored_password):
+            try:
+                new_password_hash = self._encrypt_password(auth_password)
+            except Exception as e:
+                logging.warning(f"authenticate: 登录时重新哈希密码失败，保留原哈希: {e}")
+
+        with self.lock:
+            try:
+                user_data = self.users.read(user_file)
+            except FileNotFoundError:
+                return {"success": False, "message": "用户不存在"}
+
+            # 密码校验期间未持锁：重新读取后需复核封禁状态与密码是否已被修改
+            if user_data.get("banned", False):
+                logging.warning(f"authenticate: 用户已被封禁: {auth_username}")
+                print(f"[用户认证] 用户已被封禁: {auth_username}")
+                self._log_login_attempt(
+                    auth_username, False, ip_address, user_agent, "user_banned"
+                )
+                return {"success": False, "message": "账号已被封禁，请联系管理员"}
+            if user_data.get("password") != stored_password:
+                logging.warning(f"authenticate: 校验期间密码已被修改: {auth_username}")
+                print(f"[用户认证] 校验期间密码已被修改: {auth_username}")
+                self._log_login_attempt(
+                    auth_username, False, ip_address, user_agent, "password_changed"
+                )
+                return {"success": False, "message": "密码已被修改，请重新登录"}
+
+            if user_data.get("2fa_enabled", False):
+                logging.debug(f"authenticate: 检查2FA验证: {auth_username}")
+                print(f"[用户认证] 检查2FA验证: {auth_username}")
+                if not two_fa_code:
+                    logging.info(f"authenticate: 需要2FA验证码: {auth_username}")
+                    print(f"[用户认证] 需要2FA验证码: {auth_username}")
+                    return {
+                        "success": True,
+                        "message": "需要2FA验证码",
+                        "requires_2fa": True,
+                        "auth_username": auth_username,
+                    }
+
+                if not self.verify_2fa(auth_username, two_fa_code):
+                    logging.warning(f"authenticate: 2FA验证失败: {auth_username}")
+                    print(f"[用户认证] 2FA验证失败: {auth_username}")
+                    self._log_login_attempt(
+                        auth_username, False, ip_address, user_agent, "2fa_failed"
+                    )
+                    return {"success": False, "message": "2FA验证码错误"}
+
+            logging.debug(f"authenticate: 更新最后登录时间: {auth_username}")
+            print(f"[用户认证] 更新最后登录时间: {auth_username}")
+            user_data["last_login"] = time.time()
+            user_data["last_login_ip"] = ip_address
+            if "session_ids" not in user_data:
+                user_data["session_ids"] = []
+            # 用当前成本因子的新哈希替换（上方已确认校验期间密码未被修改）
+            if new_password_hash:
+                user_data["password"] = new_password_hash
+                logging.info(f"authenticate: 已按当前配置重新哈希用户 {auth_username} 的密码")
+
+            self.users.write(user_file, user_data)
+
+            super_admin = self.config.get("Admin", "super_admin", fallback="admin")
+            if auth_username == super_admin:
+                group = "super_admin"
+            else:
+                group = user_data.get("group", "user")
+
+            self._log_login_attempt(
+                auth_username, True, ip_address, user_agent, "success"
+            )
+            logging.info(f"用户登录: {auth_username} (组: {group}) from {ip_address}")
+            print(f"[用户认证] ✓ 用户登录成功: {auth_username} (组: {group})")
+            logging.info(f"authenticate: ✓ 认证成功，返回用户信息")
+            return {
+                "success": True,
+                "auth_username": auth_username,
+                "group": group,
+                "is_guest": False,
+                "max_sessions": user_data.get("max_sessions", 1),
+                "avatar_url": user_data.get("avatar_url") or "default_avatar.png",
+                "theme": user_data.get("theme", "light"),
+                "session_ids": user_data.get("session_ids", []),
+            }
+
+    def check_permission(self, auth_username, permission):
+        """检查用户是否有特定权限（支持差分化权限）"""
+        return permission in self.get_effective_permissions(auth_username)
+
+    def get_effective_permissions(self, auth_username):
+        """
+        返回用户最终拥有的权限集合（组权限 + added - removed），按用户缓存。
+        缓存项记录计算时的所属组，组发生变化（如 config.ini 更换超管）时自动重算。
+        """
+        group = self.get_user_group(auth_username)
+        cached = self._perm_cache.get(auth_username)
+        if cached is not None and cached[0] == group:
+            return cached[1]
+
+        generation = self._perm_generation
+        effective = frozenset(
+            perm
+            for perm, granted in self.get_user_permissions(auth_username).items()
+            if granted
+        )
+        with self._perm_cache_lock:
+            # 计算期间若权限配置已变更，则本次结果可能过期，不写入缓存
+            if generation == self._perm_generation:
+                self._perm_cache[auth_username] = (group, effective)
+        return effective
+
+    def get_user_permissions(self, auth_username):
+        """获取用户的完整权限列表（包含差分权限）"""
+        group = self.get_user_group(auth_username)
+
         group_perms = (
             self.permissions["permission_groups"].get(group, {}).get("permissions", {})
         )
 
-        user_perms = dict(group_perms)
+        user_perms = dict(group_perms)
+
+        user_custom = self.permissions.get("user_custom_permissions", {}).get(
+            auth_username, {}
+        )
+        added_perms = user_custom.get("added", [])
+        removed_perms = user_custom.get("removed", [])
+
+        for perm in added_perms:
+            user_perms[perm] = True
+
+        for perm in removed_perms:
+            user_perms[perm] = False
+
+        return user_perms
+
+    def set_user_custom_permission(self, auth_username, permission, grant):
+        """为用户设置自定义权限（差分化存储）
+
+        Args:
+            auth_username: 用户名
+            permission: 权限名
+            grant: True=授予权限, False=移除权限
+        """
+        with self.lock:
+            if "user_custom_permissions" not in self.permissions:
+                self.permissions["user_custom_permissions"] = {}
+
+            if auth_username not in self.permissions["user_custom_permissions"]:
+                self.permissions["user_custom_permissions"][auth_username] = {
+                    "added": [],
+                    "removed": [],
+                }
+
+            user_custom = self.permissions["user_custom_permissions"][auth_username]
+
+            group = self.get_user_group(auth_username)
+            group_perms = (
+                self.permissions["permission_groups"]
+                .get(group, {})
+                .get("permissions", {})
+            )
+            base_has_permission = group_perms.get(permission, False)
+
+            if grant:
+                if not base_has_permission:
+                    if permission not in user_custom["added"]:
+                        user_custom["added"].append(permission)
+                    if permission in user_custom["removed"]:
+                        user_custom["removed"].remove(permission)
+                else:
+                    if permission in user_custom["removed"]:
+                        user_custom["removed"].remove(permission)
+            else:
+                if base_has_permission:
+                    if permission not in user_custom["removed"]:
+                        user_custom["removed"].append(permission)
+                    if permission in user_custom["added"]:
+                        user_custom["added"].remove(permission)
+                else:
+                    if permission in user_custom["added"]:
+                        user_custom["added"].remove(permission)
+
+            self._save_permissions()
+
+            logging.info(f"设置用户 {auth_username} 权限 {permission} = {grant}")
+            return {"success": True, "message": "权限已更新"}
+
+    def get_user_group(self, auth_username):
+        """获取用户所属组"""
+        super_admin = self.config.get("Admin", "super_admin", fallback="admin")
+        if auth_username == super_admin:
+            return "super_admin"
+        return self.permissions["user_groups"].get(auth_username, "guest")
+
+    def update_user_group(self, auth_username, new_group):
+        """更新用户组（需要管理员权限）"""
+        if new_group == "super_admin":
+            return {"success": False, "message": "不允许将用户设置为超级管理员"}
+        with self.lock:
+            if new_group not in self.permissions["permission_groups"]:
+                return {"success": False, "message": "权限组不存在"}
+
+            self.permissions["user_groups"][auth_username] = new_group
+
+            if (
+                "user_custom_permissions" in self.permissions
+                and auth_username in self.permissions["user_custom_permissions"]
+            ):
+                del self.permissions["user_custom_permissions"][auth_username]
+                logging.info(
+                    f"[权限管理] 用户 {auth_username} 切换到组 {new_group}，已自动清空其自定义差分权限"
+                )
+
+            self._save_permissions()
+
+            user_file = self.get_user_file_path(auth_username)
+            if self.users.exists(user_file):
+                user_data = self.users.read(user_file)
+                user_data["group"] = new_group
+                self.users.write(user_file, user_data)
+
+            return {"success": True, "message": "权限组已更新"}
+
+    def create_permission_group(self, group_name, permissions, display_name):
+        """创建新的权限组（需要超级管理员权限）"""
+        with self.lock:
+            if group_name in self.permissions["permission_groups"]:
+                return {"success": False, "message": "权限组已存在"}
+
+            self.permissions["permission_groups"][group_name] = {
+                "name": display_name,
+                "is_system": False,
+                "permissions": permissions,
+            }
+            self._save_permissions()
+            return {"success": True, "message": "权限组已创建"}
+
+    def update_permission_group(self, group_name, permissions):
+        """更新权限组（需要超级管理员权限）"""
+        with self.lock:
+            if group_name not in self.permissions["permission_groups"]:
+                return {"success": False, "message": "权限组不存在"}
+
+            self.permissions["permission_groups"][group_name][
+                "permissions"
+            ] = permissions
+            self._save_permissions()
+            return {"success": True, "message": "权限组已更新"}
+
+    def delete_permission_group(self, group_name):
+        """删除权限组（需要超级管理员权限）"""
+        with self.lock:
+            if group_name not in self.permissions["permission_groups"]:
+                return {"success": False, "message": "权限组不存在"}
+
+            group_info = self.permissions["permission_groups"][group_name]
+            if group_info.get("is_system", False):
+                return {"success": False, "message": "不允许删除系统预设权限组"}
+
+            users_count = sum(
+                1 for u, g in self.permissions["user_groups"].items() if g == group_name
+            )
+            if users_count > 0:
+                return {
+                    "success": False,
+                    "message": f"无法删除：有 {users_count} 个用户正在使用此权限组",
+                }
+
+            del self.permissions["permission_groups"][group_name]
+            self._save_permissions()
+
+            logging.info(f"权限组已删除: {group_name}")
+            return {"success": True, "message": "权限组已删除"}
+
+    def list_users(self):
+        """列出所有用户"""
+        users = []
+        for filename, user_data in self.users.read_all():
+            if filename.endswith(".json"):
+                user_file = os.path.join(SYSTEM_ACCOUNTS_DIR, filename)
+                try:
+                    last_ip = user_data.get("last_login_ip", None)
+                    last_city = None
+                    if last_ip:
+                        try:
+                            last_city = get_ip_location(last_ip)
+                        except Exception as ip_e:
+                            logging.warning(f"查询IP归属地失败 {last_ip}: {ip_e}")
+                            last_city = "查询失败"
+
+                    users.append(
+                        {
+                            "auth_username": user_data["auth_username"],
+                            "nickname": user_data.get("nickname", ""),
+                            "phone": user_data.get("phone", ""),
+                            "group": user_data.get("group", "user"),
+                            "created_at": user_data.get("created_at"),
+                            "last_login": user_data.get("last_login"),
+                            "last_login_ip": last_ip,
+                            "last_login_city": last_city,
+                            "2fa_enabled": user_data.get("2fa_enabled", False),
+                            "banned": user_data.get("banned", False),
+                            "max_sessions": user_data.get("max_sessions", 1),
+                        }
+                    )
+                except Exception as e:
+                    logging.error(
+                        f"[用户管理] 读取用户文件失败 --> 文件名: {filename}, 文件路径: {user_file}, 错误类型: {type(e).__name__}, 错误详情: {e}, 可能原因: 文件损坏、JSON格式错误或权限不足",
+                        exc_info=True,
+                    )
+        return users
+
+    def get_all_groups(self):
+        """获取所有权限组"""
+        return self.permissions["permission_groups"]
+
+    def link_session_to_user(self, auth_username, session_id):
+        """关联会话ID到用户账号（用于状态恢复）"""
+        if auth_username == "guest":
+            return
+
+        if not session_id or session_id == "null" or session_id.strip() == "":
+            logging.debug(
+                f"[会话管理] 跳过关联无效会话 --> 会话ID: '{session_id}', 目标用户: {auth_username}, 原因: 会话ID为空、null或仅包含空白字符"
+            )
+            return
+
+        user_file = self.get_user_file_path(auth_username)
+        if self.users.exists(user_file):
+            with self.lock:
+                user_data = self.users.read(user_file)
+
+                if "session_ids" not in user_data:
+                    user_data["session_ids"] = []
+
+                if session_id not in user_data["session_ids"]:
+                    user_data["session_ids"].append(session_id)
+
+                    max_sessions = user_data.get("max_sessions", 1)
+                    if max_sessions > 0:
+                        user_data["session_ids"] = user_data["session_ids"][
+                            -max_sessions:
+                        ]
+
+                self.users.write(user_file, user_data)
+
+    def get_user_sessions(self, auth_username):
+        """获取用户关联的会话ID列表"""
+        if auth_username == "guest":
+            return []
+
+        user_file = self.get_user_file_path(auth_username)
+        if self.users.exists(user_file):
+            user_data = self.users.read(user_file)
+            return user_data.get("session_ids", [])
+        return []
+
+    def unlink_session_from_user(self, auth_username, session_id):
+        """取消会话与用户的关联"""
+        if auth_username == "guest":
+            return
+
+        user_file = self.get_user_file_path(auth_username)
+        if self.users.exists(user_file):
+            with self.lock:
+                user_data = self.users.read(user_file)
+
+                if (
+                    "session_ids" in user_data
+                    and session_id in user_data["session_ids"]
+                ):
+                    user_data["session_ids"].remove(session_id)
+
+                    self.users.write(user_file, user_data)
+
+    def reset_user_password(self, auth_username, new_password):
+        """重置用户密码（管理员功能）"""
+        encrypted = self._encrypt_password(new_password)
+        with self.lock:
+            user_file = self.get_user_file_path(auth_username)
+            if not self.users.exists(user_file):
+                return {"success": False, "message": "用户不存在"}
+
+            user_data = self.users.read(user_file)
 
-        user_custom = self.permissions.get("user_custom_permissions", {}).get(
-            auth_username, {}
-        )
-        added_perms = user_custom.get("added", [])
-        removed_perms = user_custom.get("removed", [])
+            user_data["password"] = encrypted
 
-        for perm in added_perms:
-            user_perms[perm] = True
+            self.users.write(user_file, user_data)
 
-        for perm in removed_perms:
-            user_perms[perm] = False
+            logging.info(f"管理员重置密码: {auth_username}")
+            return {"success": True, "message": "密码已重置"}
 
-        return user_perms
+    def force_disable_2fa(self, auth_username):
+        """强制关闭指定用户的2FA（管理员功能）"""
+        with self.lock:
+            user_file = self.get_user_file_path(auth_username)
+            if not self.users.exists(user_file):
+                return {"success": False, "message": "用户不存在"}
 
-    def set_user_custom_permission(self, auth_username, permission, grant):
-        """为用户设置自定义权限（差分化存储）
+            user_data = self.users.read(user_file)
+
+            user_data["2fa_enabled"] = False
+            # 可选：是否重置secret，通常保留secret以便用户重新开启时无需重新绑定，
+            # 或者清空secret强制用户重新绑定。这里选择仅禁用。
+
+            self.users.write(user_file, user_data)
+
+            logging.info(f"管理员强制关闭2FA: {auth_username}")
+            return {"success": True, "message": "2FA已强制关闭"}
+
+    def update_user_avatar(self, auth_username, avatar_url):
+        """更新用户头像"""
+        with self.lock:
+            user_file = self.get_user_file_path(auth_username)
+            if not self.users.exists(user_file):
+                return {"success": False, "message": "用户不存在"}
+
+            user_data = self.users.read(user_file)
+
+            user_data["avatar_url"] = avatar_url
+
+            self.users.write(user_file, user_data)
+
+            return {"success": True, "message": "头像已更新"}
+
+    def update_user_theme(self, auth_username, theme):
+        """更新用户主题偏好"""
+        with self.lock:
+            user_file = self.get_user_file_path(auth_username)
+            if not self.users.exists(user_file):
+                return {"success": False, "message": "用户不存在"}
+
+            user_data = self.users.read(user_file)
+
+            user_data["theme"] = theme
+
+            self.users.write(user_file, user_data)
+
+            return {"success": True, "message": "主题已更新"}
+
+    def update_max_sessions(self, auth_username, max_sessions):
+        """更新用户最大会话数量
 
         Args:
             auth_username: 用户名
-            permission: 权限名
-            grant: True=授予权限, False=移除权限
+            max_sessions: 最大会话数 (1=单会话, >1=指定数量, -1=无限制)
         """
         with self.lock:
-            if "user_custom_permissions" not in self.permissions:
-                self.permissions["user_custom_permissions"] = {}
+            user_file = self.get_user_file_path(auth_username)
+            if not self.users.exists(user_file):
+                return {"success": False, "message": "用户不存在"}
 
-            if auth_username not in self.permissions["user_custom_permissions"]:
-                self.permissions["user_custom_permissions"][auth_username] = {
-                    "added": [],
-                    "removed": [],
-                }
+            user_data = self.users.read(user_file)
 
-            user_custom = self.permissions["user_custom_permissions"][auth_username]
+            user_data["max_sessions"] = max_sessions
 
-            group = self.get_user_group(auth_username)
-            group_perms = (
-                self.permissions["permission_groups"]
-                .get(group, {})
-                .get("permissions", {})
-            )
-            base_has_permission = group_perms.get(permission, False)
+            self.users.write(user_file, user_data)
 
-            if grant:
-                if not base_has_permission:
-                    if permission not in user_custom["added"]:
-                        user_custom["added"].append(permission)
-                    if permission in user_custom["removed"]:
-                        user_custom["removed"].remove(permission)
-                else:
-                    if permission in user_custom["removed"]:
-                        user_custom["removed"].remove(permission)
+            if max_sessions == 1:
+                msg = f"已设置为单会话模式：用户每次只能保持1个活跃会话"
+            elif max_sessions == -1:
+                msg = f"已设置为无限会话模式：用户可以创建任意数量的会话"
             else:
-                if base_has_permission:
-                    if permission not in user_custom["removed"]:
-                        user_custom["removed"].append(permission)
-                    if permission in user_custom["added"]:
-                        user_custom["added"].remove(permission)
-                else:
-                    if permission in user_custom["added"]:
-                        user_custom["added"].remove(permission)
+                msg = f"已设置最大会话数量为：{max_sessions}个，超出时将自动清理最旧的会话"
 
-            self._save_permissions()
+            return {"success": True, "message": msg}
 
-            logging.info(f"设置用户 {auth_username} 权限 {permission} = {grant}")
-            return {"success": True, "message": "权限已更新"}
+    def ban_user(self, auth_username):
+        """封禁用户"""
+        with self.lock:
+            user_file = self.get_user_file_path(auth_username)
+            if not self.users.exists(user_file):
+                return {"success": False, "message": "用户不存在"}
 
-    def get_user_group(self, auth_username):
-        """获取用户所属组"""
-        super_admin = self.config.get("Admin", "super_admin", fallback="admin")
-        if auth_username == super_admin:
-            return "super_admin"
-        return self.permissions["user_groups"].get(auth_username, "guest")
+            user_data = self.users.read(user_file)
 
-    def update_user_group(self, auth_username, new_group):
-        """更新用户组（需要管理员权限）"""
-        if new_group == "super_admin":
-            return {"success": False, "message": "不允许将用户设置为超级管理员"}
+            user_data["banned"] = True
+            user_data["banned_at"] = time.time()
+
+            self.users.write(user_file, user_data)
+
+            logging.info(f"用户已封禁: {auth_username}")
+            return {"success": True, "message": "用户已封禁"}
+
+    def unban_user(self, auth_username):
+        """解封用户"""
         with self.lock:
-            if new_group not in self.permissions["permission_groups"]:
-                return {"success": False, "message": "权限组不存在"}
+            user_file = self.get_user_file_path(auth_username)
+            if not self.users.exists(user_file):
+                return {"success": False, "message": "用户不存在"}
 
-            self.permissions["user_groups"][auth_username] = new_group
+            user_data = self.users.read(user_file)
+
+            user_data["banned"] = False
+            user_data["unbanned_at"] = time.time()
+
+            self.users.write(user_file, user_data)
+
+            logging.info(f"用户已解封: {auth_username}")
+            return {"success": True, "message": "用户已解封"}
+
+    def delete_user(self, auth_username):
+        """删除用户（需要管理员权限）"""
+        with self.lock:
+            super_admin = self.config.get("Admin", "super_admin", fallback="admin")
+            if auth_username == super_admin:
+                return {"success": False, "message": "不允许删除超级管理员"}
+
+            user_file = self.get_user_file_path(auth_username)
+            if not self.users.exists(user_file):
+                return {"success": False, "message": "用户不存在"}
+
+            try:
+                self.users.remove(user_file)
+            except Exception as e:
+                logging.error(f"删除用户文件失败: {e}")
+                return {"success": False, "message": f"删除失败: {e}"}
+
+            try:
+                school_accounts_file = self._get_user_accounts_file(auth_username)
+                if os.path.exists(school_accounts_file):
+                    os.remove(school_accounts_file)
+                    logging.info(f"已删除用户 {auth_username} 的 school accounts 文件")
+            except Exception as e:
+                logging.error(
+                    f"删除用户 {auth_username} 的 school accounts 文件失败: {e}"
+                )
+
+            if auth_username in self.permissions.get("user_groups", {}):
+                del self.permissions["user_groups"][auth_username]
 
             if (
                 "user_custom_permissions" in self.permissions
                 and auth_username in self.permissions["user_custom_permissions"]
             ):
                 del self.permissions["user_custom_permissions"][auth_username]
-                logging.info(
-                    f"[权限管理] 用户 {auth_username} 切换到组 {new_group}，已自动清空其自定义差分权限"
-                )
 
             self._save_permissions()
 
-            user_file = self.get_user_file_path(auth_username)
-            if os.path.exists(user_file):
-                with open(user_file, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
-                user_data["group"] = new_group
-                with open(user_file, "w", encoding="utf-8") as f:
-                    json.dump(user_data, f, indent=2, ensure_ascii=False)
+            logging.info(f"用户已删除: {auth_username}")
+            return {"success": True, "message": "用户已删除"}
 
-            return {"success": True, "message": "权限组已更新"}
+    def get_user_details(self, auth_username):
+        """获取用户详细信息"""
+        user_file = self.get_user_file_path(auth_username)
+        if not self.users.exists(user_file):
+            return None
+
+        user_data = self.users.read(user_file)
+
+        return {
+            "auth_username": user_data["auth_username"],
+            "group": user_data.get("group", "user"),
+            "created_at": user_data.get("created_at"),
+            "last_login": user_data.get("last_login"),
+            "2fa_enabled": user_data.get("2fa_enabled", False),
+            "avatar_url": user_data.get("avatar_url") or "default_avatar.png",
+            "max_sessions": user_data.get("max_sessions", 1),
+            "theme": user_data.get("theme", "light"),
+            "session_ids": user_data.get("session_ids", []),
+            "nickname": user_data.get("nickname", user_data["auth_username"]),
+            "phone": user_data.get("phone", ""),
+            "last_used_school_account": user_data.get("last_used_school_account", ""), # 新增字段
+        }
+
+    def update_user_last_school_account(self, auth_username, school_username):
+        """更新用户最后使用的学校账号"""
+        if not auth_username or auth_username == 'guest':
+            return
+        
+        user_file = self.get_user_file_path(auth_username)
+        if self.users.exists(user_file):
+            with self.lock:
+                try:
+                    user_data = self.users.read(user_file)
+                    
+                    user_data["last_used_school_account"] = school_username
+                    
+                    self.users.write(user_file, user_data)
+                except Exception as e:
+                    logging.error(f"更新用户 {auth_username} 的 last_used_school_account 失败: {e}")
+
+    def check_single_session_enforcement(self, auth_username, new_session_id):
+        """检查并强制执行会话数量限制"""
+        if auth_username == "guest":
+            return [], ""
+
+        user_file = self.get_user_file_path(auth_username)
+        if not self.users.exists(user_file):
+            return [], ""
+
+        with self.lock:
+            user_data = self.users.read(user_file)
+
+            max_sessions = user_data.get("max_sessions", 1)
+            old_sessions = user_data.get("session_ids", [])
+
+            if max_sessions == -1:
+                return [], ""
+
+            current_count = len(old_sessions)
+            if current_count > max_sessions:
+                sessions_to_remove = old_sessions[: current_count - max_sessions + 1]
+                remaining_sessions = old_sessions[current_count - max_sessions + 1 :]
+                user_data["session_ids"] = remaining_sessions + [new_session_id]
+
+                self.users.write(user_file, user_data)
+
+                valid_sessions_to_remove = [
+                    s
+                    for s in sessions_to_remove
+                    if s and s != "null" and s.strip() != ""
+                ]
+                message = ""
+                if len(valid_sessions_to_remove) > 0:
+                    message = f"已达到最大会话数量限制({max_sessions}个)，已自动清理{len(valid_sessions_to_remove)}个最旧的会话"
+                return valid_sessions_to_remove, message
+            else:
+                return [], ""
+
+    def log_audit(
+        self, auth_username, action, details="", ip_address="", session_id=""
+    ):
+        """记录审计日志"""
+        audit_entry = {
+            "timestamp": time.time(),
+            "datetime": datetime.datetime.now().isoformat(),
+            "username": auth_username,
+            "action": action,
+            "details": details,
+            "ip_address": ip_address,
+            "session_id": session_id,
+        }
 
-    def create_permission_group(self, group_name, permissions, display_name):
-        """创建新的权限组（需要超级管理员权限）"""
-        with self.lock:
-            if group_name in self.permissions["permission_groups"]:
-                return {"success": False, "message": "权限组已存在"}
+        try:
+            self.audit_log.append(audit_entry)
+        except Exception as e:
+            logging.error(f"记录审计日志失败: {e}")
 
-            self.permissions["permission_groups"][group_name] = {
-                "name": display_name,
-                "is_system": False,
-                "permissions": permissions,
-            }
-            self._save_permissions()
-            return {"success": True, "message": "权限组已创建"}
+    def get_audit_logs(self, username=None, action=None, limit=100):
+        """获取审计日志（按时间正序，最多 limit 条最新记录）"""
+        logs, _ = self.query_audit_logs(username=username, action=action, limit=limit)
+        logs.reverse()
+        return logs
 
-    def update_permission_group(self, group_name, permissions):
-        """更新权限组（需要超级管理员权限）"""
-        with self.lock:
-            if group_name not in self.permissions["permission_groups"]:
-                return {"success": False, "message": "权限组不存在"}
+    def query_audit_logs(
+        self,
+        username=None,
+        action=None,
+        ip_address=None,
+        since=None,
+        until=None,
+        cursor=None,
+        limit=100,
+    ):
+        """分页查询审计日志，返回 (按时间倒序的记录列表, 下一页游标)"""
+        try:
+            return self.audit_log.query(
+                {"username": username, "action": action, "ip_address": ip_address},
+                since=since,
+                until=until,
+                cursor=cursor,
+                limit=limit,
+            )
+        except (OSError, ValueError) as e:
+            logging.error(f"读取审计日志失败: {e}")
+            return [], None
 
-            self.permissions["permission_groups"][group_name][
-                "permissions"
-            ] = permissions
-            self._save_permissions()
-            return {"success": True, "message": "权限组已更新"}
+    def _synchronize_super_admin_permissions(self):
+        """
+        [启动检查] 同步 config.ini 中的 super_admin 与 permissions.json 中的权限组。
+        """
+        logging.info(
+            "[权限同步] 开始检查 config.ini 与 permissions.json 的 super_admin 一致性..."
+        )
 
-    def delete_permission_group(self, group_name):
-        """删除权限组（需要超级管理员权限）"""
-        with self.lock:
-            if group_name not in self.permissions["permission_groups"]:
-                return {"success": False, "message": "权限组不存在"}
+        try:
+            super_admin_username = self.config.get(
+                "Admin", "super_admin", fallback="admin"
+            )
+            if not super_admin_username:
+                logging.error(
+                    "[权限同步] config.ini 中 [Admin]super_admin 未配置，同步中止。"
+                )
+                return
 
-            group_info = self.permissions["permission_groups"][group_name]
-            if group_info.get("is_system", False):
-                return {"success": False, "message": "不允许删除系统预设权限组"}
+            with self.lock:
+                changes_made = False
 
-            users_count = sum(
-                1 for u, g in self.permissions["user_groups"].items() if g == group_name
-            )
-            if users_count > 0:
-                return {
-                    "success": False,
-                    "message": f"无法删除：有 {users_count} 个用户正在使用此权限组",
-                }
+                if "user_groups" not in self.permissions:
+                    self.permissions["user_groups"] = {}
 
-            del self.permissions["permission_groups"][group_name]
-            self._save_permissions()
+                user_groups = self.permissions["user_groups"]
 
-            logging.info(f"权限组已删除: {group_name}")
-            return {"success": True, "message": "权限组已删除"}
+                for username, group in user_groups.copy().items():
 
-    def list_users(self):
-        """列出所有用户"""
-        users = []
-        for filename in os.listdir(SYSTEM_ACCOUNTS_DIR):
-            if filename.endswith(".json"):
-                user_file = os.path.join(SYSTEM_ACCOUNTS_DIR, filename)
-                try:
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
+                    if group == "super_admin" and username != super_admin_username:
+                        user_groups[username] = "admin"
+                        self._update_user_file_group(username, "admin")
+                        logging.warning(
+                            f"[权限同步] 用户 '{username}' 在 permissions.json 中是 super_admin，"
+                            f"但他不是 config.ini 中指定的超管 ('{super_admin_username}')。"
+                            f"已自动降级为 'admin'。"
+                        )
+                        changes_made = True
 
-                    last_ip = user_data.get("last_login_ip", None)
-                    last_city = None
-                    if last_ip:
-                        try:
-                            last_city = get_ip_location(last_ip)
-                        except Exception as ip_e:
-                            logging.warning(f"查询IP归属地失败 {last_ip}: {ip_e}")
-                            last_city = "查询失败"
+                    elif username == super_admin_username and group != "super_admin":
+                        user_groups[username] = "super_admin"
+                        self._update_user_file_group(username, "super_admin")
+                        logging.info(
+                            f"[权限同步] 用户 '{username}' 是 config.ini 指定的超管，"
+                            f"但在 permissions.json 中是 '{group}'。已自动升级为 'super_admin'。"
+                        )
+                        changes_made = True
 
-                    users.append(
-                        {
-                            "auth_username": user_data["auth_username"],
-                            "nickname": user_data.get("nickname", ""),
-                            "phone": user_data.get("phone", ""),
-                            "group": user_data.get("group", "user"),
-                            "created_at": user_data.get("created_at"),
-                            "last_login": user_data.get("last_login"),
-                            "last_login_ip": last_ip,
-                            "last_login_city": last_city,
-                            "2fa_enabled": user_data.get("2fa_enabled", False),
-                            "banned": user_data.get("banned", False),
-                            "max_sessions": user_data.get("max_sessions", 1),
-                        }
-                    )
-                except Exception as e:
-                    logging.error(
-                        f"[用户管理] 读取用户文件失败 --> 文件名: {filename}, 文件路径: {user_file}, 错误类型: {type(e).__name__}, 错误详情: {e}, 可能原因: 文件损坏、JSON格式错误或权限不足",
-                        exc_info=True,
+                if super_admin_username not in user_groups:
+                    user_groups[super_admin_username] = "super_admin"
+                    self._update_user_file_group(super_admin_username, "super_admin")  #
+                    logging.info(
+                        f"[权限同步] config.ini 指定的超管 '{super_admin_username}' "
+                        f"不在 permissions.json 中。已自动添加为 'super_admin'。"
                     )
-        return users
-
-    def get_all_groups(self):
-        """获取所有权限组"""
-        return self.permissions["permission_groups"]
+                    changes_made = True
 
-    def link_session_to_user(self, auth_username, session_id):
-        """关联会话ID到用户账号（用于状态恢复）"""
-        if auth_username == "guest":
-            return
+                if changes_made:
+                    self._save_permissions()  #
+                    logging.info("[权限同步] 权限数据已更新并保存。")
+                else:
+                    logging.info("[权限同步] 权限一致，无需更新。")
 
-        if not session_id or session_id == "null" or session_id.strip() == "":
-            logging.debug(
-                f"[会话管理] 跳过关联无效会话 --> 会话ID: '{session_id}', 目标用户: {auth_username}, 原因: 会话ID为空、null或仅包含空白字符"
+        except Exception as e:
+            logging.error(
+                f"[权限同步] 同步 super_admin 权限时发生严重错误: {e}", exc_info=True
             )
-            return
 
-        user_file = self.get_user_file_path(auth_username)
-        if os.path.exists(user_file):
-            with self.lock:
-                with open(user_file, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
 
-                if "session_ids" not in user_data:
-                    user_data["session_ids"] = []
+# ==============================================================================
+# Token管理系统
+# ==============================================================================
 
-                if session_id not in user_data["session_ids"]:
-                    user_data["session_ids"].append(session_id)
 
-                    max_sessions = user_data.get("max_sessions", 1)
-                    if max_sessions > 0:
-                        user_data["session_ids"] = user_data["session_ids"][
-                            -max_sessions:
-                        ]
+class TokenManager:
+    """管理用户登录令牌的系统
 
-                with open(user_file, "w", encoding="utf-8") as f:
-                    json.dump(user_data, f, indent=2, ensure_ascii=False)
+    令牌记录常驻内存，校验与续期不再读写磁盘；变更由后台线程合并后写回 tokens/<username>.json：
+    创建和失效立即写回，续期最多每 flush_interval_s 秒写回一次。
 
-    def get_user_sessions(self, auth_username):
-        """获取用户关联的会话ID列表"""
-        if auth_username == "guest":
-            return []
+    [System] token_format = signed 时改为签发无状态的签名令牌
+    "v1.<密钥ID>.<载荷>.<HMAC>"，载荷包含用户名、会话ID、签发和过期时间，
+    校验只需一次 HMAC 计算。登出/顶号通过按用户记录的"此时间之前签发的令牌作废"
+    实现（撤销表），表项在令牌最长有效期过后即可丢弃。两种格式的令牌始终都能校验，
+    切换格式不会使已登录用户掉线。
+    """
 
-        user_file = self.get_user_file_path(auth_username)
-        if os.path.exists(user_file):
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
-            return user_data.get("session_ids", [])
-        return []
+    TOKEN_TTL_S = 3600
+    SIGNED_TOKEN_VERSION = "v1"
+    # 签名令牌剩余有效期低于 TOKEN_TTL_S 的该比例时，在续期请求中重新签发
+    SIGNED_TOKEN_RENEW_FRACTION = 1 / 3
 
-    def unlink_session_from_user(self, auth_username, session_id):
-        """取消会话与用户的关联"""
-        if auth_username == "guest":
-            return
+    def __init__(self, tokens_dir, flush_interval_s: float | None = None):
+        logging.info("=" * 80)
+        logging.info(f"TokenManager: 初始化令牌管理器，目录: {tokens_dir}")
+        self.tokens_dir = tokens_dir
+        self.lock = threading.Lock()
+        if not os.path.exists(tokens_dir):
+            os.makedirs(tokens_dir)
+            logging.info(f"TokenManager: 创建令牌目录: {tokens_dir}")
+        else:
+            logging.debug(f"TokenManager: 令牌目录已存在: {tokens_dir}")
+        if flush_interval_s is None:
+            flush_interval_s = 30.0
+            try:
+                config = configparser.ConfigParser()
+                config.read(CONFIG_FILE, encoding="utf-8")
+                flush_interval_s = config.getfloat(
+                    "System", "token_flush_interval", fallback=flush_interval_s
+                )
+            except Exception as e:
+                logging.warning(f"TokenManager: 读取令牌写回配置失败，使用默认值: {e}")
+        self.flush_interval_s = max(0.0, flush_interval_s)
+        self.token_format = "opaque"
+        self.signing_key_max_age_s = 30 * 86400
+        try:
+            config = configparser.ConfigParser()
+            config.read(CONFIG_FILE, encoding="utf-8")
+            self.token_format = config.get("System", "token_format", fallback="opaque").strip().lower()
+            self.signing_key_max_age_s = (
+                config.getfloat("System", "token_signing_key_max_age_days", fallback=30) * 86400
+            )
+        except Exception as e:
+            logging.warning(f"TokenManager: 读取令牌格式配置失败，使用默认值: {e}")
+        if self.token_format not in ("opaque", "signed"):
+            logging.warning(f"TokenManager: 未知的 token_format '{self.token_format}'，使用 opaque")
+            self.token_format = "opaque"
+        # 签名密钥与撤销表使用不以 .json 结尾的文件名，避免被当作用户令牌文件
+        self._keys_file = os.path.join(tokens_dir, ".signing_keys")
+        self._revoked_file = os.path.join(tokens_dir, ".revoked")
+        self._signing_keys = self._load_json_file(self._keys_file, {"current": None, "keys": {}})
+        self._revoked_before = self._load_json_file(self._revoked_file, {})
+        self._cond = threading.Condition(self.lock)
+        self._records = {}  # username -> token_data，None 表示该用户没有令牌
+        self._dirty = {}  # username -> 最晚写回时间
+        self._io_lock = threading.Lock()
+        self._thread = None
+        logging.info(f"TokenManager: 初始化完成，令牌格式: {self.token_format}")
+        logging.info("=" * 80)
 
-        user_file = self.get_user_file_path(auth_username)
-        if os.path.exists(user_file):
-            with self.lock:
-                with open(user_file, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
+    @staticmethod
+    def _load_json_file(path, default):
+        if not os.path.exists(path):
+            return default
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"TokenManager: 读取 {path} 失败: {e}")
+            return default
 
-                if (
-                    "session_ids" in user_data
-                    and session_id in user_data["session_ids"]
-                ):
-                    user_data["session_ids"].remove(session_id)
+    @staticmethod
+    def _write_json_file(path, data):
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, path)
 
-                    with open(user_file, "w", encoding="utf-8") as f:
-                        json.dump(user_data, f, indent=2, ensure_ascii=False)
+    @staticmethod
+    def _b64encode(raw: bytes) -> str:
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
 
-    def reset_user_password(self, auth_username, new_password):
-        """重置用户密码（管理员功能）"""
-        with self.lock:
-            user_file = self.get_user_file_path(auth_username)
-            if not os.path.exists(user_file):
-                return {"success": False, "message": "用户不存在"}
+    @staticmethod
+    def _b64decode(text: str) -> bytes:
+        return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+    def _current_signing_key(self):
+        """返回 (密钥ID, 密钥)，当前密钥超过最长使用期限时轮换（调用方需持有 self.lock）"""
+        now = time.time()
+        current = self._signing_keys["keys"].get(self._signing_keys.get("current") or "")
+        if current is None or now - current["created_at"] > self.signing_key_max_age_s:
+            kid = secrets.token_hex(4)
+            self._signing_keys["keys"][kid] = {
+                "secret": secrets.token_hex(32),
+                "created_at": now,
+            }
+            self._signing_keys["current"] = kid
+            # 旧密钥只需保留到用它签发的令牌全部过期
+            self._signing_keys["keys"] = {
+                key_id: key
+                for key_id, key in self._signing_keys["keys"].items()
+                if key_id == kid
+                or now - key["created_at"] <= self.signing_key_max_age_s + self.TOKEN_TTL_S
+            }
+            try:
+                self._write_json_file(self._keys_file, self._signing_keys)
+            except Exception as e:
+                logging.error(f"TokenManager: 保存签名密钥失败: {e}")
+            logging.info(f"TokenManager: 已启用新的令牌签名密钥 {kid}")
+            current = self._signing_keys["keys"][kid]
+        return self._signing_keys["current"], bytes.fromhex(current["secret"])
+
+    def _sign(self, secret: bytes, signing_input: str) -> str:
+        return self._b64encode(
+            hmac.new(secret, signing_input.encode("utf-8"), hashlib.sha256).digest()
+        )
 
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+    def _issue_signed_token(self, username, session_id, issued_at, expires_at):
+        payload = json.dumps(
+            {"u": username, "s": session_id, "iat": issued_at, "exp": expires_at},
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        kid, secret = self._current_signing_key()
+        signing_input = f"{self.SIGNED_TOKEN_VERSION}.{kid}.{self._b64encode(payload.encode('utf-8'))}"
+        return f"{signing_input}.{self._sign(secret, signing_input)}"
 
-            user_data["password"] = self._encrypt_password(new_password)
+    def _verify_signed_token(self, username, token):
+        try:
+            version, kid, payload_b64, signature = token.split(".")
+        except ValueError:
+            return False, "token_mismatch"
+        with self.lock:
+            key = self._signing_keys["keys"].get(kid)
+            revoked_before = self._revoked_before.get(username, 0)
+        if version != self.SIGNED_TOKEN_VERSION or key is None:
+            return False, "token_mismatch"
+        expected = self._sign(
+            bytes.fromhex(key["secret"]), f"{version}.{kid}.{payload_b64}"
+        )
+        if not hmac.compare_digest(expected.encode("utf-8"), signature.encode("utf-8")):
+            return False, "token_mismatch"
+        try:
+            payload = json.loads(self._b64decode(payload_b64))
+        except (ValueError, TypeError):
+            return False, "token_mismatch"
+        if not isinstance(payload, dict):
+            return False, "token_mismatch"
+        # 会话ID仅作记录，不参与校验：同一令牌会在该用户的多个会话（多标签页、切换会话）间共享
+        if payload.get("u") != username or payload.get("iat", 0) < revoked_before:
+            return False, "token_mismatch"
+        if time.time() > payload.get("exp", 0):
+            return False, "token_expired"
+        return True, "valid"
+
+    def _revoke_before(self, username, timestamp):
+        """使该用户在 timestamp 之前签发的签名令牌全部失效（调用方需持有 self.lock）"""
+        now = time.time()
+        self._revoked_before = {
+            name: ts
+            for name, ts in self._revoked_before.items()
+            if now - ts <= self.TOKEN_TTL_S
+        }
+        self._revoked_before[username] = timestamp
+        snapshot = dict(self._revoked_before)
+        try:
+            self._write_json_file(self._revoked_file, snapshot)
+        except Exception as e:
+            logging.error(f"TokenManager: 保存令牌撤销表失败: {e}")
 
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+    def _get_token_file_path(self, username):
+        """获取用户的token文件路径"""
+        file_path = os.path.join(self.tokens_dir, f"{username}.json")
+        logging.debug(f"_get_token_file_path: 用户 {username} 的令牌文件: {file_path}")
+        return file_path
 
-            logging.info(f"管理员重置密码: {auth_username}")
-            return {"success": True, "message": "密码已重置"}
+    def _record(self, username):
+        """返回用户的令牌记录（调用方需持有 self.lock），首次访问时从令牌文件载入
+
+        没有令牌的用户不缓存；值为 None 的表项只在删除令牌文件的写回完成前暂存，
+        写回后由 _write_records 移除，使 _records 只保留活跃用户。
+        """
+        if username in self._records:
+            return self._records[username]
+        token_data = None
+        token_file = self._get_token_file_path(username)
+        if os.path.exists(token_file):
+            try:
+                with open(token_file, "r", encoding="utf-8") as f:
+                    token_data = json.load(f)
+            except Exception as e:
+                logging.error(f"读取令牌文件时出错 (用户: {username}): {e}")
+        if token_data is not None:
+            self._records[username] = token_data
+        return token_data
+
+    def _mark_dirty(self, username, delay_s: float):
+        """登记需要写回的用户（调用方需持有 self.lock），多次登记取最早的写回时间"""
+        deadline = time.time() + delay_s
+        if username not in self._dirty or deadline < self._dirty[username]:
+            self._dirty[username] = deadline
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._flush_loop, daemon=True, name="TokenFlusher"
+            )
+            self._thread.start()
+        self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    due = [name for name, deadline in self._dirty.items() if deadline <= now]
+                    if due:
+                        break
+                    if not self._dirty:
+                        self._cond.wait(timeout=60)
+                        if not self._dirty:
+                            self._thread = None
+                            return
+                        continue
+                    self._cond.wait(timeout=max(0.01, min(self._dirty.values()) - now))
+                for name in due:
+                    del self._dirty[name]
+            self._write_records(due)
+
+    def _write_records(self, usernames):
+        # 快照与写入都在 _io_lock 内进行，保证同一用户的文件按变更顺序落盘
+        with self._io_lock:
+            for username in usernames:
+                with self.lock:
+                    token_data = self._records.get(username)
+                    token_data = dict(token_data) if token_data else None
+                token_file = self._get_token_file_path(username)
+                try:
+                    if token_data is None:
+                        if os.path.exists(token_file):
+                            os.remove(token_file)
+                    else:
+                        tmp_file = f"{token_file}.tmp"
+                        with open(tmp_file, "w", encoding="utf-8") as f:
+                            json.dump(token_data, f, indent=2, ensure_ascii=False)
+                        os.replace(tmp_file, token_file)
+                except Exception as e:
+                    logging.error(f"写回令牌文件时出错 (用户: {username}): {e}")
+                    continue
+                with self.lock:
+                    # 已落盘且写回后未再变更：令牌已删除或已过期的表项不再常驻内存
+                    record = self._records.get(username)
+                    if username not in self._dirty and (
+                        record is None or time.time() > record.get("expires_at", 0)
+                    ):
+                        self._records.pop(username, None)
 
-    def force_disable_2fa(self, auth_username):
-        """强制关闭指定用户的2FA（管理员功能）"""
+    def flush_all(self):
+        """立即写回所有待保存的令牌（用于退出前）"""
         with self.lock:
-            user_file = self.get_user_file_path(auth_username)
-            if not os.path.exists(user_file):
-                return {"success": False, "message": "用户不存在"}
-
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
-
-            user_data["2fa_enabled"] = False
-            # 可选：是否重置secret，通常保留secret以便用户重新开启时无需重新绑定，
-            # 或者清空secret强制用户重新绑定。这里选择仅禁用。
-
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+            usernames = list(self._dirty)
+            self._dirty.clear()
+        self._write_records(usernames)
 
-            logging.info(f"管理员强制关闭2FA: {auth_username}")
-            return {"success": True, "message": "2FA已强制关闭"}
-
-    def update_user_avatar(self, auth_username, avatar_url):
-        """更新用户头像"""
+    def pending_count(self) -> int:
         with self.lock:
-            user_file = self.get_user_file_path(auth_username)
-            if not os.path.exists(user_file):
-                return {"success": False, "message": "用户不存在"}
+            return len(self._dirty)
 
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+    def generate_token(self):
+        """生成2048位(256字节)的安全令牌"""
+        token = secrets.token_hex(256)
+        logging.debug(f"generate_token: 生成新令牌，长度: {len(token)} 字符")
+        return token
 
-            user_data["avatar_url"] = avatar_url
+    def create_token(self, username, session_id=None):
+        """为用户创建新令牌并存储"""
+        logging.info(f"create_token: 为用户 {username} 创建令牌...")
+        created_at = time.time()
+        expires_at = created_at + self.TOKEN_TTL_S
+        if self.token_format == "signed":
+            issued_at = round(created_at, 3)
+            with self.lock:
+                # 新令牌签发后该用户之前的令牌（包括旧格式令牌）全部失效，与不透明令牌的覆盖语义一致
+                self._revoke_before(username, issued_at)
+                if self._record(username) is not None:
+                    self._records[username] = None
+                    self._mark_dirty(username, 0)
+                token = self._issue_signed_token(
+                    username, session_id, issued_at, round(expires_at, 3)
+                )
+            logging.info(f"为用户 {username} 签发签名令牌完成")
+            return token
 
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+        token = self.generate_token()
 
-            return {"success": True, "message": "头像已更新"}
+        token_data = {
+            "token": token,
+            "created_at": created_at,
+            "expires_at": expires_at,
+            "last_activity": created_at,
+        }
 
-    def update_user_theme(self, auth_username, theme):
-        """更新用户主题偏好"""
         with self.lock:
-            user_file = self.get_user_file_path(auth_username)
-            if not os.path.exists(user_file):
-                return {"success": False, "message": "用户不存在"}
-
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+            self._records[username] = token_data
+            self._mark_dirty(username, 0)
+        expiry_service.ensure("token", username, expires_at)
 
-            user_data["theme"] = theme
+        logging.info(f"为用户 {username} 创建新令牌完成")
+        return token
 
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+    def verify_token(self, username, session_id, token):
+        """验证令牌是否有效（只读内存，常量时间比较）"""
+        if isinstance(token, str) and token.startswith(self.SIGNED_TOKEN_VERSION + "."):
+            return self._verify_signed_token(username, token)
+        with self.lock:
+            token_data = self._record(username)
+            if token_data is None:
+                return False, "no_token_file"
+            stored_token = token_data.get("token") or ""
+            expires_at = token_data.get("expires_at", 0)
+
+        if not isinstance(token, str) or not hmac.compare_digest(
+            stored_token.encode("utf-8"), token.encode("utf-8")
+        ):
+            return False, "token_mismatch"
 
-            return {"success": True, "message": "主题已更新"}
+        if time.time() > expires_at:
+            return False, "token_expired"
 
-    def update_max_sessions(self, auth_username, max_sessions):
-        """更新用户最大会话数量
+        return True, "valid"
 
-        Args:
-            auth_username: 用户名
-            max_sessions: 最大会话数 (1=单会话, >1=指定数量, -1=无限制)
+    def get_valid_token_for_session(self, username, session_id=None):
+        """
+        获取指定用户的有效Token（如果存在且未过期）。
+        如果找到有效Token，会刷新其活动时间。
         """
         with self.lock:
-            user_file = self.get_user_file_path(auth_username)
-            if not os.path.exists(user_file):
-                return {"success": False, "message": "用户不存在"}
+            token_data = self._record(username)
+            if token_data is None:
+                return None
 
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+            current_time = time.time()
 
-            user_data["max_sessions"] = max_sessions
+            if current_time > token_data.get("expires_at", 0):
+                logging.debug(
+                    f"get_valid_token_for_session: 用户 {username} 的Token已过期"
+                )
+                return None
 
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+            token_data["last_activity"] = current_time
+            token_data["expires_at"] = current_time + self.TOKEN_TTL_S
+            self._mark_dirty(username, self.flush_interval_s)
 
-            if max_sessions == 1:
-                msg = f"已设置为单会话模式：用户每次只能保持1个活跃会话"
-            elif max_sessions == -1:
-                msg = f"已设置为无限会话模式：用户可以创建任意数量的会话"
-            else:
-                msg = f"已设置最大会话数量为：{max_sessions}个，超出时将自动清理最旧的会话"
+        logging.info(
+            f"get_valid_token_for_session: 找到并刷新了用户 {username} 的有效Token"
+        )
+        return token_data.get("token")
 
-            return {"success": True, "message": msg}
+    def refresh_token(self, username, session_id=None, token=None):
+        """
+        刷新令牌的过期时间和最后活动时间（仅更新内存，合并后延迟写回）。
+        签名令牌的过期时间写在令牌内，无法原地延长：传入的签名令牌剩余有效期不足
+        SIGNED_TOKEN_RENEW_FRACTION 时重新签发一枚（旧令牌在过期前仍然有效）。
 
-    def ban_user(self, auth_username):
-        """封禁用户"""
+        Returns:
+            客户端此后应持有的令牌（调用方据此更新 Cookie）；用户没有令牌时返回 None
+        """
+        if isinstance(token, str) and token.startswith(self.SIGNED_TOKEN_VERSION + "."):
+            return self._renew_signed_token(username, session_id, token)
         with self.lock:
-            user_file = self.get_user_file_path(auth_username)
-            if not os.path.exists(user_file):
-                return {"success": False, "message": "用户不存在"}
+            token_data = self._record(username)
+            if token_data is None:
+                return None
 
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+            current_time = time.time()
+            token_data["expires_at"] = current_time + self.TOKEN_TTL_S
+            token_data["last_activity"] = current_time
+            self._mark_dirty(username, self.flush_interval_s)
+            return token_data.get("token")
 
-            user_data["banned"] = True
-            user_data["banned_at"] = time.time()
+    def _renew_signed_token(self, username, session_id, token):
+        """签名令牌临近过期时重新签发，否则原样返回（令牌须已通过 verify_token 校验）"""
+        try:
+            payload = json.loads(self._b64decode(token.split(".")[2]))
+        except (IndexError, ValueError, TypeError):
+            return token
+        now = time.time()
+        if payload.get("exp", 0) - now > self.TOKEN_TTL_S * self.SIGNED_TOKEN_RENEW_FRACTION:
+            return token
+        issued_at = round(now, 3)
+        with self.lock:
+            renewed = self._issue_signed_token(
+                username,
+                session_id or payload.get("s"),
+                issued_at,
+                round(issued_at + self.TOKEN_TTL_S, 3),
+            )
+        logging.debug(f"TokenManager: 用户 {username} 的签名令牌临近过期，已重新签发")
+        return renewed
 
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+    def invalidate_token(self, username, session_id=None):
+        """使令牌失效（用于登出）
 
-            logging.info(f"用户已封禁: {auth_username}")
-            return {"success": True, "message": "用户已封禁"}
+        新的简化设计：直接删除用户的token文件
 
-    def unban_user(self, auth_username):
-        """解封用户"""
+        Args:
+            username: 用户名
+            session_id: 会话UUID（保留参数以兼容，不再使用）
+        """
         with self.lock:
-            user_file = self.get_user_file_path(auth_username)
-            if not os.path.exists(user_file):
-                return {"success": False, "message": "用户不存在"}
+            had_token = self._record(username) is not None
+            self._records[username] = None
+            self._mark_dirty(username, 0)
+            if self.token_format == "signed" or username in self._revoked_before:
+                self._revoke_before(username, time.time() + 0.001)
+                had_token = True
+        if had_token:
+            logging.info(f"令牌已失效: {username}")
 
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+    def get_active_sessions(self, username):
+        """获取用户所有有效的会话"""
+        logging.debug(
+            f"get_active_sessions: token文件不再管理session列表，请使用session管理功能"
+        )
+        return []
 
-            user_data["banned"] = False
-            user_data["unbanned_at"] = time.time()
+    def cleanup_expired_tokens(self, username):
+        """清理过期的令牌
 
-            with open(user_file, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+        新的简化设计：如果token过期，直接删除整个token文件
 
-            logging.info(f"用户已解封: {auth_username}")
-            return {"success": True, "message": "用户已解封"}
+        Args:
+            username: 用户名
 
-    def delete_user(self, auth_username):
-        """删除用户（需要管理员权限）"""
+        Returns:
+            令牌仍然有效时返回其过期时间，否则返回 None（供 ExpiryService 重新登记）
+        """
         with self.lock:
-            super_admin = self.config.get("Admin", "super_admin", fallback="admin")
-            if auth_username == super_admin:
-                return {"success": False, "message": "不允许删除超级管理员"}
-
-            user_file = self.get_user_file_path(auth_username)
-            if not os.path.exists(user_file):
-                return {"success": False, "message": "用户不存在"}
+            token_data = self._record(username)
+            if token_data is None:
+                return None
 
-            try:
-                os.remove(user_file)
-            except Exception as e:
-                logging.error(f"删除用户文件失败: {e}")
-                return {"success": False, "message": f"删除失败: {e}"}
+            if time.time() > token_data.get("expires_at", 0):
+                self._records[username] = None
+                self._mark_dirty(username, 0)
+                logging.info(f"清理了过期令牌: {username}")
+                return None
+            return token_data.get("expires_at")
 
-            try:
-                school_accounts_file = self._get_user_accounts_file(auth_username)
-                if os.path.exists(school_accounts_file):
-                    os.remove(school_accounts_file)
-                    logging.info(f"已删除用户 {auth_username} 的 school accounts 文件")
-            except Exception as e:
-                logging.error(
-                    f"删除用户 {auth_username} 的 school accounts 文件失败: {e}"
+    def schedule_expiry(self):
+        """
+        向 ExpiryService 登记令牌过期清理。已有令牌文件按修改时间推算过期时间
+        （写回的过期时间约为修改时间+TOKEN_TTL_S），无需逐个解析，到期时再以内存记录为准。
+        """
+        expiry_service.register("token", self.cleanup_expired_tokens)
+        for entry in os.scandir(self.tokens_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                expiry_service.ensure(
+                    "token", entry.name[:-5], entry.stat().st_mtime + self.TOKEN_TTL_S
                 )
 
-            if auth_username in self.permissions.get("user_groups", {}):
-                del self.permissions["user_groups"][auth_username]
-
-            if (
-                "user_custom_permissions" in self.permissions
-                and auth_username in self.permissions["user_custom_permissions"]
-            ):
-                del self.permissions["user_custom_permissions"][auth_username]
-
-            self._save_permissions()
-
-            logging.info(f"用户已删除: {auth_username}")
-            return {"success": True, "message": "用户已删除"}
-
-    def get_user_details(self, auth_username):
-        """获取用户详细信息"""
-        user_file = self.get_user_file_path(auth_username)
-        if not os.path.exists(user_file):
-            return None
-
-        with open(user_file, "r", encoding="utf-8") as f:
-            user_data = json.load(f)
-
-        return {
-            "auth_username": user_data["auth_username"],
-            "group": user_data.get("group", "user"),
-            "created_at": user_data.get("created_at"),
-            "last_login": user_data.get("last_login"),
-            "2fa_enabled": user_data.get("2fa_enabled", False),
-            "avatar_url": user_data.get("avatar_url") or "default_avatar.png",
-            "max_sessions": user_data.get("max_sessions", 1),
-            "theme": user_data.get("theme", "light"),
-            "session_ids": user_data.get("session_ids", []),
-            "nickname": user_data.get("nickname", user_data["auth_username"]),
-            "phone": user_data.get("phone", ""),
-            "last_used_school_account": user_data.get("last_used_school_account", ""), # 新增字段
-        }
-
-    def update_user_last_school_account(self, auth_username, school_username):
-        """更新用户最后使用的学校账号"""
-        if not auth_username or auth_username == 'guest':
-            return
-        
-        user_file = self.get_user_file_path(auth_username)
-        if os.path.exists(user_file):
-            with self.lock:
-                try:
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
-                    
-                    user_data["last_used_school_account"] = school_username
-                    
-                    with open(user_file, "w", encoding="utf-8") as f:
-                        json.dump(user_data, f, indent=2, ensure_ascii=False)
-                except Exception as e:
-                    logging.error(f"更新用户 {auth_username} 的 last_used_school_account 失败: {e}")
-
-    def check_single_session_enforcement(self, auth_username, new_session_id):
-        """检查并强制执行会话数量限制"""
-        if auth_username == "guest":
-            return [], ""
+    def detect_multi_device_login(self, username, new_session_id):
+        """检测多设备登录"""
+        active_sessions = self.get_active_sessions(username)
 
-        user_file = self.get_user_file_path(auth_username)
-        if not os.path.exists(user_file):
-            return [], ""
+        old_sessions = [s for s in active_sessions if s != new_session_id]
 
-        with self.lock:
-            with open(user_file, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+        if old_sessions:
+            logging.info(f"检测到多设备登录: {username}, 旧会话数: {len(old_sessions)}")
 
-            max_sessions = user_data.get("max_sessions", 1)
-            old_sessions = user_data.get("session_ids", [])
+        return old_sessions
 
-            if max_sessions == -1:
-                return [], ""
 
-            current_count = len(old_sessions)
-            if current_count > max_sessions:
-                sessions_to_remove = old_sessions[: current_count - max_sessions + 1]
-                remaining_sessions = old_sessions[current_count - max_sessions + 1 :]
-                user_data["session_ids"] = remaining_sessions + [new_session_id]
+# ==============================================================================
+# 数据结构定义
+# ==============================================================================
 
-                with open(user_file, "w", encoding="utf-8") as f:
-                    json.dump(user_data, f, indent=2, ensure_ascii=False)
 
-                valid_sessions_to_remove = [
-                    s
-                    for s in sessions_to_remove
-                    if s and s != "null" and s.strip() != ""
-                ]
-                message = ""
-                if len(valid_sessions_to_remove) > 0:
-                    message = f"已达到最大会话数量限制({max_sessions}个)，已自动清理{len(valid_sessions_to_remove)}个最旧的会话"
-                return valid_sessions_to_remove, message
-            else:
-                return [], ""
+class UserData:
+    """存储用户相关信息的类"""
 
-    def log_audit(
-        self, auth_username, action, details="", ip_address="", session_id=""
-    ):
-        """记录审计日志"""
-        audit_entry = {
-            "timestamp": time.time(),
-            "datetime": datetime.datetime.now().isoformat(),
-            "username": auth_username,
-            "action": action,
-            "details": details,
-            "ip_address": ip_address,
-            "session_id": session_id,
-        }
+    def __init__(self):
+        self.name: str = ""
+        self.phone: str = ""
+        self.student_id: str = ""
+        self.id: str = ""
+        self.registration_time: str = ""
+        self.first_login_time: str = ""
+        self.id_card: str = ""
+        self.last_login_time: str = ""
+        self.current_login_time: str = ""
+        self.username: str = ""
+        self.gender: str = ""
+        self.school_name: str = ""
+        self.attribute_type: str = ""
+        self.avatar_url: str = ""
 
-        try:
-            with open(AUDIT_LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(json.dumps(audit_entry, ensure_ascii=False) + "\n")
-        except Exception as e:
-            logging.error(f"记录审计日志失败: {e}")
 
-    def get_audit_logs(self, username=None, action=None, limit=100):
-        """获取审计日志"""
-        if not os.path.exists(AUDIT_LOG_FILE):
-            return []
+class RunData:
+    """存储单个跑步任务相关数据的类"""
 
-        logs = []
-        try:
-            with open(AUDIT_LOG_FILE, "r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        entry = json.loads(line.strip())
-                        if (not username or entry.get("username") == username) and (
-                            not action or entry.get("action") == action
-                        ):
-                            logs.append(entry)
-                    except (json.JSONDecodeError, KeyError, ValueError) as e:
-                        logging.debug(f"[审计日志] 跳过无效日志行: {e}")
-                        continue
-        except Exception as e:
-            logging.error(f"读取审计日志失败: {e}")
+    # 体积较大的几何坐标字段：会话持久化时与任务进度分开存储，仅在变化后重写
+    GEOMETRY_FIELDS = ("target_points", "recommended_coords", "draft_coords", "run_coords")
+    _geometry_clock = 0
 
-        return logs[-limit:]
+    def __init__(self):
+        self.draft_coords: list[tuple[float, float, int]] = []
+        self.run_coords: list[tuple[float, float, int]] = []
+        self.recommended_coords: list[tuple[float, float]] = []
+        self.target_points: list[tuple[float, float]] = []
+        self.target_point_names: str = ""
+        self.upload_time: str = ""
+        self.start_time: str = ""
+        self.end_time: str = ""
+        self.run_name: str = ""
+        self.errand_id: str = ""
+        self.errand_schedule: str = ""
+        self.status: int = 0
 
-    def _synchronize_super_admin_permissions(self):
-        """
-        [启动检查] 同步 config.ini 中的 super_admin 与 permissions.json 中的权限组。
-        """
-        logging.info(
-            "[权限同步] 开始检查 config.ini 与 permissions.json 的 super_admin 一致性..."
-        )
+        self.target_sequence: int = 0
+        self.is_in_target_zone: bool = False
+        self.trid: str = ""
+        self.details_fetched: bool = False
+        self.total_run_time_s: float = 0.0
+        self.total_run_distance_m: float = 0.0
+        self.distance_covered_m: float = 0.0
 
+    def __setattr__(self, name, value):
+        if name in RunData.GEOMETRY_FIELDS:
+            RunData._geometry_clock += 1
+            object.__setattr__(self, "_geometry_version", RunData._geometry_clock)
+        object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        # 仅在实例上没有该属性时调用：几何坐标尚未从 sidecar 文件加载时按需加载
+        if name in RunData.GEOMETRY_FIELDS and "_geometry_source" in self.__dict__:
+            self._materialize_geometry()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def attach_geometry_source(self, source):
+        """以延迟加载方式关联会话存储中的几何坐标（CoordinateSidecar），首次访问坐标字段时才读取"""
+        for field in RunData.GEOMETRY_FIELDS:
+            self.__dict__.pop(field, None)
+        self.__dict__["_geometry_source"] = source
+        RunData._geometry_clock += 1
+        self.__dict__["_geometry_version"] = RunData._geometry_clock
+
+    def _materialize_geometry(self):
+        source = self.__dict__.pop("_geometry_source", None)
+        if source is None:
+            return
         try:
-            super_admin_username = self.config.get(
-                "Admin", "super_admin", fallback="admin"
-            )
-            if not super_admin_username:
-                logging.error(
-                    "[权限同步] config.ini 中 [Admin]super_admin 未配置，同步中止。"
-                )
-                return
-
-            with self.lock:
-                changes_made = False
-
-                if "user_groups" not in self.permissions:
-                    self.permissions["user_groups"] = {}
+            geometry = source.load()
+        except Exception as e:
+            logging.error(f"[会话存储] 加载任务 '{self.run_name}' 的坐标文件失败: {e}")
+            geometry = {}
+        for field in RunData.GEOMETRY_FIELDS:
+            # 不经过 __setattr__，保持 _geometry_version 不变（内容与存储中一致）
+            self.__dict__.setdefault(field, geometry.get(field, []))
+
+    def to_dict(self) -> dict:
+        """返回供前端使用的任务字典（包含全部坐标，不含内部字段）"""
+        self._materialize_geometry()
+        return {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+
+    def geometry_fingerprint(self) -> tuple:
+        """几何坐标的变化指纹：字段被整体替换时版本号变化，原地追加时长度变化（未加载时不触发加载）"""
+        source = self.__dict__.get("_geometry_source")
+        lengths = source.lengths if source is not None else {}
+        return (self._geometry_version,) + tuple(
+            len(self.__dict__[field]) if field in self.__dict__ else lengths.get(field, 0)
+            for field in RunData.GEOMETRY_FIELDS
+        )
 
-                user_groups = self.permissions["user_groups"]
 
-                for username, group in user_groups.copy().items():
+class AccountSession:
+    """封装单个账号的所有运行时数据、状态和操作"""
 
-                    if group == "super_admin" and username != super_admin_username:
-                        user_groups[username] = "admin"
-                        self._update_user_file_group(username, "admin")
-                        logging.warning(
-                            f"[权限同步] 用户 '{username}' 在 permissions.json 中是 super_admin，"
-                            f"但他不是 config.ini 中指定的超管 ('{super_admin_username}')。"
-                            f"已自动降级为 'admin'。"
-                        )
-                        changes_made = True
+    def __init__(self, username, password, api_bridge, tag=None):
+        self.username: str = username
+        self.password: str = password
+        self.api_bridge = api_bridge
+        self.window = api_bridge.window
 
-                    elif username == super_admin_username and group != "super_admin":
-                        user_groups[username] = "super_admin"
-                        self._update_user_file_group(username, "super_admin")
-                        logging.info(
-                            f"[权限同步] 用户 '{username}' 是 config.ini 指定的超管，"
-                            f"但在 permissions.json 中是 '{group}'。已自动升级为 'super_admin'。"
-                        )
-                        changes_made = True
+        self.api_client = ApiClient(self)
+        self.user_data = UserData()
+        self.all_run_data: list[RunData] = []
 
-                if super_admin_username not in user_groups:
-                    user_groups[super_admin_username] = "super_admin"
-                    self._update_user_file_group(super_admin_username, "super_admin")  #
-                    logging.info(
-                        f"[权限同步] config.ini 指定的超管 '{super_admin_username}' "
-                        f"不在 permissions.json 中。已自动添加为 'super_admin'。"
-                    )
-                    changes_made = True
+        self.params = copy.deepcopy(api_bridge.global_params)
+        self.device_ua: str = ""
 
-                if changes_made:
-                    self._save_permissions()  #
-                    logging.info("[权限同步] 权限数据已更新并保存。")
-                else:
-                    logging.info("[权限同步] 权限一致，无需更新。")
+        self.server_attendance_radius_m = 0.0
+        self.last_radius_fetch_time = 0
 
-        except Exception as e:
-            logging.error(
-                f"[权限同步] 同步 super_admin 权限时发生严重错误: {e}", exc_info=True
-            )
+        self.tag: str = tag if tag else ""
 
+        self.is_first_login_verified: bool = False
+        self.is_verifying: bool = False
+        self.last_refresh_time: float = 0
 
-# ==============================================================================
-# Token管理系统
-# ==============================================================================
+        self.status_text: str = "待命"
+        self.summary = {
+            "total": 0,
+            "completed": 0,
+            "pending": 0,
+            "executable": 0,
+            "expired": 0,
+            "not_started": 0,
+        }
 
+        # 多账号执行器的运行句柄（AccountRunHandle，接口与 Thread 的 is_alive/join 一致）
+        self.worker_thread = None
+        self.stop_event = threading.Event()
 
-class TokenManager:
-    """管理用户登录令牌的系统"""
+    def log(self, message: str):
+        """为日志自动添加账号前缀"""
+        self.api_bridge.log(f"[{self.username}] {message}")
 
-    def __init__(self, tokens_dir):
-        logging.info("=" * 80)
-        logging.info(f"TokenManager: 初始化令牌管理器，目录: {tokens_dir}")
-        self.tokens_dir = tokens_dir
-        self.lock = threading.Lock()
-        if not os.path.exists(tokens_dir):
-            os.makedirs(tokens_dir)
-            logging.info(f"TokenManager: 创建令牌目录: {tokens_dir}")
-        else:
-            logging.debug(f"TokenManager: 令牌目录已存在: {tokens_dir}")
-        logging.info("TokenManager: 初始化完成")
-        logging.info("=" * 80)
 
-    def _get_token_file_path(self, username):
-        """获取用户的token文件路径"""
-        file_path = os.path.join(self.tokens_dir, f"{username}.json")
-        logging.debug(f"_get_token_file_path: 用户 {username} 的令牌文件: {file_path}")
-        return file_path
+class ApiClient:
+    """处理与后端服务器网络请求的类"""
 
-    def generate_token(self):
-        """生成2048位(256字节)的安全令牌"""
-        token = secrets.token_hex(256)
-        logging.debug(f"generate_token: 生成新令牌，长度: {len(token)} 字符")
-        return token
+    BASE_URL = "https://zslf.zsc.edu.cn"
+    API_VERSION = 66
 
-    def create_token(self, username, session_id=None):
-        """为用户创建新令牌并存储"""
-        logging.info(f"create_token: 为用户 {username} 创建令牌...")
-        token = self.generate_token()
-        created_at = time.time()
-        expires_at = created_at + 3600
+    def __init__(self, owner_instance):
+        self.session = requests.Session()
+        self.app = owner_instance
+        logging.debug("ApiClient已初始化，创建了新的requests.Session会话实例")
 
-        token_data = {
-            "token": token,
-            "created_at": created_at,
-            "expires_at": expires_at,
-            "last_activity": created_at,
+    def _get_headers(self) -> dict:
+        """构建请求头，包含认证信息和设备信息"""
+        headers = {
+            "Connection": "keep-alive",
+            "Accept": "application/json, text/plain, */*",
+            "X-Requested-With": "com.zx.slm",
+            "Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7",
+            "User-Agent": self.app.device_ua,
         }
+        try:
+            auth_token = self.session.cookies.get_dict().get("shiroCookie")
+        except requests.cookies.CookieConflictError:
+            logging.warning(
+                "CookieConflictError 即使在使用 get_dict() 时也发生，尝试手动查找..."
+            )
+            auth_token = None
+            for cookie in self.session.cookies:
+                if cookie.name == "shiroCookie":
+                    auth_token = cookie.value
+                    logging.warning(f"手动查找到 'shiroCookie': {auth_token[:10]}...")
+                    break
 
-        with self.lock:
-            token_file = self._get_token_file_path(username)
-
-            with open(token_file, "w", encoding="utf-8") as f:
-                json.dump(token_data, f, indent=2, ensure_ascii=False)
+        if auth_token:
+            logging.debug(
+                f"使用shiroCookie作为认证令牌进行Authorization请求头设置: {auth_token}"
+            )
+            headers["Authorization"] = auth_token
+        else:
+            logging.debug("未找到shiroCookie认证令牌，将不会设置Authorization请求头")
+        return headers
 
-        logging.info(f"为用户 {username} 创建新令牌完成")
-        return token
+    def _request(
+        self,
+        method: str,
+        url: str,
+        data: dict = None,
+        params: dict = None,
+        is_post_str=False,
+        force_content_type: str = None,
+    ) -> requests.Response | None:
+        """统一的网络请求方法（增强：支持取消）"""
 
-    def verify_token(self, username, session_id, token):
-        """验证令牌是否有效"""
-        token_file = self._get_token_file_path(username)
+        log_func = self.app.log if hasattr(self.app, "log") else self.app.api_bridge.log
+        is_offline = (
+            self.app.is_offline_mode
+            if hasattr(self.app, "is_offline_mode")
+            else self.app.api_bridge.is_offline_mode
+        )
 
-        if not os.path.exists(token_file):
-            return False, "no_token_file"
+        cancel_requested = False
 
-        try:
-            with open(token_file, "r", encoding="utf-8") as f:
-                token_data = json.load(f)
+        if cancel_requested:
+            log_func("操作已取消，跳过网络请求。")
+            logging.debug(
+                f"[网络请求] 请求已取消 --> 请求方法: {method.upper()}, 目标URL: {url}, 取消原因: 用户停止操作或系统取消标志已设置"
+            )
+            return None
 
-            if token_data.get("token") != token:
-                return False, "token_mismatch"
+        if is_offline:
+            log_func("离线模式：网络请求已被禁用。")
+            logging.debug(
+                f"[网络请求] 离线模式已启用，已阻止网络请求 --> 请求方法: {method.upper()}, 目标URL: {url}, 说明: 离线模式下所有网络通信将被禁用"
+            )
+            return None
 
-            if time.time() > token_data.get("expires_at", 0):
-                return False, "token_expired"
+        retries = 3
+        connect_timeout = 5
+        read_timeout = 10
 
-            return True, "valid"
+        log_data = data
+        if is_post_str and isinstance(data, str) and len(data) > 500:
+            log_data = (
+                data[:500] + "... (已截断，完整数据长度: " + str(len(data)) + " 字节)"
+            )
 
-        except Exception as e:
-            logging.error(f"验证令牌时出错: {e}")
-            return False, "error"
+        logging.debug(
+            f"[网络请求] 准备发起HTTP请求 --> 请求方法: {method.upper()}, 目标URL: {url}, 重试次数配置: {retries}次, 连接超时: {connect_timeout}秒, 读取超时: {read_timeout}秒\n[请求数据]: {log_data}"
+        )
 
-    def get_valid_token_for_session(self, username, session_id=None):
-        """
-        获取指定用户的有效Token（如果存在且未过期）。
-        如果找到有效Token，会刷新其活动时间。
-        """
-        token_file = self._get_token_file_path(username)
+        for attempt in range(retries):
+            try:
+                headers = self._get_headers()
 
-        if not os.path.exists(token_file):
-            return None
+                if method.upper() == "POST":
+                    post_data_bytes = b""
 
-        try:
-            with self.lock:
-                with open(token_file, "r", encoding="utf-8") as f:
-                    token_data = json.load(f)
+                    if force_content_type:
+                        headers["Content-Type"] = force_content_type
+                    elif is_post_str:
+                        headers["Content-Type"] = "application/x-www-form-urlencoded"
+                    else:
+                        headers["Content-Type"] = "application/x-www-form-urlencoded"
 
-                current_time = time.time()
+                    if is_post_str:
+                        post_data_bytes = (data or "").encode("utf-8")
+                    else:
+                        post_data_bytes = urllib.parse.urlencode(data or {}).encode(
+                            "utf-8"
+                        )
 
-                if current_time > token_data.get("expires_at", 0):
-                    logging.debug(
-                        f"get_valid_token_for_session: 用户 {username} 的Token已过期"
+                    resp = self.session.post(
+                        url,
+                        data=post_data_bytes,
+                        params=params,
+                        headers=headers,
+                        timeout=(connect_timeout, read_timeout),
+                    )
+                else:
+                    resp = self.session.get(
+                        url,
+                        params=data,
+                        headers=headers,
+                        timeout=(connect_timeout, read_timeout),
                     )
-                    return None
-
-                token_data["last_activity"] = current_time
-                token_data["expires_at"] = current_time + 3600
 
-                with open(token_file, "w", encoding="utf-8") as f:
-                    json.dump(token_data, f, indent=2, ensure_ascii=False)
+                logging.debug(
+                    f"[网络请求] 收到服务器响应 <-- 状态码: {resp.status_code} ({resp.reason}), 来源URL: {url}, 响应头: {dict(resp.headers)}, 响应内容长度: {len(resp.content)} 字节"
+                )
+                resp.raise_for_status()
+                return resp
 
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as net_err:
+                log_func(f"网络连接失败 (第{attempt+1}/{retries}次): {net_err}")
+                logging.error(
+                    f"[网络请求] 网络连接失败 --> 重试次数: 第{attempt+1}次/共{retries}次, 请求方法: {method.upper()}, 目标URL: {url}, 错误类型: {type(net_err).__name__}, 错误详情: {net_err}, 连接超时配置: {connect_timeout}秒, 读取超时配置: {read_timeout}秒",
+                    exc_info=False,
+                )
+                if attempt + 1 == retries:
+                    log_func(f"网络连接最终失败: 无法连接到服务器 {self.BASE_URL}")
+                    logging.error(
+                        f"[网络请求] 网络连接最终失败 --> 已达到最大重试次数({retries}次), 目标服务器: {self.BASE_URL}, 无法建立连接"
+                    )
+                    return None
                 logging.info(
-                    f"get_valid_token_for_session: 找到并刷新了用户 {username} 的有效Token"
+                    f"[网络请求] 准备重试 --> 等待1.5秒后进行第{attempt+2}次请求尝试"
                 )
-                return token_data.get("token")
+                time.sleep(1.5)
+                continue
 
-        except Exception as e:
-            logging.error(f"获取Token时出错 (用户: {username}): {e}")
-            return None
+            except requests.exceptions.HTTPError as http_err:
+                log_func(
+                    f"服务器返回错误 (第{attempt+1}次): {http_err.response.status_code}"
+                )
+                logging.error(
+                    f"[网络请求] HTTP错误 --> 重试次数: 第{attempt+1}次/共{retries}次, 请求方法: {method.upper()}, 目标URL: {url}, HTTP状态码: {http_err.response.status_code}, 状态描述: {http_err.response.reason}, 服务器响应内容: {http_err.response.text[:200]}{'...(已截断)' if len(http_err.response.text) > 200 else ''}",
+                    exc_info=False,
+                )
+                if attempt + 1 == retries:
+                    log_func(f"服务器错误: {http_err.response.status_code}")
+                    logging.error(
+                        f"[网络请求] HTTP请求最终失败 --> 已达到最大重试次数({retries}次), HTTP状态码: {http_err.response.status_code}, 请求无法成功完成"
+                    )
+                    return None
+                logging.info(
+                    f"[网络请求] 准备重试 --> 等待1.5秒后进行第{attempt+2}次请求尝试"
+                )
+                time.sleep(1.5)
+                continue
 
-    def refresh_token(self, username, session_id=None):
-        """刷新令牌的过期时间和最后活动时间"""
-        with self.lock:
-            token_file = self._get_token_file_path(username)
+            except requests.exceptions.RequestException as req_err:
+                log_func(f"请求发生意外错误 (第{attempt+1}次): {req_err}")
+                logging.error(
+                    f"[网络请求] 意外的请求异常 --> 重试次数: 第{attempt+1}次/共{retries}次, 请求方法: {method.upper()}, 目标URL: {url}, 异常类型: {type(req_err).__name__}, 异常详情: {req_err}, 完整堆栈信息如下:",
+                    exc_info=True,
+                )
+                if attempt + 1 == retries:
+                    log_func(f"请求最终失败: {req_err}")
+                    logging.error(
+                        f"[网络请求] 请求最终失败 --> 已达到最大重试次数({retries}次), 所有重试均失败, 异常信息: {req_err}"
+                    )
+                    return None
+                logging.info(
+                    f"[网络请求] 准备重试 --> 等待1.5秒后进行第{attempt+2}次请求尝试"
+                )
+                time.sleep(1.5)
+                continue
 
-            if not os.path.exists(token_file):
-                return False
+        return None
 
+    def _json(self, resp: requests.Response | None) -> dict | None:
+        """安全地将Response对象解析为JSON字典"""
+        log_func = self.app.log if hasattr(self.app, "log") else self.app.api_bridge.log
+        if resp:
             try:
-                with open(token_file, "r", encoding="utf-8") as f:
-                    token_data = json.load(f)
-
-                current_time = time.time()
-                token_data["expires_at"] = current_time + 3600
-                token_data["last_activity"] = current_time
-
-                with open(token_file, "w", encoding="utf-8") as f:
-                    json.dump(token_data, f, indent=2, ensure_ascii=False)
-
-                return True
-
-            except Exception as e:
-                logging.error(f"刷新令牌时出错: {e}")
-                return False
-
-    def invalidate_token(self, username, session_id=None):
-        """使令牌失效（用于登出）
+                json_data = resp.json()
+                logging.debug(
+                    f"[JSON解析] 成功解析JSON响应 --> 响应状态码: {resp.status_code}, JSON数据字段: {list(json_data.keys()) if isinstance(json_data, dict) else type(json_data).__name__}"
+                )
+                return json_data
+            except json.JSONDecodeError as e:
+                log_func("服务器响应解析失败。")
+                logging.error(
+                    f"[JSON解析] JSON解码失败 --> 响应状态码: {resp.status_code}, 响应内容类型: {resp.headers.get('Content-Type', '未知')}, 解码错误位置: 第{e.lineno}行第{e.colno}列, 响应文本内容(前500字符): {resp.text[:500]}{'...(已截断)' if len(resp.text) > 500 else ''}, 错误详情: {e}"
+                )
+                return None
+        logging.debug(f"[JSON解析] 响应对象为空，无法解析JSON")
+        return None
 
-        新的简化设计：直接删除用户的token文件
+    def login(self, username, password):
+        return self._json(
+            self._request(
+                "POST",
+                f"{self.BASE_URL}/app/login",
+                {
+                    "username": username,
+                    "password": password,
+                    "appVersion": self.API_VERSION,
+                },
+            )
+        )
 
-        Args:
-            username: 用户名
-            session_id: 会话UUID（保留参数以兼容，不再使用）
-        """
-        with self.lock:
-            token_file = self._get_token_file_path(username)
+    def get_run_list(self, user_id, offset=0):
+        return self._json(
+            self._request(
+                "GET",
+                f"{self.BASE_URL}:9097/run/errand/getErrandList",
+                {
+                    "userId": user_id,
+                    "offset": offset,
+                    "limit": 10,
+                    "appVersion": self.API_VERSION,
+                },
+            )
+        )
 
-            if os.path.exists(token_file):
-                try:
-                    os.remove(token_file)
-                    logging.info(f"令牌已失效: {username}")
-                except Exception as e:
-                    logging.error(f"删除令牌文件时出错: {e}")
+    def get_run_details(self, errand_id, user_id, errand_schedule_id):
+        return self._json(
+            self._request(
+                "GET",
+                f"{self.BASE_URL}:9097/run/errand/getErrandDetail",
+                {
+                    "errandId": errand_id,
+                    "userId": user_id,
+                    "errandScheduleId": errand_schedule_id,
+                    "appVersion": self.API_VERSION,
+                },
+            )
+        )
 
-    def get_active_sessions(self, username):
-        """获取用户所有有效的会话"""
-        logging.debug(
-            f"get_active_sessions: token文件不再管理session列表，请使用session管理功能"
+    def get_run_history_list(self, user_id, errand_schedule_id):
+        return self._json(
+            self._request(
+                "GET",
+                f"{self.BASE_URL}:9097/run/errand/getUserErrandTrackRecord",
+                {
+                    "errandScheduleId": errand_schedule_id,
+                    "userId": user_id,
+                    "offset": 0,
+                    "limit": 20,
+                    "appVersion": self.API_VERSION,
+                },
+            )
         )
-        return []
 
-    def cleanup_expired_tokens(self, username):
-        """清理过期的令牌
+    def get_history_track_by_trid(self, trid):
+        return self._json(
+            self._request(
+                "GET",
+                f"{self.BASE_URL}:9097/run/errand/getTrackByTrid",
+                {"trid": trid, "appVersion": self.API_VERSION},
+            )
+        )
 
-        新的简化设计：如果token过期，直接删除整个token文件
+    def submit_run_track(self, payload_str):
+        return self._json(
+            self._request(
+                "POST",
+                f"{self.BASE_URL}:9097/run/errand/addErrandTrack",
+                payload_str,
+                is_post_str=True,
+            )
+        )
 
-        Args:
-            username: 用户名
-        """
-        with self.lock:
-            token_file = self._get_token_file_path(username)
+    def get_run_info_by_trid(self, trid):
+        return self._json(
+            self._request(
+                "GET",
+                f"{self.BASE_URL}:9097/run/errand/getTrackRecordByTrid",
+                {"trid": trid, "appVersion": self.API_VERSION},
+            )
+        )
 
-            if not os.path.exists(token_file):
-                return
+    def get_unread_notice_count(self):
+        """获取未读通知数量 (POST, 空body, application/json)"""
+        return self._json(
+            self._request(
+                "POST",
+                f"{self.BASE_URL}/app/appNotice/unreadNumber",
+                data="",
+                is_post_str=True,
+                force_content_type="application/json;charset=UTF-8",
+            )
+        )
 
-            try:
-                with open(token_file, "r", encoding="utf-8") as f:
-                    token_data = json.load(f)
+    def get_notice_list(self, offset=0, limit=10, type_id=0):
+        """获取通知列表 (POST, 空body, 带URL参数)"""
+        params = {"offset": offset, "limit": limit, "typeId": type_id}
+        return self._json(
+            self._request(
+                "POST",
+                f"{self.BASE_URL}/app/appNotice/noticeListByType",
+                data="",
+                params=params,
+                is_post_str=True,
+                force_content_type="application/json;charset=UTF-8",
+            )
+        )
 
-                current_time = time.time()
+    def mark_notice_as_read(self, notice_id):
+        """将单个通知设为已读 (POST, 空body, 带URL参数)"""
+        params = {"noticeId": notice_id}
+        return self._json(
+            self._request(
+                "POST",
+                f"{self.BASE_URL}/app/appNotice/updateNoticeIsRead",
+                data="",
+                params=params,
+                is_post_str=True,
+                force_content_type="application/json;charset=UTF-8",
+            )
+        )
 
-                if current_time > token_data.get("expires_at", 0):
-                    os.remove(token_file)
-                    logging.info(f"清理了过期令牌: {username}")
+    @staticmethod
+    def generate_random_ua():
+        """生成一个随机的、模拟安卓设备的User-Agent字符串"""
+        build_texts = [
+            "TD1A.221105.001.A1",
+            "TP1A.221005.003",
+            "SQ3A.220705.004",
+            "SP2A.220505.008",
+            "SQ1D.220205.004",
+            "RP1A.201005.004",
+        ]
+        phone_models = [
+            "Xiaomi 12",
+            "Xiaomi 13 Pro",
+            "Redmi K60",
+            "vivo X90",
+            "iQOO 11",
+            "OPPO Find X6 Pro",
+            "Realme GT Neo5",
+            "HONOR Magic5 Pro",
+            "OnePlus 11",
+        ]
+        android_version_map = {"T": 13, "S": 12, "R": 11, "Q": 10, "P": 9}
+        random_build = random.choice(build_texts)
+        build_letter = random_build.split(".")[0][0]
+        android_version = android_version_map.get(build_letter, 13)
+        chrome_version = f"Chrome/{random.randint(100, 120)}.0.{random.randint(4000, 6000)}.{random.randint(100, 200)}"
+        return f"Mozilla/5.0 (Linux; Android {android_version}; {random.choice(phone_models)} Build/{random_build}; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 {chrome_version} Mobile Safari/537.36"
 
-            except Exception as e:
-                logging.error(f"清理过期令牌时出错: {e}")
+    def get_roll_call_info(self, roll_call_id, user_id):
+        """获取指定签到活动的信息"""
+        params = {"id": roll_call_id, "userId": user_id, "appVersion": self.API_VERSION}
+        return self._json(
+            self._request(
+                "POST",
+                f"{self.BASE_URL}:9097/run/attendanceRecord/getAttendanceByRollCallId",
+                data="",
+                params=params,
+                is_post_str=True,
+                force_content_type="application/json;charset=UTF-8",
+            )
+        )
 
-    def detect_multi_device_login(self, username, new_session_id):
-        """检测多设备登录"""
-        active_sessions = self.get_active_sessions(username)
+    def submit_attendance(self, payload: dict):
+        """提交签到记录"""
+        payload["appVersion"] = self.API_VERSION
+        return self._json(
+            self._request(
+                "POST",
+                f"{self.BASE_URL}:9097/run/attendanceRecord/addAttendance",
+                data=payload,
+                is_post_str=False,
+            )
+        )
 
-        old_sessions = [s for s in active_sessions if s != new_session_id]
+    def get_attendance_radius(self):
+        """获取服务器设定的签到半径"""
+        params = {"code": "attendanceRadius", "num": 1}
+        logging.debug("正在从服务器请求签到有效半径配置参数...")
+        return self._json(
+            self._request(
+                "POST",
+                f"{self.BASE_URL}/app/appFind/getDictTips",
+                data="",
+                params=params,
+                is_post_str=True,
+                force_content_type="application/json;charset=UTF-8",
+            )
+        )
 
-        if old_sessions:
-            logging.info(f"检测到多设备登录: {username}, 旧会话数: {len(old_sessions)}")
 
-        return old_sessions
+class RealClock:
+    """真实时钟：运行引擎默认使用的时间源，直接委托给 time/threading"""
 
+    def time(self) -> float:
+        return time.time()
 
-# ==============================================================================
-# 数据结构定义
-# ==============================================================================
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
 
+    def wait(self, event: threading.Event, timeout: float | None = None) -> bool:
+        """等待事件或超时，返回事件是否已被设置（语义同 Event.wait）"""
+        return event.wait(timeout=timeout)
 
-class UserData:
-    """存储用户相关信息的类"""
 
-    def __init__(self):
-        self.name: str = ""
-        self.phone: str = ""
-        self.student_id: str = ""
-        self.id: str = ""
-        self.registration_time: str = ""
-        self.first_login_time: str = ""
-        self.id_card: str = ""
-        self.last_login_time: str = ""
-        self.current_login_time: str = ""
-        self.username: str = ""
-        self.gender: str = ""
-        self.school_name: str = ""
-        self.attribute_type: str = ""
-        self.avatar_url: str = ""
+class VirtualClock:
+    """
+    虚拟时钟：sleep/wait 不真正阻塞，而是立即把虚拟时间向前推进，
+    用于离线压测时以 CPU 能达到的最快速度执行完整的跑步任务。
+    多个线程共享同一时间轴，各线程的等待按调用顺序依次累加到虚拟时间上。
+    """
 
+    def __init__(self, start: float | None = None):
+        self._now = time.time() if start is None else float(start)
+        self._lock = threading.Lock()
+        self.total_slept_s = 0.0  # 累计被“跳过”的等待时长，用于压测报告
 
-class RunData:
-    """存储单个跑步任务相关数据的类"""
+    def time(self) -> float:
+        with self._lock:
+            return self._now
 
-    def __init__(self):
-        self.draft_coords: list[tuple[float, float, int]] = []
-        self.run_coords: list[tuple[float, float, int]] = []
-        self.recommended_coords: list[tuple[float, float]] = []
-        self.target_points: list[tuple[float, float]] = []
-        self.target_point_names: str = ""
-        self.upload_time: str = ""
-        self.start_time: str = ""
-        self.end_time: str = ""
-        self.run_name: str = ""
-        self.errand_id: str = ""
-        self.errand_schedule: str = ""
-        self.status: int = 0
+    def sleep(self, seconds: float):
+        if seconds and seconds > 0:
+            with self._lock:
+                self._now += seconds
+                self.total_slept_s += seconds
 
-        self.target_sequence: int = 0
-        self.is_in_target_zone: bool = False
-        self.trid: str = ""
-        self.details_fetched: bool = False
-        self.total_run_time_s: float = 0.0
-        self.total_run_distance_m: float = 0.0
-        self.distance_covered_m: float = 0.0
+    def wait(self, event: threading.Event, timeout: float | None = None) -> bool:
+        if event.is_set():
+            return True
+        if timeout is None:
+            # 无超时的等待无法用虚拟时间推进，只能真实等待
+            return event.wait()
+        self.sleep(timeout)
+        return event.is_set()
 
 
-class AccountSession:
-    """封装单个账号的所有运行时数据、状态和操作"""
+SYSTEM_CLOCK = RealClock()
 
-    def __init__(self, username, password, api_bridge, tag=None):
-        self.username: str = username
-        self.password: str = password
-        self.api_bridge = api_bridge
-        self.window = api_bridge.window
 
-        self.api_client = ApiClient(self)
-        self.user_data = UserData()
-        self.all_run_data: list[RunData] = []
+class ChunkSubmissionPipeline:
+    """
+    单个跑步任务的流水线提交器。
+    计时线程把“已走完”的数据块交给本对象后立即继续计时下一块，
+    后台线程按入队顺序逐块提交（同一时刻只有一个块在途，保证严格有序），
+    某块重试耗尽失败后丢弃后续所有块，由计时线程检测 failed 后中止任务。
+    """
 
-        self.params = copy.deepcopy(api_bridge.global_params)
-        self.device_ua: str = ""
+    def __init__(
+        self,
+        api,
+        run_data: RunData,
+        client: ApiClient,
+        user: UserData,
+        start_time_ms: str,
+        stop_flag: threading.Event,
+        max_attempts: int = 3,
+        retry_delay_s: float = 1.0,
+        acked_offset: int = 0,
+        on_ack=None,
+    ):
+        self.api = api
+        self.run_data = run_data
+        self.client = client
+        self.user = user
+        self.start_time_ms = start_time_ms
+        self.stop_flag = stop_flag
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_delay_s = retry_delay_s
+
+        self.failed = False  # 某个块重试耗尽仍失败（或重试被停止信号取消）
+        self.clean = True  # 所有块均一次提交成功（任一次失败尝试都会置 False）
+        self.stopped = False  # 收到停止信号后丢弃了尚未提交的排队块
+        self.acked_offset = acked_offset  # 服务器已确认的轨迹点数（下一个未确认块的起始索引）
+        self.on_ack = on_ack  # 每块确认后回调 on_ack(acked_offset)，用于写入预写日志
+
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._thread: threading.Thread | None = None
+
+    def submit(self, chunk, chunk_start_index: int, is_finish: bool):
+        """将一个数据块加入提交流水线（不阻塞计时线程）"""
+        with self._cond:
+            if self._closed:
+                return
+            self._pending.append((chunk, chunk_start_index, is_finish))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"ChunkPipeline-{self.run_data.trid}",
+                    daemon=True,
+                )
+                self._thread.start()
+            self._cond.notify_all()
 
-        self.server_attendance_radius_m = 0.0
-        self.last_radius_fetch_time = 0
+    def close(self):
+        """不再接受新块；后台线程在清空队列后自行退出"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """关闭流水线并等待所有在途/排队的块处理完毕，返回是否全部提交成功"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    logging.warning("等待提交流水线清空超时。")
+                    return False
+                self._cond.wait(timeout=remaining)
+        return not self.failed and not self.stopped
 
-        self.tag: str = tag if tag else ""
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._closed:
+                    # 空闲过久则退出（计时线程异常退出未调用 close 时避免线程泄漏），
+                    # 之后若再有块入队会重新拉起工作线程
+                    self._cond.wait(timeout=60.0)
+                if self._pending and self.stop_flag.is_set():
+                    # 任务已停止：排队中的块不再提交，避免停止后仍向服务器写入轨迹
+                    self.stopped = True
+                    self._pending.clear()
+                    self._cond.notify_all()
+                if not self._pending:
+                    self._thread = None
+                    return
+                chunk, chunk_start_index, is_finish = self._pending.popleft()
+                self._busy = True
+            try:
+                # 前序块已失败时不再提交后续块，保持“失败即中止”的语义
+                if not self.failed:
+                    if self._submit_with_retry(chunk, chunk_start_index, is_finish):
+                        self.acked_offset = chunk_start_index + len(chunk)
+                        if self.on_ack:
+                            self.on_ack(self.acked_offset)
+                    else:
+                        self.failed = True
+            except Exception as e:
+                logging.error(f"提交流水线执行异常: {e}", exc_info=True)
+                self.failed = True
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _submit_with_retry(self, chunk, chunk_start_index: int, is_finish: bool) -> bool:
+        """与原先同步提交一致的重试逻辑：最多 max_attempts 次，非离线模式间隔 retry_delay_s"""
+        for attempt in range(1, self.max_attempts + 1):
+            if self.api._submit_chunk(
+                self.run_data,
+                chunk,
+                self.start_time_ms,
+                is_finish,
+                chunk_start_index,
+                self.client,
+                self.user,
+            ):
+                return True
 
-        self.is_first_login_verified: bool = False
-        self.is_verifying: bool = False
-        self.last_refresh_time: float = 0
+            self.clean = False
+            if self.max_attempts == 1:
+                return False
+            if self.api.is_offline_mode:
+                logging.error(
+                    f"[离线测试模式] 模拟提交失败，尝试 {attempt}/{self.max_attempts}"
+                )
+            else:
+                logging.warning(f"数据提交失败，重试 {attempt}/{self.max_attempts}")
+                if attempt < self.max_attempts and self.api.clock.wait(
+                    self.stop_flag, self.retry_delay_s
+                ):
+                    log_func = (
+                        self.client.app.log
+                        if hasattr(self.client.app, "log")
+                        else self.client.app.api_bridge.log
+                    )
+                    log_func("检测到停止信号，已取消重试")
+                    return False
 
-        self.status_text: str = "待命"
-        self.summary = {
-            "total": 0,
-            "completed": 0,
-            "pending": 0,
-            "executable": 0,
-            "expired": 0,
-            "not_started": 0,
-        }
+        logging.error(f"数据提交在 {self.max_attempts} 次尝试后仍然失败，任务中止")
+        return False
 
-        self.worker_thread: threading.Thread | None = None
-        self.stop_event = threading.Event()
 
-    def log(self, message: str):
-        """为日志自动添加账号前缀"""
-        self.api_bridge.log(f"[{self.username}] {message}")
+class RunJournal:
+    """
+    单次跑步任务的追加式预写日志（JSON Lines，每行一条记录，写入后立即 fsync）。
+    记录类型：
+      - start: 会话ID、任务索引、trid、开始时间、轨迹点及其摘要
+      - ack:   服务器已确认的轨迹点偏移量（下一个未确认块的起始索引）
+    任务正常结束（完成/停止/失败）时删除日志文件；进程崩溃或重启后残留的
+    日志即为“未完成的任务”，启动时据此从下一个未确认的数据块继续执行。
+    """
 
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
 
-class ApiClient:
-    """处理与后端服务器网络请求的类"""
+    @staticmethod
+    def _coords_digest(coords) -> str:
+        raw = json.dumps([list(p) for p in coords], separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def begin(
+        cls, session_id: str, task_index: int, run_data: RunData, start_time_ms: str
+    ) -> "RunJournal | None":
+        """为新开始的任务创建日志并写入 start 记录，失败时返回 None（不影响任务执行）"""
+        try:
+            os.makedirs(RUN_JOURNAL_DIR, exist_ok=True)
+            session_hash = hashlib.sha256(session_id.encode()).hexdigest()[:16]
+            path = os.path.join(RUN_JOURNAL_DIR, f"{session_hash}_{run_data.trid}.jsonl")
+            journal = cls(path)
+            journal._append(
+                {
+                    "type": "start",
+                    "session_id": session_id,
+                    "task_index": task_index,
+                    "errand_schedule": run_data.errand_schedule,
+                    "run_name": run_data.run_name,
+                    "trid": run_data.trid,
+                    "start_time_ms": start_time_ms,
+                    "total_run_time_s": run_data.total_run_time_s,
+                    "total_run_distance_m": run_data.total_run_distance_m,
+                    "coords_digest": cls._coords_digest(run_data.run_coords),
+                    "run_coords": [list(p) for p in run_data.run_coords],
+                }
+            )
+            return journal
+        except Exception as e:
+            logging.error(f"创建任务预写日志失败: {e}", exc_info=True)
+            return None
 
-    BASE_URL = "https://zslf.zsc.edu.cn"
-    API_VERSION = 66
+    def _append(self, record: dict):
+        record["ts"] = time.time()
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record_ack(self, offset: int):
+        """记录服务器已确认的轨迹点偏移量（由提交流水线在每块成功后回调）"""
+        try:
+            self._append({"type": "ack", "offset": int(offset)})
+        except Exception as e:
+            logging.error(f"写入任务预写日志失败: {e}")
 
-    def __init__(self, owner_instance):
-        self.session = requests.Session()
-        self.app = owner_instance
-        logging.debug("ApiClient已初始化，创建了新的requests.Session会话实例")
+    def discard(self):
+        """任务已结束（无需恢复），删除日志文件"""
+        with self._lock:
+            try:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            except Exception as e:
+                logging.warning(f"删除任务预写日志失败 {self.path}: {e}")
 
-    def _get_headers(self) -> dict:
-        """构建请求头，包含认证信息和设备信息"""
-        headers = {
-            "Connection": "keep-alive",
-            "Accept": "application/json, text/plain, */*",
-            "X-Requested-With": "com.zx.slm",
-            "Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7",
-            "User-Agent": self.app.device_ua,
-        }
+    @classmethod
+    def replay(cls, path: str) -> dict | None:
+        """
+        读取日志并重建任务进度，返回 start 记录附加 acked_offset/path 字段；
+        末尾被截断的半行（崩溃时写入中断）会被忽略，摘要不匹配时返回 None。
+        """
+        start = None
+        acked_offset = 0
         try:
-            auth_token = self.session.cookies.get_dict().get("shiroCookie")
-        except requests.cookies.CookieConflictError:
-            logging.warning(
-                "CookieConflictError 即使在使用 get_dict() 时也发生，尝试手动查找..."
-            )
-            auth_token = None
-            for cookie in self.session.cookies:
-                if cookie.name == "shiroCookie":
-                    auth_token = cookie.value
-                    logging.warning(f"手动查找到 'shiroCookie': {auth_token[:10]}...")
-                    break
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("type") == "start":
+                        start = record
+                    elif record.get("type") == "ack":
+                        acked_offset = max(acked_offset, int(record.get("offset", 0)))
+        except Exception as e:
+            logging.error(f"读取任务预写日志失败 {path}: {e}")
+            return None
 
-        if auth_token:
-            logging.debug(
-                f"使用shiroCookie作为认证令牌进行Authorization请求头设置: {auth_token}"
-            )
-            headers["Authorization"] = auth_token
-        else:
-            logging.debug("未找到shiroCookie认证令牌，将不会设置Authorization请求头")
-        return headers
+        if not start or not start.get("run_coords"):
+            return None
+        if cls._coords_digest(start["run_coords"]) != start.get("coords_digest"):
+            logging.warning(f"任务预写日志轨迹摘要不匹配，忽略: {path}")
+            return None
+        start["acked_offset"] = min(acked_offset, len(start["run_coords"]))
+        start["path"] = path
+        return start
+
+    @classmethod
+    def list_unfinished(cls) -> list[dict]:
+        """列出所有残留（未正常结束）的任务日志"""
+        if not os.path.isdir(RUN_JOURNAL_DIR):
+            return []
+        states = []
+        for filename in sorted(os.listdir(RUN_JOURNAL_DIR)):
+            if not filename.endswith(".jsonl"):
+                continue
+            path = os.path.join(RUN_JOURNAL_DIR, filename)
+            state = cls.replay(path)
+            if state is None:
+                cls(path).discard()
+                continue
+            states.append(state)
+        return states
 
-    def _request(
+
+class RunFinalizationService:
+    """
+    跑步任务完成状态确认服务（全局单例）。
+    任务提交完毕后只需登记 trid 即可立即释放运行线程；轮询线程按到期时间
+    （最小堆）逐个取出到期任务查询，未确认的按指数退避重新排期，
+    超过确认时限仍未完成则放弃并提示用户稍后刷新。
+    最多 max_parallel_checks 个轮询线程并行查询，某个会话的学校接口响应缓慢
+    只会占住一个线程，不会拖慢其他会话的确认。
+    排期与等待都经由 clock（RealClock/VirtualClock），压测与测试中可用虚拟时间驱动。
+    """
+
+    def __init__(
         self,
-        method: str,
-        url: str,
-        data: dict = None,
-        params: dict = None,
-        is_post_str=False,
-        force_content_type: str = None,
-    ) -> requests.Response | None:
-        """统一的网络请求方法（增强：支持取消）"""
+        first_delay_s: float = 3.0,
+        base_backoff_s: float = 2.0,
+        max_backoff_s: float = 60.0,
+        horizon_s: float = 900.0,
+        max_parallel_checks: int = 8,
+        clock=None,
+    ):
+        self.clock = clock or SYSTEM_CLOCK
+        self.first_delay_s = first_delay_s
+        self.base_backoff_s = base_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.horizon_s = horizon_s
+        self.max_parallel_checks = max(1, max_parallel_checks)
+
+        self._heap = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        # 有新的（可能更早到期的）任务入堆时置位，唤醒按时钟等待的轮询线程
+        self._wakeup = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+        self.confirmed_count = 0
+        self.expired_count = 0
+
+    def register(
+        self,
+        api,
+        run_data: RunData,
+        task_index: int,
+        client: ApiClient,
+        on_confirmed=None,
+        on_failed=None,
+    ):
+        """
+        登记一个待确认的任务；确认成功后发送 task_completed 并调用 on_confirmed()。
+        查询失败（请求出错或超过确认时限放弃）时调用 on_failed()，供调用方刷新界面。
+        """
+        now = self.clock.time()
+        entry = {
+            "api": api,
+            "run_data": run_data,
+            "trid": run_data.trid,
+            "task_index": task_index,
+            "client": client,
+            "on_confirmed": on_confirmed,
+            "on_failed": on_failed,
+            "registered_at": now,
+            "attempts": 0,
+        }
+        with self._cond:
+            self._push(now + self.first_delay_s, entry)
+            self._threads = [t for t in self._threads if t.is_alive()]
+            if len(self._threads) < min(self.max_parallel_checks, len(self._heap)):
+                t = threading.Thread(
+                    target=self._poll_loop,
+                    name=f"RunFinalizer-{len(self._threads) + 1}",
+                    daemon=True,
+                )
+                self._threads.append(t)
+                t.start()
+            self._wakeup.set()
 
-        log_func = self.app.log if hasattr(self.app, "log") else self.app.api_bridge.log
-        is_offline = (
-            self.app.is_offline_mode
-            if hasattr(self.app, "is_offline_mode")
-            else self.app.api_bridge.is_offline_mode
-        )
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._heap)
 
-        cancel_requested = False
+    def _push(self, due_at: float, entry: dict):
+        self._seq += 1
+        heapq.heappush(self._heap, (due_at, self._seq, entry))
 
-        if cancel_requested:
-            log_func("操作已取消，跳过网络请求。")
-            logging.debug(
-                f"[网络请求] 请求已取消 --> 请求方法: {method.upper()}, 目标URL: {url}, 取消原因: 用户停止操作或系统取消标志已设置"
-            )
-            return None
+    def _poll_loop(self):
+        logging.debug("[RunFinalizer] 任务完成确认轮询线程已启动")
+        while True:
+            entry, delay = None, None
+            with self._cond:
+                if self._heap:
+                    due_at = self._heap[0][0]
+                    now = self.clock.time()
+                    if due_at <= now:
+                        entry = heapq.heappop(self._heap)[2]
+                    else:
+                        delay = due_at - now
+                if entry is None:
+                    self._wakeup.clear()
+            if entry is None:
+                if delay is None:
+                    self._wakeup.wait()
+                else:
+                    self.clock.wait(self._wakeup, delay)
+                continue
 
-        if is_offline:
-            log_func("离线模式：网络请求已被禁用。")
-            logging.debug(
-                f"[网络请求] 离线模式已启用，已阻止网络请求 --> 请求方法: {method.upper()}, 目标URL: {url}, 说明: 离线模式下所有网络通信将被禁用"
-            )
-            return None
+            # 网络查询在锁外进行，其他轮询线程可同时处理别的到期任务
+            try:
+                self._check_entry(entry)
+            except Exception as e:
+                logging.error(f"[RunFinalizer] 确认任务状态异常: {e}", exc_info=True)
 
-        retries = 3
-        connect_timeout = 5
-        read_timeout = 10
+    @staticmethod
+    def _notify(entry: dict, key: str):
+        callback = entry[key]
+        if not callback:
+            return
+        try:
+            callback()
+        except Exception as e:
+            logging.error(f"[RunFinalizer] 回调 {key} 执行失败: {e}", exc_info=True)
 
-        log_data = data
-        if is_post_str and isinstance(data, str) and len(data) > 500:
-            log_data = (
-                data[:500] + "... (已截断，完整数据长度: " + str(len(data)) + " 字节)"
+    def _check_entry(self, entry: dict):
+        run_data: RunData = entry["run_data"]
+        client: ApiClient = entry["client"]
+        log_func = (
+            client.app.log if hasattr(client.app, "log") else client.app.api_bridge.log
+        )
+
+        try:
+            resp = client.get_run_info_by_trid(entry["trid"])
+        except Exception as e:
+            logging.warning(f"[RunFinalizer] 查询 trid={entry['trid']} 失败: {e}")
+            resp = None
+        request_failed = not (resp and resp.get("success"))
+        confirmed = False
+        if not request_failed:
+            record_map = resp.get("data", {}).get("recordMap", {})
+            confirmed = bool(record_map and record_map.get("status") == 1)
+
+        if confirmed:
+            run_data.status = 1
+            self.confirmed_count += 1
+            log_func("任务已确认完成。")
+            logging.info(
+                f"任务已成功完成: 任务名称={run_data.run_name} (第 {entry['attempts'] + 1} 次查询确认)"
             )
+            session_id = getattr(entry["api"], "_web_session_id", None)
+            if socketio and session_id and entry["task_index"] != -1:
+                try:
+                    socketio.emit(
+                        "task_completed",
+                        {"task_index": entry["task_index"]},
+                        room=session_id,
+                    )
+                except Exception as e:
+                    logging.error(f"SocketIO发送'task_completed'事件失败: {e}")
+            self._notify(entry, "on_confirmed")
+            return
+
+        entry["attempts"] += 1
+        if self.clock.time() - entry["registered_at"] >= self.horizon_s:
+            self.expired_count += 1
+            log_func("暂未确认完成，请稍后刷新。")
+            logging.warning(f"任务完成状态确认失败: 任务名称={run_data.run_name}")
+            self._notify(entry, "on_failed")
+            return
+        if request_failed:
+            self._notify(entry, "on_failed")
 
+        backoff = min(
+            self.base_backoff_s * (2 ** (entry["attempts"] - 1)), self.max_backoff_s
+        )
         logging.debug(
-            f"[网络请求] 准备发起HTTP请求 --> 请求方法: {method.upper()}, 目标URL: {url}, 重试次数配置: {retries}次, 连接超时: {connect_timeout}秒, 读取超时: {read_timeout}秒\n[请求数据]: {log_data}"
+            f"[RunFinalizer] trid={entry['trid']} 暂未确认，{backoff:.0f}s 后重试 (第 {entry['attempts']} 次)"
         )
+        with self._cond:
+            self._push(self.clock.time() + backoff, entry)
+            self._wakeup.set()
 
-        for attempt in range(retries):
-            try:
-                headers = self._get_headers()
 
-                if method.upper() == "POST":
-                    post_data_bytes = b""
+class AccountRunHandle:
+    """
+    多账号执行器中单个账号的运行句柄。
+    沿用 acc.worker_thread 的位置与接口（is_alive/join），排队、延迟等待和执行期间均视为“运行中”。
+    """
 
-                    if force_content_type:
-                        headers["Content-Type"] = force_content_type
-                    elif is_post_str:
-                        headers["Content-Type"] = "application/x-www-form-urlencoded"
-                    else:
-                        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    def __init__(self, api, acc: AccountSession, run_only_incomplete: bool):
+        self.api = api
+        self.acc = acc
+        self.run_only_incomplete = run_only_incomplete
+        self.state = "queued"  # scheduled / queued / running / cancelled / done
+        self.start_at = 0.0
+        self._done = threading.Event()
 
-                    if is_post_str:
-                        post_data_bytes = (data or "").encode("utf-8")
-                    else:
-                        post_data_bytes = urllib.parse.urlencode(data or {}).encode(
-                            "utf-8"
-                        )
+    def is_alive(self) -> bool:
+        return not self._done.is_set()
 
-                    resp = self.session.post(
-                        url,
-                        data=post_data_bytes,
-                        params=params,
-                        headers=headers,
-                        timeout=(connect_timeout, read_timeout),
-                    )
-                else:
-                    resp = self.session.get(
-                        url,
-                        params=data,
-                        headers=headers,
-                        timeout=(connect_timeout, read_timeout),
-                    )
+    def join(self, timeout: float | None = None):
+        self._done.wait(timeout=timeout)
 
-                logging.debug(
-                    f"[网络请求] 收到服务器响应 <-- 状态码: {resp.status_code} ({resp.reason}), 来源URL: {url}, 响应头: {dict(resp.headers)}, 响应内容长度: {len(resp.content)} 字节"
-                )
-                resp.raise_for_status()
-                return resp
 
-            except (
-                requests.exceptions.ConnectionError,
-                requests.exceptions.Timeout,
-            ) as net_err:
-                log_func(f"网络连接失败 (第{attempt+1}/{retries}次): {net_err}")
-                logging.error(
-                    f"[网络请求] 网络连接失败 --> 重试次数: 第{attempt+1}次/共{retries}次, 请求方法: {method.upper()}, 目标URL: {url}, 错误类型: {type(net_err).__name__}, 错误详情: {net_err}, 连接超时配置: {connect_timeout}秒, 读取超时配置: {read_timeout}秒",
-                    exc_info=False,
-                )
-                if attempt + 1 == retries:
-                    log_func(f"网络连接最终失败: 无法连接到服务器 {self.BASE_URL}")
-                    logging.error(
-                        f"[网络请求] 网络连接最终失败 --> 已达到最大重试次数({retries}次), 目标服务器: {self.BASE_URL}, 无法建立连接"
-                    )
-                    return None
-                logging.info(
-                    f"[网络请求] 准备重试 --> 等待1.5秒后进行第{attempt+2}次请求尝试"
-                )
-                time.sleep(1.5)
-                continue
+class MultiAccountRunner:
+    """
+    多账号任务执行器（全局单例）。
+      - 固定上限的工作线程池，超出并发上限的账号在队列中排队
+      - 延迟启动由单个定时线程按到期时间（最小堆）投递到队列，不再逐秒倒计时
+      - 排队/延迟中的账号收到停止信号后立即取消，运行中的账号沿用 stop_event 停止
+    并发上限读取 config.ini 中 [System] multi_account_max_concurrency（默认20）。
+    """
 
-            except requests.exceptions.HTTPError as http_err:
-                log_func(
-                    f"服务器返回错误 (第{attempt+1}次): {http_err.response.status_code}"
-                )
-                logging.error(
-                    f"[网络请求] HTTP错误 --> 重试次数: 第{attempt+1}次/共{retries}次, 请求方法: {method.upper()}, 目标URL: {url}, HTTP状态码: {http_err.response.status_code}, 状态描述: {http_err.response.reason}, 服务器响应内容: {http_err.response.text[:200]}{'...(已截断)' if len(http_err.response.text) > 200 else ''}",
-                    exc_info=False,
+    IDLE_WORKER_TIMEOUT_S = 60.0
+
+    def __init__(self, max_workers: int | None = None):
+        self._max_workers = max_workers
+        self._cond = threading.Condition()
+        self._ready = collections.deque()
+        self._timers = []
+        self._seq = 0
+        self._workers: list[threading.Thread] = []
+        self._idle_workers = 0
+        self._timer_thread: threading.Thread | None = None
+
+    @property
+    def max_workers(self) -> int:
+        if self._max_workers is None:
+            value = 20
+            try:
+                config = configparser.ConfigParser()
+                config.read(CONFIG_FILE, encoding="utf-8")
+                value = config.getint(
+                    "System", "multi_account_max_concurrency", fallback=20
                 )
-                if attempt + 1 == retries:
-                    log_func(f"服务器错误: {http_err.response.status_code}")
-                    logging.error(
-                        f"[网络请求] HTTP请求最终失败 --> 已达到最大重试次数({retries}次), HTTP状态码: {http_err.response.status_code}, 请求无法成功完成"
+            except Exception as e:
+                logging.warning(f"读取多账号并发上限失败，使用默认值20: {e}")
+            self._max_workers = max(1, value)
+        return self._max_workers
+
+    def submit(
+        self, api, acc: AccountSession, delay: float, run_only_incomplete: bool
+    ) -> AccountRunHandle:
+        """提交一个账号的执行请求，delay>0 时到期后才进入执行队列"""
+        handle = AccountRunHandle(api, acc, run_only_incomplete)
+        with self._cond:
+            if delay > 0:
+                handle.state = "scheduled"
+                handle.start_at = time.time() + delay
+                self._seq += 1
+                heapq.heappush(self._timers, (handle.start_at, self._seq, handle))
+                if self._timer_thread is None or not self._timer_thread.is_alive():
+                    self._timer_thread = threading.Thread(
+                        target=self._timer_loop, name="MultiAccountTimer", daemon=True
                     )
-                    return None
-                logging.info(
-                    f"[网络请求] 准备重试 --> 等待1.5秒后进行第{attempt+2}次请求尝试"
-                )
-                time.sleep(1.5)
-                continue
+                    self._timer_thread.start()
+            else:
+                self._enqueue_locked(handle)
+            self._cond.notify_all()
+        return handle
 
-            except requests.exceptions.RequestException as req_err:
-                log_func(f"请求发生意外错误 (第{attempt+1}次): {req_err}")
-                logging.error(
-                    f"[网络请求] 意外的请求异常 --> 重试次数: 第{attempt+1}次/共{retries}次, 请求方法: {method.upper()}, 目标URL: {url}, 异常类型: {type(req_err).__name__}, 异常详情: {req_err}, 完整堆栈信息如下:",
-                    exc_info=True,
-                )
-                if attempt + 1 == retries:
-                    log_func(f"请求最终失败: {req_err}")
-                    logging.error(
-                        f"[网络请求] 请求最终失败 --> 已达到最大重试次数({retries}次), 所有重试均失败, 异常信息: {req_err}"
+    def cancel(self, handle) -> bool:
+        """取消尚未开始执行的账号（排队或延迟中），运行中的账号返回 False"""
+        if not isinstance(handle, AccountRunHandle):
+            return False
+        with self._cond:
+            if handle.state not in ("scheduled", "queued"):
+                return False
+            handle.state = "cancelled"
+        self._finish_cancelled(handle)
+        return True
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._ready) + len(self._timers)
+
+    def _enqueue_locked(self, handle: AccountRunHandle):
+        handle.state = "queued"
+        self._ready.append(handle)
+        self._workers = [t for t in self._workers if t.is_alive()]
+        # 排队账号多于空闲线程时补足线程，同一批提交的账号才能同时开始
+        while len(self._ready) > self._idle_workers and len(self._workers) < self.max_workers:
+            t = threading.Thread(
+                target=self._worker_loop,
+                name=f"MultiAccountWorker-{len(self._workers) + 1}",
+                daemon=True,
+            )
+            self._workers.append(t)
+            # 新线程在创建时即计入空闲数，避免它拿到锁之前重复创建
+            self._idle_workers += 1
+            t.start()
+
+    def _is_stopped(self, handle: AccountRunHandle) -> bool:
+        return handle.acc.stop_event.is_set() or handle.api.multi_run_stop_flag.is_set()
+
+    def _finish_cancelled(self, handle: AccountRunHandle):
+        acc = handle.acc
+        if acc.worker_thread is handle:
+            acc.worker_thread = None
+        handle._done.set()
+        try:
+            handle.api._update_account_status_js(acc, status_text="已中止")
+            handle.api._update_multi_global_buttons()
+        except Exception:
+            logging.debug("取消账号后更新状态失败（非致命）。", exc_info=True)
+
+    def _timer_loop(self):
+        while True:
+            cancelled, promoted = [], []
+            with self._cond:
+                while not self._timers:
+                    self._cond.wait()
+                now = time.time()
+                start_at = self._timers[0][0]
+                if start_at > now:
+                    self._cond.wait(timeout=start_at - now)
+                    continue
+                while self._timers and self._timers[0][0] <= now:
+                    handle = heapq.heappop(self._timers)[2]
+                    if handle.state != "scheduled":
+                        continue
+                    if self._is_stopped(handle):
+                        handle.state = "cancelled"
+                        cancelled.append(handle)
+                    else:
+                        self._enqueue_locked(handle)
+                        promoted.append(handle)
+                self._cond.notify_all()
+            for handle in cancelled:
+                self._finish_cancelled(handle)
+            for handle in promoted:
+                if handle.state == "queued":
+                    handle.api._update_account_status_js(
+                        handle.acc, status_text="排队等待..."
                     )
-                    return None
-                logging.info(
-                    f"[网络请求] 准备重试 --> 等待1.5秒后进行第{attempt+2}次请求尝试"
-                )
-                time.sleep(1.5)
-                continue
 
-        return None
+    def _worker_loop(self):
+        # 线程创建时已计入 _idle_workers，只在真正执行账号期间扣除
+        while True:
+            with self._cond:
+                if not self._ready:
+                    self._cond.wait(timeout=self.IDLE_WORKER_TIMEOUT_S)
+                if not self._ready:
+                    # 空闲超时，释放线程（有新任务时会重新创建）
+                    self._idle_workers -= 1
+                    self._workers = [
+                        t for t in self._workers if t is not threading.current_thread()
+                    ]
+                    return
+                handle = self._ready.popleft()
+                if handle.state != "queued":
+                    continue
+                if self._is_stopped(handle):
+                    handle.state = "cancelled"
+                else:
+                    handle.state = "running"
+                    self._idle_workers -= 1
 
-    def _json(self, resp: requests.Response | None) -> dict | None:
-        """安全地将Response对象解析为JSON字典"""
-        log_func = self.app.log if hasattr(self.app, "log") else self.app.api_bridge.log
-        if resp:
+            if handle.state == "cancelled":
+                self._finish_cancelled(handle)
+                continue
             try:
-                json_data = resp.json()
-                logging.debug(
-                    f"[JSON解析] 成功解析JSON响应 --> 响应状态码: {resp.status_code}, JSON数据字段: {list(json_data.keys()) if isinstance(json_data, dict) else type(json_data).__name__}"
-                )
-                return json_data
-            except json.JSONDecodeError as e:
-                log_func("服务器响应解析失败。")
+                handle.api._multi_account_worker(handle.acc, handle.run_only_incomplete)
+            except Exception:
                 logging.error(
-                    f"[JSON解析] JSON解码失败 --> 响应状态码: {resp.status_code}, 响应内容类型: {resp.headers.get('Content-Type', '未知')}, 解码错误位置: 第{e.lineno}行第{e.colno}列, 响应文本内容(前500字符): {resp.text[:500]}{'...(已截断)' if len(resp.text) > 500 else ''}, 错误详情: {e}"
+                    f"多账号执行器运行账号 {handle.acc.username} 出错: {traceback.format_exc()}"
                 )
-                return None
-        logging.debug(f"[JSON解析] 响应对象为空，无法解析JSON")
-        return None
+            finally:
+                handle.state = "done"
+                handle._done.set()
+                with self._cond:
+                    self._idle_workers += 1
 
-    def login(self, username, password):
-        return self._json(
-            self._request(
-                "POST",
-                f"{self.BASE_URL}/app/login",
-                {
-                    "username": username,
-                    "password": password,
-                    "appVersion": self.API_VERSION,
-                },
-            )
-        )
 
-    def get_run_list(self, user_id, offset=0):
-        return self._json(
-            self._request(
-                "GET",
-                f"{self.BASE_URL}:9097/run/errand/getErrandList",
-                {
-                    "userId": user_id,
-                    "offset": offset,
-                    "limit": 10,
-                    "appVersion": self.API_VERSION,
-                },
-            )
-        )
+class LoginAdmissionController:
+    """
+    学校账号登录准入控制器（全局单例），取代轮询 multi_login_lock 的排队方式。
+      - 先到先得（FIFO）：释放名额时直接移交给队首等待者，而非让所有等待者竞争
+      - 可取消：等待期间定期检查调用方的停止条件（stop_event 等）
+      - 并发与速率可配置：[System] login_max_concurrency / login_rate_per_second
+      - 通过回调向前端反馈排队位置，并统计登录等待耗时
+    """
 
-    def get_run_details(self, errand_id, user_id, errand_schedule_id):
-        return self._json(
-            self._request(
-                "GET",
-                f"{self.BASE_URL}:9097/run/errand/getErrandDetail",
-                {
-                    "errandId": errand_id,
-                    "userId": user_id,
-                    "errandScheduleId": errand_schedule_id,
-                    "appVersion": self.API_VERSION,
-                },
+    WAIT_SLICE_S = 0.25
+    POSITION_UPDATE_INTERVAL_S = 2.0
+
+    def __init__(self, max_concurrency: int | None = None, rate_per_second: float | None = None):
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()
+        self._active = 0
+        self._seq = 0
+        self._next_slot_at = 0.0
+
+        self._wait_samples = collections.deque(maxlen=500)
+        self.total_admitted = 0
+        self.total_cancelled = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    def _ensure_config(self):
+        if self.max_concurrency is not None and self.rate_per_second is not None:
+            return
+        max_concurrency, rate = 20, 5.0
+        try:
+            config = configparser.ConfigParser()
+            config.read(CONFIG_FILE, encoding="utf-8")
+            max_concurrency = config.getint(
+                "System", "login_max_concurrency", fallback=max_concurrency
             )
-        )
+            rate = config.getfloat("System", "login_rate_per_second", fallback=rate)
+        except Exception as e:
+            logging.warning(f"读取登录准入配置失败，使用默认值: {e}")
+        if self.max_concurrency is None:
+            self.max_concurrency = max(1, max_concurrency)
+        if self.rate_per_second is None:
+            self.rate_per_second = max(0.0, rate)
+
+    def acquire(self, should_cancel, on_position=None) -> bool:
+        """
+        排队获取一个登录名额，成功返回 True（调用方须随后调用 release）。
+        should_cancel() 返回 True 时放弃排队并返回 False；
+        on_position(position) 在排队位置变化时被调用（已节流）。
+        """
+        self._ensure_config()
+        enqueued_at = time.time()
+        with self._lock:
+            self._seq += 1
+            ticket = {"seq": self._seq, "event": threading.Event()}
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                ticket["event"].set()
+            else:
+                self._waiters.append(ticket)
+
+        last_position, last_report_at = None, 0.0
+        while not ticket["event"].wait(timeout=self.WAIT_SLICE_S):
+            if should_cancel():
+                with self._lock:
+                    granted = ticket["event"].is_set()
+                    if not granted:
+                        self._waiters.remove(ticket)
+                if granted:
+                    self.release()
+                self._count_cancelled()
+                return False
+            if on_position:
+                with self._lock:
+                    position = self._position_locked(ticket)
+                now = time.time()
+                if position != last_position and (
+                    position <= 3 or now - last_report_at >= self.POSITION_UPDATE_INTERVAL_S
+                ):
+                    last_position, last_report_at = position, now
+                    try:
+                        on_position(position)
+                    except Exception:
+                        logging.debug("登录排队位置回调失败（非致命）。", exc_info=True)
+
+        # 速率限制：按获得名额的顺序依次分配发起登录的时间点
+        slot_at = slot_end = None
+        if self.rate_per_second > 0:
+            with self._lock:
+                slot_at = max(time.time(), self._next_slot_at)
+                slot_end = slot_at + 1.0 / self.rate_per_second
+                self._next_slot_at = slot_end
+            while True:
+                remaining = slot_at - time.time()
+                if remaining <= 0:
+                    break
+                if should_cancel():
+                    self._abandon(slot_at, slot_end)
+                    return False
+                time.sleep(min(self.WAIT_SLICE_S, remaining))
 
-    def get_run_history_list(self, user_id, errand_schedule_id):
-        return self._json(
-            self._request(
-                "GET",
-                f"{self.BASE_URL}:9097/run/errand/getUserErrandTrackRecord",
-                {
-                    "errandScheduleId": errand_schedule_id,
-                    "userId": user_id,
-                    "offset": 0,
-                    "limit": 20,
-                    "appVersion": self.API_VERSION,
-                },
-            )
-        )
+        if should_cancel():
+            self._abandon(slot_at, slot_end)
+            return False
 
-    def get_history_track_by_trid(self, trid):
-        return self._json(
-            self._request(
-                "GET",
-                f"{self.BASE_URL}:9097/run/errand/getTrackByTrid",
-                {"trid": trid, "appVersion": self.API_VERSION},
-            )
-        )
+        waited = time.time() - enqueued_at
+        with self._lock:
+            self.total_admitted += 1
+            self.total_wait_s += waited
+            self.max_wait_s = max(self.max_wait_s, waited)
+            self._wait_samples.append(waited)
+        return True
 
-    def submit_run_track(self, payload_str):
-        return self._json(
-            self._request(
-                "POST",
-                f"{self.BASE_URL}:9097/run/errand/addErrandTrack",
-                payload_str,
-                is_post_str=True,
-            )
-        )
+    def _position_locked(self, ticket) -> int:
+        """返回 ticket 的排队位置（从1开始），取消的等待者已移出队列（调用方需持有 self._lock）"""
+        for position, waiter in enumerate(self._waiters, 1):
+            if waiter is ticket:
+                return position
+        # 已不在队列中：名额刚刚移交给它
+        return 1
+
+    def _count_cancelled(self):
+        with self._lock:
+            self.total_cancelled += 1
+
+    def _abandon(self, slot_at, slot_end):
+        """获得名额后放弃登录：归还名额；其后尚未分配新的速率时间点时一并退回本次占用的时间点"""
+        if slot_end is not None:
+            with self._lock:
+                if self._next_slot_at == slot_end:
+                    self._next_slot_at = slot_at
+        self.release()
+        self._count_cancelled()
+
+    def release(self):
+        """归还登录名额：有等待者时直接移交给队首，否则减少占用数"""
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft()["event"].set()
+                return
+            self._active = max(0, self._active - 1)
+
+    def get_metrics(self) -> dict:
+        """返回登录排队的统计信息（用于健康检查/监控）"""
+        with self._lock:
+            samples = sorted(self._wait_samples)
+            admitted = self.total_admitted
+            metrics = {
+                "max_concurrency": self.max_concurrency,
+                "rate_per_second": self.rate_per_second,
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "admitted": admitted,
+                "cancelled": self.total_cancelled,
+                "avg_wait_s": round(self.total_wait_s / admitted, 3) if admitted else 0.0,
+                "max_wait_s": round(self.max_wait_s, 3),
+            }
+        if samples:
+            metrics["p50_wait_s"] = round(samples[len(samples) // 2], 3)
+            metrics["p95_wait_s"] = round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)
+        return metrics
 
-    def get_run_info_by_trid(self, trid):
-        return self._json(
-            self._request(
-                "GET",
-                f"{self.BASE_URL}:9097/run/errand/getTrackRecordByTrid",
-                {"trid": trid, "appVersion": self.API_VERSION},
-            )
-        )
 
-    def get_unread_notice_count(self):
-        """获取未读通知数量 (POST, 空body, application/json)"""
-        return self._json(
-            self._request(
-                "POST",
-                f"{self.BASE_URL}/app/appNotice/unreadNumber",
-                data="",
-                is_post_str=True,
-                force_content_type="application/json;charset=UTF-8",
-            )
-        )
+class SchoolCookieCache:
+    """
+    学校账号登录凭证缓存（全局单例）：按账号持久化 shiroCookie 等 Cookie 与登录返回的用户信息。
+    再次需要登录时先恢复缓存的 Cookie，并用一次轻量的已认证请求（未读通知数）验证其有效性，
+    验证通过则跳过 /app/login，失败时删除缓存并回退到正常登录。
+    缓存文件位于 school_accounts/cookie_cache/<账号>.json，并记录密码摘要，密码变更后自动失效。
+    """
 
-    def get_notice_list(self, offset=0, limit=10, type_id=0):
-        """获取通知列表 (POST, 空body, 带URL参数)"""
-        params = {"offset": offset, "limit": limit, "typeId": type_id}
-        return self._json(
-            self._request(
-                "POST",
-                f"{self.BASE_URL}/app/appNotice/noticeListByType",
-                data="",
-                params=params,
-                is_post_str=True,
-                force_content_type="application/json;charset=UTF-8",
+    def __init__(self, enabled: bool | None = None, verify_interval_s: float | None = None):
+        self.enabled = enabled
+        self.verify_interval_s = verify_interval_s
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.validations = 0
+        self.misses = 0
+
+    def _ensure_config(self):
+        if self.enabled is not None and self.verify_interval_s is not None:
+            return
+        enabled, interval = True, 60.0
+        try:
+            config = configparser.ConfigParser()
+            config.read(CONFIG_FILE, encoding="utf-8")
+            enabled = config.getboolean(
+                "System", "school_cookie_cache_enabled", fallback=enabled
             )
-        )
-
-    def mark_notice_as_read(self, notice_id):
-        """将单个通知设为已读 (POST, 空body, 带URL参数)"""
-        params = {"noticeId": notice_id}
-        return self._json(
-            self._request(
-                "POST",
-                f"{self.BASE_URL}/app/appNotice/updateNoticeIsRead",
-                data="",
-                params=params,
-                is_post_str=True,
-                force_content_type="application/json;charset=UTF-8",
+            interval = config.getfloat(
+                "System", "school_cookie_verify_interval", fallback=interval
             )
-        )
+        except Exception as e:
+            logging.warning(f"读取登录凭证缓存配置失败，使用默认值: {e}")
+        if self.enabled is None:
+            self.enabled = enabled
+        if self.verify_interval_s is None:
+            self.verify_interval_s = max(0.0, interval)
 
     @staticmethod
-    def generate_random_ua():
-        """生成一个随机的、模拟安卓设备的User-Agent字符串"""
-        build_texts = [
-            "TD1A.221105.001.A1",
-            "TP1A.221005.003",
-            "SQ3A.220705.004",
-            "SP2A.220505.008",
-            "SQ1D.220205.004",
-            "RP1A.201005.004",
-        ]
-        phone_models = [
-            "Xiaomi 12",
-            "Xiaomi 13 Pro",
-            "Redmi K60",
-            "vivo X90",
-            "iQOO 11",
-            "OPPO Find X6 Pro",
-            "Realme GT Neo5",
-            "HONOR Magic5 Pro",
-            "OnePlus 11",
-        ]
-        android_version_map = {"T": 13, "S": 12, "R": 11, "Q": 10, "P": 9}
-        random_build = random.choice(build_texts)
-        build_letter = random_build.split(".")[0][0]
-        android_version = android_version_map.get(build_letter, 13)
-        chrome_version = f"Chrome/{random.randint(100, 120)}.0.{random.randint(4000, 6000)}.{random.randint(100, 200)}"
-        return f"Mozilla/5.0 (Linux; Android {android_version}; {random.choice(phone_models)} Build/{random_build}; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 {chrome_version} Mobile Safari/537.36"
+    def _path(username: str) -> str:
+        safe_name = re.sub(r"[^\w.-]", "_", str(username))
+        return os.path.join(SCHOOL_ACCOUNTS_DIR, "cookie_cache", f"{safe_name}.json")
 
-    def get_roll_call_info(self, roll_call_id, user_id):
-        """获取指定签到活动的信息"""
-        params = {"id": roll_call_id, "userId": user_id, "appVersion": self.API_VERSION}
-        return self._json(
-            self._request(
-                "POST",
-                f"{self.BASE_URL}:9097/run/attendanceRecord/getAttendanceByRollCallId",
-                data="",
-                params=params,
-                is_post_str=True,
-                force_content_type="application/json;charset=UTF-8",
-            )
-        )
+    @staticmethod
+    def _secret_digest(username: str, password: str) -> str:
+        return hashlib.sha256(f"{username}\0{password}".encode("utf-8")).hexdigest()
+
+    def _load(self, username: str) -> dict | None:
+        entry = self._entries.get(username)
+        if entry is not None:
+            return entry
+        path = self._path(username)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except Exception as e:
+            logging.warning(f"[登录凭证缓存] 读取 {path} 失败，忽略该缓存: {e}")
+            return None
+        self._entries[username] = entry
+        return entry
 
-    def submit_attendance(self, payload: dict):
-        """提交签到记录"""
-        payload["appVersion"] = self.API_VERSION
-        return self._json(
-            self._request(
-                "POST",
-                f"{self.BASE_URL}:9097/run/attendanceRecord/addAttendance",
-                data=payload,
-                is_post_str=False,
-            )
-        )
+    def _persist(self, username: str, entry: dict):
+        path = self._path(username)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning(f"[登录凭证缓存] 写入 {path} 失败: {e}")
 
-    def get_attendance_radius(self):
-        """获取服务器设定的签到半径"""
-        params = {"code": "attendanceRadius", "num": 1}
-        logging.debug("正在从服务器请求签到有效半径配置参数...")
-        return self._json(
-            self._request(
-                "POST",
-                f"{self.BASE_URL}/app/appFind/getDictTips",
-                data="",
-                params=params,
-                is_post_str=True,
-                force_content_type="application/json;charset=UTF-8",
-            )
-        )
+    def restore(self, api_client, username: str, password: str) -> dict | None:
+        """
+        尝试用缓存的 Cookie 恢复登录态。
+        成功时返回与 ApiClient.login 相同结构的响应（附带 from_cache=True），否则返回 None。
+        """
+        self._ensure_config()
+        if not self.enabled or not username or not password:
+            return None
+        with self._lock:
+            entry = self._load(username)
+            if not entry or entry.get("secret") != self._secret_digest(username, password):
+                self.misses += 1
+                return None
+            entry = dict(entry)
+
+        try:
+            jar = api_client.session.cookies
+            jar.clear()
+            cookies = entry.get("cookies", [])
+            if isinstance(cookies, dict):
+                # 旧版缓存只保存了 名称->值，恢复时不带 domain/path
+                requests.utils.add_dict_to_cookiejar(jar, cookies)
+            else:
+                for cookie in cookies:
+                    jar.set(
+                        cookie["name"],
+                        cookie["value"],
+                        domain=cookie.get("domain", ""),
+                        path=cookie.get("path", "/"),
+                    )
+        except Exception as e:
+            logging.warning(f"[登录凭证缓存] 恢复账号 {username} 的 Cookie 失败: {e}")
+            return None
+
+        if time.time() - entry.get("verified_at", 0) > self.verify_interval_s:
+            resp = api_client.get_unread_notice_count()
+            self.validations += 1
+            if not resp or not resp.get("success"):
+                logging.info(f"[登录凭证缓存] 账号 {username} 的缓存凭证已失效，回退到正常登录。")
+                api_client.session.cookies.clear()
+                self.invalidate(username)
+                self.misses += 1
+                return None
+            entry["verified_at"] = time.time()
+            with self._lock:
+                self._entries[username] = entry
+                self._persist(username, entry)
+
+        self.hits += 1
+        logging.debug(f"[登录凭证缓存] 账号 {username} 复用缓存凭证，跳过登录。")
+        return {"success": True, "data": entry.get("login_data", {}), "from_cache": True}
+
+    def remember(self, api_client, username: str, password: str, login_resp: dict):
+        """正常登录成功后保存该账号的 Cookie 与登录返回数据"""
+        self._ensure_config()
+        if not self.enabled or not login_resp or not login_resp.get("success"):
+            return
+        try:
+            # 保留 domain/path，同名 Cookie 在不同域或路径下不会互相覆盖
+            cookies = [
+                {
+                    "name": cookie.name,
+                    "value": cookie.value,
+                    "domain": cookie.domain,
+                    "path": cookie.path,
+                }
+                for cookie in api_client.session.cookies
+            ]
+        except Exception as e:
+            logging.warning(f"[登录凭证缓存] 读取账号 {username} 的 Cookie 失败: {e}")
+            return
+        if not any(c["name"] == "shiroCookie" and c["value"] for c in cookies):
+            return
+        now = time.time()
+        entry = {
+            "secret": self._secret_digest(username, password),
+            "cookies": cookies,
+            "login_data": login_resp.get("data", {}),
+            "saved_at": now,
+            "verified_at": now,
+        }
+        with self._lock:
+            self._entries[username] = entry
+            self._persist(username, entry)
+
+    def invalidate(self, username: str):
+        """删除指定账号的缓存凭证（内存与磁盘）"""
+        with self._lock:
+            self._entries.pop(username, None)
+            try:
+                os.remove(self._path(username))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.warning(f"[登录凭证缓存] 删除账号 {username} 的缓存失败: {e}")
+
+    def get_metrics(self) -> dict:
+        """返回缓存命中统计（用于健康检查/监控）"""
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "validations": self.validations,
+            "misses": self.misses,
+        }
 
 
 # ==============================================================================
@@ -3597,6 +6360,10 @@ class Api:
         self.args = args
         self.window = None
         self.path_gen_callbacks = {}
+        # 串行化同一会话上整体替换共享状态的 /api/<method> 调用（见 API_SESSION_LOCKED_METHODS）
+        self._api_call_lock = threading.RLock()
+        # 正在执行 _run_submission_thread 的线程，用于判断会话是否真的有任务在运行
+        self._live_submission_threads = set()
 
         self.run_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
         self.user_dir = SCHOOL_ACCOUNTS_DIR
@@ -3605,6 +6372,8 @@ class Api:
         self.user_config_path = self.config_path
 
         self.api_client = ApiClient(self)
+        # 运行引擎使用的时间源，压测时可替换为 VirtualClock
+        self.clock = SYSTEM_CLOCK
 
         self._init_state_variables()
 
@@ -3668,8 +6437,6 @@ class Api:
             self.login_success = False
         if not hasattr(self, "user_info"):
             self.user_info = None
-        if not hasattr(self, "multi_login_lock") or self.multi_login_lock is None:
-            self.multi_login_lock = threading.Semaphore(20)
 
         self.global_params = {
             "interval_ms": 3000,
@@ -4531,17 +7298,15 @@ class Api:
             logging.warning("get_user_sessions: 用户未登录或为游客，返回空列表。")
             if is_guest and hasattr(self, "_web_session_id"):
                 current_session_id = self._web_session_id
-                session_file = get_session_file_path(current_session_id)
                 created_at = 0
                 last_activity = 0
-                if os.path.exists(session_file):
-                    try:
-                        with open(session_file, "r", encoding="utf-8") as f:
-                            s_data = json.load(f)
+                try:
+                    s_data = session_store.get(current_session_id, with_geometry=False)
+                    if s_data:
                         created_at = s_data.get("created_at", 0)
                         last_activity = s_data.get("last_accessed", 0)
-                    except Exception:
-                        pass
+                except Exception:
+                    pass
 
                 guest_session_info = [
                     {
@@ -4577,38 +7342,32 @@ class Api:
             current_session_id = getattr(self, "_web_session_id", None)
 
             for sid in session_ids:
-                session_file = get_session_file_path(sid)
-                if os.path.exists(session_file):
-                    try:
-                        with open(session_file, "r", encoding="utf-8") as f:
-                            session_data = json.load(f)
-
-                        if session_data.get("auth_username") == auth_username:
-                            sessions_info.append(
-                                {
-                                    "session_id": sid,
-                                    "session_hash": hashlib.sha256(
-                                        sid.encode()
-                                    ).hexdigest()[:16],
-                                    "created_at": session_data.get("created_at", 0),
-                                    "last_activity": session_data.get(
-                                        "last_accessed", 0
-                                    ),
-                                    "is_current": sid == session_id,
-                                    "login_success": session_data.get(
-                                        "login_success", False
-                                    ),
-                                    "is_multi_account_mode": session_data.get(
-                                        "is_multi_account_mode", False
-                                    ),
-                                    "user_data": session_data.get("user_data", {}),
-                                }
-                            )
-                    except Exception as e:
-                        logging.warning(
-                            f"读取会话文件 {session_file} 失败: {e}, 跳过该会话。"
+                try:
+                    session_data = session_store.get(sid, with_geometry=False)
+                    if session_data and session_data.get("auth_username") == auth_username:
+                        sessions_info.append(
+                            {
+                                "session_id": sid,
+                                "session_hash": hashlib.sha256(
+                                    sid.encode()
+                                ).hexdigest()[:16],
+                                "created_at": session_data.get("created_at", 0),
+                                "last_activity": session_data.get(
+                                    "last_accessed", 0
+                                ),
+                                "is_current": sid == session_id,
+                                "login_success": session_data.get(
+                                    "login_success", False
+                                ),
+                                "is_multi_account_mode": session_data.get(
+                                    "is_multi_account_mode", False
+                                ),
+                                "user_data": session_data.get("user_data", {}),
+                            }
                         )
-                        continue
+                except Exception as e:
+                    logging.warning(f"读取会话 {sid[:16]}... 失败: {e}, 跳过该会话。")
+                    continue
 
             logging.info(
                 f"成功获取用户 {auth_username} 的 {len(sessions_info)} 个会话信息。"
@@ -4750,7 +7509,15 @@ class Api:
         if not self.device_ua:
             self.device_ua = ApiClient.generate_random_ua()
 
-        resp = self.api_client.login(input_username, password)
+        resp = None
+        if not self.is_offline_mode:
+            resp = school_cookie_cache.restore(self.api_client, input_username, password)
+        if resp:
+            self.log("已复用缓存的登录凭证。")
+        else:
+            resp = self.api_client.login(input_username, password)
+            if resp and resp.get("success"):
+                school_cookie_cache.remember(self.api_client, input_username, password, resp)
         if not resp or not resp.get("success"):
             msg = (
                 resp.get("message", "未知错误")
@@ -4900,6 +7667,8 @@ class Api:
 
         self.login_success = False
         self.user_info = None
+        if self.user_data.username:
+            school_cookie_cache.invalidate(self.user_data.username)
 
         self._init_state_variables()
         self._load_global_config()
@@ -4917,7 +7686,7 @@ class Api:
                 )
                 tasks_for_js = []
                 for run in self.all_run_data:
-                    task_dict = run.__dict__.copy()
+                    task_dict = run.to_dict()
                     task_dict["info_text"] = self._get_task_info_text(run)
                     tasks_for_js.append(task_dict)
                 return {"success": True, "tasks": tasks_for_js}
@@ -4934,7 +7703,7 @@ class Api:
                 logging.debug("load_tasks skipped: another refresh is in-flight.")
                 tasks_for_js = []
                 for run in self.all_run_data:
-                    task_dict = run.__dict__.copy()
+                    task_dict = run.to_dict()
                     task_dict["info_text"] = self._get_task_info_text(run)
                     tasks_for_js.append(task_dict)
                 return {"success": True, "tasks": tasks_for_js}
@@ -5002,7 +7771,7 @@ class Api:
 
                 tasks_for_js = []
                 for run in self.all_run_data:
-                    task_dict = run.__dict__.copy()
+                    task_dict = run.to_dict()
                     task_dict["info_text"] = self._get_task_info_text(run)
                     tasks_for_js.append(task_dict)
                 return {"success": True, "tasks": tasks_for_js}
@@ -5153,7 +7922,7 @@ class Api:
         run_data = self.all_run_data[index]
 
         if run_data.details_fetched:
-            task_dict = run_data.__dict__.copy()
+            task_dict = run_data.to_dict()
             task_dict["target_range_m"] = self.target_range_m
             return {"success": True, "details": task_dict}
 
@@ -5206,7 +7975,7 @@ class Api:
             logging.debug(
                 f"任务详情获取成功: 目标点数量={len(run_data.target_points)}, 推荐路径点数量={len(run_data.recommended_coords)}"
             )
-            task_dict = run_data.__dict__.copy()
+            task_dict = run_data.to_dict()
             task_dict["target_range_m"] = self.target_range_m
             return {"success": True, "details": task_dict}
         else:
@@ -5614,7 +8383,7 @@ class Api:
             logging.info(
                 f"[离线测试模式] 模拟提交 chunk: start_index={chunk_start_index}, size={len(chunk)}, is_finish={is_finish}"
             )
-            time.sleep(0.1)
+            self.clock.sleep(0.1)
             return True
 
         log_func(f"正在提交数据...")
@@ -5640,7 +8409,7 @@ class Api:
             coords_list.append(
                 {
                     "location": f"{lon},{lat}",
-                    "locatetime": str(int(time.time() * 1000)),
+                    "locatetime": str(int(self.clock.time() * 1000)),
                     "dis": f"{distance:.1f}",
                     "count": str(int(time_elapsed_before_chunk_ms / 1000)),
                 }
@@ -5672,7 +8441,7 @@ class Api:
         }
 
         if is_finish:
-            payload["endTime"] = str(int(time.time() * 1000))
+            payload["endTime"] = str(int(self.clock.time() * 1000))
 
         payload_str = urllib.parse.urlencode(payload)
 
@@ -5741,7 +8510,7 @@ class Api:
                         pass
                 
                 # 避免CPU空转，虽有队列阻塞，但保留微小延时更稳健
-                time.sleep(0.01)
+                task.get("clock", SYSTEM_CLOCK).sleep(0.01)
 
             except Exception as outer_e:
                 logging.critical(f"[SubmissionWorker] 线程主循环发生未捕获异常: {outer_e}", exc_info=True)
@@ -5758,6 +8527,7 @@ class Api:
             "payload": payload_str,
             "event": threading.Event(),
             "response": None,
+            "clock": self.clock,
         }
         try:
             qsize = self._submission_queue.qsize()
@@ -5771,35 +8541,29 @@ class Api:
             return None
         return task.get("response")
 
-    def _finalize_run(self, run_data: RunData, task_index: int, client: ApiClient):
-        """在所有数据提交后，查询服务器确认任务是否已标记为完成"""
+    def _finalize_run(
+        self,
+        run_data: RunData,
+        task_index: int,
+        client: ApiClient,
+        on_confirmed=None,
+        on_failed=None,
+    ):
+        """
+        在所有数据提交后，将任务登记到全局确认服务，由其异步查询服务器
+        确认任务是否已标记为完成；调用方线程无需等待，立即返回。
+        """
         log_func = (
             client.app.log if hasattr(client.app, "log") else client.app.api_bridge.log
         )
+        if self.is_offline_mode:
+            log_func("[离线测试模式] 跳过任务状态确认。")
+            return
         log_func("正在确认任务状态...")
         logging.debug(f"正在确认任务完成状态，任务追踪ID: trid={run_data.trid}")
-        for _ in range(3):
-            resp = client.get_run_info_by_trid(run_data.trid)
-            if resp and resp.get("success"):
-                record_map = resp.get("data", {}).get("recordMap", {})
-                if record_map and record_map.get("status") == 1:
-                    run_data.status = 1
-                    log_func("任务已确认完成。")
-                    logging.info(f"任务已成功完成: 任务名称={run_data.run_name}")
-                    session_id = getattr(self, "_web_session_id", None)
-                    if socketio and session_id and task_index != -1:
-                        try:
-                            socketio.emit(
-                                "task_completed",
-                                {"task_index": task_index},
-                                room=session_id,
-                            )
-                        except Exception as e:
-                            logging.error(f"SocketIO发送'task_completed'事件失败: {e}")
-                    return
-            time.sleep(1)
-        log_func("暂未确认完成，请稍后刷新。")
-        logging.warning(f"任务完成状态确认失败: 任务名称={run_data.run_name}")
+        run_finalizer.register(
+            self, run_data, task_index, client, on_confirmed, on_failed
+        )
 
     def _run_submission_thread(
         self,
@@ -5808,8 +8572,13 @@ class Api:
         client: ApiClient,
         is_all: bool,
         finished_event: threading.Event | None = None,
+        resume: dict | None = None,
     ):
-        """模拟跑步和提交数据的主线程函数"""
+        """
+        模拟跑步和提交数据的主线程函数。
+        resume 为 RunJournal.replay 的结果时，沿用原 trid/开始时间，
+        从下一个未确认的数据块继续执行，已被服务器接受的点不会重复提交。
+        """
         log_func = (
             client.app.log if hasattr(client.app, "log") else client.app.api_bridge.log
         )
@@ -5826,31 +8595,73 @@ class Api:
 
         session_id = getattr(self, "_web_session_id", None)
         last_auto_save_time = time.time()
+        pipeline = None
+        journal = None
+        self._live_submission_threads.add(threading.current_thread())
 
         try:
             log_func("开始执行任务。")
             logging.info(f"任务提交线程已启动: 任务名称={run_data.run_name}")
 
-            run_data.trid = f"{user_data.student_id}{int(time.time() * 1000)}"
-            start_time_ms = str(int(time.time() * 1000))
-            run_data.distance_covered_m = 0.0
-            last_point_gps = run_data.run_coords[0]
-            submission_successful = True
+            run_data.distance_covered_m = 0.0
+            last_point_gps = run_data.run_coords[0]
+            submission_successful = True
+            resume_offset = 0
+
+            if resume:
+                run_data.trid = resume["trid"]
+                start_time_ms = resume["start_time_ms"]
+                resume_offset = resume["acked_offset"]
+                journal = RunJournal(resume["path"])
+                # 重放已确认的点，恢复已跑距离与打卡进度
+                for lon, lat, _ in run_data.run_coords[:resume_offset]:
+                    run_data.distance_covered_m += self._calculate_distance_m(
+                        last_point_gps[0], last_point_gps[1], lon, lat
+                    )
+                    last_point_gps = (lon, lat, _)
+                    self.check_target_reached_during_run(run_data, lon, lat)
+                log_func(
+                    f"从断点恢复任务执行（已确认 {resume_offset}/{len(run_data.run_coords)} 个点）。"
+                )
+            else:
+                run_data.trid = f"{user_data.student_id}{int(self.clock.time() * 1000)}"
+                start_time_ms = str(int(self.clock.time() * 1000))
+                if session_id:
+                    journal = RunJournal.begin(
+                        session_id, task_index, run_data, start_time_ms
+                    )
+
+            # 数据块交由流水线在后台按序提交，计时不因网络延迟而被拉长
+            pipeline = ChunkSubmissionPipeline(
+                self,
+                run_data,
+                client,
+                user_data,
+                start_time_ms,
+                stop_flag,
+                acked_offset=resume_offset,
+                on_ack=journal.record_ack if journal else None,
+            )
 
-            point_index = 0
+            point_index = resume_offset
+            run_data.current_point_index = point_index
 
-            for i in range(0, len(run_data.run_coords), 40):
+            for i in range(resume_offset, len(run_data.run_coords), 40):
                 if stop_flag.is_set():
                     log_func("任务已中止。")
                     logging.info("检测到停止标志，正在中止任务运行")
                     break
+                if pipeline.failed:
+                    break
 
                 chunk = run_data.run_coords[i : i + 40]
 
                 for lon, lat, dur_ms in chunk:
-                    if stop_flag.wait(timeout=dur_ms / 1000.0):
+                    if self.clock.wait(stop_flag, dur_ms / 1000.0):
                         logging.debug("等待下一个坐标点时被停止信号中断")
                         break
+                    if pipeline.failed:
+                        break
 
                     run_data.distance_covered_m += self._calculate_distance_m(
                         last_point_gps[0], last_point_gps[1], lon, lat
@@ -5873,14 +8684,12 @@ class Api:
                                 and "web_sessions" in globals()
                             ):
                                 with web_sessions_lock:
-                                    if current_session_id in web_sessions:
-                                        save_session_state(
-                                            current_session_id,
-                                            web_sessions[current_session_id],
-                                        )
-                                        logging.debug(
-                                            f"任务执行中自动保存会话状态 (进度: {point_index}/{len(run_data.run_coords)})"
-                                        )
+                                    session_api = web_sessions.get(current_session_id)
+                                if session_api is not None:
+                                    mark_session_dirty(current_session_id, session_api)
+                                    logging.debug(
+                                        f"任务执行中自动保存会话状态 (进度: {point_index}/{len(run_data.run_coords)})"
+                                    )
                                 last_auto_save_time = time.time()
                         except Exception as e:
                             logging.error(f"任务执行中自动保存会话失败: {e}")
@@ -5897,70 +8706,48 @@ class Api:
                     if sio and current_session_id:
                         should_emit = True
 
-                if stop_flag.is_set():
+                if stop_flag.is_set() or pipeline.failed:
                     break
 
                 is_final_chunk = i + 40 >= len(run_data.run_coords)
+                pipeline.submit(chunk, i, is_final_chunk)
 
-                max_attempts = 3
-                attempt = 1
-                chunk_submitted = False
-                while attempt <= max_attempts:
-                    if self._submit_chunk(
-                        run_data,
-                        chunk,
-                        start_time_ms,
-                        is_final_chunk,
-                        i,
-                        client,
-                        user_data,
-                    ):
-                        chunk_submitted = True
-                        break
-
-                    submission_successful = False
-                    if self.is_offline_mode:
-                        logging.error(
-                            f"[离线测试模式] 模拟提交失败，尝试 {attempt}/{max_attempts}"
-                        )
-                    else:
-                        logging.warning(f"数据提交失败，重试 {attempt}/{max_attempts}")
-                        if stop_flag.wait(timeout=1.0):
-                            submission_successful = False
-                            log_func("检测到停止信号，已取消重试")
-                            break
-                    attempt += 1
-
-                if not chunk_submitted:
-                    logging.error(
-                        f"数据提交在 {max_attempts} 次尝试后仍然失败，任务中止"
-                    )
-                    break
+            # 等待已入队的数据块全部提交完毕（严格有序，失败则后续块不再提交）
+            if not pipeline.drain() or not pipeline.clean:
+                submission_successful = False
 
             if not stop_flag.is_set() and submission_successful:
                 log_func("任务执行完毕，等待确认...")
                 logging.info("任务运行执行完毕，等待最终确认")
-                time.sleep(3)
-                self._finalize_run(run_data, task_index, client)
 
-                if session_id:
+                def _save_after_run():
+                    if not session_id:
+                        return
                     try:
                         if (
                             "web_sessions_lock" in globals()
                             and "web_sessions" in globals()
                         ):
                             with web_sessions_lock:
-                                if session_id in web_sessions:
-                                    save_session_state(
-                                        session_id,
-                                        web_sessions[session_id],
-                                        force_save=True,
-                                    )
-                                    logging.info(f"任务完成，已保存会话状态")
+                                session_api = web_sessions.get(session_id)
+                            if session_api is not None:
+                                mark_session_dirty(session_id, session_api)
+                                logging.info(f"任务完成，已提交会话状态保存")
                     except Exception as e:
                         logging.error(f"任务完成后保存会话失败: {e}")
 
+                # 确认结果由后台服务异步获取，确认成功后再次保存完成状态
+                self._finalize_run(
+                    run_data, task_index, client, on_confirmed=_save_after_run
+                )
+                _save_after_run()
+
         finally:
+            if pipeline is not None:
+                pipeline.close()
+            # 线程正常退出（完成/停止/失败）即无需断点恢复；进程崩溃时日志会保留
+            if journal is not None:
+                journal.discard()
             if not is_all:
                 if not submission_successful or stop_flag.is_set():
                     self.stop_run_flag.set()
@@ -5978,8 +8765,13 @@ class Api:
 
             if finished_event:
                 finished_event.set()
+            self._live_submission_threads.discard(threading.current_thread())
             logging.info(f"Submission thread finished for task: {run_data.run_name}")
 
+    def _has_live_submission(self) -> bool:
+        """是否有提交线程正在执行（停止标志会随会话保存/恢复，不能据此判断）"""
+        return any(t.is_alive() for t in list(self._live_submission_threads))
+
     def _get_path_for_distance(self, path, cumulative_distances, target_dist):
         """如果路径总长不足，则通过来回走的方式凑足目标距离"""
         total_len = cumulative_distances[-1]
@@ -6634,7 +9426,7 @@ class Api:
             self.log("离线数据已导入。")
             logging.info(f"离线数据导入成功: {debug_run.run_name}")
 
-            tasks_for_js = [r.__dict__.copy() for r in self.all_run_data]
+            tasks_for_js = [r.to_dict() for r in self.all_run_data]
             tasks_for_js[0]["info_text"] = "离线"
             tasks_for_js[0]["target_range_m"] = self.target_range_m
 
@@ -6784,8 +9576,8 @@ class Api:
 
         if session_id:
             try:
-                save_session_state(session_id, self, force_save=True)
-                logging.info(f"进入多账号模式：已保存会话状态到持久化存储")
+                mark_session_dirty(session_id, self)
+                logging.info(f"进入多账号模式：已提交会话状态保存")
             except Exception as e:
                 logging.error(f"进入多账号模式：保存会话状态失败: {e}")
 
@@ -6836,8 +9628,8 @@ class Api:
         session_id = getattr(self, "_web_session_id", None)
         if session_id:
             try:
-                save_session_state(session_id, self, force_save=True)
-                logging.info(f"退出多账号模式：已清空会话中的账号列表并保存")
+                mark_session_dirty(session_id, self)
+                logging.info(f"退出多账号模式：已清空会话中的账号列表并提交保存")
             except Exception as e:
                 logging.error(f"退出多账号模式：保存会话状态失败: {e}")
 
@@ -7137,7 +9929,7 @@ class Api:
             logging.error(f"启动刷新线程失败: {traceback.format_exc()}")
 
         if hasattr(self, "_web_session_id") and self._web_session_id:
-            save_session_state(self._web_session_id, self, force_save=True)
+            mark_session_dirty(self._web_session_id, self)
 
         return self.multi_get_all_accounts_status([{"success": True}])
 
@@ -7153,7 +9945,7 @@ class Api:
             self.log(f"已移除账号: {username}")
         self._update_multi_global_buttons()
         if hasattr(self, "_web_session_id") and self._web_session_id:
-            save_session_state(self._web_session_id, self, force_save=True)
+            mark_session_dirty(self._web_session_id, self)
         return self.multi_get_all_accounts_status()
 
     def multi_refresh_all_statuses(self):
@@ -7304,7 +10096,7 @@ class Api:
                 def delayed_save():
                     time.sleep(2)
                     try:
-                        save_session_state(self._web_session_id, self, force_save=True)
+                        mark_session_dirty(self._web_session_id, self)
                         logging.debug(f"账号 {acc.username} 刷新完成后已保存会话状态")
                     except Exception as e:
                         logging.error(f"延迟保存会话状态失败: {e}")
@@ -7335,7 +10127,7 @@ class Api:
         self.log(f"移除了 {removed_count} 个选定账号。")
         self._update_multi_global_buttons()
         if hasattr(self, "_web_session_id") and self._web_session_id:
-            save_session_state(self._web_session_id, self, force_save=True)
+            mark_session_dirty(self._web_session_id, self)
 
         return self.multi_get_all_accounts_status()
 
@@ -7351,7 +10143,7 @@ class Api:
         self.log(f"已移除全部 {count} 个账号。")
         self._update_multi_global_buttons()
         if hasattr(self, "_web_session_id") and self._web_session_id:
-            save_session_state(self._web_session_id, self, force_save=True)
+            mark_session_dirty(self._web_session_id, self)
         return self.multi_get_all_accounts_status()
 
     def multi_get_all_accounts_status(self, addition=None):
@@ -7688,7 +10480,7 @@ class Api:
                 self.log(f"已更新账号 [{username}] 的参数 {key}。")
 
                 if hasattr(self, "_web_session_id") and self._web_session_id:
-                    save_session_state(self._web_session_id, self, force_save=True)
+                    mark_session_dirty(self._web_session_id, self)
 
                 return {"success": True}
             except (ValueError, TypeError) as e:
@@ -7709,14 +10501,11 @@ class Api:
         acc.stop_event.clear()
         if self.multi_run_stop_flag.is_set():
             self.multi_run_stop_flag.clear()
-        acc.worker_thread = threading.Thread(
-            target=self._multi_account_worker,
-            args=(acc, 0, bool(run_only_incomplete)),
-            daemon=True,
+        self._update_account_status_js(acc, status_text="排队等待...")
+        acc.worker_thread = multi_account_runner.submit(
+            self, acc, 0, bool(run_only_incomplete)
         )
-        acc.worker_thread.start()
         self.log(f"已启动账号: {username}")
-        self._update_account_status_js(acc, status_text="排队等待...")
         self._update_multi_global_buttons()
         return {"success": True}
 
@@ -7730,6 +10519,7 @@ class Api:
 
         if acc.worker_thread and acc.worker_thread.is_alive():
             acc.stop_event.set()
+            multi_account_runner.cancel(acc.worker_thread)
             self.log(f"已向账号 {username} 发送停止信号。")
             self._update_account_status_js(acc, status_text="正在停止...")
             self._update_multi_global_buttons()
@@ -7803,12 +10593,17 @@ class Api:
 
             delay = delays[i] if use_delay else 0
             acc.stop_event.clear()
-            acc.worker_thread = threading.Thread(
-                target=self._multi_account_worker,
-                args=(acc, delay, run_only_incomplete),
-                daemon=True,
+            # 延迟启动交由执行器定时投递，仅在排期时通知一次前端
+            if delay > 0:
+                start_at = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+                self._update_account_status_js(
+                    acc, status_text=f"延迟至 {start_at.strftime('%H:%M:%S')} 启动"
+                )
+            else:
+                self._update_account_status_js(acc, status_text="排队等待...")
+            acc.worker_thread = multi_account_runner.submit(
+                self, acc, delay, run_only_incomplete
             )
-            acc.worker_thread.start()
             started_threads += 1
 
         if started_threads == 0:
@@ -7834,6 +10629,7 @@ class Api:
         self.multi_run_stop_flag.set()
         for acc in self.accounts.values():
             acc.stop_event.set()
+            multi_account_runner.cancel(acc.worker_thread)
         self._update_multi_global_buttons()
         self.log("所有任务将在当前步骤完成后停止。")
         self._update_multi_global_buttons()
@@ -7960,75 +10756,55 @@ class Api:
         ignore_all_stops: bool = False,
     ) -> dict | None:
         """
-        多账号模式下的“排队登录”：
+        多账号模式下的“排队登录”：通过全局登录准入控制器按先后顺序获取登录名额，
+        排队期间响应停止信号，并向前端反馈排队位置。
         """
+        if not self.is_offline_mode:
+            cached_resp = school_cookie_cache.restore(
+                acc.api_client, acc.username, acc.password
+            )
+            if cached_resp:
+                acc.log("已复用缓存的登录凭证，跳过登录。")
+                return cached_resp
+
         try:
             self._update_account_status_js(acc, status_text="排队登录...")
         except Exception:
             pass
 
-        while True:
-            if not ignore_all_stops and (
+        def _should_cancel():
+            return not ignore_all_stops and (
                 acc.stop_event.is_set()
                 or (respect_global_stop and self.multi_run_stop_flag.is_set())
-            ):
-                logging.debug(
-                    f"[{acc.username}] 登录被中止: stop_event={acc.stop_event.is_set()}"
-                )
-                return None
-
-            try:
-                acquired = self.multi_login_lock.acquire(blocking=False)
-                if acquired:
-                    break
-
-                time.sleep(0.5)
-
-            except (Exception, BaseException) as e:
-                logging.warning(
-                    f"[{acc.username}] 获取登录锁异常 ({type(e).__name__}): {e}，正在尝试修复锁..."
-                )
-
-                try:
-                    from eventlet import patcher
+            )
 
-                    native_threading = patcher.original("threading")
-                    self.multi_login_lock = native_threading.Semaphore(1)
-                    logging.info(
-                        "[Lock Repair] 已将 multi_login_lock 重置为原生 Semaphore"
-                    )
-                except Exception as reset_err:
-                    logging.error(f"[Lock Repair] 重置锁失败: {reset_err}")
-                    pass
+        def _on_position(position):
+            self._update_account_status_js(
+                acc, status_text=f"排队登录 (第 {position} 位)"
+            )
 
-                time.sleep(0.5)
-                continue
+        if not login_admission.acquire(_should_cancel, _on_position):
+            logging.debug(
+                f"[{acc.username}] 登录被中止: stop_event={acc.stop_event.is_set()}"
+            )
+            return None
 
         try:
-            if not ignore_all_stops and (
-                acc.stop_event.is_set()
-                or (respect_global_stop and self.multi_run_stop_flag.is_set())
-            ):
-                self.multi_login_lock.release()
-                return None
-
             self._update_account_status_js(acc, status_text="正在登录...")
 
-            return acc.api_client.login(acc.username, acc.password)
+            login_resp = acc.api_client.login(acc.username, acc.password)
+            if login_resp and login_resp.get("success"):
+                school_cookie_cache.remember(
+                    acc.api_client, acc.username, acc.password, login_resp
+                )
+            return login_resp
         except Exception as e:
             logging.error(
                 f"[{acc.username}] 执行登录请求时发生异常: {e}", exc_info=True
             )
-            try:
-                self.multi_login_lock.release()
-            except Exception:
-                pass
             return {"success": False, "message": f"登录执行异常: {e}"}
         finally:
-            try:
-                self.multi_login_lock.release()
-            except Exception:
-                pass
+            login_admission.release()
 
     def _multi_fetch_and_summarize_tasks(self, acc: AccountSession):
         """(辅助函数) 为单个账号获取任务列表并计算统计信息（按任务ID去重）"""
@@ -8237,9 +11013,8 @@ class Api:
                 path_result["error"] = data
             completion_event.set()
 
-    def _multi_account_worker(
-        self, acc: AccountSession, delay: float, run_only_incomplete: bool
-    ):
+    def _multi_account_worker(self, acc: AccountSession, run_only_incomplete: bool):
+        """单个账号的执行流程（由 MultiAccountRunner 的工作线程调用，延迟启动已由执行器处理）"""
         try:
             if self.multi_run_stop_flag.is_set() or acc.stop_event.is_set():
                 self._update_account_status_js(acc, status_text="已取消")
@@ -8361,19 +11136,6 @@ class Api:
 
             tasks_executed_count = 0
 
-            if delay > 0:
-                end_time = time.time() + delay
-                while time.time() < end_time:
-                    if acc.stop_event.is_set() or self.multi_run_stop_flag.is_set():
-                        self._update_account_status_js(acc, status_text="已中止")
-                        self._update_multi_global_buttons()
-                        return
-                    remaining = end_time - time.time()
-                    self._update_account_status_js(
-                        acc, status_text=f"延迟 {remaining:.0f}s"
-                    )
-                    time.sleep(1)
-
             for i, run_data in enumerate(tasks_to_run):
                 if self.multi_run_stop_flag.is_set() or acc.stop_event.is_set():
                     self._update_account_status_js(acc, status_text="已中止")
@@ -8733,8 +11495,8 @@ class Api:
 
                 tasks_executed_count += 1
 
-                run_data.trid = f"{acc.user_data.student_id}{int(time.time() * 1000)}"
-                start_time_ms = str(int(time.time() * 1000))
+                run_data.trid = f"{acc.user_data.student_id}{int(self.clock.time() * 1000)}"
+                start_time_ms = str(int(self.clock.time() * 1000))
                 submission_successful = True
                 total_points = max(1, len(run_data.run_coords))
 
@@ -8742,6 +11504,17 @@ class Api:
                     acc.log("警告: 生成的轨迹点数过少，无法执行任务。")
                     continue
 
+                # 多账号模式沿用单次提交（不重试）的语义，但提交与计时并行
+                pipeline = ChunkSubmissionPipeline(
+                    self,
+                    run_data,
+                    acc.api_client,
+                    acc.user_data,
+                    start_time_ms,
+                    acc.stop_event,
+                    max_attempts=1,
+                )
+
                 for chunk_idx in range(0, len(run_data.run_coords), 40):
                     logging.debug(
                         f"[{acc.username}] 执行进度: {chunk_idx}/{len(run_data.run_coords)}"
@@ -8749,6 +11522,9 @@ class Api:
                     if self.multi_run_stop_flag.is_set() or acc.stop_event.is_set():
                         submission_successful = False
                         break
+                    if pipeline.failed:
+                        submission_successful = False
+                        break
 
                     chunk = run_data.run_coords[chunk_idx : chunk_idx + 40]
                     processed_points = chunk_idx
@@ -8773,13 +11549,16 @@ class Api:
                                     },
                                     room=session_id,
                                 )
-                                time.sleep(0.001)
+                                self.clock.sleep(0.001)
                             except Exception as e:
                                 logging.debug(
                                     f"Failed to emit multi_position_update: {e}"
                                 )
 
-                        if acc.stop_event.wait(timeout=dur_ms / 1000.0):
+                        if self.clock.wait(acc.stop_event, dur_ms / 1000.0):
+                            submission_successful = False
+                            break
+                        if pipeline.failed:
                             submission_successful = False
                             break
 
@@ -8799,25 +11578,27 @@ class Api:
                         break
 
                     is_final_chunk = chunk_idx + 40 >= len(run_data.run_coords)
-                    if not self._submit_chunk(
-                        run_data,
-                        chunk,
-                        start_time_ms,
-                        is_final_chunk,
-                        chunk_idx,
-                        acc.api_client,
-                        acc.user_data,
-                    ):
-                        submission_successful = False
-                        break
+                    pipeline.submit(chunk, chunk_idx, is_final_chunk)
+
+                if not pipeline.drain():
+                    submission_successful = False
 
                 if submission_successful:
                     acc.log(f"任务 {run_data.run_name} 数据提交完毕，等待服务器确认...")
-                    time.sleep(3)
-                    self._finalize_run(run_data, -1, acc.api_client)
+
+                    def _refresh_summary_after_check(acc=acc):
+                        self._multi_fetch_and_summarize_tasks(acc)
+                        self._update_account_status_js(acc, summary=acc.summary)
+
+                    # 确认成功或查询失败都刷新汇总，避免确认迟迟不成功时汇总一直停留在旧状态
+                    self._finalize_run(
+                        run_data,
+                        -1,
+                        acc.api_client,
+                        on_confirmed=_refresh_summary_after_check,
+                        on_failed=_refresh_summary_after_check,
+                    )
                     run_data.status = 1
-                    self._multi_fetch_and_summarize_tasks(acc)
-                    self._update_account_status_js(acc, summary=acc.summary)
                     acc.log(f"任务 {run_data.run_name} 执行流程完成。")
                     self._update_account_status_js(
                         acc,
@@ -8834,17 +11615,18 @@ class Api:
                     wait_time = random.uniform(
                         acc.params["task_gap_min_s"], acc.params["task_gap_max_s"]
                     )
-                    should_break_worker = False
-                    end_time = time.time() + wait_time
-                    while time.time() < end_time:
-                        if acc.stop_event.is_set() or self.multi_run_stop_flag.is_set():
-                            should_break_worker = True
-                            break
-                        remaining = end_time - time.time()
-                        self._update_account_status_js(
-                            acc, status_text=f"等待 {remaining:.0f}s"
-                        )
-                        time.sleep(1)
+                    resume_at = datetime.datetime.now() + datetime.timedelta(
+                        seconds=wait_time
+                    )
+                    self._update_account_status_js(
+                        acc,
+                        status_text=f"等待 {wait_time:.0f}s (至 {resume_at.strftime('%H:%M:%S')})",
+                    )
+                    # 全部停止会同时设置每个账号的 stop_event，等待它即可及时响应
+                    should_break_worker = (
+                        self.clock.wait(acc.stop_event, wait_time)
+                        or self.multi_run_stop_flag.is_set()
+                    )
                     if should_break_worker:
                         self._update_account_status_js(acc, status_text="已中止")
                         break
@@ -9660,13 +12442,18 @@ def cleanup_inactive_session(session_id):
         logging.info(f"清理不活跃会话: {session_id}")
         with web_sessions_lock:
             if session_id in web_sessions:
-                api_instance = web_sessions[session_id]
-                if hasattr(api_instance, "stop_run_flag"):
+                # 冷会话无需为清理而恢复，直接使用索引中的用户信息
+                api_instance = web_sessions.peek(session_id)
+                cold_meta = web_sessions.pop_cold(session_id)
+                if api_instance is not None and hasattr(api_instance, "stop_run_flag"):
                     api_instance.stop_run_flag.set()
-                if hasattr(api_instance, "auth_username") and not getattr(
-                    api_instance, "is_guest", True
-                ):
-                    username = api_instance.auth_username
+                if api_instance is not None:
+                    username = getattr(api_instance, "auth_username", None)
+                    is_guest = getattr(api_instance, "is_guest", True)
+                else:
+                    username = cold_meta.get("auth_username") if cold_meta else None
+                    is_guest = cold_meta.get("is_guest", True) if cold_meta else True
+                if username and not is_guest:
                     is_browsing = False
                     try:
                         timeout = 300
@@ -9701,35 +12488,119 @@ def cleanup_inactive_session(session_id):
                             f"用户 {username} 仍在其他页面浏览，跳过 Token 失效，仅清理过期会话 {session_id}"
                         )
 
-                del web_sessions[session_id]
-        session_hash = hashlib.sha256(session_id.encode()).hexdigest()
-        session_file = os.path.join(SESSION_STORAGE_DIR, f"{session_hash}.json")
-        if os.path.exists(session_file):
-            os.remove(session_file)
-            logging.info(f"已删除会话文件: {session_hash}")
+                if api_instance is not None:
+                    del web_sessions[session_id]
+        session_flusher.mark_deleted(session_id)
+        if session_store.delete(session_id):
+            logging.info(f"已删除持久化会话: {session_id}")
         with session_activity_lock:
             if session_id in session_activity:
                 del session_activity[session_id]
         with browsing_activity_lock:
             if session_id in browsing_activity:
                 del browsing_activity[session_id]
-        index = _load_session_index()
-        if session_id in index:
-            del index[session_id]
-            _save_session_index(index)
 
         logging.info(f"会话清理完成: {session_id}")
     except Exception as e:
         logging.error(f"清理会话失败 {session_id} {e}")
 
 
-def monitor_session_inactivity():
+class ExpiryService:
     """
-    监控会话不活跃状态并清理
+    统一的过期索引：会话、令牌、验证码、后台任务文件按 (deadline, kind, key) 登记到最小堆，
+    后台线程只处理已到期的条目，清理开销与实际到期的对象数量成正比，不再周期性全量扫描。
+
+    每种 kind 通过 register() 注册处理函数 handler(key)。到期时在锁外调用处理函数：
+    返回新的截止时间表示对象仍然有效（例如期间被刷新过），条目按新时间重新登记；
+    返回 None 表示对象已清理。因此对象被刷新时无需逐次更新堆，只在到期时惰性校验。
     """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._deadlines = {}
+        self._handlers = {}
+        self._seq = 0
+        self._thread = None
+        self.fired_count = 0
+
+    def register(self, kind: str, handler):
+        with self._cond:
+            self._handlers[kind] = handler
+
+    def schedule(self, kind: str, key, deadline: float):
+        """登记或改写 (kind, key) 的截止时间"""
+        with self._cond:
+            self._push(kind, key, deadline)
+
+    def ensure(self, kind: str, key, deadline: float):
+        """仅在 (kind, key) 尚未登记时登记，已登记的条目保持原截止时间"""
+        with self._cond:
+            if (kind, key) not in self._deadlines:
+                self._push(kind, key, deadline)
+
+    def cancel(self, kind: str, key):
+        with self._cond:
+            self._deadlines.pop((kind, key), None)
+
+    def _push(self, kind, key, deadline):
+        self._seq += 1
+        self._deadlines[(kind, key)] = deadline
+        heapq.heappush(self._heap, (deadline, self._seq, kind, key))
+        # 被改写或取消的旧条目留在堆中惰性丢弃，数量过多时重建堆
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [
+                (entry_deadline, index, entry_kind, entry_key)
+                for index, ((entry_kind, entry_key), entry_deadline) in enumerate(
+                    self._deadlines.items()
+                )
+            ]
+            heapq.heapify(self._heap)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._expire_loop, daemon=True, name="ExpiryService"
+            )
+            self._thread.start()
+        self._cond.notify()
+
+    def _expire_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    while self._heap and (
+                        self._deadlines.get((self._heap[0][2], self._heap[0][3]))
+                        != self._heap[0][0]
+                    ):
+                        heapq.heappop(self._heap)
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(
+                        timeout=self._heap[0][0] - now if self._heap else None
+                    )
+                _, _, kind, key = heapq.heappop(self._heap)
+                del self._deadlines[(kind, key)]
+                handler = self._handlers.get(kind)
+
+            next_deadline = None
+            if handler is not None:
+                try:
+                    next_deadline = handler(key)
+                except Exception as e:
+                    logging.error(f"[过期清理] 处理 {kind}:{key} 时出错: {e}", exc_info=True)
+            self.fired_count += 1
+            if next_deadline is not None:
+                self.ensure(kind, key, next_deadline)
+
+    def get_metrics(self) -> dict:
+        with self._cond:
+            pending = collections.Counter(kind for kind, _ in self._deadlines)
+        return {"pending": dict(pending), "fired": self.fired_count}
+
+
+def _session_monitor_config():
     check_interval = 60
     inactivity_timeout = 300
-
     try:
         if os.path.exists("config.ini"):
             config = configparser.ConfigParser()
@@ -9743,120 +12614,240 @@ def monitor_session_inactivity():
                 )
     except Exception as e:
         logging.warning(f"读取会话监控配置失败，使用默认值: {e}")
+    return check_interval, inactivity_timeout
 
-    while True:
-        try:
-            time.sleep(check_interval)
-            current_time = time.time()
-            inactive_sessions_to_cleanup = []
-            active_sessions_to_update = []
-            with web_sessions_lock:
-                sessions_snapshot = list(web_sessions.items())
 
-            for session_id, api_instance in sessions_snapshot:
-                if not api_instance:
-                    continue
-                with session_activity_lock:
-                    if session_id not in session_activity:
-                        session_activity[session_id] = current_time
-                    last_activity = session_activity[session_id]
+SESSION_CHECK_INTERVAL, SESSION_INACTIVITY_TIMEOUT = 60, 300
 
-                has_background_activity = False
-                if (
-                    hasattr(api_instance, "stop_run_flag")
-                    and not api_instance.stop_run_flag.is_set()
-                ):
-                    has_background_activity = True
-                    logging.debug(f"[会话监控] {session_id} 单账号跑步任务执行中")
-                if (
-                    hasattr(api_instance, "multi_run_stop_flag")
-                    and not api_instance.multi_run_stop_flag.is_set()
-                ):
-                    has_background_activity = True
-                    logging.debug(f"[会话监控] {session_id} 多账号跑步任务执行中")
-                is_multi = getattr(api_instance, "is_multi_account_mode", False)
-
-                if is_multi:
-                    accounts = getattr(api_instance, "accounts", {})
-                    global_params = getattr(api_instance, "multi_global_params", {})
-                    auto_attendance = global_params.get(
-                        "auto_attendance_enabled", False
-                    )
-                    logging.debug(
-                        f"[会话监控] {session_id} 多账号模式自动签到状态: {auto_attendance}, 账号数: {len(accounts)}"
-                    )
-                    if accounts and auto_attendance:
-                        has_background_activity = True
-                        logging.debug(f"[会话监控] {session_id} 多账号自动签到开启中")
-                else:
-                    params = getattr(api_instance, "params", {})
-                    auto_attendance = params.get("auto_attendance_enabled", False)
-                    logging.debug(
-                        f"[会话监控] {session_id} 单账号模式自动签到状态: {auto_attendance}"
-                    )
 
-                    if auto_attendance:
-                        has_background_activity = True
-                        logging.debug(f"[会话监控] {session_id} 单账号自动签到开启中")
-
-                # --- 结果处理 ---
-                if has_background_activity:
-                    active_sessions_to_update.append(session_id)
-                    logging.debug(f"[会话监控] {session_id} 有后台任务，更新活跃时间")
-                elif (current_time - last_activity) > inactivity_timeout:
-                    logging.debug(f"[会话监控] {session_id} 超过不活跃超时阈值")
-                    inactive_sessions_to_cleanup.append(session_id)
-                else:
-                    logging.debug(
-                        f"[会话监控] {session_id} 仍在活跃期内，上次活跃时间: {current_time - last_activity:.1f}秒前"
-                    )
+CAPTCHA_TTL_S = 600
 
-            if active_sessions_to_update:
-                with session_activity_lock:
-                    for sid in active_sessions_to_update:
-                        session_activity[sid] = current_time
 
-            if inactive_sessions_to_cleanup:
-                logging.info(
-                    f"[会话监控] 发现 {len(inactive_sessions_to_cleanup)} 个超时且无后台任务的会话，准备清理"
-                )
-                for sid in inactive_sessions_to_cleanup:
-                    cleanup_inactive_session(sid)
+def expire_captcha(captcha_id):
+    """验证码到期时删除其文件"""
+    try:
+        os.remove(os.path.join(LOGIN_LOGS_DIR, "captchas", f"{captcha_id}.json"))
+        logging.debug(f"[验证码清理] 删除过期验证码: {captcha_id}.json")
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def schedule_captcha_expiry():
+    """向 ExpiryService 登记验证码过期清理，已有验证码文件按修改时间推算过期时间"""
+    expiry_service.register("captcha", expire_captcha)
+    captchas_dir = os.path.join(LOGIN_LOGS_DIR, "captchas")
+    if not os.path.isdir(captchas_dir):
+        return
+    for entry in os.scandir(captchas_dir):
+        if entry.is_file() and entry.name.endswith(".json"):
+            expiry_service.ensure(
+                "captcha", entry.name[:-5], entry.stat().st_mtime + CAPTCHA_TTL_S
+            )
+
+
+def schedule_session_expiry(session_id):
+    """会话进入 web_sessions（已恢复或冷会话）时登记不活跃检查"""
+    expiry_service.ensure("session", session_id, time.time() + SESSION_INACTIVITY_TIMEOUT)
+
+
+def expire_inactive_session(session_id):
+    """
+    会话不活跃检查到期时调用：有后台任务的会话刷新活跃时间并在 check_interval 后再次检查；
+    期间有过访问的会话按最后活跃时间顺延；否则清理会话。冷会话不会为此被恢复。
+    """
+    if session_id not in web_sessions:
+        return None
+    current_time = time.time()
+    api_instance = web_sessions.peek(session_id)
+    if api_instance is not None and session_has_background_activity(api_instance):
+        with session_activity_lock:
+            session_activity[session_id] = current_time
+        logging.debug(f"[会话监控] {session_id} 有后台任务，更新活跃时间")
+        return current_time + SESSION_CHECK_INTERVAL
+    with session_activity_lock:
+        if api_instance is not None:
+            last_activity = session_activity.setdefault(session_id, current_time)
+        else:
+            cold_meta = web_sessions.cold_meta(session_id) or {}
+            last_activity = max(
+                cold_meta.get("last_accessed") or 0,
+                session_activity.get(session_id, 0),
+            )
+    if current_time - last_activity <= SESSION_INACTIVITY_TIMEOUT:
+        return last_activity + SESSION_INACTIVITY_TIMEOUT
+    logging.info(f"[会话监控] {session_id} 超时且无后台任务，准备清理")
+    cleanup_inactive_session(session_id)
+    return None
 
-        except Exception as e:
-            logging.error(f"会话监控线程错误: {e}", exc_info=True)
+
+def purge_expired_session_store(_key):
+    """每天清理一次会话存储中超过7天未访问的会话"""
+    cleanup_expired_sessions()
+    return time.time() + 86400
 
 
 def start_session_monitor():
-    """启动会话不活跃监控"""
-    monitor_thread = threading.Thread(target=monitor_session_inactivity, daemon=True)
-    monitor_thread.start()
-    logging.info("会话监控线程已启动")
+    """启动会话不活跃监控：为当前所有会话登记过期检查，之后新会话在进入 web_sessions 时登记"""
+    global SESSION_CHECK_INTERVAL, SESSION_INACTIVITY_TIMEOUT
+    SESSION_CHECK_INTERVAL, SESSION_INACTIVITY_TIMEOUT = _session_monitor_config()
+    expiry_service.register("session", expire_inactive_session)
+    expiry_service.register("session_store", purge_expired_session_store)
+    for session_id in list(dict.keys(web_sessions)):
+        schedule_session_expiry(session_id)
+    for session_id, _ in web_sessions.cold_items():
+        schedule_session_expiry(session_id)
+    expiry_service.ensure("session_store", "expired", time.time() + 86400)
+    logging.info("会话监控已启动")
+
+
+class SessionFlusher:
+    """
+    会话状态的后台写回器（write-behind）。
+    调用方只需通过 mark_dirty() 标记会话已变更，由后台线程合并同一会话的多次标记，
+    在最多 flush_interval_s 秒后批量调用 save_session_state() 写入会话存储，
+    使请求处理和跑步线程不再在持有 web_sessions_lock 时进行序列化与磁盘写入。
+    被删除的会话记录墓碑（见 mark_deleted），之后的标记和尚未开始的写入都会被丢弃。
+    """
 
+    # 墓碑保留时长：超过该时间后仍在引用已删除会话的线程早已结束
+    TOMBSTONE_TTL_S = 24 * 3600
 
-def _load_session_index():
-    """加载会话索引文件"""
-    try:
-        if os.path.exists(SESSION_INDEX_FILE):
-            with open(SESSION_INDEX_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        logging.warning(f"加载会话索引失败: {e}")
-    return {}
+    def __init__(self, flush_interval_s: float | None = None):
+        if flush_interval_s is None:
+            flush_interval_s = 2.0
+            try:
+                config = configparser.ConfigParser()
+                config.read(CONFIG_FILE, encoding="utf-8")
+                flush_interval_s = config.getfloat(
+                    "System", "session_flush_interval", fallback=flush_interval_s
+                )
+            except Exception as e:
+                logging.warning(f"读取会话写回配置失败，使用默认值: {e}")
+        self.flush_interval_s = max(0.0, flush_interval_s)
+        self._cond = threading.Condition()
+        self._dirty = {}
+        self._flushing = collections.Counter()  # session_id -> 正在写入的次数
+        self._tombstones = {}  # session_id -> 删除时间
+        self._thread = None
+        self.flushed_count = 0
+
+    def mark_dirty(self, session_id, api_instance):
+        """标记会话需要保存；同一会话在写入前的多次标记会被合并，截止时间以第一次标记为准"""
+        if not session_id or session_id == "null" or api_instance is None:
+            return
+        with self._cond:
+            if session_id in self._tombstones:
+                return
+            if session_id in self._dirty:
+                self._dirty[session_id] = (api_instance, self._dirty[session_id][1])
+            else:
+                self._dirty[session_id] = (api_instance, time.time() + self.flush_interval_s)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._flush_loop, daemon=True, name="SessionFlusher"
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def discard(self, session_id):
+        """丢弃尚未写入的变更（调用方随后自行同步保存）"""
+        with self._cond:
+            self._dirty.pop(session_id, None)
+
+    def mark_deleted(self, session_id, timeout: float = 10.0):
+        """
+        会话被删除时调用（须在从会话存储删除之前）：丢弃尚未写入的变更，记录墓碑使之后的标记
+        和尚未开始的写入被跳过，并等待该会话正在进行的写入完成，避免删除后又被写回。
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            self._dirty.pop(session_id, None)
+            now = time.time()
+            self._tombstones = {
+                sid: deleted_at
+                for sid, deleted_at in self._tombstones.items()
+                if now - deleted_at < self.TOMBSTONE_TTL_S
+            }
+            self._tombstones[session_id] = now
+            while self._flushing[session_id] and time.time() < deadline:
+                self._cond.wait(timeout=max(0.01, deadline - time.time()))
 
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._dirty)
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    due = [sid for sid, (_, deadline) in self._dirty.items() if deadline <= now]
+                    if due:
+                        break
+                    if not self._dirty:
+                        self._cond.wait(timeout=60)
+                        if not self._dirty:
+                            self._thread = None
+                            return
+                        continue
+                    next_deadline = min(deadline for _, deadline in self._dirty.values())
+                    self._cond.wait(timeout=max(0.01, next_deadline - now))
+                batch = [(sid, self._dirty.pop(sid)[0]) for sid in due]
+                self._flushing.update(sid for sid, _ in batch)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        """依次写入批次中的会话（调用前已计入 _flushing），每写完一个立即撤销其写入中标记"""
+        for session_id, api_instance in batch:
+            try:
+                with self._cond:
+                    if session_id in self._tombstones:
+                        continue
+                save_session_state(session_id, api_instance, force_save=True)
+                self.flushed_count += 1
+            except Exception as e:
+                logging.error(f"[会话写回] 保存会话 {session_id[:16]}... 失败: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    self._flushing[session_id] -= 1
+                    if self._flushing[session_id] <= 0:
+                        del self._flushing[session_id]
+                    self._cond.notify_all()
+
+    def flush_all(self, timeout: float = 10.0):
+        """立即写入所有待保存的会话（用于退出前），并等待正在进行的写入完成"""
+        with self._cond:
+            batch = [(sid, api) for sid, (api, _) in self._dirty.items()]
+            self._dirty.clear()
+            self._flushing.update(sid for sid, _ in batch)
+        self._write_batch(batch)
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._flushing and time.time() < deadline:
+                self._cond.wait(timeout=max(0.01, deadline - time.time()))
 
-def _save_session_index(index):
-    """保存会话索引文件"""
-    try:
-        with open(SESSION_INDEX_FILE, "w", encoding="utf-8") as f:
-            json.dump(index, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logging.error(f"保存会话索引失败: {e}")
+
+def mark_session_dirty(session_id, api_instance):
+    """标记会话状态已变更，由后台写回器在短时间内合并保存"""
+    session_flusher.mark_dirty(session_id, api_instance)
+
+
+SESSION_LOCK_STRIPES = 64
+
+
+def _session_stripe_lock(session_id: str):
+    """按会话ID散列到固定数量的条带锁之一，避免为每个会话创建并永久保留一把锁"""
+    digest = hashlib.sha256(session_id.encode()).digest()
+    return session_file_locks[int.from_bytes(digest[:4], "little") % SESSION_LOCK_STRIPES]
 
 
 def save_session_state(session_id, api_instance, force_save=False):
     """
-    将会话状态保存到文件（完整版：保存所有应用状态包括离线任务数据）
+    将会话状态保存到会话存储（完整版：保存所有应用状态包括离线任务数据）
+
+    采用增量检查点：与该 Api 实例上一次写入的内容相比，状态未变化时只刷新 last_accessed；
+    各任务的几何坐标按 RunData.geometry_fingerprint() 判断，只重写发生变化的任务。
 
     Args:
         session_id: 会话UUID
@@ -9867,18 +12858,17 @@ def save_session_state(session_id, api_instance, force_save=False):
         logging.warning(f"拒绝保存会话：无效的 session_id: '{session_id}'")
         return
     try:
-        session_hash = hashlib.sha256(session_id.encode()).hexdigest()
-        session_file = os.path.join(SESSION_STORAGE_DIR, f"{session_hash}.json")
-        with session_file_locks_lock:
-            if session_hash not in session_file_locks:
-                session_file_locks[session_hash] = threading.Lock()
-            file_lock = session_file_locks[session_hash]
-        with file_lock:
+        with _session_stripe_lock(session_id):
             if not force_save:
                 last_save_time = getattr(api_instance, "_last_session_save_time", 0)
                 if time.time() - last_save_time < 2.0:
                     return
             api_instance._last_session_save_time = time.time()
+            if not hasattr(api_instance, "_session_created_at"):
+                api_instance._session_created_at = time.time()
+            checkpoint = getattr(api_instance, "_session_checkpoint", None)
+            if not checkpoint or checkpoint.get("session_id") != session_id:
+                checkpoint = {"session_id": session_id, "state_digest": None, "geometry": {}}
             state = {
                 "session_id": session_id,
                 "school_account_logged_in": getattr(
@@ -9886,9 +12876,7 @@ def save_session_state(session_id, api_instance, force_save=False):
                 ),
                 "login_success": getattr(api_instance, "login_success", False),
                 "user_info": getattr(api_instance, "user_info", None),
-                "created_at": getattr(api_instance, "_session_created_at", time.time()),
-                "last_accessed": time.time(),
-                "last_saved": time.time(),
+                "created_at": api_instance._session_created_at,
             }
             if hasattr(api_instance, "auth_username"):
                 state["auth_username"] = api_instance.auth_username
@@ -9920,9 +12908,18 @@ def save_session_state(session_id, api_instance, force_save=False):
                 }
             if hasattr(api_instance, "current_run_idx"):
                 state["current_run_idx"] = api_instance.current_run_idx
+            changed_geometry = {}
+            geometry_fingerprints = {}
             if hasattr(api_instance, "all_run_data") and api_instance.all_run_data:
                 loaded_tasks = []
-                for run_data in api_instance.all_run_data:
+                for task_index, run_data in enumerate(api_instance.all_run_data):
+                    fingerprint = run_data.geometry_fingerprint()
+                    geometry_fingerprints[task_index] = fingerprint
+                    if checkpoint["geometry"].get(task_index) != fingerprint:
+                        changed_geometry[task_index] = {
+                            field: getattr(run_data, field)
+                            for field in RunData.GEOMETRY_FIELDS
+                        }
                     task_dict = {
                         "run_name": getattr(run_data, "run_name", ""),
                         "errand_id": getattr(run_data, "errand_id", ""),
@@ -9935,15 +12932,9 @@ def save_session_state(session_id, api_instance, force_save=False):
                         "total_run_distance_m": getattr(
                             run_data, "total_run_distance_m", 0.0
                         ),
-                        "target_points": getattr(run_data, "target_points", []),
                         "target_point_names": getattr(
                             run_data, "target_point_names", ""
                         ),
-                        "recommended_coords": getattr(
-                            run_data, "recommended_coords", []
-                        ),
-                        "draft_coords": getattr(run_data, "draft_coords", []),
-                        "run_coords": getattr(run_data, "run_coords", []),
                         "target_sequence": getattr(run_data, "target_sequence", 0),
                         "is_in_target_zone": getattr(
                             run_data, "is_in_target_zone", False
@@ -9990,45 +12981,8 @@ def save_session_state(session_id, api_instance, force_save=False):
                             "status_text": getattr(
                                 account_session, "status_text", "待命"
                             ),
-                            "is_first_login_verified": getattr(
-                                account_session, "is_first_login_verified", False
-                            ),
-                            "school_account_logged_in": bool(
-                                getattr(account_session, "user_data", None)
-                                and getattr(account_session.user_data, "id", "")
-                            )
-                            and getattr(
-                                account_session, "is_first_login_verified", False
-                            ),
-                            "summary": getattr(account_session, "summary", {}),
-                        }
-                        if hasattr(account_session, "params"):
-                            account_state["params"] = account_session.params
-
-                        multi_account_states[username] = account_state
-
-                    except Exception as e:
-                        logging.warning(f"保存账号 {username} 状态时出错: {e}")
-                        continue
-
-                state["multi_account_states"] = multi_account_states
-                state["multi_account_usernames"] = list(
-                    getattr(api_instance, "accounts", {}).keys()
-                )
-                if hasattr(api_instance, "global_params"):
-                    global_params_to_save = api_instance.global_params.copy()
-                    if "amap_js_key" in global_params_to_save:
-                        del global_params_to_save["amap_js_key"]
-                    state["multi_global_params"] = global_params_to_save
-                else:
-                    state["multi_global_params"] = {}
-                multi_account_states = {}
-                accounts = getattr(api_instance, "accounts", {})
-                for username, account_session in accounts.items():
-                    try:
-                        account_state = {
-                            "status_text": getattr(
-                                account_session, "status_text", "待命"
+                            "is_first_login_verified": getattr(
+                                account_session, "is_first_login_verified", False
                             ),
                             "school_account_logged_in": bool(
                                 getattr(account_session, "user_data", None)
@@ -10049,6 +13003,9 @@ def save_session_state(session_id, api_instance, force_save=False):
                         continue
 
                 state["multi_account_states"] = multi_account_states
+                state["multi_account_usernames"] = list(
+                    getattr(api_instance, "accounts", {}).keys()
+                )
                 state["multi_dashboard_info"] = {
                     "total_accounts": len(accounts),
                     "running_accounts": sum(
@@ -10118,11 +13075,39 @@ def save_session_state(session_id, api_instance, force_save=False):
                 state["ui_state"] = api_instance.ui_state
             if hasattr(api_instance, "user_settings"):
                 state["user_settings"] = api_instance.user_settings
-            with open(session_file, "w", encoding="utf-8") as f:
-                json.dump(state, f, indent=2, ensure_ascii=False)
-            index = _load_session_index()
-            index[session_id] = session_hash
-            _save_session_index(index)
+            state_json = json.dumps(state, ensure_ascii=False)
+            state_digest = hashlib.sha1(state_json.encode("utf-8")).hexdigest()
+            incremental = checkpoint["state_digest"] is not None
+            written = session_store.put(
+                session_id,
+                state if state_digest != checkpoint["state_digest"] else None,
+                geometry=changed_geometry,
+                task_count=len(geometry_fingerprints),
+                state_json=state_json,
+                incremental=incremental,
+            )
+            if not written:
+                session_store.put(
+                    session_id,
+                    state,
+                    geometry={
+                        index: {
+                            field: getattr(run_data, field)
+                            for field in RunData.GEOMETRY_FIELDS
+                        }
+                        for index, run_data in enumerate(
+                            getattr(api_instance, "all_run_data", [])
+                        )
+                    },
+                    task_count=len(geometry_fingerprints),
+                    state_json=state_json,
+                )
+            api_instance._session_checkpoint = {
+                "session_id": session_id,
+                "state_digest": state_digest,
+                "geometry": geometry_fingerprints,
+            }
+            api_instance._session_state_bytes = len(state_json)
 
             tasks_count = len(state.get("loaded_tasks", []))
             logging.debug(
@@ -10133,30 +13118,10 @@ def save_session_state(session_id, api_instance, force_save=False):
 
 
 def load_session_state(session_id):
-    """从文件加载会话状态"""
+    """从会话存储加载会话状态"""
     try:
-        index = _load_session_index()
-        if session_id in index:
-            session_hash = index[session_id]
-            logging.debug(
-                f"从索引找到会话哈希: {session_id[:32]}... -> {session_hash[:16]}..."
-            )
-        else:
-            session_hash = hashlib.sha256(session_id.encode()).hexdigest()
-            logging.debug(
-                f"索引中未找到，计算会话哈希: {session_id[:32]}... -> {session_hash[:16]}..."
-            )
-
-        session_file = os.path.join(SESSION_STORAGE_DIR, f"{session_hash}.json")
-
-        if os.path.exists(session_file):
-            with session_file_locks_lock:
-                if session_hash not in session_file_locks:
-                    session_file_locks[session_hash] = threading.Lock()
-                file_lock = session_file_locks[session_hash]
-            with file_lock:
-                with open(session_file, "r", encoding="utf-8") as f:
-                    state = json.load(f)
+        state = session_store.get(session_id)
+        if state:
             if state.get("session_id") == session_id:
                 last_accessed = state.get("last_accessed", 0)
                 session_age_days = (time.time() - last_accessed) / 86400
@@ -10167,19 +13132,19 @@ def load_session_state(session_id):
                         f"[会话管理] 会话已过期 --> 会话ID: {session_id[:32]}..., 最后访问: {session_age_days:.1f}天前, 最大保留期限: {max_age_days}天, 将被自动清理"
                     )
                     try:
-                        os.remove(session_file)
-                        logging.info(f"[会话管理] 已删除过期会话文件: {session_file}")
+                        session_store.delete(session_id)
+                        logging.info(f"[会话管理] 已删除过期会话: {session_id[:32]}...")
                     except Exception as remove_err:
-                        logging.error(f"[会话管理] 删除过期会话文件失败: {remove_err}")
+                        logging.error(f"[会话管理] 删除过期会话失败: {remove_err}")
                     return None
 
                 tasks_count = len(state.get("loaded_tasks", []))
                 logging.info(
-                    f"[会话管理] 从文件加载会话 --> 会话ID: {session_id[:32]}..., 登录状态: {state.get('login_success')}, 任务数: {tasks_count}, 最后访问: {session_age_days:.1f}天前"
+                    f"[会话管理] 从会话存储加载会话 --> 会话ID: {session_id[:32]}..., 登录状态: {state.get('login_success')}, 任务数: {tasks_count}, 最后访问: {session_age_days:.1f}天前"
                 )
                 return state
             else:
-                logging.warning(f"[会话管理] 会话文件UUID不匹配，忽略")
+                logging.warning(f"[会话管理] 会话记录UUID不匹配，忽略")
     except Exception as e:
         logging.error(f"[会话管理] 加载会话状态失败 --> 错误: {e}", exc_info=True)
     return None
@@ -10187,52 +13152,15 @@ def load_session_state(session_id):
 
 def cleanup_expired_sessions():
     """
-    清理过期的会话文件（7天未访问）
+    清理过期的会话（7天未访问）
 
-    此函数遍历所有会话文件，删除超过7天未访问的会话。
+    依赖 sessions 表上 last_accessed 列的索引，单条 DELETE 即可完成。
     """
     try:
-        if not os.path.exists(SESSION_STORAGE_DIR):
-            return
-
         max_age_days = 7
-        max_age_seconds = max_age_days * 86400
-        current_time = time.time()
-        cleaned_count = 0
-        error_count = 0
-
         logging.info(f"[会话清理] 开始清理过期会话 --> 最大保留期限: {max_age_days}天")
-
-        for filename in os.listdir(SESSION_STORAGE_DIR):
-            if not filename.endswith(".json") or filename == "_index.json":
-                continue
-
-            session_file = os.path.join(SESSION_STORAGE_DIR, filename)
-
-            try:
-                with open(session_file, "r", encoding="utf-8") as f:
-                    state = json.load(f)
-
-                last_accessed = state.get("last_accessed", 0)
-                if current_time - last_accessed > max_age_seconds:
-                    session_id = state.get("session_id", "unknown")[:32]
-                    age_days = (current_time - last_accessed) / 86400
-
-                    os.remove(session_file)
-                    cleaned_count += 1
-                    logging.info(
-                        f"[会话清理] 已删除过期会话 --> 会话ID: {session_id}..., 文件: {filename}, 年龄: {age_days:.1f}天"
-                    )
-
-            except Exception as e:
-                error_count += 1
-                logging.debug(
-                    f"[会话清理] 处理会话文件失败 --> 文件: {filename}, 错误: {e}"
-                )
-
-        logging.info(
-            f"[会话清理] 清理完成 --> 已删除: {cleaned_count}个过期会话, 错误: {error_count}个"
-        )
+        cleaned_count = session_store.delete_expired(max_age_days * 86400)
+        logging.info(f"[会话清理] 清理完成 --> 已删除: {cleaned_count}个过期会话")
 
     except Exception as e:
         logging.error(f"[会话清理] 清理过期会话失败 --> 错误: {e}", exc_info=True)
@@ -10282,19 +13210,22 @@ def restore_session_to_api_instance(api_instance, state):
                 run_data.total_run_distance_m = task_dict.get(
                     "total_run_distance_m", 0.0
                 )
-                run_data.target_points = [
-                    tuple(p) for p in task_dict.get("target_points", [])
-                ]
+                if "geometry_source" in task_dict:
+                    run_data.attach_geometry_source(task_dict["geometry_source"])
+                else:
+                    run_data.target_points = [
+                        tuple(p) for p in task_dict.get("target_points", [])
+                    ]
+                    run_data.recommended_coords = [
+                        tuple(p) for p in task_dict.get("recommended_coords", [])
+                    ]
+                    run_data.draft_coords = [
+                        tuple(p) for p in task_dict.get("draft_coords", [])
+                    ]
+                    run_data.run_coords = [
+                        tuple(p) for p in task_dict.get("run_coords", [])
+                    ]
                 run_data.target_point_names = task_dict.get("target_point_names", "")
-                run_data.recommended_coords = [
-                    tuple(p) for p in task_dict.get("recommended_coords", [])
-                ]
-                run_data.draft_coords = [
-                    tuple(p) for p in task_dict.get("draft_coords", [])
-                ]
-                run_data.run_coords = [
-                    tuple(p) for p in task_dict.get("run_coords", [])
-                ]
                 run_data.target_sequence = task_dict.get("target_sequence", 0)
                 run_data.is_in_target_zone = task_dict.get("is_in_target_zone", False)
                 run_data.trid = task_dict.get("trid", "")
@@ -10302,6 +13233,16 @@ def restore_session_to_api_instance(api_instance, state):
                 run_data.distance_covered_m = task_dict.get("distance_covered_m", 0.0)
 
                 api_instance.all_run_data.append(run_data)
+            # 延迟加载的几何坐标与存储中一致，记入检查点以免下次保存时被加载并重写
+            api_instance._session_checkpoint = {
+                "session_id": state.get("session_id"),
+                "state_digest": None,
+                "geometry": {
+                    index: run_data.geometry_fingerprint()
+                    for index, run_data in enumerate(api_instance.all_run_data)
+                    if "_geometry_source" in run_data.__dict__
+                },
+            }
         if "current_run_idx" in state:
             api_instance.current_run_idx = state["current_run_idx"]
         if "is_offline_mode" in state:
@@ -10635,95 +13576,140 @@ def resize_captcha_html(html_content, target_width):
         return html_content
 
 
+def hydrate_session(session_id):
+    """
+    从会话存储恢复单个会话的 Api 实例，失败时删除损坏的会话并返回 None。
+
+    由 SessionRegistry 在首次访问冷会话时调用，调用方可能已持有 web_sessions_lock，
+    因此这里不能再获取该锁。
+    """
+    try:
+        state = session_store.get(session_id)
+        if not state:
+            raise ValueError("会话数据损坏")
+        if state.get("session_id") != session_id:
+            raise ValueError("会话数据中的 session_id 不匹配")
+        api_instance = Api(args)
+        api_instance._session_created_at = state.get("created_at", time.time())
+        api_instance._web_session_id = session_id
+        restore_session_to_api_instance(api_instance, state)
+        session_activity.setdefault(session_id, state.get("last_accessed", 0))
+        logging.info(
+            f"成功恢复会话: {session_id}... (用户: {api_instance.auth_username if hasattr(api_instance, 'auth_username') else 'Unknown'})"
+        )
+        return api_instance
+    except (
+        ValueError,
+        KeyError,
+        TypeError,
+        AttributeError,
+    ) as e:
+        logging.error(f"加载或恢复会话 {session_id[:8]}... 失败: {e}", exc_info=False)
+        logging.warning(f"将删除损坏的/无法恢复的会话: {session_id[:8]}...")
+    except Exception as e:
+        logging.error(
+            f"处理会话 {session_id[:8]}... 时发生未知错误: {e}", exc_info=True
+        )
+    try:
+        session_store.delete(session_id)
+    except Exception as remove_err:
+        logging.error(f"删除损坏的会话 {session_id[:8]}... 失败: {remove_err}")
+    return None
+
+
 def load_all_sessions(args):
-    """启动时加载所有持久化会话"""
-    if not os.path.exists(SESSION_STORAGE_DIR):
-        return
-    index = _load_session_index()
-    new_index = {}
+    """
+    启动时加载所有持久化会话
 
-    successful_sessions = {}
+    只读取会话索引：有后台活动（跑步中、自动签到）的会话立即恢复以重启后台线程，
+    其余会话登记为冷会话，在第一次被访问时才恢复。
+    """
+    expired_count = session_store.delete_expired(7 * 24 * 3600)
+    if expired_count:
+        logging.info(f"清理过期会话: {expired_count} 个")
 
     loaded_count = 0
-    for filename in os.listdir(SESSION_STORAGE_DIR):
-        if filename == "_index.json":
+    cold_count = 0
+    for meta in session_store.list_index():
+        session_id = meta["session_id"]
+        if not meta["background_active"]:
+            web_sessions.add_cold(session_id, meta)
+            cold_count += 1
+            continue
+        api_instance = hydrate_session(session_id)
+        if api_instance is None:
             continue
+        web_sessions[session_id] = api_instance
+        session_activity[session_id] = meta["last_accessed"]
+        loaded_count += 1
 
-        if filename.endswith(".json"):
-            session_file = os.path.join(SESSION_STORAGE_DIR, filename)
-            session_id = None
-            session_hash = filename[:-5]
-            try:
-                with open(session_file, "r", encoding="utf-8") as f:
-                    state = json.load(f)
+    if loaded_count > 0 or cold_count > 0:
+        logging.info(
+            f"共加载 {loaded_count} 个有后台活动的持久化会话，{cold_count} 个会话将在首次访问时恢复"
+        )
 
-                session_id = state.get("session_id")
-                if not session_id:
-                    raise ValueError(f"文件 {filename} 缺少 session_id")
-                last_accessed = state.get("last_accessed", 0)
-                if time.time() - last_accessed > 7 * 24 * 3600:
-                    logging.info(
-                        f"清理过期会话: {session_id[:8]}... (文件: {filename})"
-                    )
-                    try:
-                        os.remove(session_file)
-                    except Exception as remove_err:
-                        logging.error(f"删除过期会话文件 {filename} 失败: {remove_err}")
-                    continue
-                api_instance = Api(args)
-                api_instance._session_created_at = state.get("created_at", time.time())
-                api_instance._web_session_id = session_id
-                restore_session_to_api_instance(api_instance, state)
-                logging.info(
-                    f"成功恢复会话: {session_id}... (用户: {api_instance.auth_username if hasattr(api_instance, 'auth_username') else 'Unknown'}, 文件: {filename})"
-                )
-                web_sessions[session_id] = api_instance
-                session_activity[session_id] = last_accessed
-                successful_sessions[session_id] = session_hash
-                loaded_count += 1
 
-            except (
-                json.JSONDecodeError,
-                ValueError,
-                KeyError,
-                TypeError,
-                AttributeError,
-            ) as e:
-                logging.error(
-                    f"加载或恢复会话文件 {filename} 失败: {e}", exc_info=False
-                )
-                logging.warning(f"将删除损坏的/无法恢复的会话文件: {filename}")
-                try:
-                    os.remove(session_file)
-                except Exception as remove_err:
-                    logging.error(f"删除损坏的会话文件 {filename} 失败: {remove_err}")
-                continue
-            except Exception as e:
-                logging.error(
-                    f"处理会话文件 {filename} 时发生未知错误: {e}", exc_info=True
-                )
-                try:
-                    os.remove(session_file)
-                except Exception as remove_err:
-                    logging.error(
-                        f"删除未知错误的会话文件 {filename} 失败: {remove_err}"
-                    )
-                continue
-    if successful_sessions:
-        _save_session_index(successful_sessions)
-        logging.info(f"会话索引已更新，包含 {len(successful_sessions)} 个有效会话")
-    elif not any(
-        f.endswith(".json") and f != "_index.json"
-        for f in os.listdir(SESSION_STORAGE_DIR)
-    ):
-        _save_session_index({})
-        logging.info("会话目录为空，已清空会话索引。")
-    if new_index:
-        _save_session_index(new_index)
-        logging.debug(f"会话索引已更新，包含 {len(new_index)} 个有效会话")
+def resume_journaled_runs():
+    """
+    启动时根据残留的任务预写日志恢复被中断的跑步任务。
+    仅恢复单账号模式的会话；会话已不存在或任务已变化的日志直接丢弃。
+    """
+    states = RunJournal.list_unfinished()
+    if not states:
+        logging.info("未发现需要恢复的中断任务。")
+        return
+
+    resumed_count = 0
+    for state in states:
+        journal = RunJournal(state["path"])
+        session_id = state.get("session_id")
+        task_index = state.get("task_index", -1)
+        with web_sessions_lock:
+            api_instance = web_sessions.get(session_id)
+        if api_instance is None or getattr(api_instance, "is_multi_account_mode", False):
+            logging.info(f"中断任务所属会话不可用，丢弃预写日志: {state['path']}")
+            journal.discard()
+            continue
+        if not (0 <= task_index < len(api_instance.all_run_data)):
+            logging.info(f"中断任务索引已失效，丢弃预写日志: {state['path']}")
+            journal.discard()
+            continue
+        run_data = api_instance.all_run_data[task_index]
+        if run_data.errand_schedule != state.get("errand_schedule"):
+            logging.info(f"中断任务与会话中的任务不一致，丢弃预写日志: {state['path']}")
+            journal.discard()
+            continue
+        if api_instance._has_live_submission():
+            # 同一 trid 的日志由正在运行的提交线程持有，结束时由它删除
+            if run_data.trid != state.get("trid"):
+                logging.info(f"会话已有任务在运行，丢弃预写日志: {state['path']}")
+                journal.discard()
+            continue
+
+        # 使用日志中的轨迹，保证续跑的点与已提交的点属于同一条轨迹
+        run_data.run_coords = [tuple(p) for p in state["run_coords"]]
+        run_data.total_run_time_s = state.get("total_run_time_s", run_data.total_run_time_s)
+        run_data.total_run_distance_m = state.get(
+            "total_run_distance_m", run_data.total_run_distance_m
+        )
+        run_data.target_sequence = 0
+        run_data.is_in_target_zone = False
+        api_instance.current_run_idx = task_index
+        api_instance.stop_run_flag.clear()
 
-    if loaded_count > 0:
-        logging.info(f"共加载 {loaded_count} 个持久化会话")
+        threading.Thread(
+            target=api_instance._run_submission_thread,
+            args=(run_data, task_index, api_instance.api_client, False),
+            kwargs={"resume": state},
+            daemon=True,
+        ).start()
+        resumed_count += 1
+        logging.info(
+            f"已恢复中断任务: 会话={session_id[:8]}..., 任务={run_data.run_name}, "
+            f"trid={state['trid']}, 已确认点数={state['acked_offset']}/{len(run_data.run_coords)}"
+        )
+
+    logging.info(f"共恢复 {resumed_count} 个中断的跑步任务。")
 
 
 class BackgroundTaskManager:
@@ -10737,6 +13723,7 @@ class BackgroundTaskManager:
         )
         if not os.path.exists(self.task_storage_dir):
             os.makedirs(self.task_storage_dir)
+        self.task_max_age_s = 24 * 3600
         logging.info("BackgroundTaskManager initialized")
 
     def _get_task_file_path(self, session_id):
@@ -10750,6 +13737,11 @@ class BackgroundTaskManager:
         try:
             with open(task_file, "w", encoding="utf-8") as f:
                 json.dump(task_state, f, indent=2, ensure_ascii=False)
+            expiry_service.ensure(
+                "background_task",
+                task_file,
+                task_state.get("last_update", time.time()) + self.task_max_age_s,
+            )
             logging.debug(f"后台任务状态已保存，会话ID: {session_id}")
         except Exception as e:
             logging.error(f"保存后台任务状态失败: {e}")
@@ -11373,29 +14365,39 @@ class BackgroundTaskManager:
                 return {"success": True, "message": "后台任务已停止"}
             return {"success": False, "message": "未找到运行中的后台任务"}
 
-    def cleanup_old_tasks(self, max_age_hours=24):
-        """清理旧的任务状态文件"""
+    def expire_task_file(self, filepath):
+        """任务状态文件到期时调用：仍在更新的任务按 last_update 顺延，否则删除文件"""
         try:
-            current_time = time.time()
-            max_age_seconds = max_age_hours * 3600
-
-            for filename in os.listdir(self.task_storage_dir):
-                if not filename.endswith(".json"):
-                    continue
-
-                filepath = os.path.join(self.task_storage_dir, filename)
-                try:
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        task_state = json.load(f)
+            with open(filepath, "r", encoding="utf-8") as f:
+                task_state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"处理任务文件失败，文件名: {os.path.basename(filepath)}，错误: {e}")
+            task_state = {}
+        deadline = task_state.get("last_update", 0) + self.task_max_age_s
+        if deadline > time.time():
+            return deadline
+        try:
+            os.remove(filepath)
+            logging.info(f"已删除旧的任务状态文件: {os.path.basename(filepath)}")
+        except FileNotFoundError:
+            pass
+        return None
 
-                    last_update = task_state.get("last_update", 0)
-                    if current_time - last_update > max_age_seconds:
-                        os.remove(filepath)
-                        logging.info(f"已删除旧的任务状态文件: {filename}")
-                except Exception as e:
-                    logging.warning(f"处理任务文件失败，文件名: {filename}，错误: {e}")
+    def schedule_expiry(self):
+        """向 ExpiryService 登记任务状态文件的过期清理，已有文件按修改时间推算"""
+        expiry_service.register("background_task", self.expire_task_file)
+        try:
+            for entry in os.scandir(self.task_storage_dir):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    expiry_service.ensure(
+                        "background_task",
+                        entry.path,
+                        entry.stat().st_mtime + self.task_max_age_s,
+                    )
         except Exception as e:
-            logging.error(f"清理旧任务文件失败，异常信息: {e}")
+            logging.error(f"登记任务文件过期清理失败，异常信息: {e}")
 
 
 class MicroPixelCaptcha:
@@ -12661,11 +15663,524 @@ def get_ssl_certificate_info(cert_path):
     return cert_info
 
 
+def file_stamp(path):
+    """返回文件的 (mtime_ns, size)，文件不存在时返回 None，用作缓存版本号"""
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def build_static_entry(body: bytes, mimetype: str, last_modified: float | None = None) -> dict:
+    """为一份静态响应体预先计算 ETag（内容摘要）与 gzip / brotli（可选）压缩版本"""
+    digest = hashlib.sha256(body).hexdigest()
+    entry = {
+        "body": body,
+        "gzip": gzip.compress(body, compresslevel=9),
+        "br": None,
+        "digest": digest,
+        "version": digest[:12],
+        "mimetype": mimetype,
+        "last_modified": last_modified or time.time(),
+    }
+    try:
+        import brotli
+
+        entry["br"] = brotli.compress(body, quality=11)
+    except ImportError:
+        pass
+    return entry
+
+
+def send_static_entry(entry: dict, cache_control: str):
+    """
+    按请求头返回预先计算好的静态内容：
+    支持 Accept-Encoding 协商（gzip，不同编码使用不同 ETag），
+    以及 If-None-Match / If-Modified-Since 条件请求（命中时返回 304）。
+    """
+    etag = entry["digest"][:32]
+    body = entry["body"]
+    encoding = None
+    if entry.get("br") and "br" in request.accept_encodings and len(entry["br"]) < len(body):
+        body, encoding, etag = entry["br"], "br", f"{etag}-br"
+    elif "gzip" in request.accept_encodings and len(entry["gzip"]) < len(body):
+        body, encoding, etag = entry["gzip"], "gzip", f"{etag}-gz"
+
+    response = make_response(body)
+    response.headers["Content-Type"] = entry["mimetype"]
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.last_modified = datetime.datetime.fromtimestamp(
+        entry["last_modified"], tz=datetime.timezone.utc
+    )
+    return response.make_conditional(request)
+
+
+# 从 index.html 中拆分出的前端功能模块：模块名 -> 该模块包含的顶层元素 id
+FRONTEND_MODULES = {
+    "admin-panel": [
+        "admin-panel-modal",
+        "mobile-multi-admin-panel-modal",
+        "mobile-create-user-modal",
+    ],
+    "multi-account": ["multi-account-app", "mobile-manual-account-modal"],
+    "captcha-sms-admin": [
+        "verification-codes-modal",
+        "admin-modify-phone-modal",
+        "sms-test-modal",
+        "captcha-detail-modal",
+        "mobile-captcha-history-modal",
+    ],
+    "map-tools": ["mobile-track-modal", "mobile-map-attendance-modal"],
+}
+
+
+def _find_element_span(html: str, element_id: str):
+    """
+    返回 id 为 element_id 的元素在 html 中的 (起始, 结束) 位置。
+    按同名标签的嵌套层数匹配结束标签，跳过 HTML 注释；找不到或不平衡时返回 None。
+    """
+    start_match = re.search(rf'<(\w+)\b[^>]*\bid="{re.escape(element_id)}"[^>]*>', html)
+    if not start_match:
+        return None
+    tag = start_match.group(1)
+    depth = 0
+    for match in re.finditer(
+        rf"<!--.*?-->|<(/?){tag}\b[^>]*>", html[start_match.start():], re.DOTALL
+    ):
+        if match.group(0).startswith("<!--"):
+            continue
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return start_match.start(), start_match.start() + match.end()
+    return None
+
+
+def split_frontend_modules(html: str, modules: dict):
+    """
+    把 index.html 中的功能模块（隐藏的管理面板、多账号面板等）拆分为独立脚本。
+
+    原位置替换为 <template data-fragment-slot="id"> 占位，模块脚本以 defer 方式在
+    scripts/main.js 之前执行并把 HTML 插回占位处：首屏只需解析外壳页面，模块脚本可单独
+    长期缓存，而 main.js 初始化时依然能找到全部元素，DOMContentLoaded 的时序也不变。
+
+    返回 (外壳 HTML, {模块名: 模块脚本内容})；无法定位的元素保留在外壳中。
+    """
+    bundles = {}
+    for name, element_ids in modules.items():
+        parts = {}
+        for element_id in element_ids:
+            span = _find_element_span(html, element_id)
+            if span is None:
+                logging.warning(f"[前端模块] 未找到元素 #{element_id}，保留在页面中")
+                continue
+            start, end = span
+            parts[element_id] = html[start:end]
+            html = f'{html[:start]}<template data-fragment-slot="{element_id}"></template>{html[end:]}'
+        if not parts:
+            continue
+        payload = json.dumps(parts, ensure_ascii=False).replace("</", "<\\/")
+        bundles[name] = (
+            f"// 前端模块: {name}（由服务器从 index.html 拆分生成）\n"
+            "(function () {\n"
+            f"  var parts = {payload};\n"
+            "  Object.keys(parts).forEach(function (id) {\n"
+            "    var slot = document.querySelector('template[data-fragment-slot=\"' + id + '\"]');\n"
+            "    if (slot) {\n"
+            "      slot.insertAdjacentHTML(\"beforebegin\", parts[id]);\n"
+            "      slot.remove();\n"
+            "    }\n"
+            "  });\n"
+            "})();\n"
+        )
+
+    if bundles:
+        module_scripts = "".join(
+            f'<script src="/fragments/{name}.js" defer=""></script>\n    '
+            for name in bundles
+        )
+        marker = '<script src="scripts/main.js"'
+        if marker in html:
+            html = html.replace(marker, f"{module_scripts}{marker}", 1)
+        else:
+            html = html.replace("</body>", f"{module_scripts}</body>", 1)
+    return html, bundles
+
+
+class RenderedPageCache:
+    """
+    首页（/）与会话页（/uuid=<uuid>）的预渲染缓存。
+
+    index.html 不含模板语法，两者唯一的差异来源是注入的 window.APP_CONFIG，
+    因此按 config.ini 的版本（修改时间与大小）缓存注入配置后的页面字节、gzip 版本与 ETag，
+    配置文件变化后的首次请求才重新生成，不再每次请求都让 Jinja 解析整页。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+        self._stamp = None
+        self._asset_urls = None
+
+    def get(self, html: str, config_loader, asset_urls: dict | None = None) -> dict:
+        """
+        asset_urls: 页面中引用的资源地址 -> 带内容版本号的地址，
+        资源内容变化时映射随之变化，页面缓存也会重新生成。
+        """
+        entry = self._entry
+        if (
+            entry is not None
+            and asset_urls == self._asset_urls
+            and file_stamp(CONFIG_FILE) == self._stamp
+        ):
+            return entry
+        with self._lock:
+            if (
+                self._entry is not None
+                and asset_urls == self._asset_urls
+                and file_stamp(CONFIG_FILE) == self._stamp
+            ):
+                return self._entry
+            app_config = config_loader()
+            config_script = f"""
+        <script>
+            window.APP_CONFIG = {json.dumps(app_config)};
+        </script>
+        """
+            page = html.replace("</body>", f"{config_script}</body>")
+            for url, versioned_url in (asset_urls or {}).items():
+                page = page.replace(f'="{url}"', f'="{versioned_url}"')
+            body = page.encode("utf-8")
+            self._entry = build_static_entry(body, "text/html; charset=utf-8")
+            self._asset_urls = dict(asset_urls or {})
+            # 读取配置时可能会回写配置文件（清理重复项），因此在读取之后再记录版本
+            self._stamp = file_stamp(CONFIG_FILE)
+            logging.info(
+                f"[页面缓存] 已重新生成首页缓存 ({len(body)} 字节, gzip {len(self._entry['gzip'])} 字节)"
+            )
+            return self._entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+            self._stamp = None
+
+
+class StaticAssetManifest:
+    """
+    静态资源清单：scripts/、styles/、favicon 以及内存中的 CDN 缓存文件。
+
+    每个资源只在内容变化时（文件的修改时间/大小，或 CDN 缓存内容对象被替换）重新读取、
+    计算 SHA-256 与 gzip/brotli 压缩体，之后的请求直接返回内存中的字节。
+    页面引用的地址带上 ?v=<内容摘要前12位>，版本号匹配的请求按 immutable 长期缓存，
+    其余请求使用 no-cache + ETag 协商（未变化时返回 304）。
+    """
+
+    IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # 逻辑路径 -> 资源条目
+
+    def file_entry(self, logical_path: str, file_path: str, mimetype: str | None = None):
+        """返回磁盘文件对应的资源条目，文件不存在时返回 None"""
+        stamp = file_stamp(file_path)
+        if stamp is None:
+            return None
+        entry = self._entries.get(logical_path)
+        if entry is not None and entry.get("stamp") == stamp:
+            return entry
+        with open(file_path, "rb") as f:
+            body = f.read()
+        if mimetype is None:
+            mimetype = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+            if mimetype.startswith("text/") or mimetype == "application/javascript":
+                mimetype = f"{mimetype}; charset=utf-8"
+        entry = build_static_entry(body, mimetype, last_modified=os.path.getmtime(file_path))
+        entry["stamp"] = stamp
+        with self._lock:
+            self._entries[logical_path] = entry
+        logging.debug(
+            f"[静态资源] 已构建 {logical_path} (版本 {entry['version']}, {len(body)} 字节, gzip {len(entry['gzip'])} 字节)"
+        )
+        return entry
+
+    def content_entry(self, logical_path: str, content, mimetype: str):
+        """返回内存内容（如 CDN 缓存）对应的资源条目，内容对象未变化时直接复用"""
+        entry = self._entries.get(logical_path)
+        if entry is not None and entry.get("source") is content:
+            return entry
+        body = content.encode("utf-8") if isinstance(content, str) else content
+        entry = build_static_entry(body, mimetype)
+        entry["source"] = content
+        with self._lock:
+            self._entries[logical_path] = entry
+        return entry
+
+    @staticmethod
+    def versioned_url(url: str, entry: dict) -> str:
+        return f"{url}?v={entry['version']}"
+
+    def send(self, entry: dict):
+        """版本号与当前内容一致时长期缓存，否则要求浏览器每次协商"""
+        if request.args.get("v") == entry["version"]:
+            return send_static_entry(entry, self.IMMUTABLE_CACHE_CONTROL)
+        return send_static_entry(entry, "no-cache")
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            entries = list(self._entries.items())
+        return {
+            "assets": len(entries),
+            "raw_bytes": sum(len(e["body"]) for _, e in entries),
+            "gzip_bytes": sum(len(e["gzip"]) for _, e in entries),
+            "brotli_enabled": any(e.get("br") for _, e in entries),
+        }
+
+
+# /api/<method> 调度时需要的细粒度权限（方法名 -> 权限名），未列出的方法不做额外权限检查
+API_METHOD_PERMISSIONS = {
+    # ===== 通知相关权限 =====
+    "mark_notification_read": "mark_notifications_read",
+    "mark_all_read": "mark_notifications_read",
+    "get_notifications": "view_notifications",
+    "get_cached_notifications": "view_notifications",
+    # ===== 签到相关权限 =====
+    "trigger_attendance": "use_attendance",
+    # ===== 多账号管理相关权限 =====
+    "enter_multi_account_mode": "execute_multi_account",
+    "exit_multi_account_mode": "execute_multi_account",
+    "multi_add_account": "execute_multi_account",
+    "multi_remove_account": "execute_multi_account",
+    "multi_remove_selected_accounts": "execute_multi_account",
+    "multi_remove_all_accounts": "execute_multi_account",
+    "multi_get_all_config_users": "execute_multi_account",
+    "multi_load_accounts_from_config": "execute_multi_account",
+    "multi_import_accounts": "execute_multi_account",
+    "multi_export_accounts_summary": "execute_multi_account",
+    "multi_download_import_template": "execute_multi_account",
+    "multi_refresh_all_statuses": "execute_multi_account",
+    "multi_refresh_single_status": "execute_multi_account",
+    "multi_get_all_accounts_status": "execute_multi_account",
+    "multi_get_account_params": "execute_multi_account",
+    "multi_update_account_param": "execute_multi_account",
+    "multi_start_single_account": "execute_multi_account",
+    "multi_start_all_accounts": "execute_multi_account",
+    "multi_stop_single_account": "execute_multi_account",
+    "multi_stop_all_accounts": "execute_multi_account",
+    # ===== 任务管理相关权限 =====
+    "load_tasks": "view_tasks",
+    "get_task_details": "view_tasks",
+    "get_task_history": "view_tasks",
+    "get_historical_track": "view_tasks",
+    "get_run_status": "view_tasks",
+    "create_task": "create_tasks",
+    "delete_task": "delete_tasks",
+    "start_single_run": "start_tasks",
+    "start_all_runs": "start_tasks",
+    "stop_run": "stop_tasks",
+    "stop_current_run": "stop_tasks",
+    "import_offline_file": "import_offline",
+    "import_task_data": "import_offline",
+    "export_offline_file": "export_data",
+    "export_task_data": "export_data",
+    "record_path": "record_path",
+    "set_draft_path": "record_path",
+    "clear_path": "record_path",
+    "process_path": "record_path",
+    "clear_current_task_draft": "record_path",
+    "auto_generate_path": "auto_generate_path",
+    "auto_generate_path_with_api": "auto_generate_path",
+    "update_param": "modify_params",
+    "generate_new_ua": "modify_params",
+    "save_amap_key": "modify_params",
+    # ===== 地图查看权限 =====
+    "get_map_data": "view_map",
+    # ===== 用户信息权限 =====
+    "get_user_info": "view_user_details",
+    "on_user_selected": "view_user_details",
+    "update_user_settings": "modify_user_settings",
+    # ===== 会话管理权限 =====
+    "get_user_sessions": "manage_own_sessions",
+    # ===== 日志权限 =====
+    "get_logs": "view_logs",
+    "clear_logs": "clear_logs",
+}
+
+# Api 上的公开方法中仅供内部调用、不通过 /api/<method> 暴露的部分
+API_INTERNAL_METHODS = frozenset(
+    {
+        "normalize_chinese_config_to_english",
+        "check_target_reached_during_run",
+    }
+)
+
+# 调用成功后需要标记会话待保存的方法
+API_AUTO_SAVE_METHODS = frozenset(
+    {
+        "login",
+        "logout",
+        "load_tasks",
+        "get_task_details",
+        "set_draft_path",
+        "clear_current_task_draft",
+        "process_path",
+        "auto_generate_path_with_api",
+        "start_single_run",
+        "start_all_runs",
+        "stop_run",
+        "import_task_data",
+        "export_task_data",
+        "update_param",
+        "generate_new_ua",
+        "enter_multi_account_mode",
+        "exit_multi_account_mode",
+        "enter_single_account_mode",
+        "multi_add_account",
+        "multi_remove_account",
+    }
+)
+
+# 需要持有会话调用锁执行的方法：它们会整体替换 Api 上的共享状态（登录身份、任务列表、单/多账号模式），
+# 彼此之间必须串行。其余方法不取该锁，查询和停止类调用不会被同一会话中的慢调用阻塞。
+API_SESSION_LOCKED_METHODS = frozenset(
+    {
+        "login",
+        "logout",
+        "import_task_data",
+        "enter_multi_account_mode",
+        "exit_multi_account_mode",
+        "enter_single_account_mode",
+    }
+)
+
+
+class ApiMethodSpec:
+    """
+    /api/<method> 注册表中的一项。
+
+    在导入时由 Api 的方法签名生成，记录权限、自动保存策略、参数表和锁策略，
+    并累计该方法的调用次数与耗时。计数只在处理请求的协程中更新，两次更新之间没有让出点，无需加锁。
+    """
+
+    __slots__ = (
+        "name",
+        "func",
+        "permission",
+        "auto_save",
+        "lock_free",
+        "params",
+        "required",
+        "min_positional",
+        "calls",
+        "errors",
+        "total_s",
+        "max_s",
+    )
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.permission = API_METHOD_PERMISSIONS.get(name)
+        self.auto_save = name in API_AUTO_SAVE_METHODS
+        self.lock_free = name not in API_SESSION_LOCKED_METHODS
+        parameters = [
+            p
+            for p in list(inspect.signature(func).parameters.values())[1:]
+            if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)
+        ]
+        self.params = tuple(p.name for p in parameters)
+        self.required = tuple(p.name for p in parameters if p.default is p.empty)
+        self.min_positional = sum(
+            1
+            for p in parameters
+            if p.kind == p.POSITIONAL_OR_KEYWORD and p.default is p.empty
+        )
+        self.calls = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+    def check_params(self, params):
+        """按方法签名校验请求参数，返回错误说明；参数合法时返回 None"""
+        if isinstance(params, dict):
+            unknown = [key for key in params if key not in self.params]
+            if unknown:
+                return f"未知参数: {', '.join(map(str, unknown))}"
+            missing = [name for name in self.required if name not in params]
+            if missing:
+                return f"缺少参数: {', '.join(missing)}"
+            return None
+        if isinstance(params, list):
+            if not self.min_positional <= len(params) <= len(self.params):
+                return (
+                    f"参数数量错误：需要 {self.min_positional}~{len(self.params)} 个，"
+                    f"收到 {len(params)} 个"
+                )
+            return None
+        return "参数格式错误"
+
+    def invoke(self, api_instance, params):
+        """在指定 Api 实例上调用该方法，必要时持有会话调用锁"""
+        args, kwargs = ((), params) if isinstance(params, dict) else (params, {})
+        if self.lock_free:
+            return self.func(api_instance, *args, **kwargs)
+        with api_instance._api_call_lock:
+            return self.func(api_instance, *args, **kwargs)
+
+    def record(self, elapsed_s: float, failed: bool):
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.total_s += elapsed_s
+        if elapsed_s > self.max_s:
+            self.max_s = elapsed_s
+
+    def get_metrics(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_s / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_s * 1000, 2),
+        }
+
+
+def build_api_method_registry(api_cls) -> dict:
+    """收集 Api 类上定义的公开方法，生成 方法名 -> ApiMethodSpec 的调度表（实例属性不会进入调度表）"""
+    registry = {}
+    for name, func in vars(api_cls).items():
+        if name.startswith("_") or name in API_INTERNAL_METHODS:
+            continue
+        if not inspect.isfunction(func):
+            continue
+        registry[name] = ApiMethodSpec(name, func)
+    return registry
+
+
+API_METHOD_REGISTRY = build_api_method_registry(Api)
+
+
+def get_api_dispatch_metrics(limit: int = 10) -> dict:
+    """汇总 /api/<method> 的调用统计，按累计耗时列出最慢的若干方法"""
+    called = [spec for spec in API_METHOD_REGISTRY.values() if spec.calls]
+    called.sort(key=lambda spec: spec.total_s, reverse=True)
+    return {
+        "methods": len(API_METHOD_REGISTRY),
+        "calls": sum(spec.calls for spec in called),
+        "errors": sum(spec.errors for spec in called),
+        "slowest": {spec.name: spec.get_metrics() for spec in called[:limit]},
+    }
+
+
 def start_web_server(args_param):
     """
     启动Flask Web服务器主函数，集成SocketIO实时通信和Chrome浏览器自动化。
     """
-    global chrome_pool, background_task_manager, web_sessions, web_sessions_lock, session_file_locks, session_file_locks_lock, session_activity, session_activity_lock, args
+    global chrome_pool, background_task_manager, web_sessions, web_sessions_lock, session_file_locks, session_activity, session_activity_lock, args
     global server_start_time
     server_start_time = time.time()
     logging.info(
@@ -12676,10 +16191,9 @@ def start_web_server(args_param):
     cache = {}
     global sms_verification_codes
     sms_verification_codes = {}
-    web_sessions = {}
+    web_sessions = SessionRegistry()
     web_sessions_lock = threading.Lock()
-    session_file_locks = {}
-    session_file_locks_lock = threading.Lock()
+    session_file_locks = [threading.Lock() for _ in range(SESSION_LOCK_STRIPES)]
     session_activity = {}
     session_activity_lock = threading.Lock()
     logging.info("内存锁和会话状态已重置。")
@@ -13534,9 +17048,8 @@ def start_web_server(args_param):
                 return jsonify({"success": False, "message": "验证码错误"})
             del sms_verification_codes[auth_phone]
             user_file = auth_system.get_user_file_path(target_username)
-            if os.path.exists(user_file):
-                with open(user_file, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
+            if auth_system.users.exists(user_file):
+                user_data = auth_system.users.read(user_file)
 
                 if user_data.get("2fa_enabled", False):
                     if not two_fa_code:
@@ -14270,84 +17783,53 @@ def start_web_server(args_param):
                 ),
                 400,
             )
-        session_file = get_session_file_path(check_uuid)
-        file_exists = os.path.exists(session_file)
-        logging.debug(
-            # f"/auth/check_uuid_type: Checking UUID {check_uuid[:8]}..., File path: {session_file}, Exists: {file_exists}"
-            f"正在检查UUID {check_uuid[:8]}...，文件路径: {session_file}，存在: {file_exists}"
-        )
-
-        if not file_exists:
+        try:
+            session_data = session_store.get(check_uuid, with_geometry=False)
+        except Exception as e:
+            logging.error(f"读取会话失败: {e}")
+            return (
+                jsonify({"success": False, "message": "读取会话失败，请稍后重试"}),
+                500,
+            )
+        logging.debug(
+            f"正在检查UUID {check_uuid[:8]}...，存在: {session_data is not None}"
+        )
+
+        if session_data is None:
+            return jsonify(
+                {
+                    "success": True,
+                    "uuid_type": "unknown",
+                    "message": "UUID不存在 (会话未找到)",
+                }
+            )
+        is_guest = session_data.get("is_guest", False)
+        auth_username = session_data.get("auth_username", "")
+
+        if is_guest or auth_username == "guest":
+            return jsonify(
+                {"success": True, "uuid_type": "guest", "message": "游客UUID"}
+            )
+        elif auth_username:
+            return jsonify(
+                {
+                    "success": True,
+                    "uuid_type": "system_account",
+                    "auth_username": auth_username,
+                    "message": "系统账号UUID",
+                }
+            )
+        else:
+            logging.warning(
+                f"/auth/check_uuid_type: 会话 {check_uuid[:8]}... 存在但内容无法识别用户类型 (auth_username='{auth_username}', is_guest={is_guest})，返回 unknown"
+            )
             return jsonify(
                 {
                     "success": True,
                     "uuid_type": "unknown",
-                    "message": "UUID不存在 (文件未找到)",
+                    "message": "未知类型UUID (内容无法识别)",
                 }
             )
-        max_retries = 3
-        retry_delay = 0.1
-        fcntl = None
-
-        for attempt in range(max_retries):
-            try:
-                with open(session_file, "r", encoding="utf-8") as f:
-                    if fcntl:
-                        fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-                    try:
-                        session_data = json.load(f)
-                    finally:
-                        if fcntl:
-                            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-                is_guest = session_data.get("is_guest", False)
-                auth_username = session_data.get("auth_username", "")
-
-                if is_guest or auth_username == "guest":
-                    return jsonify(
-                        {"success": True, "uuid_type": "guest", "message": "游客UUID"}
-                    )
-                elif auth_username:
-                    return jsonify(
-                        {
-                            "success": True,
-                            "uuid_type": "system_account",
-                            "auth_username": auth_username,
-                            "message": "系统账号UUID",
-                        }
-                    )
-                else:
-                    logging.warning(
-                        f"/auth/check_uuid_type: 文件 {session_file} 存在但内容无法识别用户类型 (auth_username='{auth_username}', is_guest={is_guest})，返回 unknown"
-                    )
-                    return jsonify(
-                        {
-                            "success": True,
-                            "uuid_type": "unknown",
-                            "message": "未知类型UUID (内容无法识别)",
-                        }
-                    )
-            except (IOError, OSError) as e:
-                if attempt < max_retries - 1:
-
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    logging.error(f"读取会话文件失败（已重试{max_retries}次）: {e}")
-                    return (
-                        jsonify(
-                            {"success": False, "message": "读取会话失败，请稍后重试"}
-                        ),
-                        500,
-                    )
-            except json.JSONDecodeError as e:
-                logging.error(f"会话文件JSON解析失败: {e}")
-                return jsonify({"success": False, "message": "会话数据损坏"}), 500
-            except Exception as e:
-                logging.error(f"检查UUID类型失败: {e}")
-                return (
-                    jsonify({"success": False, "message": f"服务器错误: {str(e)}"}),
-                    500,
-                )
 
     @app.route("/auth/2fa/generate", methods=["POST"])
     def auth_2fa_generate():
@@ -14423,15 +17905,13 @@ def start_web_server(args_param):
         if auth_username == "guest":
             return jsonify({"success": False, "message": "游客不支持2FA"}), 403
         user_file = auth_system.get_user_file_path(auth_username)
-        if os.path.exists(user_file):
+        if auth_system.users.exists(user_file):
             try:
                 with auth_system.lock:
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
+                    user_data = auth_system.users.read(user_file)
 
                     user_data["2fa_enabled"] = False
-                    with open(user_file, "w", encoding="utf-8") as f:
-                        json.dump(user_data, f, indent=2, ensure_ascii=False)
+                    auth_system.users.write(user_file, user_data)
 
                 logging.info(f"用户 {auth_username} 已关闭2FA")
                 return jsonify({"success": True, "message": "2FA已关闭"})
@@ -14471,11 +17951,10 @@ def start_web_server(args_param):
         api_instance.is_guest = is_guest
         web_sessions[session_id] = api_instance
         user_file = auth_system.get_user_file_path(auth_username)
-        if os.path.exists(user_file):
+        if auth_system.users.exists(user_file):
             try:
                 with auth_system.lock:
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
+                    user_data = auth_system.users.read(user_file)
 
                     user_data["last_login"] = time.time()
                     if "session_ids" not in user_data:
@@ -14483,8 +17962,7 @@ def start_web_server(args_param):
                     if session_id not in user_data["session_ids"]:
                         user_data["session_ids"].append(session_id)
 
-                    with open(user_file, "w", encoding="utf-8") as f:
-                        json.dump(user_data, f, indent=2, ensure_ascii=False)
+                    auth_system.users.write(user_file, user_data)
             except Exception as e:
                 logging.error(f"更新用户登录信息失败: {e}", exc_info=True)
         token = None
@@ -14772,15 +18250,13 @@ def start_web_server(args_param):
         # 4. 清空用户配置文件中的会话列表
         try:
             user_file = auth_system.get_user_file_path(target_username)
-            if os.path.exists(user_file):
+            if auth_system.users.exists(user_file):
                 with auth_system.lock:
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
+                    user_data = auth_system.users.read(user_file)
 
                     user_data["session_ids"] = []
 
-                    with open(user_file, "w", encoding="utf-8") as f:
-                        json.dump(user_data, f, indent=2, ensure_ascii=False)
+                    auth_system.users.write(user_file, user_data)
         except Exception as e:
             logging.error(f"强制登出清理用户文件失败: {e}")
 
@@ -14859,13 +18335,11 @@ def start_web_server(args_param):
 
         try:
             user_file_path = auth_system.get_user_file_path(username)
-            if not os.path.exists(user_file_path):
+            if not auth_system.users.exists(user_file_path):
                 return jsonify({"success": False, "message": "用户不存在"}), 404
-            with open(user_file_path, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+            user_data = auth_system.users.read(user_file_path)
             user_data["nickname"] = nickname
-            with open(user_file_path, "w", encoding="utf-8") as f:
-                json.dump(user_data, f, indent=2, ensure_ascii=False)
+            auth_system.users.write(user_file_path, user_data)
             ip_address = request.headers.get("X-Forwarded-For", request.remote_addr)
             auth_system.log_audit(
                 current_username,
@@ -14909,16 +18383,14 @@ def start_web_server(args_param):
                 return jsonify({"success": False, "message": "新昵称不能为空"}), 400
             user_file_path = auth_system.get_user_file_path(target_username)
 
-            if not os.path.exists(user_file_path):
+            if not auth_system.users.exists(user_file_path):
                 return jsonify({"success": False, "message": "用户不存在"}), 404
             with auth_system.lock:
-                with open(user_file_path, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
+                user_data = auth_system.users.read(user_file_path)
 
                 user_data["nickname"] = new_nickname
 
-                with open(user_file_path, "w", encoding="utf-8") as f:
-                    json.dump(user_data, f, indent=2, ensure_ascii=False)
+                auth_system.users.write(user_file_path, user_data)
             ip_address = request.headers.get("X-Forwarded-For", request.remote_addr)
             auth_system.log_audit(
                 current_username,
@@ -14993,15 +18465,13 @@ def start_web_server(args_param):
 
         try:
             user_file_path = auth_system.get_user_file_path(username)
-            if not os.path.exists(user_file_path):
+            if not auth_system.users.exists(user_file_path):
                 return jsonify({"success": False, "message": "用户不存在"}), 404
             auth_system.unbind_phone_from_user(new_phone, except_username=username)
             with auth_system.lock:
-                with open(user_file_path, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
+                user_data = auth_system.users.read(user_file_path)
                 user_data["phone"] = new_phone
-                with open(user_file_path, "w", encoding="utf-8") as f:
-                    json.dump(user_data, f, indent=2, ensure_ascii=False)
+                auth_system.users.write(user_file_path, user_data)
             ip_address = request.headers.get("X-Forwarded-For", request.remote_addr)
             auth_system.log_audit(
                 current_username,
@@ -15036,9 +18506,19 @@ def start_web_server(args_param):
             return jsonify({"success": False, "message": "权限不足"}), 403
         username = request.args.get("username", None)
         limit = int(request.args.get("limit", 100))
-
-        logs = auth_system.get_login_history(username, limit)
-        return jsonify({"success": True, "logs": logs})
+        try:
+            logs, next_cursor = auth_system.query_login_history(
+                username=username,
+                ip_address=request.args.get("ip"),
+                since=parse_log_time(request.args.get("since")),
+                until=parse_log_time(request.args.get("until")),
+                cursor=request.args.get("cursor"),
+                limit=limit,
+            )
+        except ValueError:
+            return jsonify({"success": False, "message": "时间参数格式错误"}), 400
+        logs.reverse()
+        return jsonify({"success": True, "logs": logs, "next_cursor": next_cursor})
 
     @app.route("/auth/admin/get_user_school_accounts", methods=["GET"])
     def auth_admin_get_user_school_accounts():
@@ -15475,13 +18955,12 @@ def start_web_server(args_param):
             # 获取用户信息文件路径
             user_file = auth_system.get_user_file_path(auth_username)
             # 检查用户文件是否存在
-            if not os.path.exists(user_file):
+            if not auth_system.users.exists(user_file):
                 return jsonify({"success": False, "message": "用户不存在"}), 404
 
             try:
                 # 读取用户信息文件
-                with open(user_file, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
+                user_data = auth_system.users.read(user_file)
                 # 获取存储的密码哈希值
                 stored_password = user_data.get("password")
                 # 获取用户绑定的手机号（用于短信验证）
@@ -16005,21 +19484,17 @@ def start_web_server(args_param):
             logging.debug(
                 f"auth_user_sessions: Handling guest session {session_id[:8]}"
             )
-            session_file = get_session_file_path(session_id)
             created_at = 0
             last_activity = 0
             login_success_status = False
 
-            if os.path.exists(session_file):
-                try:
-                    with open(session_file, "r", encoding="utf-8") as f:
-                        session_data = json.load(f)
+            try:
+                session_data = session_store.get(session_id, with_geometry=False)
+                if session_data:
                     created_at = session_data.get("created_at", 0)
                     last_activity = session_data.get("last_accessed", 0)
-                except Exception as e:
-                    logging.warning(
-                        f"Failed to read guest session file {session_file}: {e}"
-                    )
+            except Exception as e:
+                logging.warning(f"Failed to read guest session {session_id[:8]}: {e}")
 
             sessions_info.append(
                 {
@@ -16053,49 +19528,46 @@ def start_web_server(args_param):
             max_sessions = user_details.get("max_sessions", 1) if user_details else 1
 
             for sid in session_ids:
-                session_file = get_session_file_path(sid)
-                if os.path.exists(session_file):
-                    try:
-                        with open(session_file, "r", encoding="utf-8") as f:
-                            session_data = json.load(f)
-                        if session_data.get("auth_username") == auth_username:
-                            is_multi_mode = session_data.get(
-                                "is_multi_account_mode", False
+                try:
+                    session_data = session_store.get(sid, with_geometry=False)
+                    if session_data and session_data.get("auth_username") == auth_username:
+                        is_multi_mode = session_data.get(
+                            "is_multi_account_mode", False
+                        )
+                        session_login_success = session_data.get(
+                            "login_success", False
+                        )
+
+                        if is_multi_mode:
+                            account_states = session_data.get(
+                                "multi_account_states", {}
                             )
-                            session_login_success = session_data.get(
-                                "login_success", False
+                            session_login_success = any(
+                                acc.get("school_account_logged_in", False)
+                                for acc in account_states.values()
                             )
 
-                            if is_multi_mode:
-                                account_states = session_data.get(
-                                    "multi_account_states", {}
-                                )
-                                session_login_success = any(
-                                    acc.get("school_account_logged_in", False)
-                                    for acc in account_states.values()
-                                )
-
-                            sessions_info.append(
-                                {
-                                    "session_id": sid,
-                                    "session_hash": hashlib.sha256(
-                                        sid.encode()
-                                    ).hexdigest()[:16],
-                                    "created_at": session_data.get("created_at", 0),
-                                    "last_activity": session_data.get(
-                                        "last_accessed", 0
-                                    ),
-                                    "is_current": sid == session_id,
-                                    "login_success": session_login_success,
-                                    "is_multi_account_mode": is_multi_mode,
-                                    "user_data": session_data.get("user_data", {}),
-                                }
-                            )
-                    except Exception as e:
-                        logging.warning(
-                            f"Failed to read session file {session_file} for user {auth_username}: {e}"
+                        sessions_info.append(
+                            {
+                                "session_id": sid,
+                                "session_hash": hashlib.sha256(
+                                    sid.encode()
+                                ).hexdigest()[:16],
+                                "created_at": session_data.get("created_at", 0),
+                                "last_activity": session_data.get(
+                                    "last_accessed", 0
+                                ),
+                                "is_current": sid == session_id,
+                                "login_success": session_login_success,
+                                "is_multi_account_mode": is_multi_mode,
+                                "user_data": session_data.get("user_data", {}),
+                            }
                         )
-                        continue
+                except Exception as e:
+                    logging.warning(
+                        f"Failed to read session {sid[:8]} for user {auth_username}: {e}"
+                    )
+                    continue
             logging.debug(
                 f"auth_user_sessions: Registered user session info prepared: {len(sessions_info)} sessions"
             )
@@ -16133,12 +19605,11 @@ def start_web_server(args_param):
         if target_session_id == session_id:
             return jsonify({"success": False, "message": "不能删除当前会话"})
         auth_system.unlink_session_from_user(auth_username, target_session_id)
-        session_file = get_session_file_path(target_session_id)
-        if os.path.exists(session_file):
-            try:
-                os.remove(session_file)
-            except (FileNotFoundError, PermissionError) as e:
-                logging.debug(f"[会话删除] 删除会话文件失败: {e}")
+        session_flusher.mark_deleted(target_session_id)
+        try:
+            session_store.delete(target_session_id)
+        except Exception as e:
+            logging.debug(f"[会话删除] 删除持久化会话失败: {e}")
         with web_sessions_lock:
             if target_session_id in web_sessions:
                 del web_sessions[target_session_id]
@@ -16372,50 +19843,41 @@ def start_web_server(args_param):
                 all_sessions.append(session_info)
                 session_ids_in_memory.add(sid)
         try:
-            if os.path.exists(SESSION_STORAGE_DIR):
-                for filename in os.listdir(SESSION_STORAGE_DIR):
-                    if filename == "_index.json" or not filename.endswith(".json"):
-                        continue
-
-                    session_file = os.path.join(SESSION_STORAGE_DIR, filename)
-                    try:
-                        with open(session_file, "r", encoding="utf-8") as f:
-                            state = json.load(f)
-
-                        sid = state.get("session_id")
-                        if not sid or sid in session_ids_in_memory:
-                            continue
-                        is_multi_mode = state.get("is_multi_account_mode", False)
-                        session_login_success = state.get("login_success", False)
-
-                        if is_multi_mode:
-                            account_states = state.get("multi_account_states", {})
-                            session_login_success = any(
-                                acc.get("school_account_logged_in", False)
-                                for acc in account_states.values()
-                            )
-                        session_info = {
-                            "session_id": sid,
-                            "session_hash": hashlib.sha256(sid.encode()).hexdigest()[
-                                :16
-                            ],
-                            "auth_username": state.get("auth_username", None),
-                            "auth_group": state.get("auth_group", "guest"),
-                            "is_authenticated": state.get("is_authenticated", False),
-                            "is_guest": state.get("is_guest", False),
-                            "created_at": state.get("created_at", 0),
-                            "login_success": session_login_success,
-                            "is_multi_account_mode": is_multi_mode,
-                            "user_info": state.get("user_info", {}),
-                            "is_current": sid == session_id,
-                            "username": state.get("auth_username", None),
-                        }
-                        all_sessions.append(session_info)
-                    except Exception as e:
-                        logging.warning(f"读取会话文件 {filename} 失败: {e}")
-                        continue
+            for sid, state in session_store.iter_states(with_geometry=False):
+                if not state or sid in session_ids_in_memory:
+                    continue
+                try:
+                    is_multi_mode = state.get("is_multi_account_mode", False)
+                    session_login_success = state.get("login_success", False)
+
+                    if is_multi_mode:
+                        account_states = state.get("multi_account_states", {})
+                        session_login_success = any(
+                            acc.get("school_account_logged_in", False)
+                            for acc in account_states.values()
+                        )
+                    session_info = {
+                        "session_id": sid,
+                        "session_hash": hashlib.sha256(sid.encode()).hexdigest()[
+                            :16
+                        ],
+                        "auth_username": state.get("auth_username", None),
+                        "auth_group": state.get("auth_group", "guest"),
+                        "is_authenticated": state.get("is_authenticated", False),
+                        "is_guest": state.get("is_guest", False),
+                        "created_at": state.get("created_at", 0),
+                        "login_success": session_login_success,
+                        "is_multi_account_mode": is_multi_mode,
+                        "user_info": state.get("user_info", {}),
+                        "is_current": sid == session_id,
+                        "username": state.get("auth_username", None),
+                    }
+                    all_sessions.append(session_info)
+                except Exception as e:
+                    logging.warning(f"读取会话 {sid[:16]}... 失败: {e}")
+                    continue
         except Exception as e:
-            logging.error(f"扫描会话文件目录失败: {e}")
+            logging.error(f"扫描会话存储失败: {e}")
 
         return jsonify(
             {
@@ -16451,13 +19913,11 @@ def start_web_server(args_param):
                 target_username = getattr(target_api, "auth_username", "unknown")
         if target_username != "unknown" and target_username != "guest":
             auth_system.unlink_session_from_user(target_username, target_session_id)
-        session_hash = hashlib.sha256(target_session_id.encode()).hexdigest()
-        session_file = os.path.join(SESSION_STORAGE_DIR, f"{session_hash}.json")
-        if os.path.exists(session_file):
-            try:
-                os.remove(session_file)
-            except (FileNotFoundError, PermissionError) as e:
-                logging.debug(f"[会话强制登出] 删除会话文件失败: {e}")
+        session_flusher.mark_deleted(target_session_id)
+        try:
+            session_store.delete(target_session_id)
+        except Exception as e:
+            logging.debug(f"[会话强制登出] 删除持久化会话失败: {e}")
         with web_sessions_lock:
             if target_session_id in web_sessions:
                 del web_sessions[target_session_id]
@@ -16488,9 +19948,20 @@ def start_web_server(args_param):
         username = request.args.get("username", None)
         action = request.args.get("action", None)
         limit = int(request.args.get("limit", 100))
-
-        logs = auth_system.get_audit_logs(username, action, limit)
-        return jsonify({"success": True, "logs": logs})
+        try:
+            logs, next_cursor = auth_system.query_audit_logs(
+                username=username,
+                action=action,
+                ip_address=request.args.get("ip"),
+                since=parse_log_time(request.args.get("since")),
+                until=parse_log_time(request.args.get("until")),
+                cursor=request.args.get("cursor"),
+                limit=limit,
+            )
+        except ValueError:
+            return jsonify({"success": False, "message": "时间参数格式错误"}), 400
+        logs.reverse()
+        return jsonify({"success": True, "logs": logs, "next_cursor": next_cursor})
 
     @app.route("/api/sms/send_code", methods=["POST"])
     def sms_send_code():
@@ -16928,14 +20399,24 @@ def start_web_server(args_param):
                 if not auth_system.check_permission(current_user, "manage_users"):
                     target_username = current_user
             username_to_query = target_username if target_username else None
-            history = auth_system.get_login_history(username_to_query, limit)
-            history.reverse()
+            try:
+                history, next_cursor = auth_system.query_login_history(
+                    username=username_to_query,
+                    ip_address=request.args.get("ip"),
+                    since=parse_log_time(request.args.get("since")),
+                    until=parse_log_time(request.args.get("until")),
+                    cursor=request.args.get("cursor"),
+                    limit=limit,
+                )
+            except ValueError:
+                return jsonify({"success": False, "message": "时间参数格式错误"}), 400
 
             return jsonify(
                 {
                     "success": True,
                     "logs": history,
                     "total": len(history),
+                    "next_cursor": next_cursor,
                 }
             )
 
@@ -16956,9 +20437,28 @@ def start_web_server(args_param):
             username = request.args.get("username", "").strip()
             action = request.args.get("action", "").strip()
             limit = int(request.args.get("limit", 100))
-            logs = auth_system.get_audit_logs(username, action, limit)
+            try:
+                logs, next_cursor = auth_system.query_audit_logs(
+                    username=username,
+                    action=action,
+                    ip_address=request.args.get("ip"),
+                    since=parse_log_time(request.args.get("since")),
+                    until=parse_log_time(request.args.get("until")),
+                    cursor=request.args.get("cursor"),
+                    limit=limit,
+                )
+            except ValueError:
+                return jsonify({"success": False, "message": "时间参数格式错误"}), 400
+            logs.reverse()
 
-            return jsonify({"success": True, "logs": logs, "total": len(logs)})
+            return jsonify(
+                {
+                    "success": True,
+                    "logs": logs,
+                    "total": len(logs),
+                    "next_cursor": next_cursor,
+                }
+            )
 
         except Exception as e:
             app.logger.error(f"[审计日志] 查询失败：{str(e)}")
@@ -17423,12 +20923,11 @@ def start_web_server(args_param):
             # 获取用户信息文件路径
             user_file_path = auth_system.get_user_file_path(current_username)
             # 检查用户文件是否存在
-            if not os.path.exists(user_file_path):
+            if not auth_system.users.exists(user_file_path):
                 return jsonify({"success": False, "message": "当前用户文件不存在"}), 404
             
             # 读取用户信息以验证密码
-            with open(user_file_path, "r", encoding="utf-8") as f:
-                user_data = json.load(f)
+            user_data = auth_system.users.read(user_file_path)
             
             # 获取存储的密码哈希值
             stored_password = user_data.get("password", "")
@@ -17474,15 +20973,13 @@ def start_web_server(args_param):
             # 使用锁保护文件读写操作，防止并发冲突
             with auth_system.lock:
                 # 重新读取用户信息文件（防止锁等待期间数据被修改）
-                with open(user_file_path, "r", encoding="utf-8") as f:
-                    user_data = json.load(f)
+                user_data = auth_system.users.read(user_file_path)
 
                 # 更新手机号字段
                 user_data["phone"] = new_phone
 
                 # 将更新后的用户信息写回文件
-                with open(user_file_path, "w", encoding="utf-8") as f:
-                    json.dump(user_data, f, indent=2, ensure_ascii=False)
+                auth_system.users.write(user_file_path, user_data)
             
             # 手机号更新成功后，删除已使用的验证码（一次性使用）
             # 放在此处确保只有在所有操作成功后才删除验证码
@@ -18326,6 +21823,102 @@ def start_web_server(args_param):
     # 应用主路由
     # ============================================================================
 
+    def send_asset_file(prefix, directory, filename):
+        """通过静态资源清单返回 directory 下的文件（预压缩 + ETag + 版本号缓存）"""
+        file_path = safe_join(directory, filename)
+        if file_path is None or not os.path.isfile(file_path):
+            return jsonify({"success": False, "message": "File not found"}), 404
+        entry = asset_manifest.file_entry(f"{prefix}/{filename}", file_path)
+        return asset_manifest.send(entry)
+
+    def cdn_asset_entry(file_key, content):
+        """CDN 缓存内容对应的资源条目"""
+        file_type = CDN_FILES.get(file_key, {}).get("type", "js")
+        mimetype = "text/css" if file_type == "css" else "application/javascript"
+        return asset_manifest.content_entry(
+            f"cdn/{file_key}", content, f"{mimetype}; charset=utf-8"
+        )
+
+    # ===== 前端模块拆分：外壳页面 + 按功能拆分的模块脚本 =====
+    frontend_shell, frontend_bundles = html_content, {}
+    try:
+        split_config = configparser.ConfigParser()
+        split_config.read(CONFIG_FILE, encoding="utf-8")
+        if split_config.getboolean("System", "frontend_split_modules", fallback=True):
+            frontend_shell, frontend_bundles = split_frontend_modules(
+                html_content, FRONTEND_MODULES
+            )
+            module_sizes = ", ".join(
+                f"{name}({len(bundle)}字符)" for name, bundle in frontend_bundles.items()
+            )
+            logging.info(
+                f"[前端模块] 页面外壳 {len(frontend_shell)} 字符，拆分出模块: {module_sizes}"
+            )
+    except Exception as e:
+        logging.error(f"[前端模块] 拆分 index.html 失败，使用完整页面: {e}", exc_info=True)
+        frontend_shell, frontend_bundles = html_content, {}
+
+    @app.route("/fragments/<name>.js")
+    def serve_frontend_module(name):
+        """返回从 index.html 拆分出的前端功能模块脚本"""
+        bundle = frontend_bundles.get(name)
+        if bundle is None:
+            return jsonify({"success": False, "message": "模块不存在"}), 404
+        return asset_manifest.send(
+            asset_manifest.content_entry(
+                f"fragments/{name}", bundle, "application/javascript; charset=utf-8"
+            )
+        )
+
+    def current_asset_urls():
+        """
+        页面引用的静态资源地址 -> 带内容版本号的地址。
+        每次只做 stat / 对象比较，资源内容变化时才重新计算摘要和压缩体。
+        """
+        base_dir = os.path.dirname(__file__)
+        urls = {}
+        for url, prefix, filename in (
+            ("scripts/main.js", "scripts", "main.js"),
+            ("styles/style.css", "styles", "style.css"),
+        ):
+            entry = asset_manifest.file_entry(
+                url, os.path.join(base_dir, prefix, filename)
+            )
+            if entry is not None:
+                urls[url] = asset_manifest.versioned_url(url, entry)
+        favicon_entry = asset_manifest.file_entry(
+            "favicon.ico",
+            os.path.join(base_dir, "favicon.ico"),
+            "image/vnd.microsoft.icon",
+        )
+        if favicon_entry is not None:
+            urls["/favicon.ico"] = asset_manifest.versioned_url(
+                "/favicon.ico", favicon_entry
+            )
+        for name, bundle in frontend_bundles.items():
+            url = f"/fragments/{name}.js"
+            urls[url] = asset_manifest.versioned_url(
+                url,
+                asset_manifest.content_entry(
+                    f"fragments/{name}", bundle, "application/javascript; charset=utf-8"
+                ),
+            )
+        with js_cache_lock:
+            cdn_contents = list(js_cache_storage.items())
+        for file_key, content in cdn_contents:
+            url = f"/api/cdn/{file_key}"
+            urls[url] = asset_manifest.versioned_url(
+                url, cdn_asset_entry(file_key, content)
+            )
+        return urls
+
+    # 启动时预先构建静态资源清单（摘要与压缩体），首个页面请求无需等待压缩
+    try:
+        current_asset_urls()
+        logging.info(f"[静态资源] 资源清单已构建: {asset_manifest.get_metrics()}")
+    except Exception as e:
+        logging.warning(f"[静态资源] 预构建资源清单失败: {e}")
+
     def get_frontend_config():
         """辅助函数：读取前端需要的功能开关配置"""
         # [修正] 使用 strict=False 允许读取包含重复项的配置文件（保留最后一个值）
@@ -18388,31 +21981,15 @@ def start_web_server(args_param):
         """
         try:
             with js_cache_lock:
-                if file_key in js_cache_storage:
-                    content = js_cache_storage[file_key]
-                    file_config = CDN_FILES.get(file_key, {})
-                    file_type = file_config.get("type", "js")
-
-                    # 设置正确的Content-Type
-                    if file_type == "css":
-                        mimetype = "text/css"
-                    else:
-                        mimetype = "application/javascript"
-
-                    response = make_response(content)
-                    response.headers["Content-Type"] = mimetype
-                    response.headers["Cache-Control"] = (
-                        "public, max-age=3600"  # 缓存1小时
-                    )
-                    return response
-                else:
-                    logging.warning(f"[CDN缓存API] 请求的文件不存在: {file_key}")
-                    return (
-                        jsonify(
-                            {"success": False, "message": f"文件未找到: {file_key}"}
-                        ),
-                        404,
-                    )
+                content = js_cache_storage.get(file_key)
+            if content is None:
+                logging.warning(f"[CDN缓存API] 请求的文件不存在: {file_key}")
+                return (
+                    jsonify({"success": False, "message": f"文件未找到: {file_key}"}),
+                    404,
+                )
+            # 压缩与摘要按内容缓存，CDN 定时更新替换内容后自动重建
+            return asset_manifest.send(cdn_asset_entry(file_key, content))
         except Exception as e:
             logging.error(f"[CDN缓存API] 返回文件时发生错误: {e}", exc_info=True)
             return jsonify({"success": False, "message": "服务器内部错误"}), 500
@@ -18520,8 +22097,8 @@ def start_web_server(args_param):
             if not os.path.exists(script_dir):
                  logging.warning(f"请求 scripts 文件但目录不存在: {script_dir}")
                  return jsonify({"success": False, "message": f"Scripts 文件 {filename} 未找到！"}), 404
-            
-            return send_from_directory(script_dir, filename)
+
+            return send_asset_file("scripts", script_dir, filename)
         except Exception as e:
             logging.error(f"Serving script error: {e}")
             return jsonify({"success": False, "message": "File not found"}), 404
@@ -18540,7 +22117,7 @@ def start_web_server(args_param):
                  logging.warning(f"请求 styles 文件但目录不存在: {style_dir}")
                  return jsonify({"success": False, "message": f"Styles 文件 {filename} 未找到！"}), 404
 
-            return send_from_directory(style_dir, filename)
+            return send_asset_file("styles", style_dir, filename)
         except Exception as e:
             logging.error(f"Serving style error: {e}")
             return jsonify({"success": False, "message": "File not found"}), 404
@@ -18557,7 +22134,11 @@ def start_web_server(args_param):
             if not os.path.exists(favicon_path):
                 logging.warning(f"Favicon文件不存在: {favicon_path}")
                 return jsonify({"success": False, "message": "Favicon文件未找到"}), 404
-            return send_file(favicon_path, mimetype="image/vnd.microsoft.icon")
+            return asset_manifest.send(
+                asset_manifest.file_entry(
+                    "favicon.ico", favicon_path, "image/vnd.microsoft.icon"
+                )
+            )
         except Exception as e:
             logging.error(f"返回 favicon.ico 时发生错误: {e}", exc_info=True)
             return jsonify({"success": False, "message": "服务器内部错误"}), 500
@@ -18649,15 +22230,10 @@ def start_web_server(args_param):
     @app.route("/")
     def index():
         """首页：显示登录页面，等待用户认证后分配UUID"""
-        app_config = get_frontend_config()
-        config_script = f"""
-        <script>
-            window.APP_CONFIG = {json.dumps(app_config)};
-        </script>
-        """
-        modified_html = html_content.replace("</body>", f"{config_script}</body>")
-
-        return render_template_string(modified_html)
+        return send_static_entry(
+            page_cache.get(frontend_shell, get_frontend_config, current_asset_urls()),
+            "no-cache",
+        )
 
     @app.route("/uuid=<uuid>")
     def session_view(uuid):
@@ -18699,14 +22275,10 @@ def start_web_server(args_param):
                 if not hasattr(api_instance, "_web_session_id"):
                     api_instance._web_session_id = uuid
                 logging.debug(f"使用现有会话: {uuid[:32]}...")
-        app_config = get_frontend_config()
-        config_script = f"""
-        <script>
-            window.APP_CONFIG = {json.dumps(app_config)};
-        </script>
-        """
-        modified_html = html_content.replace("</body>", f"{config_script}</body>")
-        return render_template_string(modified_html)
+        return send_static_entry(
+            page_cache.get(frontend_shell, get_frontend_config, current_asset_urls()),
+            "no-cache",
+        )
 
 #     @app.route("/JavaScript/<path:function_path>.js", methods=["GET"])
 #     def serve_javascript(function_path):
@@ -19193,6 +22765,8 @@ def start_web_server(args_param):
 
         if not session_id:
             return jsonify({"success": False, "message": "缺少会话ID"}), 401
+        # 续期后客户端应持有的令牌（签名令牌临近过期时会换发新令牌）
+        renewed_token = None
         with web_sessions_lock:
             if session_id in web_sessions:
                 api_instance = web_sessions[session_id]
@@ -19283,7 +22857,9 @@ def start_web_server(args_param):
                                     )
                             # 刷新实际持有人(validated_user)的Token，而不是会话拥有者(username)的Token
                             # 否则管理员操作用户界面会导致管理员自己的Token过期或无法刷新
-                            token_manager.refresh_token(validated_user, session_id)
+                            renewed_token = token_manager.refresh_token(
+                                validated_user, session_id, token
+                            )
         update_session_activity(session_id)
 
         with web_sessions_lock:
@@ -19311,89 +22887,29 @@ def start_web_server(args_param):
             params = request.get_json() or {}
         else:
             params = dict(request.args)
+        spec = API_METHOD_REGISTRY.get(method)
+        if spec is None:
+            return (
+                jsonify({"success": False, "message": f"未知的API方法: {method}"}),
+                404,
+            )
+        param_error = spec.check_params(params)
+        if param_error:
+            return jsonify({"success": False, "message": param_error}), 400
         try:
             # ============================================================
             # 权限检查：细粒度权限控制
             # ============================================================
-            permission_required_methods = {
-                # ===== 通知相关权限 =====
-                "mark_notification_read": "mark_notifications_read",
-                "mark_all_read": "mark_notifications_read",
-                "get_notifications": "view_notifications",
-                "get_cached_notifications": "view_notifications",
-                # ===== 签到相关权限 =====
-                "trigger_attendance": "use_attendance",
-                # ===== 多账号管理相关权限 =====
-                "enter_multi_account_mode": "execute_multi_account",
-                "exit_multi_account_mode": "execute_multi_account",
-                "multi_add_account": "execute_multi_account",
-                "multi_remove_account": "execute_multi_account",
-                "multi_remove_selected_accounts": "execute_multi_account",
-                "multi_remove_all_accounts": "execute_multi_account",
-                "multi_get_all_config_users": "execute_multi_account",
-                "multi_load_accounts_from_config": "execute_multi_account",
-                "multi_import_accounts": "execute_multi_account",
-                "multi_export_accounts_summary": "execute_multi_account",
-                "multi_download_import_template": "execute_multi_account",
-                "multi_refresh_all_statuses": "execute_multi_account",
-                "multi_refresh_single_status": "execute_multi_account",
-                "multi_get_all_accounts_status": "execute_multi_account",
-                "multi_get_account_params": "execute_multi_account",
-                "multi_update_account_param": "execute_multi_account",
-                "multi_start_single_account": "execute_multi_account",
-                "multi_start_all_accounts": "execute_multi_account",
-                "multi_stop_single_account": "execute_multi_account",
-                "multi_stop_all_accounts": "execute_multi_account",
-                # ===== 任务管理相关权限 =====
-                "load_tasks": "view_tasks",
-                "get_task_details": "view_tasks",
-                "get_task_history": "view_tasks",
-                "get_historical_track": "view_tasks",
-                "get_run_status": "view_tasks",
-                "create_task": "create_tasks",
-                "delete_task": "delete_tasks",
-                "start_single_run": "start_tasks",
-                "start_all_runs": "start_tasks",
-                "stop_run": "stop_tasks",
-                "stop_current_run": "stop_tasks",
-                "import_offline_file": "import_offline",
-                "import_task_data": "import_offline",
-                "export_offline_file": "export_data",
-                "export_task_data": "export_data",
-                "record_path": "record_path",
-                "set_draft_path": "record_path",
-                "clear_path": "record_path",
-                "process_path": "record_path",
-                "clear_current_task_draft": "record_path",
-                "auto_generate_path": "auto_generate_path",
-                "auto_generate_path_with_api": "auto_generate_path",
-                "update_param": "modify_params",
-                "generate_new_ua": "modify_params",
-                "save_amap_key": "modify_params",
-                # ===== 地图查看权限 =====
-                "get_map_data": "view_map",
-                # ===== 用户信息权限 =====
-                "get_user_info": "view_user_details",
-                "on_user_selected": "view_user_details",
-                "update_user_settings": "modify_user_settings",
-                # ===== 会话管理权限 =====
-                "get_user_sessions": "manage_own_sessions",
-                # ===== 日志权限 =====
-                "get_logs": "view_logs",
-                "clear_logs": "clear_logs",
-            }
-
-            if method in permission_required_methods:
-                required_permission = permission_required_methods[method]
+            if spec.permission is not None:
                 if hasattr(api_instance, "auth_username"):
                     if not auth_system.check_permission(
-                        api_instance.auth_username, required_permission
+                        api_instance.auth_username, spec.permission
                     ):
                         return (
                             jsonify(
                                 {
                                     "success": False,
-                                    "message": f"权限不足：需要 {required_permission} 权限",
+                                    "message": f"权限不足：需要 {spec.permission} 权限",
                                 }
                             ),
                             403,
@@ -19410,75 +22926,44 @@ def start_web_server(args_param):
                     f"会话 {session_id} 调用 get_initial_data，更新活跃时间戳"
                 )
 
-            if hasattr(api_instance, method):
-                func = getattr(api_instance, method)
-                logging.debug(
-                    f"API调用: 方法={method}, 参数类型={type(params)}, 参数内容={str(params)[:200]}"
-                )
+            logging.debug(f"API调用: 方法={method}, 参数个数={len(params)}")
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = spec.invoke(api_instance, params)
+                failed = False
+            finally:
+                spec.record(time.perf_counter() - started, failed)
 
-                if params:
-                    result = (
-                        func(**params) if isinstance(params, dict) else func(*params)
+            if method == "on_user_selected" and result and isinstance(result, dict):
+                has_auto_fill = False
+                if hasattr(api_instance, "auth_username"):
+                    has_auto_fill = auth_system.check_permission(
+                        api_instance.auth_username, "auto_fill_password"
                     )
-                else:
-                    result = func()
-
-                if method == "on_user_selected" and result and isinstance(result, dict):
-                    has_auto_fill = False
-                    if hasattr(api_instance, "auth_username"):
-                        has_auto_fill = auth_system.check_permission(
-                            api_instance.auth_username, "auto_fill_password"
+                if not has_auto_fill:
+                    result["password"] = ""
+            if spec.auto_save:
+                mark_session_dirty(session_id, api_instance)
+                logging.debug(f"API '{method}' 调用后自动保存会话状态")
+            response = jsonify(result if result is not None else {"success": True})
+            if (
+                hasattr(api_instance, "is_authenticated")
+                and api_instance.is_authenticated
+            ):
+                if hasattr(api_instance, "is_guest") and not api_instance.is_guest:
+                    token = renewed_token or request.cookies.get("auth_token")
+                    if token:
+                        response.set_cookie(
+                            "auth_token",
+                            value=token,
+                            max_age=3600,
+                            httponly=True,
+                            secure=False,
+                            samesite="Lax",
                         )
-                    if not has_auto_fill:
-                        result["password"] = ""
-                auto_save_methods = [
-                    "login",
-                    "logout",
-                    "load_tasks",
-                    "select_task",
-                    "start_single_run",
-                    "start_all_runs",
-                    "stop_current_run",
-                    "import_offline_file",
-                    "export_offline_file",
-                    "record_path",
-                    "auto_generate_path",
-                    "process_path",
-                    "clear_path",
-                    "update_param",
-                    "generate_new_ua",
-                    "enter_multi_account_mode",
-                    "exit_multi_account_mode",
-                    "enter_single_account_mode",
-                    "multi_add_account",
-                    "multi_remove_account",
-                ]
-                if method in auto_save_methods:
-                    save_session_state(session_id, api_instance)
-                    logging.debug(f"API '{method}' 调用后自动保存会话状态")
-                response = jsonify(result if result is not None else {"success": True})
-                if (
-                    hasattr(api_instance, "is_authenticated")
-                    and api_instance.is_authenticated
-                ):
-                    if hasattr(api_instance, "is_guest") and not api_instance.is_guest:
-                        token = request.cookies.get("auth_token")
-                        if token:
-                            response.set_cookie(
-                                "auth_token",
-                                value=token,
-                                max_age=3600,
-                                httponly=True,
-                                secure=False,
-                                samesite="Lax",
-                            )
 
-                return response
-            else:
-                return (
-                    jsonify({"success": False, "message": f"未知的API方法: {method}"}),
-                    404,
-                )
+            return response
         except Exception as e:
             logging.error(f"API调用失败 {method}: {e}", exc_info=True)
             return jsonify({"success": False, "message": "服务器内部错误"}), 500
@@ -19797,11 +23282,10 @@ def start_web_server(args_param):
                 user_hash = hashlib.sha256(auth_username.encode()).hexdigest()
                 user_file = os.path.join(SYSTEM_ACCOUNTS_DIR, f"{user_hash}.json")
 
-                if os.path.exists(user_file):
-                    with open(user_file, "r", encoding="utf-8") as f:
-                        user_data = json.load(f)
-                        user_nickname = user_data.get("nickname", auth_username)
-                        avatar_url = user_data.get("avatar_url") or "default_avatar.png"
+                if auth_system.users.exists(user_file):
+                    user_data = auth_system.users.read(user_file)
+                    user_nickname = user_data.get("nickname", auth_username)
+                    avatar_url = user_data.get("avatar_url") or "default_avatar.png"
             except Exception as e:
                 logging.warning(f"[留言板] 读取用户信息失败: {str(e)}")
                 user_nickname = auth_username
@@ -20353,12 +23837,13 @@ def start_web_server(args_param):
                 "html": captcha_html,
                 "session_id": session_id,
                 "timestamp": time.time(),
-                "expires_at": time.time() + 600,
+                "expires_at": time.time() + CAPTCHA_TTL_S,
             }
 
             captcha_file = os.path.join(captchas_dir, f"{captcha_id}.json")
             with open(captcha_file, "w", encoding="utf-8") as f:
                 json.dump(captcha_data, f, indent=2, ensure_ascii=False)
+            expiry_service.schedule("captcha", captcha_id, captcha_data["expires_at"])
 
             def log_captcha_history(
                 p_captcha_id, p_code, p_html, p_session_id, p_client_ip, p_user_agent
@@ -20414,30 +23899,6 @@ def start_web_server(args_param):
                 daemon=True,
             ).start()
 
-            def cleanup_expired_captchas():
-                try:
-                    current_time = time.time()
-                    for filename in os.listdir(captchas_dir):
-                        if filename.endswith(".json"):
-                            file_path = os.path.join(captchas_dir, filename)
-                            try:
-                                with open(file_path, "r", encoding="utf-8") as f:
-                                    data = json.load(f)
-                                if data.get("expires_at", 0) < current_time:
-                                    os.remove(file_path)
-                                    logging.debug(
-                                        f"[验证码清理] 删除过期验证码: {filename}"
-                                    )
-                            except Exception as e:
-                                logging.warning(
-                                    f"[验证码清理] 处理文件 {filename} 时出错: {e}"
-                                )
-                except Exception as e:
-                    logging.error(f"[验证码清理] 清理过期验证码失败: {e}")
-
-            import threading
-
-            threading.Thread(target=cleanup_expired_captchas, daemon=True).start()
             if session_id and str(session_id).lower() not in ("null", "undefined", ""):
                 logging.info(
                     f"[本地验证码] 已生成验证码 ID: {captcha_id} 会话: {session_id} 长度: {length} 尺寸: {captcha_width}x{captcha_height}px"
@@ -21175,12 +24636,13 @@ def start_web_server(args_param):
                 "html": html,
                 "session_id": request.headers.get("X-Session-ID", "test_session"),
                 "timestamp": time.time(),
-                "expires_at": time.time() + 600,
+                "expires_at": time.time() + CAPTCHA_TTL_S,
             }
 
             captcha_file = os.path.join(captchas_dir, f"{captcha_id}.json")
             with open(captcha_file, "w", encoding="utf-8") as f:
                 json.dump(captcha_data, f, indent=2, ensure_ascii=False)
+            expiry_service.schedule("captcha", captcha_id, captcha_data["expires_at"])
             try:
                 history_dir = os.path.join(LOGIN_LOGS_DIR, "captcha_history")
                 os.makedirs(history_dir, exist_ok=True)
@@ -21326,6 +24788,15 @@ def start_web_server(args_param):
                 "active_background_tasks": active_tasks,
                 "current_thread_chrome_contexts": contexts_count,
                 "cdn_cache": cdn_cache_status,
+                "login_admission": login_admission.get_metrics(),
+                "password_hashing": password_hasher.get_metrics(),
+                "static_assets": asset_manifest.get_metrics(),
+                "api_dispatch": get_api_dispatch_metrics(),
+                "school_cookie_cache": school_cookie_cache.get_metrics(),
+                "pending_session_writes": session_flusher.pending_count(),
+                "session_memory": web_sessions.get_metrics(),
+                "expiry": expiry_service.get_metrics(),
+                "pending_token_writes": token_manager.pending_count(),
                 "response_time_ms": response_time_ms,
             }
         )
@@ -21381,75 +24852,18 @@ def start_web_server(args_param):
         except Exception as e:
             logging.error(f"[SocketIO] 推送 'verification_codes_updated' 失败: {e}")
 
-    def cleanup_sessions():
-        """定期清理超过24小时无活动的会话，并强制执行内存会话数量限制"""
-        while True:
-            time.sleep(3600)
-            try:
-                current_time = time.time()
-                expired_sessions = []
-
-                with web_sessions_lock:
-                    for session_id in list(web_sessions.keys()):
-                        with session_activity_lock:
-                            last_activity = session_activity.get(session_id, 0)
-                            if current_time - last_activity > 86400:
-                                expired_sessions.append(session_id)
-                    remaining_sessions = len(web_sessions) - len(expired_sessions)
-                    if remaining_sessions > MAX_MEMORY_SESSIONS:
-                        with session_activity_lock:
-                            active_sessions = [
-                                sid
-                                for sid in web_sessions.keys()
-                                if sid not in expired_sessions
-                            ]
-                            sorted_sessions = sorted(
-                                active_sessions,
-                                key=lambda sid: session_activity.get(sid, 0),
-                            )
-                            sessions_to_remove = (
-                                remaining_sessions - MAX_MEMORY_SESSIONS
-                            )
-                            for session_id in sorted_sessions[:sessions_to_remove]:
-                                expired_sessions.append(session_id)
-                        logging.warning(
-                            f"[会话清理] 内存会话数超过限制({MAX_MEMORY_SESSIONS})，额外清理了 {sessions_to_remove} 个最旧会话"
-                        )
-                    for session_id in expired_sessions:
-                        try:
-                            if chrome_pool:
-                                chrome_pool.cleanup_context(session_id)
-                            if session_id in web_sessions:
-                                del web_sessions[session_id]
-
-                            with session_activity_lock:
-                                if session_id in session_activity:
-                                    del session_activity[session_id]
-                            logging.info(f"[会话清理] 已清理会话: {session_id[:8]}...")
-                        except Exception as e:
-                            logging.error(
-                                f"[会话清理] 清理会话 {session_id[:8]}... 时出错: {e}"
-                            )
-
-                if expired_sessions:
-                    logging.info(
-                        f"[会话清理] 本次清理了 {len(expired_sessions)} 个会话"
-                    )
-                    gc.collect()
-                else:
-                    with web_sessions_lock:
-                        logging.debug(
-                            f"[会话清理] 当前内存会话数: {len(web_sessions)}/{MAX_MEMORY_SESSIONS}"
-                        )
-            except Exception as e:
-                logging.error(f"[会话清理] 清理过程出错: {e}", exc_info=True)
-
-    cleanup_thread = threading.Thread(target=cleanup_sessions, daemon=True)
-    cleanup_thread.start()
+    # 内存会话数量与估算内存超出预算时，由后台线程按 LRU 将空闲会话写回存储并移出内存
+    web_sessions.start_evictor()
     logging.info("正在加载持久化会话...")
     load_all_sessions(args)
+    atexit.register(session_flusher.flush_all)
+    atexit.register(token_manager.flush_all)
     logging.info("正在启动会话监控...")
     start_session_monitor()
+    token_manager.schedule_expiry()
+    schedule_captcha_expiry()
+    if background_task_manager:
+        background_task_manager.schedule_expiry()
     try:
         start_background_auto_attendance(args)
     except Exception as e:
@@ -21554,6 +24968,11 @@ def start_web_server(args_param):
             logging.info(
                 f"已清空后台任务管理器的内存状态（清理了 {initial_task_count} 个任务记录）。"
             )
+    logging.info("正在根据预写日志恢复中断的跑步任务...")
+    try:
+        resume_journaled_runs()
+    except Exception as e:
+        logging.error(f"恢复中断的跑步任务失败: {e}", exc_info=True)
     # ============================================================================
     # SSL/HTTPS 配置加载和验证
     # 在启动服务器之前，加载SSL配置并验证证书（如果启用了SSL）
@@ -21870,6 +25289,97 @@ def start_web_server(args_param):
         pass
 
 
+def _make_benchmark_track(points: int, interval_ms: int = 3000):
+    """生成一条用于压测的合成轨迹（沿直线前进并叠加少量随机抖动）"""
+    lon, lat = 113.3900, 22.5200
+    coords = [(lon, lat, 0)]
+    for _ in range(max(1, points - 1)):
+        lon += 0.00003 + random.uniform(-0.000005, 0.000005)
+        lat += random.uniform(-0.000005, 0.000005)
+        coords.append((lon, lat, int(random.uniform(0.9, 1.1) * interval_ms)))
+    return coords
+
+
+def run_throughput_benchmark(args, runs=10, accounts=0, points=600):
+    """
+    使用虚拟时钟在离线模式下端到端执行跑步任务，报告吞吐量与单次任务 CPU 开销。
+      - runs:     单账号模式下顺序执行的任务数
+      - accounts: 多账号批量模式下并发执行任务的账号数（0 表示跳过）
+      - points:   每个任务的轨迹点数（600 点约等于 30 分钟的跑步）
+    """
+    clock = VirtualClock()
+    api = Api(args)
+    api.is_offline_mode = True
+    api.clock = clock
+    api.user_data.student_id = "bench"
+    track = _make_benchmark_track(points)
+    track_time_s = sum(p[2] for p in track) / 1000.0
+
+    def _new_run_data(name):
+        run_data = RunData()
+        run_data.run_name = name
+        run_data.run_coords = list(track)
+        run_data.total_run_time_s = track_time_s
+        run_data.total_run_distance_m = 1.0
+        return run_data
+
+    def _report(title, count, wall_s, cpu_s, virtual_s):
+        print(f"[压测] {title}")
+        print(f"  任务数: {count}, 每任务轨迹点: {points}")
+        print(f"  虚拟时间: {virtual_s:.0f}s, 实际耗时: {wall_s:.3f}s")
+        print(f"  吞吐量: {count / wall_s if wall_s > 0 else float('inf'):.2f} 任务/秒")
+        print(f"  CPU: {cpu_s * 1000 / max(1, count):.2f} ms/任务")
+
+    # 离线模式下任务状态确认必然失败，屏蔽逐任务的日志噪音，仅输出压测结果
+    previous_disable = logging.root.manager.disable
+    logging.disable(logging.WARNING)
+    try:
+        if runs > 0:
+            slept_before = clock.total_slept_s
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            for n in range(runs):
+                run_data = _new_run_data(f"bench-{n}")
+                api.stop_run_flag.clear()
+                api._run_submission_thread(run_data, -1, api.api_client, True)
+            _report(
+                "单账号顺序执行",
+                runs,
+                time.perf_counter() - wall_start,
+                time.process_time() - cpu_start,
+                clock.total_slept_s - slept_before,
+            )
+
+        if accounts > 0:
+            sessions = []
+            for n in range(accounts):
+                acc = AccountSession(f"bench{n:04d}", "", api)
+                acc.user_data.student_id = acc.username
+                sessions.append(acc)
+            slept_before = clock.total_slept_s
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            threads = [
+                threading.Thread(
+                    target=api._run_submission_thread,
+                    args=(_new_run_data(acc.username), -1, acc.api_client, True),
+                    daemon=True,
+                )
+                for acc in sessions
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            _report(
+                "多账号批量执行",
+                accounts,
+                time.perf_counter() - wall_start,
+                time.process_time() - cpu_start,
+                clock.total_slept_s - slept_before,
+            )
+    finally:
+        logging.disable(previous_disable)
+
+
 def main():
     """主函数，启动Web服务器模式（已弃用桌面模式）"""
     # ========== 第1步：导入内置模块 ==========
@@ -21912,6 +25422,26 @@ def main():
         action="store_true",
         help="启用调试日志（兼容旧参数，等同于 --log-level debug）",
     )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="以虚拟时钟离线执行跑步任务并报告吞吐量，完成后退出（不启动Web服务器）",
+    )
+    parser.add_argument(
+        "--benchmark-runs", type=int, default=10, help="压测：顺序执行的任务数（默认10）"
+    )
+    parser.add_argument(
+        "--benchmark-accounts",
+        type=int,
+        default=0,
+        help="压测：并发执行任务的账号数（默认0，不执行批量压测）",
+    )
+    parser.add_argument(
+        "--benchmark-points",
+        type=int,
+        default=600,
+        help="压测：每个任务的轨迹点数（默认600，约30分钟）",
+    )
     args = parser.parse_args()
     # ========== 第6步：配置日志级别 ==========
     selected_level_name = "debug" if args.debug else args.log_level
@@ -21935,6 +25465,14 @@ def main():
     )
     logging.info(f"服务器地址: {args.host}:{args.port}")
     logging.info("=" * 60)
+    if args.benchmark:
+        run_throughput_benchmark(
+            args,
+            runs=args.benchmark_runs,
+            accounts=args.benchmark_accounts,
+            points=args.benchmark_points,
+        )
+        return
     # ========== 第7步：检查Playwright是否可用 ==========
     if not playwright_available:
         print("\n" + "=" * 60)
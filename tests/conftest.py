@@ -0,0 +1,43 @@
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+# main.py 在启动时通过 import_standard_libraries() 按需导入其余内置模块（同时会执行
+# eventlet.monkey_patch()）；测试中只导入这些模块，不打补丁
+for _name in (
+    "atexit",
+    "base64",
+    "bisect",
+    "copy",
+    "csv",
+    "functools",
+    "gzip",
+    "hmac",
+    "io",
+    "ipaddress",
+    "math",
+    "mimetypes",
+    "pickle",
+    "queue",
+    "secrets",
+    "socket",
+    "sqlite3",
+    "string",
+    "urllib.parse",
+    "uuid",
+    "warnings",
+):
+    importlib.import_module(_name)
+    _top = _name.split(".")[0]
+    setattr(main, _top, sys.modules[_top])
+
+# 第三方依赖由 check_and_import_dependencies() 以别名注入
+import numpy  # noqa: E402
+import requests  # noqa: E402
+
+main.np = numpy
+main.requests = requests
@@ -0,0 +1,29 @@
+import main
+
+
+def test_registry_only_exposes_public_api_methods():
+    registry = main.API_METHOD_REGISTRY
+    assert "login" in registry
+    assert not any(name.startswith("_") for name in registry)
+    assert not main.API_INTERNAL_METHODS & set(registry)
+    # 实例属性不在调度表中
+    assert "login_success" not in registry
+
+
+def test_only_state_replacing_methods_take_the_session_lock():
+    registry = main.API_METHOD_REGISTRY
+    assert main.API_SESSION_LOCKED_METHODS <= set(registry)
+    locked = {name for name, spec in registry.items() if not spec.lock_free}
+    assert locked == main.API_SESSION_LOCKED_METHODS
+    for name in ("get_run_status", "load_tasks", "stop_run", "multi_refresh_all_statuses"):
+        assert registry[name].lock_free
+
+
+def test_check_params_follows_signature():
+    spec = main.API_METHOD_REGISTRY["login"]
+    assert spec.check_params({"username": "a", "password": "b"}) is None
+    assert spec.check_params(["a", "b"]) is None
+    assert spec.check_params({"username": "a"}) == "缺少参数: password"
+    assert spec.check_params({"username": "a", "password": "b", "x": 1}) == "未知参数: x"
+    assert spec.check_params(["a"]).startswith("参数数量错误")
+    assert spec.check_params("a") == "参数格式错误"
@@ -0,0 +1,64 @@
+import configparser
+import threading
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def auth(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "SYSTEM_ACCOUNTS_DIR", str(tmp_path))
+    auth = object.__new__(main.AuthSystem)
+    auth.config = configparser.ConfigParser()
+    auth.lock = threading.Lock()
+    auth.users = main.UserDirectory(str(tmp_path))
+    auth.attempts = []
+    auth.check_brute_force = lambda username, ip: (False, "")
+    auth._password_needs_rehash = lambda stored: False
+    auth._log_login_attempt = lambda username, ok, ip, ua, reason: auth.attempts.append(reason)
+    auth.users.write(
+        auth.get_user_file_path("alice"), {"password": "hash-1", "group": "user"}
+    )
+    return auth
+
+
+def _verify_then(auth, change):
+    """模拟 bcrypt 校验期间（未持锁）另一请求修改了该用户"""
+
+    def verify(password, stored):
+        path = auth.get_user_file_path("alice")
+        data = dict(auth.users.read(path))
+        change(data)
+        auth.users.write(path, data)
+        return True
+
+    auth._verify_password = verify
+
+
+def test_user_banned_during_password_check_is_rejected(auth):
+    _verify_then(auth, lambda data: data.update(banned=True))
+
+    result = auth.authenticate("alice", "pw")
+
+    assert result["success"] is False
+    assert auth.attempts == ["user_banned"]
+
+
+def test_password_reset_during_password_check_is_rejected(auth):
+    _verify_then(auth, lambda data: data.update(password="hash-2"))
+
+    result = auth.authenticate("alice", "pw")
+
+    assert result["success"] is False
+    assert auth.attempts == ["password_changed"]
+    assert auth.users.read(auth.get_user_file_path("alice"))["password"] == "hash-2"
+
+
+def test_unchanged_user_logs_in(auth):
+    _verify_then(auth, lambda data: None)
+
+    result = auth.authenticate("alice", "pw")
+
+    assert result["success"] is True
+    assert auth.attempts == ["success"]
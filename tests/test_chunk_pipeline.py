@@ -0,0 +1,61 @@
+import threading
+
+import main
+
+
+class _BlockingApi:
+    """第一块提交时阻塞，便于在其后仍有排队块时触发停止"""
+
+    is_offline_mode = True
+
+    def __init__(self):
+        self.submitted = []
+        self.first_started = threading.Event()
+        self.release_first = threading.Event()
+
+    def _submit_chunk(self, run_data, chunk, start_time_ms, is_finish, chunk_start_index, client, user):
+        self.submitted.append(chunk_start_index)
+        if chunk_start_index == 0:
+            self.first_started.set()
+            self.release_first.wait(timeout=5)
+        return True
+
+
+def _make_pipeline(api, stop_flag):
+    run = main.RunData()
+    run.trid = "trid-1"
+    return main.ChunkSubmissionPipeline(
+        api, run, client=None, user=None, start_time_ms="0", stop_flag=stop_flag, retry_delay_s=0
+    )
+
+
+def test_queued_chunks_are_dropped_after_stop():
+    api = _BlockingApi()
+    stop_flag = threading.Event()
+    pipeline = _make_pipeline(api, stop_flag)
+
+    pipeline.submit([(0, 0, 0)] * 40, 0, False)
+    assert api.first_started.wait(timeout=5)
+    pipeline.submit([(0, 0, 0)] * 40, 40, False)
+    pipeline.submit([(0, 0, 0)] * 10, 80, True)
+
+    stop_flag.set()
+    api.release_first.set()
+
+    assert pipeline.drain(timeout=5) is False
+    assert api.submitted == [0]
+    assert pipeline.stopped
+    assert pipeline.acked_offset == 40
+
+
+def test_drain_succeeds_when_not_stopped():
+    api = _BlockingApi()
+    api.release_first.set()
+    pipeline = _make_pipeline(api, threading.Event())
+
+    pipeline.submit([(0, 0, 0)] * 40, 0, False)
+    pipeline.submit([(0, 0, 0)] * 10, 40, True)
+
+    assert pipeline.drain(timeout=5) is True
+    assert api.submitted == [0, 40]
+    assert not pipeline.stopped
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import main
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_position_skips_cancelled_waiters():
+    controller = main.LoginAdmissionController(max_concurrency=1, rate_per_second=0)
+    controller.WAIT_SLICE_S = 0.01
+    assert controller.acquire(lambda: False)
+
+    cancel_first = threading.Event()
+    positions = []
+    first = threading.Thread(target=controller.acquire, args=(cancel_first.is_set,))
+    first.start()
+    assert wait_for(lambda: len(controller._waiters) == 1)
+    second = threading.Thread(
+        target=controller.acquire, args=(lambda: len(positions) >= 2, positions.append)
+    )
+    second.start()
+    assert wait_for(lambda: positions == [2])
+
+    cancel_first.set()
+    first.join(timeout=2)
+    second.join(timeout=2)
+    assert positions == [2, 1]
+    assert controller.get_metrics()["waiting"] == 0
+
+
+def test_cancel_during_rate_wait_returns_the_slot():
+    controller = main.LoginAdmissionController(max_concurrency=5, rate_per_second=1)
+    assert controller.acquire(lambda: False)
+    next_slot = controller._next_slot_at
+
+    # 第二个登录需要等待约 1 秒的速率时间点，等待期间取消
+    assert not controller.acquire(lambda: True)
+
+    assert controller._next_slot_at == next_slot
+    metrics = controller.get_metrics()
+    assert metrics["active"] == 1
+    assert metrics["cancelled"] == 1
+
+
+def test_concurrent_cancels_are_all_counted():
+    controller = main.LoginAdmissionController(max_concurrency=1, rate_per_second=0)
+    assert controller.acquire(lambda: False)
+    controller.WAIT_SLICE_S = 0.01
+
+    stop = threading.Event()
+    results = []
+
+    def waiter():
+        results.append(controller.acquire(stop.is_set))
+
+    threads = [threading.Thread(target=waiter) for _ in range(20)]
+    for t in threads:
+        t.start()
+    stop.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == [False] * 20
+    metrics = controller.get_metrics()
+    assert metrics["cancelled"] == 20
+    assert metrics["waiting"] == 0
+    assert metrics["active"] == 1
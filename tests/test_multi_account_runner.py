@@ -0,0 +1,95 @@
+import threading
+import time
+
+import main
+
+
+class FakeAccount:
+    def __init__(self, username):
+        self.username = username
+        self.stop_event = threading.Event()
+        self.worker_thread = None
+
+
+class FakeApi:
+    """只实现 MultiAccountRunner 用到的接口：记录每个账号的开始时间，并阻塞到放行"""
+
+    def __init__(self):
+        self.multi_run_stop_flag = threading.Event()
+        self.release = threading.Event()
+        self.started = {}
+        self.lock = threading.Lock()
+
+    def _multi_account_worker(self, acc, run_only_incomplete):
+        with self.lock:
+            self.started[acc.username] = time.monotonic()
+        self.release.wait(timeout=5)
+
+    def _update_account_status_js(self, acc, status_text=""):
+        pass
+
+    def _update_multi_global_buttons(self):
+        pass
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def submit_burst(runner, api, count, delay):
+    return [
+        runner.submit(api, FakeAccount(f"acc{i}"), delay, True) for i in range(count)
+    ]
+
+
+def test_burst_starts_together_with_idle_worker():
+    runner = main.MultiAccountRunner(max_workers=5)
+    warmup = FakeApi()
+    warmup.release.set()
+    runner.submit(warmup, FakeAccount("warmup"), 0, True).join(timeout=2)
+    # 预热账号结束后留下一个空闲线程，之后同时提交的账号不能都排给它
+    assert wait_for(lambda: runner._idle_workers == 1)
+
+    api = FakeApi()
+    handles = submit_burst(runner, api, 4, delay=0)
+    try:
+        assert wait_for(lambda: len(api.started) == 4)
+    finally:
+        api.release.set()
+        for handle in handles:
+            handle.join(timeout=2)
+
+
+def test_delayed_accounts_due_at_same_time_start_together():
+    runner = main.MultiAccountRunner(max_workers=5)
+    api = FakeApi()
+    handles = submit_burst(runner, api, 5, delay=0.05)
+    try:
+        assert wait_for(lambda: len(api.started) == 5)
+        starts = sorted(api.started.values())
+        assert starts[-1] - starts[0] < 0.5
+    finally:
+        api.release.set()
+        for handle in handles:
+            handle.join(timeout=2)
+
+
+def test_concurrency_is_capped_at_max_workers():
+    runner = main.MultiAccountRunner(max_workers=2)
+    api = FakeApi()
+    handles = submit_burst(runner, api, 4, delay=0)
+    try:
+        assert wait_for(lambda: len(api.started) == 2)
+        time.sleep(0.1)
+        assert len(api.started) == 2
+        assert runner.pending_count() == 2
+    finally:
+        api.release.set()
+        for handle in handles:
+            handle.join(timeout=2)
+    assert len(api.started) == 4
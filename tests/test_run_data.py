@@ -0,0 +1,26 @@
+import json
+
+import main
+
+
+def test_to_dict_of_restored_run_loads_geometry_and_is_json_serializable(tmp_path):
+    geometry = {
+        "target_points": [(120.1, 30.2), (120.3, 30.4)],
+        "recommended_coords": [],
+        "draft_coords": [(120.1, 30.2, 0), (120.2, 30.3, 1000)],
+        "run_coords": [],
+    }
+    meta = main.CoordinateSidecar.write(str(tmp_path), 0, geometry)
+    source = main.CoordinateSidecar(
+        str(tmp_path / meta["file"]), meta["segments"], meta["inline"]
+    )
+    run = main.RunData()
+    run.run_name = "晨跑"
+    run.attach_geometry_source(source)
+
+    details = run.to_dict()
+
+    json.dumps(details)
+    assert "_geometry_source" not in details
+    assert details["target_points"] == geometry["target_points"]
+    assert details["draft_coords"] == geometry["draft_coords"]
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import main
+
+
+class FakeApp:
+    def log(self, message):
+        pass
+
+
+class FakeClient:
+    """get_run_info_by_trid 的替身：可设置延迟与返回的完成状态"""
+
+    def __init__(self, delay=0.0, status=1, fail=False):
+        self.app = FakeApp()
+        self.delay = delay
+        self.status = status
+        self.fail = fail
+        self.calls = 0
+
+    def get_run_info_by_trid(self, trid):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            return None
+        return {"success": True, "data": {"recordMap": {"status": self.status}}}
+
+
+class FakeApi:
+    _web_session_id = None
+
+
+@pytest.fixture(autouse=True)
+def no_socketio(monkeypatch):
+    monkeypatch.setattr(main, "socketio", None, raising=False)
+
+
+def make_run(trid):
+    run = main.RunData()
+    run.trid = trid
+    run.run_name = trid
+    return run
+
+
+def test_slow_check_does_not_delay_other_confirmations():
+    service = main.RunFinalizationService(first_delay_s=0, max_parallel_checks=4)
+    slow_done, fast_done = threading.Event(), threading.Event()
+    service.register(FakeApi(), make_run("slow"), 0, FakeClient(delay=1.0), slow_done.set)
+    service.register(FakeApi(), make_run("fast"), 1, FakeClient(), fast_done.set)
+
+    assert fast_done.wait(timeout=0.5)
+    assert not slow_done.is_set()
+    assert slow_done.wait(timeout=2)
+
+
+def test_failed_check_notifies_and_retries():
+    service = main.RunFinalizationService(first_delay_s=0, base_backoff_s=0.05)
+    client = FakeClient(fail=True)
+    failed = threading.Event()
+    confirmed = threading.Event()
+    service.register(FakeApi(), make_run("t1"), -1, client, confirmed.set, failed.set)
+
+    assert failed.wait(timeout=1)
+    client.fail = False
+    assert confirmed.wait(timeout=1)
+    assert client.calls >= 2
+
+
+def test_unconfirmed_run_gives_up_after_horizon():
+    service = main.RunFinalizationService(
+        first_delay_s=0, base_backoff_s=0.01, max_backoff_s=0.01, horizon_s=0.1
+    )
+    failed = threading.Event()
+    run = make_run("t1")
+    service.register(FakeApi(), run, -1, FakeClient(status=0), None, failed.set)
+
+    assert failed.wait(timeout=2)
+    assert service.expired_count == 1
+    assert service.pending_count() == 0
+
+
+def test_backoff_runs_on_virtual_time():
+    clock = main.VirtualClock(start=1_700_000_000.0)
+    service = main.RunFinalizationService(clock=clock)
+    client = FakeClient(status=0)
+    failed = threading.Event()
+    service.register(FakeApi(), make_run("t1"), -1, client, None, failed.set)
+
+    # 默认 900 秒的确认时限在虚拟时间里走完，不需要真实等待
+    assert failed.wait(timeout=2)
+    assert clock.time() - 1_700_000_000.0 >= service.horizon_s
+    assert client.calls > 10
+    assert service.expired_count == 1
@@ -0,0 +1,104 @@
+import argparse
+import threading
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def session_env(tmp_path, monkeypatch):
+    """最小的会话存储环境：会话库、条带锁与内存会话表均位于临时目录"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "SCHOOL_ACCOUNTS_DIR", str(tmp_path / "school_accounts"))
+    monkeypatch.setattr(main, "RUN_JOURNAL_DIR", str(tmp_path / "run_journal"))
+    monkeypatch.setattr(
+        main,
+        "session_file_locks",
+        [threading.Lock() for _ in range(main.SESSION_LOCK_STRIPES)],
+        raising=False,
+    )
+    monkeypatch.setattr(
+        main, "session_store", main.SessionStore(str(tmp_path / "sessions.db")), raising=False
+    )
+    monkeypatch.setattr(main, "web_sessions", {}, raising=False)
+    monkeypatch.setattr(main, "web_sessions_lock", threading.Lock(), raising=False)
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """替换提交线程：只记录被恢复的任务，不执行真正的跑步流程"""
+    calls = []
+    done = threading.Event()
+
+    def fake_submission_thread(self, run_data, task_index, client, is_all, resume=None):
+        calls.append((run_data.trid, task_index, resume))
+        done.set()
+
+    monkeypatch.setattr(main.Api, "_run_submission_thread", fake_submission_thread)
+    return calls, done
+
+
+def make_api():
+    return main.Api(argparse.Namespace(headless=True, port=5000, host="127.0.0.1"))
+
+
+def save_session_mid_run(session_id):
+    api = make_api()
+    api._web_session_id = session_id
+    api.login_success = True
+    run = main.RunData()
+    run.run_name = "晨跑"
+    run.errand_schedule = "S1"
+    run.trid = "T1"
+    run.run_coords = [(120.0, 30.0, 0), (120.001, 30.0, 1000), (120.002, 30.0, 2000)]
+    api.all_run_data = [run]
+    api.current_run_idx = 0
+    # 任务运行期间停止标志是清除状态，会随会话一起保存
+    api.stop_run_flag.clear()
+    main.save_session_state(session_id, api, force_save=True)
+    journal = main.RunJournal.begin(session_id, 0, run, "1700000000000")
+    journal.record_ack(1)
+    return journal
+
+
+def restore_session(session_id):
+    state = main.load_session_state(session_id)
+    api = make_api()
+    api._web_session_id = session_id
+    main.restore_session_to_api_instance(api, state)
+    main.web_sessions[session_id] = api
+    return api
+
+
+def test_interrupted_run_is_resumed_after_restart(session_env, started):
+    calls, done = started
+    journal = save_session_mid_run("sid-1")
+    api = restore_session("sid-1")
+    assert not api.stop_run_flag.is_set()
+
+    main.resume_journaled_runs()
+
+    assert done.wait(timeout=2)
+    trid, task_index, resume = calls[0]
+    assert (trid, task_index) == ("T1", 0)
+    assert resume["acked_offset"] == 1
+    assert main.os.path.exists(journal.path)
+
+
+def test_journal_of_live_run_is_left_alone(session_env, started):
+    calls, _ = started
+    journal = save_session_mid_run("sid-1")
+    api = restore_session("sid-1")
+    release = threading.Event()
+    live = threading.Thread(target=release.wait, args=(2,))
+    live.start()
+    api._live_submission_threads.add(live)
+    try:
+        main.resume_journaled_runs()
+    finally:
+        release.set()
+        live.join()
+
+    assert calls == []
+    assert main.os.path.exists(journal.path)
@@ -0,0 +1,55 @@
+import json
+import types
+
+import requests
+
+import main
+
+
+def make_client():
+    return types.SimpleNamespace(session=requests.Session())
+
+
+def test_cookies_round_trip_with_domain_and_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "SCHOOL_ACCOUNTS_DIR", str(tmp_path))
+    cache = main.SchoolCookieCache(enabled=True, verify_interval_s=3600)
+    client = make_client()
+    jar = client.session.cookies
+    jar.set("shiroCookie", "abc", domain="run.example.edu", path="/")
+    jar.set("JSESSIONID", "one", domain="run.example.edu", path="/app")
+    jar.set("JSESSIONID", "two", domain="map.example.edu", path="/")
+    cache.remember(client, "alice", "pw", {"success": True, "data": {"id": 1}})
+
+    # 新实例从磁盘读取，确认持久化格式保留了 domain/path
+    restored_cache = main.SchoolCookieCache(enabled=True, verify_interval_s=3600)
+    restored = make_client()
+    resp = restored_cache.restore(restored, "alice", "pw")
+
+    assert resp == {"success": True, "data": {"id": 1}, "from_cache": True}
+    cookies = {(c.name, c.domain, c.path): c.value for c in restored.session.cookies}
+    assert cookies == {
+        ("shiroCookie", "run.example.edu", "/"): "abc",
+        ("JSESSIONID", "run.example.edu", "/app"): "one",
+        ("JSESSIONID", "map.example.edu", "/"): "two",
+    }
+
+
+def test_legacy_flat_cache_entry_is_still_restored(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "SCHOOL_ACCOUNTS_DIR", str(tmp_path))
+    cache = main.SchoolCookieCache(enabled=True, verify_interval_s=3600)
+    path = cache._path("alice")
+    main.os.makedirs(main.os.path.dirname(path))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "secret": cache._secret_digest("alice", "pw"),
+                "cookies": {"shiroCookie": "abc"},
+                "login_data": {},
+                "verified_at": main.time.time(),
+            },
+            f,
+        )
+
+    client = make_client()
+    assert cache.restore(client, "alice", "pw")["from_cache"] is True
+    assert client.session.cookies.get("shiroCookie") == "abc"
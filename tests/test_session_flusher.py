@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def saves(monkeypatch):
+    """替换 save_session_state：记录写入的会话，并可在写入过程中阻塞"""
+    record = {"saved": [], "entered": threading.Event(), "release": threading.Event()}
+    record["release"].set()
+
+    def fake_save(session_id, api_instance, force_save=False):
+        record["entered"].set()
+        record["release"].wait(timeout=5)
+        record["saved"].append(session_id)
+
+    monkeypatch.setattr(main, "save_session_state", fake_save)
+    return record
+
+
+def test_mark_deleted_drops_pending_and_later_writes(saves):
+    flusher = main.SessionFlusher(flush_interval_s=60)
+    flusher.mark_dirty("s1", object())
+    flusher.mark_deleted("s1")
+    flusher.mark_dirty("s1", object())
+    assert flusher.pending_count() == 0
+    flusher.flush_all()
+    assert saves["saved"] == []
+
+
+def test_mark_deleted_waits_for_in_flight_write(saves):
+    flusher = main.SessionFlusher(flush_interval_s=0)
+    saves["release"].clear()
+    flusher.mark_dirty("s1", object())
+    assert saves["entered"].wait(timeout=2)
+
+    deleted = threading.Event()
+
+    def delete():
+        flusher.mark_deleted("s1")
+        deleted.set()
+
+    threading.Thread(target=delete).start()
+    # 写入仍在进行，删除必须等它结束后才能继续（随后才会从会话存储中删除）
+    assert not deleted.wait(timeout=0.2)
+    saves["release"].set()
+    assert deleted.wait(timeout=2)
+    assert saves["saved"] == ["s1"]
+
+
+def test_queued_write_is_skipped_after_delete(saves):
+    flusher = main.SessionFlusher(flush_interval_s=60)
+    flusher.mark_dirty("s1", object())
+    with flusher._cond:
+        batch = [("s1", flusher._dirty.pop("s1")[0])]
+        flusher._flushing.update(sid for sid, _ in batch)
+    flusher.mark_deleted("s1", timeout=0.05)
+    flusher._write_batch(batch)
+    assert saves["saved"] == []
+    assert not flusher._flushing
@@ -0,0 +1,127 @@
+import time as real_time
+
+import pytest
+
+import main
+
+
+class FakeTime:
+    """替换 main.time：time() 返回可控的当前时间，其余函数沿用真实实现"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(real_time, name)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime(1_700_000_000.0)
+    monkeypatch.setattr(main, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def signed_manager(tmp_path, clock):
+    manager = main.TokenManager(str(tmp_path / "tokens"), flush_interval_s=0)
+    manager.token_format = "signed"
+    return manager
+
+
+def test_signed_token_survives_an_hour_of_activity(signed_manager, clock):
+    first = token = signed_manager.create_token("alice", "session-1")
+
+    # 两小时内每 10 分钟一次请求：每次校验通过后按续期结果更新 Cookie
+    for _ in range(12):
+        clock.now += 600
+        assert signed_manager.verify_token("alice", "session-1", token) == (True, "valid")
+        token = signed_manager.refresh_token("alice", "session-1", token)
+
+    assert token != first
+    assert signed_manager.verify_token("alice", "session-1", first) == (
+        False,
+        "token_expired",
+    )
+
+
+def test_signed_token_is_not_reissued_early(signed_manager, clock):
+    token = signed_manager.create_token("alice", "session-1")
+    clock.now += 600
+    assert signed_manager.refresh_token("alice", "session-1", token) == token
+
+
+def test_signed_token_expires_without_activity(signed_manager, clock):
+    token = signed_manager.create_token("alice", "session-1")
+    clock.now += main.TokenManager.TOKEN_TTL_S + 1
+    assert signed_manager.verify_token("alice", "session-1", token) == (
+        False,
+        "token_expired",
+    )
+
+
+def test_logout_revokes_renewed_token(signed_manager, clock):
+    token = signed_manager.create_token("alice", "session-1")
+    clock.now += 3000
+    renewed = signed_manager.refresh_token("alice", "session-1", token)
+    assert renewed != token
+    clock.now += 1
+    signed_manager.invalidate_token("alice")
+    clock.now += 1
+    assert signed_manager.verify_token("alice", "session-1", renewed)[0] is False
+
+
+@pytest.mark.parametrize(
+    "mangle",
+    [
+        lambda token: token.rsplit(".", 1)[0] + ".签名",
+        lambda token: ".".join(token.split(".")[:2] + ["载荷", "签名"]),
+        lambda token: "v1.密钥.载荷.签名",
+        lambda token: "v1.x.y",
+    ],
+)
+def test_malformed_signed_token_is_rejected(signed_manager, mangle):
+    token = signed_manager.create_token("alice", "session-1")
+    assert signed_manager.verify_token("alice", "session-1", mangle(token)) == (
+        False,
+        "token_mismatch",
+    )
+
+
+@pytest.fixture
+def opaque_manager(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(main, "expiry_service", main.ExpiryService(), raising=False)
+    return main.TokenManager(str(tmp_path / "tokens"), flush_interval_s=0)
+
+
+def test_lookup_of_user_without_token_is_not_cached(opaque_manager):
+    assert opaque_manager.verify_token("bob", "session-1", "x") == (False, "no_token_file")
+    assert opaque_manager.refresh_token("bob") is None
+    assert "bob" not in opaque_manager._records
+
+
+def test_logout_evicts_record_after_flush(opaque_manager):
+    token = opaque_manager.create_token("alice", "session-1")
+    opaque_manager.flush_all()
+    assert "alice" in opaque_manager._records
+
+    opaque_manager.invalidate_token("alice")
+    opaque_manager.flush_all()
+
+    assert "alice" not in opaque_manager._records
+    assert not (main.os.path.exists(opaque_manager._get_token_file_path("alice")))
+    assert opaque_manager.verify_token("alice", "session-1", token) == (False, "no_token_file")
+
+
+def test_expired_record_is_evicted_after_cleanup(opaque_manager, clock):
+    opaque_manager.create_token("alice", "session-1")
+    opaque_manager.flush_all()
+    clock.now += main.TokenManager.TOKEN_TTL_S + 1
+
+    assert opaque_manager.cleanup_expired_tokens("alice") is None
+    opaque_manager.flush_all()
+
+    assert "alice" not in opaque_manager._records